@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, Header, Query
-from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from typing import Callable, Dict, List, Optional, Union
 from pydantic import BaseModel, EmailStr, validator
-from core.database.enhanced_unified_service import enhanced_unified_db
+from core.database.async_unified_service import BackendUnavailableError, async_unified_db
 import logging
 from datetime import datetime
 
@@ -107,13 +109,32 @@ async def verify_admin_token(authorization: str = Header(None)):
 
 # === РОУТЕРЫ ===
 
-telegram_router = APIRouter(prefix="/telegram", tags=["Telegram Bot"])
-website_router = APIRouter(prefix="/website", tags=["Website"])
-mobile_router = APIRouter(prefix="/mobile", tags=["Mobile Apps"])
-desktop_router = APIRouter(prefix="/desktop", tags=["Desktop Apps"])
-universal_router = APIRouter(prefix="/universal", tags=["Cross-Platform"])
-admin_router = APIRouter(prefix="/admin", tags=["Administration"])
-api_router = APIRouter(prefix="/api", tags=["Partner API"])
+class BackendAwareRoute(APIRoute):
+    """Перегруженный или зависший бэкенд -> 503 с Retry-After вместо 500"""
+    
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        
+        async def route_handler(request: Request):
+            try:
+                return await handler(request)
+            except BackendUnavailableError as e:
+                logger.warning(f"{request.url.path}: {e}")
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": f"Service temporarily unavailable: {e}"},
+                    headers={"Retry-After": "5"}
+                )
+        
+        return route_handler
+
+telegram_router = APIRouter(prefix="/telegram", tags=["Telegram Bot"], route_class=BackendAwareRoute)
+website_router = APIRouter(prefix="/website", tags=["Website"], route_class=BackendAwareRoute)
+mobile_router = APIRouter(prefix="/mobile", tags=["Mobile Apps"], route_class=BackendAwareRoute)
+desktop_router = APIRouter(prefix="/desktop", tags=["Desktop Apps"], route_class=BackendAwareRoute)
+universal_router = APIRouter(prefix="/universal", tags=["Cross-Platform"], route_class=BackendAwareRoute)
+admin_router = APIRouter(prefix="/admin", tags=["Administration"], route_class=BackendAwareRoute)
+api_router = APIRouter(prefix="/api", tags=["Partner API"], route_class=BackendAwareRoute)
 
 # === TELEGRAM ENDPOINTS ===
 
@@ -121,7 +142,7 @@ api_router = APIRouter(prefix="/api", tags=["Partner API"])
 async def create_telegram_user(user: TelegramUserCreate):
     """Создать пользователя Telegram"""
     try:
-        user_uuid = enhanced_unified_db.create_telegram_user(user.telegram_id, user.dict())
+        user_uuid = await async_unified_db.create_telegram_user(user.telegram_id, user.dict())
         if user_uuid:
             return {
                 "status": "success", 
@@ -131,6 +152,8 @@ async def create_telegram_user(user: TelegramUserCreate):
             }
         else:
             raise HTTPException(status_code=400, detail="Failed to create user")
+    except BackendUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error creating Telegram user: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -138,7 +161,7 @@ async def create_telegram_user(user: TelegramUserCreate):
 @telegram_router.get("/users/{telegram_id}")
 async def get_telegram_user(telegram_id: int):
     """Получить информацию о пользователе Telegram"""
-    user_info = enhanced_unified_db.get_telegram_user_info(telegram_id)
+    user_info = await async_unified_db.get_telegram_user_info(telegram_id)
     if user_info:
         return user_info
     else:
@@ -147,7 +170,7 @@ async def get_telegram_user(telegram_id: int):
 @telegram_router.post("/users/{telegram_id}/orders")
 async def create_telegram_order(telegram_id: int, order: OrderCreate):
     """Создать заказ от Telegram пользователя"""
-    order_id = enhanced_unified_db.create_telegram_order(telegram_id, order.dict())
+    order_id = await async_unified_db.create_telegram_order(telegram_id, order.dict())
     if order_id:
         return {
             "status": "success", 
@@ -162,13 +185,13 @@ async def create_telegram_order(telegram_id: int, order: OrderCreate):
 @telegram_router.get("/users/{telegram_id}/loyalty")
 async def get_telegram_loyalty(telegram_id: int):
     """Получить информацию о лояльности"""
-    loyalty_info = enhanced_unified_db.get_telegram_loyalty(telegram_id)
+    loyalty_info = await async_unified_db.get_telegram_loyalty(telegram_id)
     return loyalty_info
 
 @telegram_router.get("/users/{telegram_id}/orders")
 async def get_telegram_orders(telegram_id: int, limit: int = Query(10, ge=1, le=100)):
     """Получить заказы пользователя"""
-    orders = enhanced_unified_db.get_telegram_orders(telegram_id, limit)
+    orders = await async_unified_db.get_telegram_orders(telegram_id, limit)
     return {"orders": orders, "count": len(orders)}
 
 # === WEBSITE ENDPOINTS ===
@@ -177,7 +200,7 @@ async def get_telegram_orders(telegram_id: int, limit: int = Query(10, ge=1, le=
 async def create_website_user(user: WebsiteUserCreate):
     """Создать пользователя сайта"""
     try:
-        user_uuid = enhanced_unified_db.create_website_user(user.email, user.dict())
+        user_uuid = await async_unified_db.create_website_user(user.email, user.dict())
         if user_uuid:
             return {
                 "status": "success", 
@@ -188,6 +211,8 @@ async def create_website_user(user: WebsiteUserCreate):
             }
         else:
             raise HTTPException(status_code=400, detail="Failed to create user")
+    except BackendUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error creating website user: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -195,7 +220,7 @@ async def create_website_user(user: WebsiteUserCreate):
 @website_router.get("/users/{email}")
 async def get_website_user(email: str):
     """Получить информацию о пользователе сайта"""
-    user_info = enhanced_unified_db.get_website_user_info(email)
+    user_info = await async_unified_db.get_website_user_info(email)
     if user_info:
         return user_info
     else:
@@ -204,7 +229,7 @@ async def get_website_user(email: str):
 @website_router.put("/users/{email}/profile")
 async def update_website_profile(email: str, profile_data: Dict):
     """Обновить профиль пользователя"""
-    success = enhanced_unified_db.update_website_profile(email, profile_data)
+    success = await async_unified_db.update_website_profile(email, profile_data)
     if success:
         return {
             "status": "success", 
@@ -220,7 +245,7 @@ async def link_telegram_account(email: str, link_data: LinkAccountData):
     if not link_data.telegram_id:
         raise HTTPException(status_code=400, detail="telegram_id is required")
     
-    success = enhanced_unified_db.link_telegram_to_website(email, link_data.telegram_id)
+    success = await async_unified_db.link_telegram_to_website(email, link_data.telegram_id)
     if success:
         return {
             "status": "success", 
@@ -233,7 +258,7 @@ async def link_telegram_account(email: str, link_data: LinkAccountData):
 @website_router.post("/users/{email}/orders")
 async def create_website_order(email: str, order: OrderCreate):
     """Создать заказ от веб-пользователя"""
-    order_id = enhanced_unified_db.create_website_order(email, order.dict())
+    order_id = await async_unified_db.create_website_order(email, order.dict())
     if order_id:
         return {
             "status": "success", 
@@ -248,7 +273,7 @@ async def create_website_order(email: str, order: OrderCreate):
 @website_router.get("/users/{email}/loyalty")
 async def get_website_loyalty(email: str):
     """Получить информацию о лояльности"""
-    return enhanced_unified_db.get_website_loyalty(email)
+    return await async_unified_db.get_website_loyalty(email)
 
 # === MOBILE ENDPOINTS ===
 
@@ -256,7 +281,7 @@ async def get_website_loyalty(email: str):
 async def create_mobile_user(user: MobileUserCreate):
     """Создать пользователя мобильного приложения"""
     try:
-        user_uuid = enhanced_unified_db.create_mobile_user(user.device_id, user.platform, user.dict())
+        user_uuid = await async_unified_db.create_mobile_user(user.device_id, user.platform, user.dict())
         if user_uuid:
             return {
                 "status": "success", 
@@ -267,6 +292,8 @@ async def create_mobile_user(user: MobileUserCreate):
             }
         else:
             raise HTTPException(status_code=400, detail="Failed to create user")
+    except BackendUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error creating mobile user: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -274,7 +301,7 @@ async def create_mobile_user(user: MobileUserCreate):
 @mobile_router.get("/users/{device_id}")
 async def get_mobile_user(device_id: str, platform: str = Query(..., regex="^(ios|android)$")):
     """Получить информацию о пользователе приложения"""
-    user_info = enhanced_unified_db.get_mobile_user_info(device_id, platform)
+    user_info = await async_unified_db.get_mobile_user_info(device_id, platform)
     if user_info:
         return user_info
     else:
@@ -283,7 +310,7 @@ async def get_mobile_user(device_id: str, platform: str = Query(..., regex="^(io
 @mobile_router.post("/users/{device_id}/sync")
 async def sync_mobile_data(device_id: str, platform: str, sync_data: SyncData):
     """Синхронизировать данные мобильного приложения"""
-    result = enhanced_unified_db.sync_mobile_data(device_id, platform, sync_data.dict())
+    result = await async_unified_db.sync_mobile_data(device_id, platform, sync_data.dict())
     return result
 
 @mobile_router.post("/users/{device_id}/push-token")
@@ -293,7 +320,7 @@ async def register_push_token(device_id: str, platform: str, push_data: Dict):
     if not push_token:
         raise HTTPException(status_code=400, detail="push_token is required")
     
-    success = enhanced_unified_db.register_mobile_push_token(device_id, platform, push_token)
+    success = await async_unified_db.register_mobile_push_token(device_id, platform, push_token)
     if success:
         return {
             "status": "success", 
@@ -315,7 +342,7 @@ async def link_mobile_accounts(device_id: str, platform: str, link_data: LinkAcc
     if not account_data:
         raise HTTPException(status_code=400, detail="At least one account identifier required")
     
-    success = enhanced_unified_db.link_mobile_accounts(device_id, platform, account_data)
+    success = await async_unified_db.link_mobile_accounts(device_id, platform, account_data)
     if success:
         return {
             "status": "success", 
@@ -329,7 +356,7 @@ async def link_mobile_accounts(device_id: str, platform: str, link_data: LinkAcc
 @mobile_router.post("/users/{device_id}/orders")
 async def create_mobile_order(device_id: str, platform: str, order: OrderCreate):
     """Создать заказ от мобильного пользователя"""
-    order_id = enhanced_unified_db.create_mobile_order(device_id, platform, order.dict())
+    order_id = await async_unified_db.create_mobile_order(device_id, platform, order.dict())
     if order_id:
         return {
             "status": "success", 
@@ -347,7 +374,7 @@ async def create_mobile_order(device_id: str, platform: str, order: OrderCreate)
 async def create_desktop_user(user: DesktopUserCreate):
     """Создать пользователя десктопного приложения"""
     try:
-        user_uuid = enhanced_unified_db.create_desktop_user(user.user_id, user.platform, user.dict())
+        user_uuid = await async_unified_db.create_desktop_user(user.user_id, user.platform, user.dict())
         if user_uuid:
             return {
                 "status": "success", 
@@ -358,6 +385,8 @@ async def create_desktop_user(user: DesktopUserCreate):
             }
         else:
             raise HTTPException(status_code=400, detail="Failed to create user")
+    except BackendUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error creating desktop user: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -365,7 +394,7 @@ async def create_desktop_user(user: DesktopUserCreate):
 @desktop_router.get("/users/{user_id}")
 async def get_desktop_user(user_id: str, platform: str = Query(..., regex="^(windows|mac|linux)$")):
     """Получить информацию о пользователе десктопа"""
-    user_info = enhanced_unified_db.get_desktop_user_info(user_id, platform)
+    user_info = await async_unified_db.get_desktop_user_info(user_id, platform)
     if user_info:
         return user_info
     else:
@@ -374,7 +403,7 @@ async def get_desktop_user(user_id: str, platform: str = Query(..., regex="^(win
 @desktop_router.post("/users/{user_id}/sync-cloud")
 async def sync_desktop_cloud(user_id: str, platform: str, cloud_data: SyncData):
     """Синхронизировать десктопные данные с облаком"""
-    result = enhanced_unified_db.sync_desktop_with_cloud(user_id, platform, cloud_data.dict())
+    result = await async_unified_db.sync_desktop_with_cloud(user_id, platform, cloud_data.dict())
     return result
 
 # === UNIVERSAL ENDPOINTS ===
@@ -382,7 +411,7 @@ async def sync_desktop_cloud(user_id: str, platform: str, cloud_data: SyncData):
 @universal_router.post("/users/search")
 async def search_user_across_platforms(identifiers: Dict):
     """Найти пользователя по любому идентификатору"""
-    user_info = enhanced_unified_db.get_user_across_platforms(identifiers)
+    user_info = await async_unified_db.get_user_across_platforms(identifiers)
     if user_info:
         return user_info
     else:
@@ -398,7 +427,7 @@ async def create_cross_platform_order(order_data: Dict):
     if not user_identifiers or not primary_platform:
         raise HTTPException(status_code=400, detail="user_identifiers and primary_platform are required")
     
-    order_id = enhanced_unified_db.create_cross_platform_order(user_identifiers, order_details, primary_platform)
+    order_id = await async_unified_db.create_cross_platform_order(user_identifiers, order_details, primary_platform)
     if order_id:
         return {
             "status": "success", 
@@ -412,7 +441,7 @@ async def create_cross_platform_order(order_data: Dict):
 @universal_router.post("/loyalty/unified")
 async def get_unified_loyalty(identifiers: Dict):
     """Получить объединенную информацию о лояльности"""
-    loyalty_info = enhanced_unified_db.get_unified_loyalty_info(identifiers)
+    loyalty_info = await async_unified_db.get_unified_loyalty_info(identifiers)
     return loyalty_info
 
 @universal_router.post("/users/sync-platforms")
@@ -425,35 +454,37 @@ async def sync_user_across_platforms(sync_request: Dict):
     if not primary_identifier or not primary_platform:
         raise HTTPException(status_code=400, detail="primary_identifier and primary_platform are required")
     
-    result = enhanced_unified_db.sync_user_across_platforms(primary_identifier, primary_platform, sync_data)
+    result = await async_unified_db.sync_user_across_platforms(primary_identifier, primary_platform, sync_data)
     return result
 
 @universal_router.get("/statistics/platforms")
 async def get_platform_statistics():
     """Получить статистику по всем платформам"""
-    return enhanced_unified_db.get_platform_statistics()
+    return await async_unified_db.get_platform_statistics()
 
 # === ADMIN ENDPOINTS ===
 
 @admin_router.get("/status", dependencies=[Depends(verify_admin_token)])
 async def get_system_status():
     """Получить статус всей системы"""
-    return enhanced_unified_db.get_admin_dashboard_data()
+    data = await async_unified_db.get_admin_dashboard_data()
+    data['backends'] = async_unified_db.get_stats()
+    return data
 
 @admin_router.post("/sync", dependencies=[Depends(verify_admin_token)])
 async def force_system_sync():
     """Принудительная синхронизация системы"""
-    return enhanced_unified_db.force_system_sync()
+    return await async_unified_db.force_system_sync()
 
 @admin_router.get("/report", dependencies=[Depends(verify_admin_token)])
 async def export_system_report():
     """Экспорт полного отчета о системе"""
-    return enhanced_unified_db.export_system_report()
+    return await async_unified_db.export_system_report()
 
 @admin_router.get("/health")
 async def health_check():
     """Быстрая проверка здоровья (без авторизации)"""
-    status = enhanced_unified_db.health_check()
+    status = await async_unified_db.health_check()
     return {
         "status": "ok" if status['health']['overall'] else "degraded",
         "mode": status['mode'],
@@ -476,7 +507,7 @@ async def create_api_order(order_data: Dict, api_key: str = Depends(verify_api_k
     if not external_user_id:
         raise HTTPException(status_code=400, detail="external_user_id is required")
     
-    order_id = enhanced_unified_db.create_api_order(api_key, external_user_id, order_details)
+    order_id = await async_unified_db.create_api_order(api_key, external_user_id, order_details)
     if order_id:
         return {
             "status": "success", 
@@ -490,7 +521,7 @@ async def create_api_order(order_data: Dict, api_key: str = Depends(verify_api_k
 @api_router.get("/users/{external_user_id}", dependencies=[Depends(verify_api_key)])
 async def get_api_user(external_user_id: str, api_key: str = Depends(verify_api_key)):
     """Получить информацию о внешнем пользователе"""
-    user_info = enhanced_unified_db.get_api_user_info(api_key, external_user_id)
+    user_info = await async_unified_db.get_api_user_info(api_key, external_user_id)
     if user_info:
         return user_info
     else:
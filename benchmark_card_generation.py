@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк массовой генерации пластиковых карт (CardService.generate_cards)
+
+С DATABASE_URL=postgresql://... замеряет полный путь (резерв диапазона,
+COPY + INSERT ... ON CONFLICT DO NOTHING, потоковый CSV). Без PostgreSQL
+замеряет только запись CSV и PDF. Запуск:
+
+    python benchmark_card_generation.py --count 10000 [--pdf]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def report(stage: str, count: int, elapsed: float) -> None:
+    print(f"⚡ {stage}: {count} карт за {elapsed:.2f} s ({count / elapsed:.0f} cards/s)")
+
+
+async def run(count: int, with_pdf: bool) -> None:
+    from core.services.card_service import card_service
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "cards.pdf") if with_pdf else None
+
+        if os.getenv("DATABASE_URL", "").startswith("postgres"):
+            started = time.perf_counter()
+            result = await card_service.generate_cards(
+                count, created_by=0, csv_path=os.path.join(tmp, "cards.csv"), pdf_path=pdf_path
+            )
+            if not result['success']:
+                print(f"❌ {result['message']}")
+                return
+            report("generate_cards" + (" + PDF" if with_pdf else ""), result['created_count'], time.perf_counter() - started)
+            return
+
+        print("ℹ️ DATABASE_URL не указывает на PostgreSQL — замеряем только файлы")
+        cards = [
+            {
+                'card_id': card_service.generate_card_id(number),
+                'card_id_printable': card_service.generate_card_id_printable(number),
+                'qr_url': card_service.generate_qr_url(card_service.generate_card_id(number))
+            }
+            for number in range(12340001, 12340001 + count)
+        ]
+
+        started = time.perf_counter()
+        card_service.write_cards_csv(cards, os.path.join(tmp, "cards.csv"))
+        report("CSV", count, time.perf_counter() - started)
+
+        if pdf_path:
+            started = time.perf_counter()
+            card_service.write_cards_pdf(cards, pdf_path)
+            report("PDF", count, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark bulk plastic card generation")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--pdf", action="store_true", help="also render the print-ready PDF sheet")
+    args = parser.parse_args()
+    asyncio.run(run(args.count, args.pdf))
+
+
+if __name__ == "__main__":
+    main()
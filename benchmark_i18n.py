@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк get_text: скомпилированный каталог против прежнего рекурсивного поиска
+
+Прежняя реализация воспроизведена ниже один в один, ответы сверяются по всем
+ключам и языкам. Запуск:
+
+    python benchmark_i18n.py --lookups 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.utils.locales_v2 import ALIASES, get_text, translations_v2
+
+
+def legacy_get_text(key: str, lang: str = 'ru') -> str:
+    """get_text до компиляции каталога: алиасы, язык, фолбэк на ru на каждом вызове"""
+    if key in ALIASES:
+        return legacy_get_text(ALIASES[key], lang)
+    if lang in translations_v2 and key in translations_v2[lang]:
+        return translations_v2[lang][key]
+    if key in translations_v2['ru']:
+        return translations_v2['ru'][key]
+    return f"[{key}]"
+
+
+def measure(fn, workload) -> float:
+    started = time.perf_counter()
+    for key, lang in workload:
+        fn(key, lang)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark locales_v2.get_text")
+    parser.add_argument("--lookups", type=int, default=500000)
+    args = parser.parse_args()
+
+    langs = list(translations_v2.keys()) + ['de']  # неподдерживаемый язык -> фолбэк
+    keys = sorted({k for texts in translations_v2.values() for k in texts} | set(ALIASES) | {'missing.key'})
+
+    mismatches = [(k, l) for k in keys for l in langs if get_text(k, l) != legacy_get_text(k, l)]
+    print(f"🔎 Сверка: {len(keys)} ключей x {len(langs)} языков, расхождений: {len(mismatches)}")
+
+    # Реалистичная смесь: в основном ru, заметная доля фолбэков и алиасов
+    rnd = random.Random(42)
+    workload = [
+        (rnd.choice(keys), rnd.choices(langs, weights=[2, 2, 6, 3, 1])[0])
+        for _ in range(args.lookups)
+    ]
+
+    legacy = measure(legacy_get_text, workload)
+    compiled = measure(get_text, workload)
+    print(f"🐢 legacy:   {args.lookups / legacy / 1e6:.2f} M lookups/s")
+    print(f"⚡ compiled: {args.lookups / compiled / 1e6:.2f} M lookups/s ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пути продажи на кассе партнера (PaymentService.process_sale)
+
+Создаёт временную SQLite-базу, прогоняет N продаж и печатает sales/s и
+p50/p95 латентность. Запуск:
+
+    python benchmark_process_sale.py --sales 2000 --users 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE users (
+    telegram_id INTEGER PRIMARY KEY,
+    points_balance INTEGER DEFAULT 0,
+    updated_at TEXT
+);
+CREATE TABLE partner_places (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    status TEXT,
+    base_discount_pct REAL,
+    loyalty_accrual_pct REAL,
+    min_redeem INTEGER,
+    max_percent_per_bill REAL
+);
+CREATE TABLE platform_loyalty_config (
+    id INTEGER PRIMARY KEY,
+    redeem_rate REAL,
+    rounding_rule TEXT,
+    max_accrual_percent REAL
+);
+CREATE TABLE partner_sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    partner_id INTEGER, place_id INTEGER, operator_telegram_id INTEGER, user_telegram_id INTEGER,
+    amount_gross REAL, base_discount_pct REAL, extra_discount_pct REAL, extra_value REAL,
+    amount_partner_due REAL, amount_user_subsidy REAL, points_spent INTEGER, points_earned INTEGER,
+    redeem_rate REAL, qr_token TEXT, created_at TEXT
+);
+CREATE TABLE points_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, change_amount INTEGER, reason TEXT, transaction_type TEXT,
+    sale_id INTEGER, admin_id INTEGER, created_at TEXT
+);
+CREATE TABLE loyalty_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    partner_id INTEGER, transaction_type TEXT, created_at TEXT
+);
+CREATE TABLE user_notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER, message TEXT, notification_type TEXT, is_read INTEGER, created_at TEXT
+);
+"""
+
+
+def prepare_database(path: str, users: int) -> None:
+    """Схема и тестовые данные"""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO users (telegram_id, points_balance) VALUES (?, ?)",
+        [(user_id, 1000) for user_id in range(1, users + 1)]
+    )
+    conn.execute(
+        "INSERT INTO partner_places VALUES (1, 'Benchmark Cafe', 'published', 10.0, 5.0, 0, 50.0)"
+    )
+    conn.execute("INSERT INTO platform_loyalty_config VALUES (1, 5000.0, 'bankers', 20.0)")
+    conn.commit()
+    conn.close()
+
+
+async def run(sales: int, users: int) -> None:
+    from datetime import datetime
+    from core.services.cache import cache_service
+    from core.services.payment_service import PaymentService
+    from core.services.tariff_service import tariff_service
+
+    # Счетчик лимита тарифа живет в кэше; засеваем его, чтобы не ходить в основную БД
+    await cache_service.set(tariff_service._usage_key(1, datetime.now()), 0)
+
+    service = PaymentService()
+    latencies = []
+
+    started = time.perf_counter()
+    for i in range(sales):
+        user_id = random.randint(1, users)
+        points_to_spend = 2 if i % 4 == 0 else 0
+        t0 = time.perf_counter()
+        await service.process_sale(
+            partner_id=1, place_id=1, operator_id=1, user_id=user_id,
+            amount_gross=random.choice([50000, 120000, 350000]),
+            points_to_spend=points_to_spend
+        )
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"🧾 Продаж: {sales}, пользователей: {users}")
+    print(f"⚡ Пропускная способность: {sales / elapsed:.1f} sales/s")
+    print(f"⏱️ p50: {statistics.median(latencies) * 1000:.2f} ms, p95: {p95 * 1000:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark PaymentService.process_sale")
+    parser.add_argument("--sales", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "benchmark.db")
+        prepare_database(db_path, args.users)
+        os.environ["DATABASE_PATH"] = db_path
+        os.environ.pop("DATABASE_URL", None)
+        asyncio.run(run(args.sales, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска пользователей в админке (AdminService.search_users_page)
+
+SQLite (по умолчанию): создает временную базу с N синтетических пользователей,
+применяет миграцию 027 (FTS5 trigram) и сравнивает индексный поиск с прежним
+`LIKE '%q%' OR ...` сканом. PostgreSQL: --pg на ПУСТОЙ scratch-базе из
+DATABASE_URL — заполняет users через generate_series и строит pg_trgm индекс.
+
+    python benchmark_user_search.py --users 1000000
+    DATABASE_URL=postgresql://.../scratch python benchmark_user_search.py --pg --users 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем путь к проекту
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = ["Иван", "Анна", "Nguyen", "Minh", "Olga", "Ji-ho", "Sergey", "Linh", "Maria", "Tuan"]
+LAST_NAMES = ["Petrov", "Tran", "Kim", "Ivanova", "Le", "Smirnov", "Pham", "Park", "Sokolova", "Vo"]
+QUERIES = ["petrov", "minh", "user_4242", "anna", "kim", "ol", "sokol", "xyz_nobody"]
+
+
+def percentile(samples, pct: float) -> float:
+    samples = sorted(samples)
+    return samples[max(0, int(len(samples) * pct) - 1)]
+
+
+def prepare_sqlite(path: str, users: int) -> None:
+    from core.database.migrations import DatabaseMigrator
+
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE,
+            username TEXT, first_name TEXT, last_name TEXT,
+            karma_points INTEGER DEFAULT 0, level INTEGER DEFAULT 1,
+            role TEXT DEFAULT 'user', is_banned INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    rnd = random.Random(42)
+    conn.executemany(
+        "INSERT INTO users (telegram_id, username, first_name, last_name, karma_points) VALUES (?, ?, ?, ?, ?)",
+        (
+            (100000 + i, f"user_{i}", rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), rnd.randint(0, 5000))
+            for i in range(users)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+    started = time.perf_counter()
+    migrator = DatabaseMigrator(path)
+    migrator.init_migration_table()
+    migrator.migrate_027_users_search_fts()
+    print(f"🏗️ FTS5 индекс построен за {time.perf_counter() - started:.1f} s")
+
+
+def legacy_sqlite_search(path: str, query: str, limit: int):
+    conn = sqlite3.connect(path)
+    try:
+        pattern = f"%{query}%"
+        return conn.execute("""
+            SELECT telegram_id, username, first_name, last_name, karma_points
+            FROM users
+            WHERE username LIKE ? OR first_name LIKE ? OR last_name LIKE ?
+            ORDER BY karma_points DESC
+            LIMIT ?
+        """, (pattern, pattern, pattern, limit)).fetchall()
+    finally:
+        conn.close()
+
+
+async def prepare_pg(users: int) -> None:
+    import asyncpg
+    from core.database.migrations import ensure_users_search_index
+
+    conn = await asyncpg.connect(os.environ["DATABASE_URL"])
+    try:
+        exists = await conn.fetchval("SELECT to_regclass('public.users') IS NOT NULL")
+        if exists and await conn.fetchval("SELECT EXISTS (SELECT 1 FROM users)"):
+            raise SystemExit("❌ users уже содержит данные — нужен пустой scratch DATABASE_URL")
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                telegram_id BIGINT PRIMARY KEY,
+                username TEXT, first_name TEXT, last_name TEXT,
+                karma_points INTEGER DEFAULT 0, level INTEGER DEFAULT 1,
+                role TEXT DEFAULT 'user', is_banned BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT now()
+            )
+        """)
+        await conn.execute("""
+            INSERT INTO users (telegram_id, username, first_name, last_name, karma_points)
+            SELECT 100000 + i, 'user_' || i,
+                   ($2::text[])[1 + (i % 10)], ($3::text[])[1 + ((i / 10) % 10)],
+                   (random() * 5000)::int
+            FROM generate_series(0, $1 - 1) AS i
+        """, users, FIRST_NAMES, LAST_NAMES)
+    finally:
+        await conn.close()
+
+    started = time.perf_counter()
+    ensure_users_search_index()
+    print(f"🏗️ pg_trgm индекс построен за {time.perf_counter() - started:.1f} s")
+
+
+async def legacy_pg_search(query: str, limit: int):
+    import asyncpg
+
+    conn = await asyncpg.connect(os.environ["DATABASE_URL"])
+    try:
+        return await conn.fetch("""
+            SELECT telegram_id, username, first_name, last_name, karma_points
+            FROM users
+            WHERE username ILIKE $1 OR first_name ILIKE $1 OR last_name ILIKE $1
+            ORDER BY karma_points DESC
+            LIMIT $2
+        """, f"%{query}%", limit)
+    finally:
+        await conn.close()
+
+
+async def run(users: int, rounds: int, use_pg: bool, db_path: str) -> None:
+    from core.services.admin_service import AdminService
+
+    service = AdminService()
+    indexed, legacy = [], []
+    for _ in range(rounds):
+        for query in QUERIES:
+            t0 = time.perf_counter()
+            page = await service.search_users_page(query, limit=10)
+            if page['next_cursor']:
+                await service.search_users_page(query, limit=10, cursor=page['next_cursor'])
+            indexed.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            if use_pg:
+                await legacy_pg_search(query, 10)
+            else:
+                legacy_sqlite_search(db_path, query, 10)
+            legacy.append(time.perf_counter() - t0)
+
+    print(f"👥 Пользователей: {users}, запросов: {len(indexed)} (2 страницы на запрос для индекса)")
+    print(f"🐢 LIKE scan: p50 {statistics.median(legacy) * 1000:.1f} ms, p95 {percentile(legacy, 0.95) * 1000:.1f} ms")
+    print(f"⚡ indexed:   p50 {statistics.median(indexed) * 1000:.1f} ms, p95 {percentile(indexed, 0.95) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark AdminService user search")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--pg", action="store_true", help="use the scratch PostgreSQL database from DATABASE_URL")
+    args = parser.parse_args()
+
+    if args.pg:
+        asyncio.run(prepare_pg(args.users))
+        asyncio.run(run(args.users, args.rounds, True, ""))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "users.db")
+        prepare_sqlite(db_path, args.users)
+        os.environ["DATABASE_PATH"] = db_path
+        os.environ.pop("DATABASE_URL", None)
+        asyncio.run(run(args.users, args.rounds, False, db_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Асинхронный фасад EnhancedUnifiedDatabaseService для FastAPI
+
+Цепочка EnhancedUnifiedDatabaseService -> адаптеры -> FaultTolerantService
+синхронная: supabase-py, db_v2 и запись JSON-файлов блокируют поток. Фасад
+выполняет каждый вызов в общем пуле потоков, не занимая цикл событий воркера:
+
+  - у каждого бэкенда свой лимит одновременных вызовов, поэтому медленный
+    Supabase не занимает потоки, нужные основной БД;
+  - вызов, не получивший слот за UNIFIED_DB_QUEUE_TIMEOUT, и вызов дольше
+    UNIFIED_DB_TIMEOUT завершаются BackendUnavailableError (в API это 503).
+    Поток по таймауту не прерывается: слот освобождается, когда он закончит.
+
+Env:
+  - UNIFIED_DB_MAIN_CONCURRENCY (default 8): пользователи, заказы, связки аккаунтов
+  - UNIFIED_DB_LOYALTY_CONCURRENCY (default 4): баллы и карты (Supabase)
+  - UNIFIED_DB_ADMIN_CONCURRENCY (default 2): статус, отчеты, принудительная синхронизация
+  - UNIFIED_DB_TIMEOUT (seconds, default 10), UNIFIED_DB_QUEUE_TIMEOUT (seconds, default 2)
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .enhanced_unified_service import EnhancedUnifiedDatabaseService, enhanced_unified_db
+
+logger = logging.getLogger(__name__)
+
+# Метод EnhancedUnifiedDatabaseService -> бэкенд, чей лимит он расходует (по умолчанию 'main')
+METHOD_BACKENDS = {
+    'get_telegram_loyalty': 'loyalty',
+    'get_website_loyalty': 'loyalty',
+    'get_unified_loyalty_info': 'loyalty',
+    'health_check': 'admin',
+    'get_platform_statistics': 'admin',
+    'get_admin_dashboard_data': 'admin',
+    'force_system_sync': 'admin',
+    'export_system_report': 'admin',
+}
+
+
+class BackendUnavailableError(RuntimeError):
+    """Бэкенд перегружен (нет свободного слота) или не ответил за таймаут"""
+
+    def __init__(self, backend: str, reason: str):
+        super().__init__(f"{backend} backend {reason}")
+        self.backend = backend
+        self.reason = reason
+
+
+class BlockingOffloader:
+    """Пул потоков для блокирующих вызовов с лимитом и таймаутом на бэкенд"""
+
+    def __init__(self, limits: Dict[str, int], timeout: float = 10.0, queue_timeout: float = 2.0):
+        self.limits = {backend: max(1, limit) for backend, limit in limits.items()}
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        # Потоков ровно на сумму лимитов: бэкенды не отнимают потоки друг у друга
+        self._executor = ThreadPoolExecutor(max_workers=sum(self.limits.values()), thread_name_prefix="unified-db")
+        self._semaphores = {backend: asyncio.Semaphore(limit) for backend, limit in self.limits.items()}
+        self._stats = {backend: {'calls': 0, 'in_flight': 0, 'rejected': 0, 'timeouts': 0, 'total_seconds': 0.0}
+                       for backend in self.limits}
+
+    async def run(self, backend: str, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        semaphore = self._semaphores[backend]
+        stats = self._stats[backend]
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            stats['rejected'] += 1
+            raise BackendUnavailableError(backend, "busy") from None
+
+        stats['calls'] += 1
+        stats['in_flight'] += 1
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+        def _release(done: asyncio.Future) -> None:
+            stats['in_flight'] -= 1
+            stats['total_seconds'] += time.monotonic() - started
+            semaphore.release()
+            if not done.cancelled():
+                done.exception()  # результат после таймаута никто не ждет
+
+        future.add_done_callback(_release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout or self.timeout)
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+            logger.warning(f"{backend} backend call {getattr(func, '__name__', func)} timed out")
+            raise BackendUnavailableError(backend, "timeout") from None
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            backend: {
+                'limit': self.limits[backend],
+                'calls': stats['calls'],
+                'in_flight': stats['in_flight'],
+                'rejected': stats['rejected'],
+                'timeouts': stats['timeouts'],
+                'avg_seconds': round(stats['total_seconds'] / stats['calls'], 4) if stats['calls'] else None,
+            }
+            for backend, stats in self._stats.items()
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncUnifiedDatabaseService:
+    """Те же методы, что у EnhancedUnifiedDatabaseService, но корутины"""
+
+    def __init__(self, service: EnhancedUnifiedDatabaseService, offloader: Optional[BlockingOffloader] = None):
+        self._service = service
+        self.offloader = offloader or BlockingOffloader(
+            {
+                'main': int(os.getenv("UNIFIED_DB_MAIN_CONCURRENCY", "8")),
+                'loyalty': int(os.getenv("UNIFIED_DB_LOYALTY_CONCURRENCY", "4")),
+                'admin': int(os.getenv("UNIFIED_DB_ADMIN_CONCURRENCY", "2")),
+            },
+            timeout=float(os.getenv("UNIFIED_DB_TIMEOUT", "10")),
+            queue_timeout=float(os.getenv("UNIFIED_DB_QUEUE_TIMEOUT", "2")),
+        )
+
+    def __getattr__(self, name: str):
+        method = getattr(self._service, name)
+        if name.startswith('_') or not callable(method):
+            return method
+        backend = METHOD_BACKENDS.get(name, 'main')
+
+        async def call(*args, **kwargs):
+            return await self.offloader.run(backend, method, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return self.offloader.get_stats()
+
+
+async_unified_db = AsyncUnifiedDatabaseService(enhanced_unified_db)
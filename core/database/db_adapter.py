@@ -77,6 +77,74 @@ class DatabaseAdapter:
         else:
             return self.sqlite_service.get_cards_by_category(category_slug, status, limit)
     
+    async def search_cards(self, query: str, city_id: int = None, category_slug: str = None, limit: int = 50):
+        """Get catalog search candidates"""
+        if self.use_postgresql:
+            return await self.postgresql_service.search_cards(query, city_id, category_slug, limit=limit)
+        else:
+            return self.sqlite_service.search_cards(query, city_id, category_slug, limit=limit)
+    
+    async def get_sync_watermark(self, source: str):
+        """Get last synced (write_date, id) for a sync source"""
+        if self.use_postgresql:
+            return await self.postgresql_service.get_sync_watermark(source)
+        else:
+            return self.sqlite_service.get_sync_watermark(source)
+    
+    async def upsert_odoo_cards(self, cards, *, partner_tg_id: int, source: str, watermark):
+        """Upsert a batch of Odoo cards and advance the sync watermark"""
+        if self.use_postgresql:
+            return await self.postgresql_service.upsert_odoo_cards(
+                cards, partner_tg_id=partner_tg_id, source=source, watermark=watermark
+            )
+        else:
+            return self.sqlite_service.upsert_odoo_cards(
+                cards, partner_tg_id=partner_tg_id, source=source, watermark=watermark
+            )
+    
+    async def retry_parked_odoo_cards(self, *, partner_tg_id: int, source: str):
+        """Apply parked Odoo cards whose category exists now"""
+        if self.use_postgresql:
+            return await self.postgresql_service.retry_parked_odoo_cards(partner_tg_id=partner_tg_id, source=source)
+        else:
+            return self.sqlite_service.retry_parked_odoo_cards(partner_tg_id=partner_tg_id, source=source)
+    
+    # Identity graph (multi-platform adapters call these from worker threads)
+    def ensure_identity(self, platform: str, external_id, user_uuid: Optional[str] = None) -> str:
+        """Register (platform, external_id) in the identity graph; returns its canonical uuid"""
+        if self.use_postgresql:
+            return self.postgresql_service.ensure_identity_sync(platform, external_id, user_uuid)
+        else:
+            return self.sqlite_service.ensure_identity(platform, external_id, user_uuid)
+    
+    def link_identities(self, first, second) -> str:
+        """Merge the users owning two identities; returns the canonical uuid"""
+        if self.use_postgresql:
+            return self.postgresql_service.link_identities_sync(first, second)
+        else:
+            return self.sqlite_service.link_identities(first, second)
+    
+    def resolve_identity(self, platform: str, external_id) -> Optional[str]:
+        """Canonical user uuid for the identity, None if unknown"""
+        if self.use_postgresql:
+            return self.postgresql_service.resolve_identity_sync(platform, external_id)
+        else:
+            return self.sqlite_service.resolve_identity(platform, external_id)
+    
+    def get_linked_identities(self, platform: str, external_id) -> Dict[str, List[str]]:
+        """Other identities of the same user, grouped by platform"""
+        if self.use_postgresql:
+            return self.postgresql_service.get_linked_identities_sync(platform, external_id)
+        else:
+            return self.sqlite_service.get_linked_identities(platform, external_id)
+    
+    def get_identity_counters(self) -> Dict[str, int]:
+        """Identity graph counters: identities, users, links, platform:<name>"""
+        if self.use_postgresql:
+            return self.postgresql_service.get_identity_counters_sync()
+        else:
+            return self.sqlite_service.get_identity_counters()
+    
     def get_categories(self):
         """Get all categories"""
         if self.use_postgresql:
@@ -143,6 +211,17 @@ class DatabaseAdapter:
         else:
             return self.sqlite_service.get_card_photos(card_id)
     
+    async def get_cards_photos(self, card_ids):
+        """Photos of a page of cards in one query: {card_id: photos}"""
+        if self.use_postgresql:
+            return await self.postgresql_service.get_cards_photos(card_ids)
+        else:
+            try:
+                return self.sqlite_service.get_cards_photos(card_ids)
+            except Exception as e:
+                logger.error(f"Error getting photos for cards {card_ids}: {e}")
+                return {}
+    
     async def add_to_favorites(self, user_id: int, card_id: int) -> bool:
         """Add card to user favorites"""
         if self.use_postgresql:
@@ -2,18 +2,29 @@
 Enhanced database service with backward compatibility
 Implements new schema while maintaining legacy support
 """
+import json
 import os
 import sqlite3
+import uuid
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import logging
 
 from .migrations import DatabaseMigrator
+from ..utils.trigrams import fts5_match_expression, words as query_words
 
 logger = logging.getLogger(__name__)
 
+def _publish_card_changed(card_id) -> None:
+    """Событие 'card' в шину инвалидации: кэш рендера сбрасывается сразу, каталог и другие инстансы — в фоне"""
+    try:
+        from core.services.invalidation_bus import invalidation_bus
+        invalidation_bus.publish_nowait('card', int(card_id))
+    except Exception as e:
+        logger.debug(f"Card cache invalidation skipped for {card_id}: {e}")
+
 def get_connection():
     """Get database connection for backward compatibility"""
     import sqlite3
@@ -207,6 +218,7 @@ class DatabaseServiceV2:
                 "UPDATE cards_v2 SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                 (status, card_id)
             )
+            _publish_card_changed(card_id)
             
             # Log moderation action
             if moderator_id:
@@ -277,6 +289,272 @@ class DatabaseServiceV2:
             logger.error(f"ДИАГНОСТИКА: Ошибка при получении карточек для категории '{category_slug}': {e}")
             return []
 
+    def search_cards(self, query: str, city_id: Optional[int] = None, category_slug: Optional[str] = None,
+                     status: str = 'published', limit: int = 50) -> List[Dict]:
+        """
+        Candidate cards for catalog search (FTS5 trigram index, migration 028).
+
+        Returns up to `limit` cards ordered by bm25; typo-tolerant ranking is done
+        by CatalogSearchService. Queries without 3+ char words use a title prefix.
+        """
+        terms = query_words(query)
+        if not terms:
+            return []
+        expression = fts5_match_expression(terms)
+        select = """
+            SELECT c.*, cat.slug as category_slug, cat.name as category_name, cat.emoji as category_emoji,
+                   (SELECT COUNT(*) FROM card_photos cp WHERE cp.card_id = c.id) as photos_count
+        """
+        filters = """
+            AND c.status = ? AND cat.is_active = 1
+            AND (? IS NULL OR c.city_id = ?)
+            AND (? IS NULL OR cat.slug = ?)
+        """
+        filter_params = (status, city_id, city_id, category_slug, category_slug)
+        try:
+            with self.get_connection() as conn:
+                if not expression:
+                    # 1-2 символа: префикс по названию (фильтры по статусу/городу уже сужают выборку)
+                    cursor = conn.execute(
+                        select + """
+                        FROM cards_v2 c
+                        JOIN categories_v2 cat ON c.category_id = cat.id
+                        WHERE lower(c.title) LIKE ?
+                        """ + filters + " ORDER BY c.title LIMIT ?",
+                        (terms[0] + '%',) + filter_params + (limit,),
+                    )
+                    return [dict(row) for row in cursor.fetchall()]
+                # Слова короче триграммы ("15", "mi") проверяем уже среди найденных индексом
+                short_terms = [t for t in terms if len(t) < 3]
+                short_filter = "".join(
+                    " AND (c.title LIKE ? OR c.description LIKE ? OR c.address LIKE ? OR c.discount_text LIKE ?)"
+                    for _ in short_terms
+                )
+                short_params = tuple(f"%{t}%" for t in short_terms for _ in range(4))
+                try:
+                    cursor = conn.execute(
+                        select + """
+                        FROM cards_search_fts f
+                        JOIN cards_v2 c ON c.id = f.rowid
+                        JOIN categories_v2 cat ON c.category_id = cat.id
+                        WHERE cards_search_fts MATCH ?
+                        """ + filters + short_filter + """
+                        ORDER BY bm25(cards_search_fts, 4.0, 1.0, 2.0, 2.0)
+                        LIMIT ?
+                        """,
+                        (expression,) + filter_params + short_params + (limit,),
+                    )
+                except sqlite3.OperationalError as e:
+                    # Индекс еще не создан (APPLY_MIGRATIONS=0) — медленный, но рабочий скан
+                    logger.warning(f"cards_search_fts unavailable, falling back to LIKE scan: {e}")
+                    like = " AND ".join(
+                        "(c.title LIKE ? OR c.description LIKE ? OR c.address LIKE ? OR c.discount_text LIKE ?)"
+                        for _ in terms
+                    )
+                    cursor = conn.execute(
+                        select + """
+                        FROM cards_v2 c
+                        JOIN categories_v2 cat ON c.category_id = cat.id
+                        WHERE """ + like + filters + " LIMIT ?",
+                        tuple(f"%{t}%" for t in terms for _ in range(4)) + filter_params + (limit,),
+                    )
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error searching cards for '{query}': {e}")
+            return []
+
+    # --- Odoo card sync (OdooCardSyncService, migration 029) ---
+    def get_sync_watermark(self, source: str) -> Tuple[Optional[str], int]:
+        """Last synced (write_date, id) for the source; (None, 0) before the first sync"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT watermark, last_id FROM sync_watermarks WHERE source = ?", (source,)
+            ).fetchone()
+            return (row[0], int(row[1] or 0)) if row else (None, 0)
+
+    def upsert_odoo_cards(self, cards: List[Dict[str, Any]], *, partner_tg_id: int, source: str,
+                          watermark: Tuple[str, int]) -> List[int]:
+        """
+        Insert or update cards synced from Odoo (origin='odoo') by odoo_card_id and
+        advance the source watermark in the same transaction.
+
+        Cards created in the bot and pushed to Odoo (origin='local') are not touched.
+        Cards whose category does not exist locally are parked in sync_parked_records
+        and retried by retry_parked_odoo_cards, so the watermark never skips them.
+        Returns ids of inserted/updated local cards.
+        """
+        partner_id = self.get_or_create_partner(partner_tg_id, "Odoo").id
+        with self.get_connection() as conn:
+            changed = self._apply_odoo_cards(conn, cards, partner_id, source)
+            conn.execute(
+                """
+                INSERT INTO sync_watermarks (source, watermark, last_id, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(source) DO UPDATE SET
+                    watermark = excluded.watermark, last_id = excluded.last_id, updated_at = excluded.updated_at
+                """,
+                (source, watermark[0], int(watermark[1])),
+            )
+        return changed
+
+    def retry_parked_odoo_cards(self, *, partner_tg_id: int, source: str) -> List[int]:
+        """Apply parked cards whose category exists now; returns ids of inserted/updated local cards"""
+        with self.get_connection() as conn:
+            cards = [json.loads(row[0]) for row in conn.execute(
+                "SELECT payload FROM sync_parked_records WHERE source = ? ORDER BY record_id", (source,)
+            )]
+        if not cards:
+            return []
+        partner_id = self.get_or_create_partner(partner_tg_id, "Odoo").id
+        with self.get_connection() as conn:
+            return self._apply_odoo_cards(conn, cards, partner_id, source)
+
+    @staticmethod
+    def _apply_odoo_cards(conn, cards: List[Dict[str, Any]], partner_id: int, source: str) -> List[int]:
+        categories = {row[1]: row[0] for row in conn.execute("SELECT id, slug FROM categories_v2")}
+        changed: List[int] = []
+        for card in cards:
+            category_id = categories.get(card['category_slug'])
+            if category_id is None:
+                logger.warning(f"Odoo card {card['odoo_card_id']}: unknown category '{card['category_slug']}', parked")
+                conn.execute(
+                    """
+                    INSERT INTO sync_parked_records (source, record_id, payload, reason)
+                    VALUES (?, ?, ?, 'unknown_category')
+                    ON CONFLICT(source, record_id) DO UPDATE SET payload = excluded.payload
+                    """,
+                    (source, int(card['odoo_card_id']), json.dumps(card)),
+                )
+                continue
+            row = conn.execute(
+                """
+                INSERT INTO cards_v2 (
+                    partner_id, category_id, title, description, contact, address, google_maps_url,
+                    discount_text, latitude, longitude, status, odoo_card_id, origin
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'odoo')
+                ON CONFLICT(odoo_card_id) DO UPDATE SET
+                    category_id = excluded.category_id, title = excluded.title,
+                    description = excluded.description, contact = excluded.contact,
+                    address = excluded.address, google_maps_url = excluded.google_maps_url,
+                    discount_text = excluded.discount_text, latitude = excluded.latitude,
+                    longitude = excluded.longitude, status = excluded.status,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE cards_v2.origin = 'odoo'
+                RETURNING id
+                """,
+                (
+                    partner_id, category_id, card['title'], card.get('description'), card.get('contact'),
+                    card.get('address'), card.get('google_maps_url'), card.get('discount_text'),
+                    card.get('latitude'), card.get('longitude'), card['status'], int(card['odoo_card_id']),
+                ),
+            ).fetchone()
+            conn.execute(
+                "DELETE FROM sync_parked_records WHERE source = ? AND record_id = ?",
+                (source, int(card['odoo_card_id'])),
+            )
+            if row:
+                changed.append(int(row[0]))
+        return changed
+
+    # --- Identity graph: (platform, external_id) -> canonical user uuid ---
+    @staticmethod
+    def _bump_identity_counters(conn, changes: Dict[str, int]) -> None:
+        for name, delta in changes.items():
+            conn.execute(
+                """
+                INSERT INTO identity_counters (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                """,
+                (name, delta),
+            )
+
+    @classmethod
+    def _ensure_identity(cls, conn, platform: str, external_id: str, user_uuid: Optional[str]) -> str:
+        row = conn.execute(
+            "SELECT user_uuid FROM identity_links WHERE platform = ? AND external_id = ?", (platform, external_id)
+        ).fetchone()
+        if row:
+            return row[0]
+        user_uuid = user_uuid or str(uuid.uuid4())
+        conn.execute(
+            "INSERT INTO identity_users (user_uuid, size) VALUES (?, 1) "
+            "ON CONFLICT(user_uuid) DO UPDATE SET size = size + 1",
+            (user_uuid,),
+        )
+        users_delta = 1 if conn.execute(
+            "SELECT size FROM identity_users WHERE user_uuid = ?", (user_uuid,)
+        ).fetchone()[0] == 1 else 0
+        conn.execute(
+            "INSERT INTO identity_links (platform, external_id, user_uuid) VALUES (?, ?, ?)",
+            (platform, external_id, user_uuid),
+        )
+        cls._bump_identity_counters(conn, {'identities': 1, 'users': users_delta, f'platform:{platform}': 1})
+        return user_uuid
+
+    def resolve_identity(self, platform: str, external_id: Any) -> Optional[str]:
+        """Canonical user uuid for the identity, None if it was never registered"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT user_uuid FROM identity_links WHERE platform = ? AND external_id = ?",
+                (platform, str(external_id)),
+            ).fetchone()
+            return row[0] if row else None
+
+    def ensure_identity(self, platform: str, external_id: Any, user_uuid: Optional[str] = None) -> str:
+        """Register the identity (as its own user, with user_uuid if given); returns its canonical uuid"""
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return self._ensure_identity(conn, platform, str(external_id), user_uuid)
+
+    def link_identities(self, first: Tuple[str, Any], second: Tuple[str, Any]) -> str:
+        """
+        Merge the users owning two identities (union by size) and return the canonical uuid.
+
+        Every identity row points straight at its user, so the smaller user's rows are
+        repointed in one indexed UPDATE and resolution stays a single lookup.
+        """
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            roots = [self._ensure_identity(conn, platform, str(external_id), None)
+                     for platform, external_id in (first, second)]
+            if roots[0] == roots[1]:
+                return roots[0]
+            sizes = {
+                row[0]: int(row[1]) for row in conn.execute(
+                    "SELECT user_uuid, size FROM identity_users WHERE user_uuid IN (?, ?)", roots
+                )
+            }
+            winner, loser = sorted(roots, key=lambda root: (-sizes[root], roots.index(root)))
+            conn.execute("UPDATE identity_links SET user_uuid = ? WHERE user_uuid = ?", (winner, loser))
+            conn.execute("UPDATE identity_users SET size = size + ? WHERE user_uuid = ?", (sizes[loser], winner))
+            conn.execute("DELETE FROM identity_users WHERE user_uuid = ?", (loser,))
+            self._bump_identity_counters(conn, {'users': -1, 'links': 1})
+            return winner
+
+    def get_linked_identities(self, platform: str, external_id: Any) -> Dict[str, List[str]]:
+        """Other identities of the same user, grouped by platform"""
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT other.platform, other.external_id
+                FROM identity_links AS own
+                JOIN identity_links AS other ON other.user_uuid = own.user_uuid
+                WHERE own.platform = ? AND own.external_id = ?
+                  AND NOT (other.platform = own.platform AND other.external_id = own.external_id)
+                ORDER BY other.linked_at, other.platform
+                """,
+                (platform, str(external_id)),
+            ).fetchall()
+        linked: Dict[str, List[str]] = {}
+        for other_platform, other_id in rows:
+            linked.setdefault(other_platform, []).append(other_id)
+        return linked
+
+    def get_identity_counters(self) -> Dict[str, int]:
+        """identities, users, links and per-platform identity counts"""
+        with self.get_connection() as conn:
+            return {row[0]: int(row[1]) for row in conn.execute("SELECT name, value FROM identity_counters")}
+
     # --- Superadmin helpers: bans and deletions ---
     def ban_user(self, tg_user_id: int, reason: str = "") -> None:
         """Ban Telegram user by ID (idempotent)."""
@@ -347,6 +625,7 @@ class DatabaseServiceV2:
     def delete_card(self, card_id: int) -> bool:
         with self.get_connection() as conn:
             cur = conn.execute("DELETE FROM cards_v2 WHERE id = ?", (int(card_id),))
+            _publish_card_changed(card_id)
             return (cur.rowcount or 0) > 0
 
     def delete_cards_by_partner_tg(self, tg_user_id: int) -> int:
@@ -442,6 +721,29 @@ class DatabaseServiceV2:
             )
             return [dict(r) for r in cur.fetchall()]
 
+    def get_cards_photos(self, card_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Photos of several cards in one query: {card_id: photos ordered by position ASC}.
+
+        Both card_photos layouts are supported (file_id/position and
+        photo_url/photo_file_id); file_id is always present in the result.
+        """
+        ids = [int(card_id) for card_id in card_ids]
+        if not ids:
+            return {}
+        result: Dict[int, List[Dict[str, Any]]] = {}
+        with self.get_connection() as conn:
+            cur = conn.execute(
+                f"SELECT * FROM card_photos WHERE card_id IN ({','.join('?' * len(ids))}) ORDER BY card_id, id",
+                ids,
+            )
+            for row in cur.fetchall():
+                photo = dict(row)
+                photo.setdefault('file_id', photo.get('photo_file_id'))
+                result.setdefault(int(photo['card_id']), []).append(photo)
+        for photos in result.values():
+            photos.sort(key=lambda photo: photo.get('position') or 0)
+        return result
+
     def delete_card_photo(self, photo_id: int) -> bool:
         with self.get_connection() as conn:
             cur = conn.execute("DELETE FROM card_photos WHERE id = ?", (int(photo_id),))
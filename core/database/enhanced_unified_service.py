@@ -296,7 +296,7 @@ class EnhancedUnifiedDatabaseService:
     def get_unified_loyalty_info(self, identifiers: Dict) -> Dict:
         """Получить объединенную информацию о лояльности"""
         try:
-            return UniversalAdapter.get_unified_loyalty(identifiers)
+            return UniversalAdapter.get_unified_loyalty_info(identifiers)
         except Exception as e:
             logger.error(f"Error getting unified loyalty info: {e}")
             return {'current_points': 0, 'partner_cards': [], 'recent_history': [], 'source': 'error'}
@@ -6,12 +6,15 @@ from typing import Dict, List, Optional, Any, Union
 from dataclasses import dataclass, asdict
 from collections import deque
 import os
+import random
 import threading
 import time
 from enum import Enum
+from functools import wraps
 import uuid
 
 from .db_v2 import db_v2
+from core.utils.scheduler import JobScheduler
 
 # Реальное подключение к Supabase
 class SupabaseClient:
@@ -49,6 +52,23 @@ class SupabaseClient:
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
     
+    async def health_check_async(self, timeout: float = 5.0):
+        """Та же проверка через REST API Supabase без блокирующего клиента"""
+        if not self.client:
+            return {'status': 'error', 'message': 'Supabase client not initialized'}
+        
+        import aiohttp
+        headers = {'apikey': self.key, 'Authorization': f'Bearer {self.key}'}
+        url = f"{self.url.rstrip('/')}/rest/v1/user_profiles"
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+                async with session.get(url, params={'select': 'id', 'limit': '1'}, headers=headers) as resp:
+                    if resp.status < 400:
+                        return {'status': 'ok'}
+                    return {'status': 'error', 'message': f'HTTP {resp.status}'}
+        except Exception as e:
+            return {'status': 'error', 'message': str(e) or type(e).__name__}
+    
     def create_user_profile(self, user_id, user_data):
         if not self.client:
             return True  # Fallback to stub behavior
@@ -167,6 +187,19 @@ class SupabaseClient:
             import logging
             logging.getLogger(__name__).error(f"Supabase activate_partner_card error: {e}")
             return False
+    
+    def insert_rows(self, table, rows):
+        """Вставить пачку строк одним запросом (PostgREST выполняет его одной транзакцией)"""
+        if not self.client:
+            return True  # Fallback to stub behavior
+        
+        try:
+            self.client.table(table).insert(rows).execute()
+            return True
+        except Exception as e:
+            import logging
+            logging.getLogger(__name__).error(f"Supabase bulk insert into {table} error ({len(rows)} rows): {e}")
+            return False
 
 secure_supabase = SupabaseClient()
 
@@ -202,9 +235,50 @@ class PendingOperation:
     retry_count: int = 0
     max_retries: int = 3
     expires_at: Optional[str] = None
+    next_attempt_at: Optional[str] = None  # не повторять раньше (экспоненциальная пауза)
+
+# Операции, меняющие баланс баллов: после успешного повтора сбрасываем кэш лояльности
+POINTS_OPERATIONS = frozenset({'add_loyalty_points', 'spend_loyalty_points'})
+
+# Пакетный повтор операций Supabase: тип операции -> (таблица, строка для вставки).
+# Строки совпадают с тем, что пишут одиночные методы SupabaseClient.
+SUPABASE_BULK_ROWS = {
+    'add_loyalty_points': ('loyalty_points', lambda op: {
+        'user_id': op.user_identifier,
+        'points': op.data.get('points', 0),
+        'reason': op.data.get('reason', 'Pending operation recovery'),
+        'created_at': 'now()'
+    }),
+    'spend_loyalty_points': ('loyalty_transactions', lambda op: {
+        'user_id': op.user_identifier,
+        'points_spent': op.data.get('points', 0),
+        'reason': op.data.get('reason', 'Pending operation recovery'),
+        'partner_id': op.user_identifier,
+        'created_at': 'now()'
+    }),
+    'create_user_profile': ('user_profiles', lambda op: {
+        'user_id': op.user_identifier,
+        **op.data,
+        'created_at': 'now()'
+    }),
+    'activate_partner_card': ('partner_cards', lambda op: {
+        'user_id': op.user_identifier,
+        'card_number': op.data.get('card_number'),
+        'partner_id': op.user_identifier,
+        'activated_at': 'now()'
+    }),
+}
+
+def _locked(method):
+    """Выполнить метод под self._lock: API вызывает сервис из пула потоков"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class DatabaseHealthMonitor:
-    """Мониторинг состояния всех баз данных"""
+    """Мониторинг состояния всех баз данных (проверки запускает планировщик FaultTolerantService)"""
     
     def __init__(self):
         self.postgresql_status = True
@@ -213,25 +287,25 @@ class DatabaseHealthMonitor:
         self.downtime_start = {}
         self.check_interval = 30  # секунд
         self.health_history = deque(maxlen=100)  # последние 100 проверок
-        self._start_monitoring()
-    
-    def _start_monitoring(self):
-        """Запустить фоновый мониторинг"""
-        def monitor_loop():
-            while True:
-                self._check_all_databases()
-                time.sleep(self.check_interval)
-        
-        thread = threading.Thread(target=monitor_loop, daemon=True)
-        thread.start()
-        logger.info("🔍 Database health monitoring started")
     
     def _check_all_databases(self):
-        """Проверить состояние всех БД"""
-        timestamp = datetime.utcnow().isoformat()
-        
+        """Проверить состояние всех БД (синхронно, для инициализации)"""
+        self._record_health(self._check_postgresql(), self._check_supabase())
+    
+    async def check_all_databases(self):
+        """Проверить состояние всех БД, не блокируя цикл событий"""
         postgresql_ok = self._check_postgresql()
-        supabase_ok = self._check_supabase()
+        try:
+            health = await secure_supabase.health_check_async()
+            supabase_ok = health.get('status') == 'ok'
+        except Exception as e:
+            logger.error(f"Supabase health check failed: {e}")
+            supabase_ok = False
+        self._record_health(postgresql_ok, supabase_ok)
+    
+    def _record_health(self, postgresql_ok: bool, supabase_ok: bool):
+        """Записать результат проверки в историю и обновить статусы"""
+        timestamp = datetime.utcnow().isoformat()
         
         # Записать в историю
         health_record = {
@@ -325,25 +399,17 @@ class OperationQueue:
     
     def __init__(self, max_size: int = 10000):
         self.queue = deque(maxlen=max_size)
+        self._lock = threading.RLock()
         self.file_path = "data/pending_operations.json"
         self._ensure_data_dir()
+        self.cleanup_interval = 300  # Каждые 5 минут
         self._load_from_file()
-        self._start_cleanup_timer()
     
     def _ensure_data_dir(self):
         """Создать директорию для данных"""
         os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
     
-    def _start_cleanup_timer(self):
-        """Запустить таймер очистки просроченных операций"""
-        def cleanup_loop():
-            while True:
-                self._cleanup_expired_operations()
-                time.sleep(300)  # Каждые 5 минут
-        
-        thread = threading.Thread(target=cleanup_loop, daemon=True)
-        thread.start()
-    
+    @_locked
     def add_operation(self, operation: PendingOperation):
         """Добавить операцию в очередь"""
         # Генерировать ID если не указан
@@ -364,11 +430,28 @@ class OperationQueue:
         self._save_to_file()
         logger.info(f"📝 Added pending operation: {operation.operation_type} for user {operation.user_identifier}")
     
+    @_locked
     def get_operations_for_db(self, db_name: str) -> List[PendingOperation]:
         """Получить операции для конкретной БД"""
         operations = [op for op in self.queue if op.target_db == db_name]
         return sorted(operations, key=lambda x: (x.priority, x.timestamp), reverse=True)
     
+    def get_ready_operations(self, db_name: str) -> List[PendingOperation]:
+        """Операции для БД, у которых истекла пауза перед повтором"""
+        now = datetime.utcnow().isoformat()
+        return [op for op in self.get_operations_for_db(db_name)
+                if not op.next_attempt_at or op.next_attempt_at <= now]
+    
+    @_locked
+    def remove_operations(self, operations: List[PendingOperation]):
+        """Удалить пачку операций с одной перезаписью файла"""
+        ids = {op.operation_id for op in operations}
+        if not ids:
+            return
+        self.queue = deque((op for op in self.queue if op.operation_id not in ids), maxlen=self.queue.maxlen)
+        self._save_to_file()
+    
+    @_locked
     def remove_operation(self, operation: PendingOperation):
         """Удалить операцию из очереди"""
         try:
@@ -378,6 +461,7 @@ class OperationQueue:
         except ValueError:
             pass
     
+    @_locked
     def _cleanup_expired_operations(self):
         """Очистить просроченные операции"""
         now = datetime.utcnow()
@@ -398,6 +482,7 @@ class OperationQueue:
             logger.info(f"🧹 Cleaned up {expired_count} expired operations")
             self._save_to_file()
     
+    @_locked
     def get_queue_stats(self) -> Dict:
         """Получить статистику очереди"""
         stats = {
@@ -432,6 +517,7 @@ class OperationQueue:
         
         return stats
     
+    @_locked
     def _save_to_file(self):
         """Сохранить очередь в файл"""
         try:
@@ -459,22 +545,14 @@ class LocalCache:
     
     def __init__(self):
         self.cache = {}
+        self._lock = threading.RLock()
         self.cache_file = "data/local_cache.json"
         self.cache_expiry = {}  # Время истечения кэша
         self.default_ttl = 3600  # 1 час по умолчанию
+        self.cleanup_interval = 600  # Каждые 10 минут
         self._load_cache()
-        self._start_cleanup_timer()
-    
-    def _start_cleanup_timer(self):
-        """Запустить таймер очистки просроченного кэша"""
-        def cleanup_loop():
-            while True:
-                self._cleanup_expired_cache()
-                time.sleep(600)  # Каждые 10 минут
-        
-        thread = threading.Thread(target=cleanup_loop, daemon=True)
-        thread.start()
     
+    @_locked
     def set(self, key: str, data: Any, ttl: int = None) -> bool:
         """Установить данные в кэш"""
         try:
@@ -493,6 +571,7 @@ class LocalCache:
             logger.error(f"Error setting cache: {e}")
             return False
     
+    @_locked
     def get(self, key: str) -> Optional[Any]:
         """Получить данные из кэша"""
         try:
@@ -512,14 +591,15 @@ class LocalCache:
             logger.error(f"Error getting from cache: {e}")
             return None
     
+    @_locked
     def delete(self, key: str) -> bool:
         """Удалить данные из кэша"""
         try:
-            if key in self.cache:
-                del self.cache[key]
-            if key in self.cache_expiry:
-                del self.cache_expiry[key]
-            self._save_cache()
+            removed = key in self.cache or key in self.cache_expiry
+            self.cache.pop(key, None)
+            self.cache_expiry.pop(key, None)
+            if removed:  # не переписываем файл кэша впустую
+                self._save_cache()
             return True
         except Exception as e:
             logger.error(f"Error deleting from cache: {e}")
@@ -535,6 +615,7 @@ class LocalCache:
         cache_key = f"user_{platform}_{user_identifier}"
         return self.get(cache_key)
     
+    @_locked
     def _cleanup_expired_cache(self):
         """Очистить просроченный кэш"""
         now = datetime.utcnow()
@@ -554,6 +635,7 @@ class LocalCache:
             logger.info(f"🧹 Cleaned up {len(expired_keys)} expired cache entries")
             self._save_cache()
     
+    @_locked
     def get_cache_stats(self) -> Dict:
         """Получить статистику кэша"""
         total_items = len(self.cache)
@@ -572,6 +654,7 @@ class LocalCache:
             'memory_usage_mb': len(json.dumps(self.cache)) / 1024 / 1024
         }
     
+    @_locked
     def _save_cache(self):
         """Сохранить кэш в файл"""
         try:
@@ -617,50 +700,170 @@ class FaultTolerantService:
             'queued_operations': 0
         }
         
-        self._start_recovery_processor()
+        self.recovery_interval = 60  # Каждую минуту
+        # Повтор отложенных операций: пачки на вставку, параллельные вызовы, пауза между попытками
+        self.replay_batch_size = max(1, int(os.getenv("FT_REPLAY_BATCH_SIZE", "200")))
+        self.replay_concurrency = max(1, int(os.getenv("FT_REPLAY_CONCURRENCY", "4")))
+        self.replay_backoff_base = float(os.getenv("FT_REPLAY_BACKOFF_BASE", "30"))
+        self.replay_backoff_max = float(os.getenv("FT_REPLAY_BACKOFF_MAX", "1800"))
+        self.replay_stats = {
+            'passes': 0,
+            'batches': 0,
+            'replayed': 0,
+            'retried': 0,
+            'dropped': 0,
+            'last_pass_operations': 0,
+            'last_pass_seconds': None,
+            'drain_rate_per_sec': None
+        }
+        # Подписчики на изменение баланса баллов (сброс производных кэшей)
+        self._points_listeners = []
+        
+        # Фоновые задачи: один планировщик в цикле событий процесса (бот или API) вместо потоков
+        self.scheduler = JobScheduler("fault_tolerance")
+        self.scheduler.add_job("health_check", self._run_health_check,
+                               self.health_monitor.check_interval, timeout=20)
+        self.scheduler.add_job("queue_cleanup", self._run_queue_cleanup,
+                               self.operation_queue.cleanup_interval)
+        self.scheduler.add_job("cache_cleanup", self._run_cache_cleanup,
+                               self.local_cache.cleanup_interval)
+        self.scheduler.add_job("recovery", self._process_pending_operations,
+                               self.recovery_interval, run_at_start=False)
         logger.info("🛡️ FaultTolerantService initialized successfully")
     
-    def _start_recovery_processor(self):
-        """Запустить процессор восстановления операций"""
-        def recovery_loop():
-            while True:
-                self._process_pending_operations()
-                time.sleep(60)  # Каждую минуту
-        
-        thread = threading.Thread(target=recovery_loop, daemon=True)
-        thread.start()
-        logger.info("🔄 Recovery processor started")
+    async def start(self):
+        """Запустить фоновые задачи (на старте бота или API)"""
+        await self.scheduler.start()
+    
+    async def stop(self):
+        await self.scheduler.stop()
     
-    def _process_pending_operations(self):
-        """Обработать отложенные операции при восстановлении БД"""
+    def on_points_changed(self, listener):
+        """Подписаться на изменение баланса: listener(user_identifier)"""
+        self._points_listeners.append(listener)
+    
+    def _notify_points_changed(self, user_identifier: Union[int, str]):
+        """Баланс пользователя изменился: сбросить кэш лояльности и оповестить подписчиков"""
+        for platform in PlatformType:
+            self.local_cache.delete(f"loyalty_{platform.value}_{user_identifier}")
+        for listener in self._points_listeners:
+            try:
+                listener(user_identifier)
+            except Exception as e:
+                logger.error(f"Points change listener failed: {e}")
+    
+    async def _run_queue_cleanup(self):
+        """Очистка очереди пишет JSON-файл — выполняем вне цикла событий"""
+        await asyncio.to_thread(self.operation_queue._cleanup_expired_operations)
+    
+    async def _run_cache_cleanup(self):
+        await asyncio.to_thread(self.local_cache._cleanup_expired_cache)
+    
+    async def _run_health_check(self):
+        """Проверить БД; после восстановления сразу запустить повтор операций"""
+        was_down = not (self.health_monitor.postgresql_status and self.health_monitor.supabase_status)
+        await self.health_monitor.check_all_databases()
+        recovered = self.health_monitor.postgresql_status or self.health_monitor.supabase_status
+        if was_down and recovered and self.operation_queue.queue:
+            self.scheduler.jobs['recovery'].trigger()
+    
+    async def _process_pending_operations(self):
+        """Повторить все готовые отложенные операции доступных БД
+
+        Операции Supabase одного типа вставляются пачками по replay_batch_size,
+        остальные выполняются по одной; одновременно идет не больше
+        replay_concurrency вызовов. Очередь меняется и сохраняется один раз за проход.
+        """
         health_status = self.health_monitor.get_health_status()
+        ready = []
+        for db_type in DatabaseType:
+            if health_status[db_type.value]['status']:
+                ready.extend(self.operation_queue.get_ready_operations(db_type.value))
+        if not ready:
+            return
         
-        # Обработать операции для PostgreSQL
-        if health_status['postgresql']['status']:
-            postgresql_ops = self.operation_queue.get_operations_for_db(DatabaseType.POSTGRESQL.value)
-            for operation in postgresql_ops[:10]:  # Обрабатываем по 10 за раз
-                if self._execute_pending_operation(operation):
-                    self.operation_queue.remove_operation(operation)
-                    self.operation_stats['successful_operations'] += 1
-                else:
-                    operation.retry_count += 1
-                    if operation.retry_count >= operation.max_retries:
-                        self.operation_queue.remove_operation(operation)
-                        self.operation_stats['failed_operations'] += 1
-                        logger.error(f"❌ Operation {operation.operation_id} failed after {operation.max_retries} retries")
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.replay_concurrency)
         
-        # Обработать операции для Supabase
-        if health_status['supabase']['status']:
-            supabase_ops = self.operation_queue.get_operations_for_db(DatabaseType.SUPABASE.value)
-            for operation in supabase_ops[:10]:
-                if self._execute_pending_operation(operation):
-                    self.operation_queue.remove_operation(operation)
-                    self.operation_stats['successful_operations'] += 1
+        async def run(func, *args):
+            async with semaphore:
+                return await asyncio.to_thread(func, *args)
+        
+        async def replay_batch(batch):
+            table, build_row = SUPABASE_BULK_ROWS[batch[0].operation_type]
+            if await run(secure_supabase.insert_rows, table, [build_row(op) for op in batch]):
+                return [(op, True) for op in batch]
+            if len(batch) == 1:
+                return [(batch[0], False)]
+            # Пачка отклонена целиком: повторяем по одной, чтобы отделить плохие строки
+            results = await asyncio.gather(*(run(self._execute_pending_operation, op) for op in batch))
+            return list(zip(batch, results))
+        
+        async def replay_single(operation):
+            return [(operation, await run(self._execute_pending_operation, operation))]
+        
+        groups: Dict[str, List[PendingOperation]] = {}
+        jobs = []
+        for operation in ready:
+            if operation.target_db == DatabaseType.SUPABASE.value and operation.operation_type in SUPABASE_BULK_ROWS:
+                groups.setdefault(operation.operation_type, []).append(operation)
+            else:
+                jobs.append(replay_single(operation))
+        for operations in groups.values():
+            for i in range(0, len(operations), self.replay_batch_size):
+                jobs.append(replay_batch(operations[i:i + self.replay_batch_size]))
+                self.replay_stats['batches'] += 1
+        
+        done, retried, dropped = [], 0, 0
+        for results in await asyncio.gather(*jobs):
+            for operation, ok in results:
+                if ok:
+                    done.append(operation)
+                    if operation.operation_type in POINTS_OPERATIONS:
+                        self._notify_points_changed(operation.user_identifier)
+                    continue
+                operation.retry_count += 1
+                if operation.retry_count >= operation.max_retries:
+                    done.append(operation)
+                    dropped += 1
+                    logger.error(f"❌ Operation {operation.operation_id} failed after {operation.max_retries} retries")
                 else:
-                    operation.retry_count += 1
-                    if operation.retry_count >= operation.max_retries:
-                        self.operation_queue.remove_operation(operation)
-                        self.operation_stats['failed_operations'] += 1
+                    retried += 1
+                    operation.next_attempt_at = (datetime.utcnow() + timedelta(seconds=self._backoff_delay(operation))).isoformat()
+        
+        if done:
+            self.operation_queue.remove_operations(done)
+        elif retried:
+            self.operation_queue._save_to_file()
+        
+        replayed = len(done) - dropped
+        elapsed = time.monotonic() - started
+        self.operation_stats['successful_operations'] += replayed
+        self.operation_stats['failed_operations'] += dropped
+        self.replay_stats['passes'] += 1
+        self.replay_stats['replayed'] += replayed
+        self.replay_stats['retried'] += retried
+        self.replay_stats['dropped'] += dropped
+        self.replay_stats['last_pass_operations'] = len(ready)
+        self.replay_stats['last_pass_seconds'] = round(elapsed, 3)
+        self.replay_stats['drain_rate_per_sec'] = round(replayed / elapsed, 2) if elapsed > 0 else None
+        logger.info(f"🔄 Replayed {replayed}/{len(ready)} pending operations in {elapsed:.2f}s "
+                    f"({retried} deferred, {dropped} dropped)")
+    
+    def _backoff_delay(self, operation: PendingOperation) -> float:
+        """Пауза перед следующей попыткой: base * 2^(n-1), не больше max, с разбросом ±50%"""
+        delay = min(self.replay_backoff_max, self.replay_backoff_base * 2 ** max(0, operation.retry_count - 1))
+        return delay * random.uniform(0.5, 1.5)
+    
+    def get_replay_stats(self) -> Dict:
+        """Статистика повтора и оценка времени разбора очереди"""
+        backlog = len(self.operation_queue.queue)
+        rate = self.replay_stats['drain_rate_per_sec']
+        return {
+            **self.replay_stats,
+            'backlog': backlog,
+            'estimated_drain_seconds': round(backlog / rate, 1) if rate else None
+        }
     
     def _execute_pending_operation(self, operation: PendingOperation) -> bool:
         """Выполнить отложенную операцию"""
@@ -913,6 +1116,7 @@ class FaultTolerantService:
                             f"Заказ #{order_id}"
                         )
                         logger.info(f"✅ Loyalty points added: {loyalty_points}")
+                        self._notify_points_changed(user_identifier)
                     except Exception as e:
                         logger.error(f"Failed to add loyalty points: {e}")
                         
@@ -1045,6 +1249,8 @@ class FaultTolerantService:
             'queue': queue_stats,
             'cache': cache_stats,
             'operations': self.operation_stats,
+            'replay': self.get_replay_stats(),
+            'jobs': self.scheduler.get_stats(),
             'mode': self._get_system_mode()
         }
     
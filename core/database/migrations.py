@@ -650,6 +650,20 @@ class DatabaseMigrator:
         self.migrate_024_user_roles_2fa()
         # Card photos table
         self.migrate_025_card_photos()
+        # Daily analytics rollups
+        self.migrate_026_analytics_daily()
+        # Indexed admin user search
+        self.migrate_027_users_search_fts()
+        # Indexed catalog search
+        self.migrate_028_cards_search_fts()
+        # Background sync of Odoo partner cards
+        self.migrate_029_odoo_card_sync()
+        # Cross-platform identity graph
+        self.migrate_030_identity_graph()
+        # Odoo records waiting for a local category
+        self.migrate_031_sync_parked_records()
+        # City of existing partner places for per-city analytics
+        self.migrate_032_backfill_partner_places_city()
         
         # 021: Extend qr_codes_v2 for user-scoped QR operations used by db_v2 helpers
         try:
@@ -2876,6 +2890,418 @@ class DatabaseMigrator:
             logger.error(f"Failed to apply migration {version}: {e}")
             raise
 
+    def migrate_026_analytics_daily(self):
+        """
+        EXPAND Phase: Pre-aggregated daily analytics rollups.
+        - analytics_daily: one row per (day, dimension, dimension_id) with signups,
+          actives, transactions, points earned/spent and revenue.
+          dimension is 'all', 'partner', 'city' or 'tx_type'.
+        - partner_places.city_id (nullable) so sales can be split per city.
+
+        Idempotent: checks existing columns before altering.
+        """
+        version = "026"
+        desc = "EXPAND: Create analytics_daily rollups and partner_places.city_id"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analytics_daily (
+                    day TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    dimension_id TEXT NOT NULL DEFAULT '',
+                    signups INTEGER NOT NULL DEFAULT 0,
+                    actives INTEGER NOT NULL DEFAULT 0,
+                    transactions INTEGER NOT NULL DEFAULT 0,
+                    points_earned INTEGER NOT NULL DEFAULT 0,
+                    points_spent INTEGER NOT NULL DEFAULT 0,
+                    points_abs_total INTEGER NOT NULL DEFAULT 0,
+                    revenue REAL NOT NULL DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (day, dimension, dimension_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analytics_daily_dimension_day ON analytics_daily(dimension, day)")
+            if _col_exists(conn, "partner_places", "id") and not _col_exists(conn, "partner_places", "city_id"):
+                conn.execute("ALTER TABLE partner_places ADD COLUMN city_id INTEGER")
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
+    def migrate_027_users_search_fts(self):
+        """
+        EXPAND Phase: FTS5 index for AdminService.search_users.
+        - users_search_fts: external-content FTS5 table over users(username,
+          first_name, last_name) with the trigram tokenizer, so substring and
+          prefix queries of 3+ chars hit the index instead of scanning users.
+        - Triggers keep the index in sync; 'rebuild' fills it for existing rows.
+
+        Idempotent: skipped when users table is missing or the migration is recorded.
+        """
+        version = "027"
+        desc = "EXPAND: Create users_search_fts (FTS5 trigram) for admin user search"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            if not all(_col_exists(conn, "users", col) for col in ("username", "first_name", "last_name")):
+                logger.info("users table has no name columns, skipping users_search_fts")
+                return
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS users_search_fts USING fts5(
+                    username, first_name, last_name,
+                    content='users', content_rowid='rowid', tokenize='trigram'
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_search_fts_ai AFTER INSERT ON users BEGIN
+                    INSERT INTO users_search_fts(rowid, username, first_name, last_name)
+                    VALUES (new.rowid, new.username, new.first_name, new.last_name);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_search_fts_ad AFTER DELETE ON users BEGIN
+                    INSERT INTO users_search_fts(users_search_fts, rowid, username, first_name, last_name)
+                    VALUES ('delete', old.rowid, old.username, old.first_name, old.last_name);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_search_fts_au
+                AFTER UPDATE OF username, first_name, last_name ON users BEGIN
+                    INSERT INTO users_search_fts(users_search_fts, rowid, username, first_name, last_name)
+                    VALUES ('delete', old.rowid, old.username, old.first_name, old.last_name);
+                    INSERT INTO users_search_fts(rowid, username, first_name, last_name)
+                    VALUES (new.rowid, new.username, new.first_name, new.last_name);
+                END
+            """)
+            conn.execute("INSERT INTO users_search_fts(users_search_fts) VALUES ('rebuild')")
+            # Короткие запросы (1-2 символа) идут префиксом по username
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)")
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
+    def migrate_028_cards_search_fts(self):
+        """
+        EXPAND Phase: FTS5 index for catalog search.
+        - cards_search_fts: external-content FTS5 table over cards_v2(title,
+          description, address, discount_text) with the trigram tokenizer;
+          CatalogSearchService matches by query trigrams for typo tolerance.
+        - Triggers keep the index in sync; 'rebuild' fills it for existing cards.
+
+        Idempotent: skipped when cards_v2 is missing or the migration is recorded.
+        """
+        version = "028"
+        desc = "EXPAND: Create cards_search_fts (FTS5 trigram) for catalog search"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            columns = ("title", "description", "address", "discount_text")
+            if not all(_col_exists(conn, "cards_v2", col) for col in columns):
+                logger.info("cards_v2 has no searchable columns, skipping cards_search_fts")
+                return
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS cards_search_fts USING fts5(
+                    title, description, address, discount_text,
+                    content='cards_v2', content_rowid='id', tokenize='trigram'
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS cards_search_fts_ai AFTER INSERT ON cards_v2 BEGIN
+                    INSERT INTO cards_search_fts(rowid, title, description, address, discount_text)
+                    VALUES (new.id, new.title, new.description, new.address, new.discount_text);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS cards_search_fts_ad AFTER DELETE ON cards_v2 BEGIN
+                    INSERT INTO cards_search_fts(cards_search_fts, rowid, title, description, address, discount_text)
+                    VALUES ('delete', old.id, old.title, old.description, old.address, old.discount_text);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS cards_search_fts_au
+                AFTER UPDATE OF title, description, address, discount_text ON cards_v2 BEGIN
+                    INSERT INTO cards_search_fts(cards_search_fts, rowid, title, description, address, discount_text)
+                    VALUES ('delete', old.id, old.title, old.description, old.address, old.discount_text);
+                    INSERT INTO cards_search_fts(rowid, title, description, address, discount_text)
+                    VALUES (new.id, new.title, new.description, new.address, new.discount_text);
+                END
+            """)
+            conn.execute("INSERT INTO cards_search_fts(cards_search_fts) VALUES ('rebuild')")
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
+    def migrate_029_odoo_card_sync(self):
+        """
+        EXPAND Phase: local copy of Odoo partner cards (OdooCardSyncService).
+        - cards_v2.origin: 'local' for cards created in the bot, 'odoo' for synced ones
+        - cards_v2.latitude/longitude: coordinates from Odoo
+        - unique index on cards_v2.odoo_card_id (added here if 023 did not run): upsert target
+        - sync_watermarks: last synced (write_date, id) per source
+
+        Idempotent: skipped when cards_v2 is missing or the migration is recorded.
+        """
+        version = "029"
+        desc = "EXPAND: cards_v2.origin/coordinates and sync_watermarks for Odoo card sync"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            if not _col_exists(conn, "cards_v2", "id"):
+                logger.info("cards_v2 table not found, skipping Odoo card sync schema")
+                return
+            columns = (
+                ("odoo_card_id", "INTEGER"), ("origin", "TEXT NOT NULL DEFAULT 'local'"),
+                ("latitude", "REAL"), ("longitude", "REAL"),
+            )
+            for name, typ in columns:
+                if not _col_exists(conn, "cards_v2", name):
+                    conn.execute(f"ALTER TABLE cards_v2 ADD COLUMN {name} {typ}")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cards_v2_odoo_card_id ON cards_v2(odoo_card_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_watermarks (
+                    source TEXT PRIMARY KEY,
+                    watermark TEXT,
+                    last_id INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
+    def migrate_030_identity_graph(self):
+        """
+        EXPAND Phase: cross-platform identity graph (multi-platform adapters).
+        - identity_links: (platform, external_id) -> canonical user_uuid; unique per identity,
+          indexed by user_uuid so merging repoints a user's identities in one UPDATE
+        - identity_users: identities per canonical user (union by size)
+        - identity_counters: identities/users/links/per-platform totals for statistics
+        """
+        version = "030"
+        desc = "EXPAND: identity_links, identity_users and identity_counters"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS identity_links (
+                    platform TEXT NOT NULL,
+                    external_id TEXT NOT NULL,
+                    user_uuid TEXT NOT NULL,
+                    linked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (platform, external_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_identity_links_user_uuid ON identity_links(user_uuid)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS identity_users (
+                    user_uuid TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL DEFAULT 1,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS identity_counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
+    def migrate_031_sync_parked_records(self):
+        """
+        EXPAND Phase: records a sync pass could not apply yet (OdooCardSyncService).
+        - sync_parked_records: mapped record per (source, record_id), retried on every
+          pass so the watermark can move past it without losing the record
+        """
+        version = "031"
+        desc = "EXPAND: sync_parked_records for Odoo card sync"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_parked_records (
+                    source TEXT NOT NULL,
+                    record_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    reason TEXT,
+                    parked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (source, record_id)
+                )
+            """)
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
+    def migrate_032_backfill_partner_places_city(self):
+        """
+        DATA Phase: fill partner_places.city_id (added in 026) for existing places.
+        - city is derived from the already populated address, or from geo_lat/geo_lon
+          when the address names no city (core.utils.geo.resolve_city_id)
+        - places that match no city keep city_id NULL
+        """
+        version = "032"
+        desc = "DATA: Backfill partner_places.city_id from address/coordinates"
+        if self.is_migration_applied(version):
+            logger.info(f"Migration {version} already applied, skipping")
+            return
+        def _apply(conn: sqlite3.Connection):
+            from core.utils.geo import resolve_city_id
+            if _col_exists(conn, "partner_places", "city_id"):
+                places = conn.execute("""
+                    SELECT id, address, geo_lat, geo_lon FROM partner_places WHERE city_id IS NULL
+                """).fetchall()
+                updates = []
+                for place_id, address, lat, lon in places:
+                    city_id = resolve_city_id(address, lat, lon)
+                    if city_id is not None:
+                        updates.append((city_id, place_id))
+                conn.executemany("UPDATE partner_places SET city_id = ? WHERE id = ?", updates)
+                logger.info(f"Migration {version}: city resolved for {len(updates)} of {len(places)} places")
+            # record migration
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (version, desc),
+            )
+        if self._is_memory:
+            conn = self.get_connection()
+            try:
+                _apply(conn)
+                conn.commit()
+                logger.info(f"Applied migration {version}: {desc}")
+            except Exception as e:
+                logger.error(f"Failed to apply migration {version}: {e}")
+                raise
+        else:
+            with self.get_connection() as conn:
+                try:
+                    _apply(conn)
+                    logger.info(f"Applied migration {version}: {desc}")
+                except Exception as e:
+                    logger.error(f"Failed to apply migration {version}: {e}")
+                    raise
+
     def migrate_021_partner_tariff_system(self):
         """Migration 021: Partner tariff system"""
         version = "021"
@@ -3305,6 +3731,20 @@ def ensure_database_ready():
         add_sample_cards()
         # Create favorites table
         ensure_favorites_table()
+        # Achievement counters for the event-driven achievement engine
+        ensure_achievement_counters_table()
+        # Partial index for atomic QR redemption
+        ensure_qr_codes_indexes()
+        # Trigram index for admin user search
+        ensure_users_search_index()
+        # Trigram index for catalog search
+        ensure_cards_search_index()
+        # Columns and watermark table for the Odoo card sync
+        ensure_odoo_card_sync_schema()
+        # NOTIFY triggers feeding the cache invalidation bus
+        ensure_cache_invalidation_triggers()
+        # Cross-platform identity graph
+        ensure_identity_graph_schema()
         return
         
     try:
@@ -3478,6 +3918,350 @@ def ensure_favorites_table():
     except Exception as e:
         logger.error(f"Error creating favorites table: {e}")
 
+def ensure_achievement_counters_table():
+    """Create compact per-user achievement counters and seed them from raw tables"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            # One row per (user, counter): updated by AchievementEngine in O(1) per event
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS user_achievement_counters (
+                    user_id BIGINT NOT NULL,
+                    counter VARCHAR(50) NOT NULL,
+                    value BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (user_id, counter)
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_achievements_user_type
+                ON user_achievements (user_id, achievement_type)
+            """)
+            
+            # Seed counters once from existing history; existing counters are kept
+            seeds = {
+                'karma': "SELECT telegram_id, 'karma', COALESCE(karma_points, 0) FROM users WHERE telegram_id IS NOT NULL",
+                'loyalty_points': "SELECT telegram_id, 'loyalty_points', COALESCE(points_balance, 0) FROM users WHERE telegram_id IS NOT NULL",
+                'cards': "SELECT telegram_id, 'cards', COUNT(*) FROM cards_binding WHERE status = 'active' GROUP BY telegram_id",
+                'referrals': "SELECT inviter_id, 'referrals', COUNT(*) FROM referrals GROUP BY inviter_id",
+            }
+            for counter, select_sql in seeds.items():
+                try:
+                    cur.execute(f"""
+                        INSERT INTO user_achievement_counters (user_id, counter, value)
+                        {select_sql}
+                        ON CONFLICT (user_id, counter) DO NOTHING
+                    """)
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not seed achievement counter '{counter}': {e}")
+            
+            cur.close()
+            conn.close()
+            logger.info("✅ user_achievement_counters table created/verified")
+            
+        else:
+            logger.info("Using SQLite, skipping achievement counters table creation")
+            
+    except Exception as e:
+        logger.error(f"Error creating achievement counters table: {e}")
+
+def ensure_qr_codes_indexes():
+    """Create partial index on unused QR codes for atomic redemption"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            cur.execute("SELECT to_regclass('public.qr_codes')")
+            if cur.fetchone()[0] is None:
+                logger.info("qr_codes table not found, skipping partial index")
+            else:
+                # UPDATE ... WHERE qr_id = $1 AND NOT is_used AND expires_at > now()
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_qr_codes_unused
+                    ON qr_codes (qr_id, expires_at)
+                    WHERE NOT is_used
+                """)
+                logger.info("✅ qr_codes partial index created/verified")
+            
+            cur.close()
+            conn.close()
+            
+        else:
+            logger.info("Using SQLite, skipping qr_codes index creation")
+            
+    except Exception as e:
+        logger.error(f"Error creating qr_codes indexes: {e}")
+
+def ensure_users_search_index():
+    """Create pg_trgm GIN expression index over the combined users names for admin search"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            cur.execute("SELECT to_regclass('public.users')")
+            if cur.fetchone()[0] is None:
+                logger.info("users table not found, skipping search index")
+            else:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                # Ранние версии хранили выражение в STORED-колонке; удаление колонки не переписывает таблицу
+                cur.execute("ALTER TABLE users DROP COLUMN IF EXISTS search_name")
+                # Индекс по выражению вместо трех ILIKE (совпадает с admin_service.USERS_SEARCH_NAME).
+                # Колонка не нужна, users не переписывается; CONCURRENTLY не блокирует запись
+                cur.execute("""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_search_name_trgm
+                    ON users USING gin (
+                        (lower(coalesce(username, '') || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, '')))
+                        gin_trgm_ops
+                    )
+                """)
+                # Запросы короче трех символов: префикс по username
+                cur.execute("""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username_lower_prefix
+                    ON users (lower(username) text_pattern_ops)
+                """)
+                logger.info("✅ users search indexes created/verified")
+            
+            cur.close()
+            conn.close()
+            
+        else:
+            logger.info("Using SQLite, users search index is created by migration 027")
+            
+    except Exception as e:
+        logger.error(f"Error creating users search index: {e}")
+
+def ensure_cards_search_index():
+    """Create pg_trgm GIN expression index over the combined cards_v2 text for catalog search"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            cur.execute("SELECT to_regclass('public.cards_v2')")
+            if cur.fetchone()[0] is None:
+                logger.info("cards_v2 table not found, skipping catalog search index")
+            else:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                # discount_text есть не во всех инсталляциях; nullable-колонка без DEFAULT добавляется без перезаписи
+                cur.execute("ALTER TABLE cards_v2 ADD COLUMN IF NOT EXISTS discount_text TEXT")
+                # Ранние версии хранили текст в STORED-колонке; удаление колонки не переписывает таблицу
+                cur.execute("ALTER TABLE cards_v2 DROP COLUMN IF EXISTS search_text")
+                # Индекс по выражению (совпадает с postgresql_service.CARDS_SEARCH_TEXT);
+                # CONCURRENTLY: не блокируем запись в cards_v2 на время построения
+                cur.execute("""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cards_v2_search_text_trgm
+                    ON cards_v2 USING gin (
+                        (lower(coalesce(title, '') || ' ' || coalesce(description, '') || ' '
+                               || coalesce(address, '') || ' ' || coalesce(discount_text, '')))
+                        gin_trgm_ops
+                    )
+                """)
+                logger.info("✅ cards_v2 search index created/verified")
+            
+            cur.close()
+            conn.close()
+            
+        else:
+            logger.info("Using SQLite, catalog search index is created by migration 028")
+            
+    except Exception as e:
+        logger.error(f"Error creating catalog search index: {e}")
+
+def ensure_odoo_card_sync_schema():
+    """Ensure cards_v2 columns, upsert index, sync_watermarks and sync_parked_records for OdooCardSyncService"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            cur.execute("""
+                ALTER TABLE cards_v2
+                    ADD COLUMN IF NOT EXISTS origin TEXT NOT NULL DEFAULT 'local',
+                    ADD COLUMN IF NOT EXISTS contact TEXT,
+                    ADD COLUMN IF NOT EXISTS discount_text TEXT,
+                    ADD COLUMN IF NOT EXISTS google_maps_url TEXT
+            """)
+            cur.execute("""
+                CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_cards_v2_odoo_card_id
+                ON cards_v2(odoo_card_id)
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS sync_watermarks (
+                    source TEXT PRIMARY KEY,
+                    watermark TEXT,
+                    last_id BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS sync_parked_records (
+                    source TEXT NOT NULL,
+                    record_id BIGINT NOT NULL,
+                    payload JSONB NOT NULL,
+                    reason TEXT,
+                    parked_at TIMESTAMPTZ DEFAULT NOW(),
+                    PRIMARY KEY (source, record_id)
+                )
+            """)
+            logger.info("✅ Odoo card sync schema created/verified")
+            
+            cur.close()
+            conn.close()
+            
+        else:
+            logger.info("Using SQLite, Odoo card sync schema is created by migrations 029 and 031")
+            
+    except Exception as e:
+        logger.error(f"Error ensuring Odoo card sync schema: {e}")
+
+def ensure_identity_graph_schema():
+    """Ensure identity_links, identity_users and identity_counters for the multi-platform identity graph"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS identity_links (
+                    platform TEXT NOT NULL,
+                    external_id TEXT NOT NULL,
+                    user_uuid TEXT NOT NULL,
+                    linked_at TIMESTAMPTZ DEFAULT NOW(),
+                    PRIMARY KEY (platform, external_id)
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_identity_links_user_uuid ON identity_links(user_uuid)")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS identity_users (
+                    user_uuid TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS identity_counters (
+                    name TEXT PRIMARY KEY,
+                    value BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+            logger.info("✅ Identity graph schema created/verified")
+            
+            cur.close()
+            conn.close()
+            
+        else:
+            logger.info("Using SQLite, identity graph schema is created by migration 030")
+            
+    except Exception as e:
+        logger.error(f"Error ensuring identity graph schema: {e}")
+
+# table -> (event kind, id column, columns whose UPDATE is an event; None — any change)
+CACHE_INVALIDATION_TRIGGERS = {
+    'cards_v2': ('card', 'id', None),
+    'partners_v2': ('partner', 'id', None),
+    'partner_tariff_subscriptions': ('partner', 'partner_id', None),
+    'partner_tariffs': ('tariff', 'id', None),
+    'categories_v2': ('category', 'id', None),
+}
+# Триггеры, снятые с таблиц: событий с них никто не слушает
+RETIRED_CACHE_INVALIDATION_TRIGGERS = ('users',)
+
+def ensure_cache_invalidation_triggers():
+    """Create row triggers that NOTIFY 'cache_invalidation' with typed events for InvalidationBus"""
+    try:
+        database_url = os.getenv('DATABASE_URL', '')
+        
+        if database_url and database_url.startswith("postgresql"):
+            import psycopg2
+            
+            conn = psycopg2.connect(database_url)
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+                DECLARE
+                    row_data jsonb := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+                BEGIN
+                    -- TG_ARGV: вид события и колонка с id; одинаковые NOTIFY в транзакции Postgres схлопывает сам.
+                    -- origin — инстанс, чья сессия пишет (InvalidationBus.instance_id); он событие не обрабатывает
+                    PERFORM pg_notify('cache_invalidation', json_build_object(
+                        'type', TG_ARGV[0],
+                        'ids', json_build_array((row_data ->> TG_ARGV[1])::bigint),
+                        'origin', current_setting('karmabot.instance_id', true)
+                    )::text);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            for table, (kind, id_column, update_columns) in CACHE_INVALIDATION_TRIGGERS.items():
+                cur.execute(
+                    "SELECT column_name FROM information_schema.columns WHERE table_name = %s",
+                    (table,),
+                )
+                present = {row[0] for row in cur.fetchall()}
+                if id_column not in present:
+                    logger.info(f"{table}.{id_column} not found, skipping cache invalidation trigger")
+                    continue
+                events = "INSERT OR UPDATE OR DELETE"
+                if update_columns:
+                    columns = [c for c in update_columns if c in present]
+                    events = f"INSERT OR UPDATE OF {', '.join(columns)} OR DELETE" if columns else "INSERT OR DELETE"
+                cur.execute(f"DROP TRIGGER IF EXISTS {table}_cache_invalidation ON {table}")
+                cur.execute(f"""
+                    CREATE TRIGGER {table}_cache_invalidation
+                    AFTER {events} ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation('{kind}', '{id_column}')
+                """)
+            for table in RETIRED_CACHE_INVALIDATION_TRIGGERS:
+                cur.execute("SELECT to_regclass(%s)", (f"public.{table}",))
+                if cur.fetchone()[0] is not None:
+                    cur.execute(f"DROP TRIGGER IF EXISTS {table}_cache_invalidation ON {table}")
+            logger.info("✅ Cache invalidation triggers created/verified")
+            
+            cur.close()
+            conn.close()
+            
+        else:
+            logger.info("Using SQLite, cache invalidation events are published by the application")
+            
+    except Exception as e:
+        logger.error(f"Error creating cache invalidation triggers: {e}")
+
 def unify_database_structure():
     """Унификация структуры PostgreSQL с SQLite согласно ТЗ"""
     try:
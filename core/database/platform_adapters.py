@@ -1,12 +1,117 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
+from .db_v2 import db_v2
 from .fault_tolerant_service import fault_tolerant_db, PlatformType
+import copy
 import logging
 import hashlib
+import heapq
+import os
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import partial
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+# Объединенная лояльность: параллельный опрос платформ и короткий кэш результата
+LOYALTY_PLATFORM_TIMEOUT = float(os.getenv("LOYALTY_PLATFORM_TIMEOUT", "3"))
+LOYALTY_PLATFORM_CONCURRENCY = max(1, int(os.getenv("LOYALTY_PLATFORM_CONCURRENCY", "4")))
+LOYALTY_PLATFORMS = ('telegram', 'website', 'mobile_ios', 'mobile_android')
+# У каждой платформы свои слоты: зависшие вызовы одной платформы не занимают потоки остальных.
+# Слот освобождается, когда вызов действительно завершился, а не по таймауту ожидания.
+_loyalty_slots = {platform: threading.BoundedSemaphore(LOYALTY_PLATFORM_CONCURRENCY)
+                  for platform in LOYALTY_PLATFORMS}
+_loyalty_pool = ThreadPoolExecutor(max_workers=LOYALTY_PLATFORM_CONCURRENCY * len(LOYALTY_PLATFORMS),
+                                   thread_name_prefix="loyalty-fanout")
+
+
+class _TTLCache:
+    """Небольшой потокобезопасный кэш в памяти: запись живет ttl секунд"""
+    
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[1]
+    
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._data) >= self.max_size and key not in self._data:
+                self._data.pop(next(iter(self._data)))  # самая старая запись
+            self._data[key] = (time.monotonic() + self.ttl, value)
+    
+    def discard(self, predicate):
+        """Удалить записи, ключ которых удовлетворяет predicate"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_unified_loyalty_cache = _TTLCache(float(os.getenv("UNIFIED_LOYALTY_CACHE_TTL", "30")))
+
+
+def _invalidate_unified_loyalty(user_identifier) -> None:
+    """Сбросить объединенную лояльность всех наборов идентификаторов с этим пользователем"""
+    value = str(user_identifier)
+    _unified_loyalty_cache.discard(lambda key: any(item[1] == value for item in key))
+
+
+fault_tolerant_db.on_points_changed(_invalidate_unified_loyalty)
+
+
+def _history_date(entry: Dict) -> str:
+    return entry.get('created_at') or ''
+
+
+def _newest_first(history: List[Dict]) -> List[Dict]:
+    """История платформы приходит от новых к старым; сортируем, только если это не так"""
+    if all(_history_date(a) >= _history_date(b) for a, b in zip(history, history[1:])):
+        return history
+    return sorted(history, key=_history_date, reverse=True)
+
+# Граф идентичностей (identity_links): вид идентификатора -> platform в графе.
+# Устройство одно и то же на iOS и Android, поэтому device_id — один вид.
+IDENTITY_PLATFORMS = {
+    'telegram_id': 'telegram',
+    'email': 'email',
+    'device_id': 'device',
+    'desktop_user_id': 'desktop'
+}
+
+
+def _identity(key: str, value: Union[int, str]) -> Tuple[str, str]:
+    platform = IDENTITY_PLATFORMS[key]
+    value = str(value).strip()
+    return platform, value.lower() if platform == 'email' else value
+
+
+def _register_identity(key: str, value: Union[int, str], user_uuid: str) -> str:
+    """Зарегистрировать идентичность в графе; если БД недоступна — uuid платформы"""
+    try:
+        return db_v2.ensure_identity(*_identity(key, value), user_uuid=user_uuid)
+    except Exception as e:
+        logger.error(f"Identity graph unavailable, using platform uuid: {e}")
+        return user_uuid
+
 class TelegramAdapter:
     """Адаптер для Telegram бота"""
     
@@ -27,7 +132,7 @@ class TelegramAdapter:
         )
         
         if success:
-            user_uuid = TelegramAdapter._generate_user_uuid(telegram_id)
+            user_uuid = _register_identity('telegram_id', telegram_id, TelegramAdapter._generate_user_uuid(telegram_id))
             logger.info(f"✅ Telegram user created: {telegram_id}")
             return user_uuid
         
@@ -125,7 +230,7 @@ class WebsiteAdapter:
         )
         
         if success:
-            user_uuid = WebsiteAdapter._generate_user_uuid(email)
+            user_uuid = _register_identity('email', email, WebsiteAdapter._generate_user_uuid(email))
             logger.info(f"✅ Website user created: {email}")
             return user_uuid
         
@@ -183,32 +288,15 @@ class WebsiteAdapter:
         try:
             # Получаем информацию о пользователе сайта
             website_user = WebsiteAdapter.get_user_info(email)
-            telegram_user = TelegramAdapter.get_user_info(telegram_id)
             
             if not website_user:
                 logger.error(f"Website user not found: {email}")
                 return False
             
-            # Создаем связь в кэше
-            link_data = {
-                'email': email,
-                'telegram_id': telegram_id,
-                'linked_at': datetime.utcnow().isoformat(),
-                'link_type': 'email_telegram'
-            }
-            
-            # Сохраняем связь в обе стороны
-            fault_tolerant_db.local_cache.set(f"link_email_{email}", {
-                'telegram_id': telegram_id,
-                'linked_at': link_data['linked_at']
-            }, ttl=86400)  # 24 часа
-            
-            fault_tolerant_db.local_cache.set(f"link_telegram_{telegram_id}", {
-                'email': email,
-                'linked_at': link_data['linked_at']
-            }, ttl=86400)
+            # Объединяем пользователей в графе идентичностей
+            user_uuid = db_v2.link_identities(_identity('email', email), _identity('telegram_id', telegram_id))
             
-            logger.info(f"✅ Accounts linked: {email} <-> {telegram_id}")
+            logger.info(f"✅ Accounts linked: {email} <-> {telegram_id} ({user_uuid})")
             return True
             
         except Exception as e:
@@ -219,8 +307,8 @@ class WebsiteAdapter:
     def get_linked_telegram(email: str) -> Optional[int]:
         """Получить связанный Telegram ID"""
         try:
-            link_data = fault_tolerant_db.local_cache.get(f"link_email_{email}")
-            return link_data.get('telegram_id') if link_data else None
+            linked = db_v2.get_linked_identities(*_identity('email', email)).get('telegram')
+            return int(linked[0]) if linked else None
         except Exception as e:
             logger.error(f"Error getting linked Telegram: {e}")
             return None
@@ -277,7 +365,9 @@ class MobileAppAdapter:
         )
         
         if success:
-            user_uuid = MobileAppAdapter._generate_user_uuid(device_id, platform_type)
+            user_uuid = _register_identity(
+                'device_id', device_id, MobileAppAdapter._generate_user_uuid(device_id, platform_type)
+            )
             logger.info(f"✅ Mobile user created: {device_id} ({platform_type})")
             return user_uuid
         
@@ -399,26 +489,11 @@ class MobileAppAdapter:
     def link_accounts(device_id: str, platform_type: str, account_data: Dict) -> bool:
         """Связать мобильный аккаунт с другими платформами"""
         try:
-            link_data = {
-                'device_id': device_id,
-                'platform': platform_type,
-                'linked_accounts': account_data,
-                'linked_at': datetime.utcnow().isoformat()
-            }
-            
-            # Сохраняем связи
+            # Объединяем устройство со всеми переданными аккаунтами в графе идентичностей
+            device = _identity('device_id', device_id)
             for account_type, account_id in account_data.items():
-                if account_type == 'telegram_id':
-                    fault_tolerant_db.local_cache.set(f"link_mobile_{device_id}_telegram", {
-                        'telegram_id': account_id,
-                        'linked_at': link_data['linked_at']
-                    }, ttl=86400)
-                    
-                elif account_type == 'email':
-                    fault_tolerant_db.local_cache.set(f"link_mobile_{device_id}_email", {
-                        'email': account_id,
-                        'linked_at': link_data['linked_at']
-                    }, ttl=86400)
+                if account_type in ('telegram_id', 'email') and account_id:
+                    db_v2.link_identities(device, _identity(account_type, account_id))
             
             logger.info(f"✅ Mobile accounts linked for device: {device_id}")
             return True
@@ -456,7 +531,9 @@ class DesktopAppAdapter:
         )
         
         if success:
-            user_uuid = DesktopAppAdapter._generate_user_uuid(user_id, platform_type)
+            user_uuid = _register_identity(
+                'desktop_user_id', user_id, DesktopAppAdapter._generate_user_uuid(user_id, platform_type)
+            )
             logger.info(f"✅ Desktop user created: {user_id} ({platform_type})")
             return user_uuid
         
@@ -683,9 +760,37 @@ class UniversalAdapter:
         
         return None
     
+    @staticmethod
+    def _loyalty_sources(user_identifiers: Dict) -> Dict:
+        """Платформа -> вызов get_loyalty_info для тех идентификаторов, что переданы"""
+        sources = {}
+        if 'telegram_id' in user_identifiers:
+            sources['telegram'] = partial(TelegramAdapter.get_loyalty_info, user_identifiers['telegram_id'])
+        if 'email' in user_identifiers:
+            sources['website'] = partial(WebsiteAdapter.get_loyalty_info, user_identifiers['email'])
+        if 'device_id' in user_identifiers:
+            for platform in ('mobile_ios', 'mobile_android'):
+                sources[platform] = partial(MobileAppAdapter.get_loyalty_info, user_identifiers['device_id'], platform)
+        return sources
+    
     @staticmethod
     def get_unified_loyalty_info(user_identifiers: Dict) -> Dict:
-        """Получить объединенную информацию о лояльности со всех платформ"""
+        """Получить объединенную информацию о лояльности со всех платформ
+
+        Платформы опрашиваются параллельно; не ответившие за
+        LOYALTY_PLATFORM_TIMEOUT попадают в platforms_timed_out, а ответ
+        собирается из остальных. Платформа, у которой заняты все
+        LOYALTY_PLATFORM_CONCURRENCY слотов, сразу считается не ответившей.
+        Полный ответ кэшируется на UNIFIED_LOYALTY_CACHE_TTL секунд по набору
+        идентификаторов (вызывающему отдается копия) и сбрасывается при
+        изменении баланса.
+        """
+        cache_key = tuple(sorted((key, str(value)) for key, value in user_identifiers.items()
+                                 if key in ('telegram_id', 'email', 'device_id')))
+        cached = _unified_loyalty_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
         loyalty_data = {
             'total_points': 0,
             'partner_cards': [],
@@ -695,63 +800,70 @@ class UniversalAdapter:
             'unified_at': datetime.utcnow().isoformat()
         }
         
-        # Собираем данные с каждой платформы
-        platforms_checked = []
-        
-        for platform, identifier_key in [
-            ('telegram', 'telegram_id'),
-            ('website', 'email'),
-            ('mobile_ios', 'device_id'),
-            ('mobile_android', 'device_id')
-        ]:
-            if identifier_key in user_identifiers:
-                try:
-                    if platform == 'telegram':
-                        platform_loyalty = TelegramAdapter.get_loyalty_info(user_identifiers[identifier_key])
-                    elif platform == 'website':
-                        platform_loyalty = WebsiteAdapter.get_loyalty_info(user_identifiers[identifier_key])
-                    elif platform in ['mobile_ios', 'mobile_android']:
-                        platform_loyalty = MobileAppAdapter.get_loyalty_info(user_identifiers[identifier_key], platform)
-                    else:
-                        continue
-                    
-                    if platform_loyalty and platform_loyalty.get('current_points', 0) > 0:
-                        # Берем максимальное количество баллов (они должны быть синхронизированы)
-                        loyalty_data['total_points'] = max(loyalty_data['total_points'], platform_loyalty['current_points'])
-                        
-                        # Собираем партнерские карты
-                        if platform_loyalty.get('partner_cards'):
-                            loyalty_data['partner_cards'].extend(platform_loyalty['partner_cards'])
-                        
-                        # Собираем историю
-                        if platform_loyalty.get('recent_history'):
-                            loyalty_data['history'].extend(platform_loyalty['recent_history'])
-                        
-                        # Отмечаем платформу
-                        loyalty_data['platforms'].append(platform)
-                        platforms_checked.append(platform)
-                        
-                except Exception as e:
-                    logger.error(f"Error getting loyalty from {platform}: {e}")
+        # Опрашиваем платформы параллельно
+        sources = UniversalAdapter._loyalty_sources(user_identifiers)
+        futures = {}
+        busy = []
+        for platform, call in sources.items():
+            slot = _loyalty_slots[platform]
+            if not slot.acquire(blocking=False):
+                busy.append(platform)
+                continue
+            future = _loyalty_pool.submit(call)
+            future.add_done_callback(lambda _future, slot=slot: slot.release())
+            futures[future] = platform
+        for platform in busy:
+            logger.warning(f"Loyalty from {platform} skipped: {LOYALTY_PLATFORM_CONCURRENCY} calls still in flight")
+        done, not_done = wait(futures, timeout=LOYALTY_PLATFORM_TIMEOUT)
+        late = {futures[future] for future in not_done}
+        for platform in late:
+            logger.warning(f"Loyalty from {platform} timed out after {LOYALTY_PLATFORM_TIMEOUT}s")
+        timed_out = [platform for platform in sources if platform in busy or platform in late]
         
-        # Убираем дубликаты партнерских карт
+        platforms_checked = []
+        histories = []
         unique_cards = {}
-        for card in loyalty_data['partner_cards']:
-            card_id = card.get('card_id') or card.get('id')
-            if card_id and card_id not in unique_cards:
-                unique_cards[card_id] = card
+        for future, platform in futures.items():  # порядок платформ как в запросе
+            if future not in done:
+                continue
+            try:
+                platform_loyalty = future.result()
+            except Exception as e:
+                logger.error(f"Error getting loyalty from {platform}: {e}")
+                continue
+            
+            if platform_loyalty and platform_loyalty.get('current_points', 0) > 0:
+                # Берем максимальное количество баллов (они должны быть синхронизированы)
+                loyalty_data['total_points'] = max(loyalty_data['total_points'], platform_loyalty['current_points'])
+                
+                # Партнерские карты без дубликатов
+                for card in platform_loyalty.get('partner_cards') or []:
+                    card_id = card.get('card_id') or card.get('id')
+                    if card_id and card_id not in unique_cards:
+                        unique_cards[card_id] = card
+                
+                if platform_loyalty.get('recent_history'):
+                    histories.append(_newest_first(platform_loyalty['recent_history']))
+                
+                loyalty_data['platforms'].append(platform)
+                platforms_checked.append(platform)
+        
         loyalty_data['partner_cards'] = list(unique_cards.values())
         
-        # Сортируем историю по дате
-        loyalty_data['history'].sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        loyalty_data['history'] = loyalty_data['history'][:10]  # Последние 10 записей
+        # История каждой платформы уже отсортирована: сливаем и берем последние 10 записей
+        loyalty_data['history'] = list(islice(
+            heapq.merge(*histories, key=_history_date, reverse=True), 10
+        ))
         
         # Определяем последнюю активность
         if loyalty_data['history']:
             loyalty_data['last_activity'] = loyalty_data['history'][0].get('created_at')
         
         loyalty_data['platforms_checked'] = platforms_checked
+        loyalty_data['platforms_timed_out'] = timed_out
         
+        if not timed_out:
+            _unified_loyalty_cache.set(cache_key, copy.deepcopy(loyalty_data))
         return loyalty_data
     
     @staticmethod
@@ -808,6 +920,16 @@ class UniversalAdapter:
                 'sync_timestamp': datetime.utcnow().isoformat()
             }
     
+    @staticmethod
+    def resolve_user_uuid(identifiers: Dict) -> Optional[str]:
+        """Канонический uuid пользователя по первому известному графу идентификатору"""
+        for key in IDENTITY_PLATFORMS:
+            if identifiers.get(key):
+                user_uuid = db_v2.resolve_identity(*_identity(key, identifiers[key]))
+                if user_uuid:
+                    return user_uuid
+        return None
+    
     @staticmethod
     def _get_linked_accounts(identifier: str, platform: str) -> Dict:
         """Получить связанные аккаунты пользователя"""
@@ -815,26 +937,20 @@ class UniversalAdapter:
         
         try:
             if platform == 'telegram':
-                # Ищем связанные email
-                email_link = fault_tolerant_db.local_cache.get(f"link_telegram_{identifier}")
-                if email_link and email_link.get('email'):
-                    linked_accounts['website'] = email_link['email']
-            
+                key = 'telegram_id'
             elif platform == 'website':
-                # Ищем связанный Telegram
-                telegram_link = fault_tolerant_db.local_cache.get(f"link_email_{identifier}")
-                if telegram_link and telegram_link.get('telegram_id'):
-                    linked_accounts['telegram'] = telegram_link['telegram_id']
-            
+                key = 'email'
             elif platform.startswith('mobile_'):
-                # Ищем связанные аккаунты для мобильного
-                telegram_link = fault_tolerant_db.local_cache.get(f"link_mobile_{identifier}_telegram")
-                if telegram_link and telegram_link.get('telegram_id'):
-                    linked_accounts['telegram'] = telegram_link['telegram_id']
-                
-                email_link = fault_tolerant_db.local_cache.get(f"link_mobile_{identifier}_email")
-                if email_link and email_link.get('email'):
-                    linked_accounts['website'] = email_link['email']
+                key = 'device_id'
+            else:
+                return linked_accounts
+            
+            linked = db_v2.get_linked_identities(*_identity(key, identifier))
+            if key != 'telegram_id' and linked.get('telegram'):
+                telegram_id = linked['telegram'][0]
+                linked_accounts['telegram'] = int(telegram_id) if telegram_id.isdigit() else telegram_id
+            if key != 'email' and linked.get('email'):
+                linked_accounts['website'] = linked['email'][0]
             
         except Exception as e:
             logger.error(f"Error getting linked accounts: {e}")
@@ -845,24 +961,21 @@ class UniversalAdapter:
     def get_platform_statistics() -> Dict:
         """Получить статистику по всем платформам"""
         try:
-            stats = {
+            # Счетчики графа идентичностей обновляются при регистрации и связывании
+            counters = db_v2.get_identity_counters()
+            
+            return {
                 'total_platforms': len(UniversalAdapter.get_adapters()),
-                'platform_usage': {},
-                'cross_platform_links': 0,
+                'platform_usage': {
+                    name.split(':', 1)[1]: value for name, value in counters.items() if name.startswith('platform:')
+                },
+                'total_identities': counters.get('identities', 0),
+                'unified_users': counters.get('users', 0),
+                'cross_platform_links': counters.get('links', 0),
+                'cache_items': len(fault_tolerant_db.local_cache.cache),
                 'generated_at': datetime.utcnow().isoformat()
             }
             
-            # Подсчитываем использование платформ из кэша
-            cache_stats = fault_tolerant_db.local_cache.get_cache_stats()
-            stats['cache_items'] = cache_stats['total_items']
-            
-            # Подсчитываем количество связей между платформами
-            for key in fault_tolerant_db.local_cache.cache.keys():
-                if key.startswith('link_'):
-                    stats['cross_platform_links'] += 1
-            
-            return stats
-            
         except Exception as e:
             logger.error(f"Error getting platform statistics: {e}")
             return {'error': str(e)}
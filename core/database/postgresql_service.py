@@ -3,10 +3,12 @@ PostgreSQL database service for production
 """
 import os
 import asyncio
+import json
 import asyncpg
 import logging
 import threading
-from typing import List, Dict, Optional, Any
+import uuid
+from typing import List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
@@ -14,6 +16,15 @@ import functools
 
 logger = logging.getLogger(__name__)
 
+# Размер пула для sync-вызовов (граф идентичностей из синхронного кода)
+SYNC_POOL_MAX_SIZE = int(os.getenv("PG_SYNC_POOL_MAX_SIZE", "5"))
+
+# Выражение GIN-индекса idx_cards_v2_search_text_trgm (ensure_cards_search_index)
+CARDS_SEARCH_TEXT = (
+    "lower(coalesce(c.title, '') || ' ' || coalesce(c.description, '') || ' ' "
+    "|| coalesce(c.address, '') || ' ' || coalesce(c.discount_text, ''))"
+)
+
 def safe_db_query(func):
     """Декоратор для безопасных database queries с retry"""
     @functools.wraps(func)
@@ -70,6 +81,10 @@ class PostgreSQLService:
         self.database_url = database_url
         self._pool = None
         self._lock = threading.Lock()
+        # Пул для sync-вызовов живет на собственном фоновом event loop
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_pool = None
+        self._sync_pool_lock = threading.Lock()
     
     @retry(
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -104,6 +119,7 @@ class PostgreSQLService:
                 logger.info("🔧 Creating PostgreSQL connection pool with SSL...")
                 self._pool = await asyncpg.create_pool(
                     self.database_url,
+                    init=self._init_connection,
                     **ssl_settings
                 )
                 logger.info("✅ PostgreSQL connection pool created with SSL")
@@ -119,16 +135,31 @@ class PostgreSQLService:
                 self._pool = await asyncpg.create_pool(
                     self.database_url,
                     min_size=1,
-                    max_size=10
+                    max_size=10,
+                    init=self._init_connection
                 )
                 logger.info("✅ PostgreSQL connection pool created (fallback)")
     
+    @staticmethod
+    async def _init_connection(conn) -> None:
+        """Пометить сессию id инстанса: триггеры инвалидации кладут его в origin события"""
+        from ..services.invalidation_bus import ORIGIN_SETTING, invalidation_bus
+        await conn.execute("SELECT set_config($1, $2, false)", ORIGIN_SETTING, invalidation_bus.instance_id)
+    
     async def close_pool(self):
         """Close connection pool"""
         if self._pool:
             await self._pool.close()
             self._pool = None
             logger.info("✅ PostgreSQL connection pool closed")
+        with self._sync_pool_lock:
+            loop, pool = self._sync_loop, self._sync_pool
+            self._sync_loop = self._sync_pool = None
+        if loop is not None:
+            if pool is not None:
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(pool.close(), loop))
+            loop.call_soon_threadsafe(loop.stop)
+            logger.info("✅ PostgreSQL sync connection pool closed")
     
     @retry(
         wait=wait_exponential(multiplier=1, min=1, max=3),
@@ -314,6 +345,301 @@ class PostgreSQLService:
             logger.error(f"❌ Sync wrapper error in get_cards_by_category_sync: {e}")
             return []
     
+    @safe_db_query
+    async def search_cards(self, query: str, city_id: Optional[int] = None, category_slug: Optional[str] = None,
+                           status: str = 'published', limit: int = 50) -> List[Dict]:
+        """Candidate cards for catalog search: pg_trgm word similarity over the indexed cards_v2 text"""
+        from ..utils.trigrams import words
+        
+        # Те же слова (\w+), что и у FTS5-поиска в SQLite: пунктуация не попадает в запрос
+        terms = words(query)
+        if not terms:
+            return []
+        text = " ".join(terms)
+        select = """
+            SELECT c.*, cat.slug as category_slug, cat.name as category_name, cat.emoji as category_emoji,
+                   (SELECT COUNT(*) FROM card_photos cp WHERE cp.card_id = c.id) as photos_count
+            FROM cards_v2 c
+            JOIN categories_v2 cat ON c.category_id = cat.id
+            WHERE c.status = $2 AND cat.is_active = true
+              AND ($3::int IS NULL OR c.city_id = $3)
+              AND ($4::text IS NULL OR cat.slug = $4)
+        """
+        try:
+            pool = await self.get_pool()
+            async with pool.acquire() as conn:
+                if max(len(w) for w in terms) < 3:
+                    # Триграммам не хватает символов: префикс по названию
+                    rows = await conn.fetch(
+                        select + " AND lower(c.title) LIKE $1 || '%' ORDER BY c.title LIMIT $5",
+                        terms[0], status, city_id, category_slug, limit
+                    )
+                    return [dict(row) for row in rows]
+                async with conn.transaction():
+                    # Порог ниже дефолтного 0.6, чтобы пропускать опечатки; точность добирает сервис
+                    await conn.execute("SET LOCAL pg_trgm.word_similarity_threshold = 0.3")
+                    rows = await conn.fetch(
+                        select + f"""
+                          AND $1 <% {CARDS_SEARCH_TEXT}
+                        ORDER BY word_similarity($1, {CARDS_SEARCH_TEXT}) DESC
+                        LIMIT $5
+                        """,
+                        text, status, city_id, category_slug, limit
+                    )
+                return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"❌ Database error in search_cards: {e}")
+            return []
+    
+    async def get_sync_watermark(self, source: str) -> Tuple[Optional[str], int]:
+        """Last synced (write_date, id) for the source; (None, 0) before the first sync"""
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT watermark, last_id FROM sync_watermarks WHERE source = $1", source)
+            return (row['watermark'], int(row['last_id'] or 0)) if row else (None, 0)
+    
+    async def upsert_odoo_cards(self, cards: List[Dict[str, Any]], *, partner_tg_id: int, source: str,
+                                watermark: Tuple[str, int]) -> List[int]:
+        """Upsert cards synced from Odoo (origin='odoo') and advance the watermark in one transaction
+
+        Cards with a category missing locally are parked in sync_parked_records for retry_parked_odoo_cards.
+        """
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                changed = await self._apply_odoo_cards(conn, cards, partner_tg_id, source)
+                await conn.execute(
+                    """
+                    INSERT INTO sync_watermarks (source, watermark, last_id, updated_at)
+                    VALUES ($1, $2, $3, NOW())
+                    ON CONFLICT (source) DO UPDATE SET
+                        watermark = EXCLUDED.watermark, last_id = EXCLUDED.last_id, updated_at = EXCLUDED.updated_at
+                    """,
+                    source, watermark[0], int(watermark[1])
+                )
+                return changed
+    
+    async def retry_parked_odoo_cards(self, *, partner_tg_id: int, source: str) -> List[int]:
+        """Apply parked Odoo cards whose category exists now"""
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    "SELECT payload FROM sync_parked_records WHERE source = $1 ORDER BY record_id FOR UPDATE", source
+                )
+                if not rows:
+                    return []
+                cards = [json.loads(row['payload']) for row in rows]
+                return await self._apply_odoo_cards(conn, cards, partner_tg_id, source)
+    
+    @staticmethod
+    async def _apply_odoo_cards(conn, cards: List[Dict[str, Any]], partner_tg_id: int, source: str) -> List[int]:
+        partner_id = await conn.fetchval("SELECT id FROM partners_v2 WHERE tg_user_id = $1", partner_tg_id)
+        if partner_id is None:
+            partner_id = await conn.fetchval(
+                """
+                INSERT INTO partners_v2 (tg_user_id, display_name, is_verified, is_active)
+                VALUES ($1, 'Odoo', true, true)
+                ON CONFLICT (tg_user_id) DO UPDATE SET display_name = partners_v2.display_name
+                RETURNING id
+                """,
+                partner_tg_id
+            )
+        categories = {row['slug']: row['id'] for row in await conn.fetch("SELECT id, slug FROM categories_v2")}
+        changed: List[int] = []
+        for card in cards:
+            category_id = categories.get(card['category_slug'])
+            if category_id is None:
+                logger.warning(f"Odoo card {card['odoo_card_id']}: unknown category '{card['category_slug']}', parked")
+                await conn.execute(
+                    """
+                    INSERT INTO sync_parked_records (source, record_id, payload, reason)
+                    VALUES ($1, $2, $3, 'unknown_category')
+                    ON CONFLICT (source, record_id) DO UPDATE SET payload = EXCLUDED.payload
+                    """,
+                    source, int(card['odoo_card_id']), json.dumps(card)
+                )
+                continue
+            card_id = await conn.fetchval(
+                """
+                INSERT INTO cards_v2 (
+                    partner_id, category_id, title, description, contact, address, google_maps_url,
+                    discount_text, latitude, longitude, status, odoo_card_id, origin
+                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, 'odoo')
+                ON CONFLICT (odoo_card_id) DO UPDATE SET
+                    category_id = EXCLUDED.category_id, title = EXCLUDED.title,
+                    description = EXCLUDED.description, contact = EXCLUDED.contact,
+                    address = EXCLUDED.address, google_maps_url = EXCLUDED.google_maps_url,
+                    discount_text = EXCLUDED.discount_text, latitude = EXCLUDED.latitude,
+                    longitude = EXCLUDED.longitude, status = EXCLUDED.status,
+                    updated_at = NOW()
+                WHERE cards_v2.origin = 'odoo'
+                RETURNING id
+                """,
+                partner_id, category_id, card['title'], card.get('description'), card.get('contact'),
+                card.get('address'), card.get('google_maps_url'), card.get('discount_text'),
+                card.get('latitude'), card.get('longitude'), card['status'], int(card['odoo_card_id'])
+            )
+            await conn.execute(
+                "DELETE FROM sync_parked_records WHERE source = $1 AND record_id = $2",
+                source, int(card['odoo_card_id'])
+            )
+            if card_id is not None:
+                changed.append(int(card_id))
+        return changed
+    
+    # --- Identity graph: (platform, external_id) -> canonical user uuid ---
+    def _get_sync_pool(self) -> Tuple[asyncio.AbstractEventLoop, Any]:
+        """
+        Persistent pool for sync callers, created once on a background event loop.
+        
+        The main pool belongs to the bot's event loop and cannot be awaited from
+        another thread, and a sync call made on that loop must not block it.
+        """
+        with self._sync_pool_lock:
+            if self._sync_pool is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="pg-sync-pool", daemon=True).start()
+                try:
+                    self._sync_pool = asyncio.run_coroutine_threadsafe(asyncpg.create_pool(
+                        self.database_url,
+                        min_size=1,
+                        max_size=SYNC_POOL_MAX_SIZE,
+                        init=self._init_connection
+                    ), loop).result()
+                except Exception:
+                    loop.call_soon_threadsafe(loop.stop)
+                    raise
+                self._sync_loop = loop
+                logger.info("✅ PostgreSQL sync connection pool created")
+            return self._sync_loop, self._sync_pool
+    
+    def _run_with_connection_sync(self, func, *args):
+        """Run func(conn, *args) on a connection from the persistent sync pool"""
+        loop, pool = self._get_sync_pool()
+        
+        async def runner():
+            async with pool.acquire() as conn:
+                return await func(conn, *args)
+        return asyncio.run_coroutine_threadsafe(runner(), loop).result()
+    
+    @staticmethod
+    async def _bump_identity_counters(conn, changes: Dict[str, int]) -> None:
+        for name, delta in changes.items():
+            await conn.execute(
+                """
+                INSERT INTO identity_counters (name, value) VALUES ($1, $2)
+                ON CONFLICT (name) DO UPDATE SET value = identity_counters.value + EXCLUDED.value
+                """,
+                name, delta
+            )
+    
+    @classmethod
+    async def _ensure_identity(cls, conn, platform: str, external_id: str, user_uuid: Optional[str]) -> str:
+        existing = await conn.fetchval(
+            "SELECT user_uuid FROM identity_links WHERE platform = $1 AND external_id = $2", platform, external_id
+        )
+        if existing:
+            return existing
+        user_uuid = user_uuid or str(uuid.uuid4())
+        inserted = await conn.fetchval(
+            """
+            INSERT INTO identity_links (platform, external_id, user_uuid) VALUES ($1, $2, $3)
+            ON CONFLICT (platform, external_id) DO NOTHING
+            RETURNING user_uuid
+            """,
+            platform, external_id, user_uuid
+        )
+        if inserted is None:  # зарегистрирована параллельно
+            return await conn.fetchval(
+                "SELECT user_uuid FROM identity_links WHERE platform = $1 AND external_id = $2", platform, external_id
+            )
+        size = await conn.fetchval(
+            """
+            INSERT INTO identity_users (user_uuid, size) VALUES ($1, 1)
+            ON CONFLICT (user_uuid) DO UPDATE SET size = identity_users.size + 1
+            RETURNING size
+            """,
+            user_uuid
+        )
+        await cls._bump_identity_counters(
+            conn, {'identities': 1, 'users': 1 if size == 1 else 0, f'platform:{platform}': 1}
+        )
+        return user_uuid
+    
+    async def _ensure_identity_tx(self, conn, platform: str, external_id: str, user_uuid: Optional[str]) -> str:
+        async with conn.transaction():
+            return await self._ensure_identity(conn, platform, external_id, user_uuid)
+    
+    async def _link_identities_tx(self, conn, first: Tuple[str, str], second: Tuple[str, str]) -> str:
+        async with conn.transaction():
+            # Слияния сериализуются: корни не меняются между чтением и переносом
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('identity_graph'))")
+            roots = [await self._ensure_identity(conn, platform, external_id, None) for platform, external_id in (first, second)]
+            if roots[0] == roots[1]:
+                return roots[0]
+            sizes = {
+                row['user_uuid']: int(row['size']) for row in await conn.fetch(
+                    "SELECT user_uuid, size FROM identity_users WHERE user_uuid = ANY($1::text[])", roots
+                )
+            }
+            winner, loser = sorted(roots, key=lambda root: (-sizes[root], roots.index(root)))
+            await conn.execute("UPDATE identity_links SET user_uuid = $1 WHERE user_uuid = $2", winner, loser)
+            await conn.execute("UPDATE identity_users SET size = size + $1 WHERE user_uuid = $2", sizes[loser], winner)
+            await conn.execute("DELETE FROM identity_users WHERE user_uuid = $1", loser)
+            await self._bump_identity_counters(conn, {'users': -1, 'links': 1})
+            return winner
+    
+    @staticmethod
+    async def _resolve_identity(conn, platform: str, external_id: str) -> Optional[str]:
+        return await conn.fetchval(
+            "SELECT user_uuid FROM identity_links WHERE platform = $1 AND external_id = $2", platform, external_id
+        )
+    
+    @staticmethod
+    async def _get_linked_identities(conn, platform: str, external_id: str) -> Dict[str, List[str]]:
+        rows = await conn.fetch(
+            """
+            SELECT other.platform, other.external_id
+            FROM identity_links AS own
+            JOIN identity_links AS other ON other.user_uuid = own.user_uuid
+            WHERE own.platform = $1 AND own.external_id = $2
+              AND NOT (other.platform = own.platform AND other.external_id = own.external_id)
+            ORDER BY other.linked_at, other.platform
+            """,
+            platform, external_id
+        )
+        linked: Dict[str, List[str]] = {}
+        for row in rows:
+            linked.setdefault(row['platform'], []).append(row['external_id'])
+        return linked
+    
+    @staticmethod
+    async def _get_identity_counters(conn) -> Dict[str, int]:
+        return {row['name']: int(row['value']) for row in await conn.fetch("SELECT name, value FROM identity_counters")}
+    
+    def ensure_identity_sync(self, platform: str, external_id: Any, user_uuid: Optional[str] = None) -> str:
+        """Register the identity; returns its canonical uuid (sync)"""
+        return self._run_with_connection_sync(self._ensure_identity_tx, platform, str(external_id), user_uuid)
+    
+    def link_identities_sync(self, first: Tuple[str, Any], second: Tuple[str, Any]) -> str:
+        """Merge the users owning two identities (union by size); returns the canonical uuid (sync)"""
+        return self._run_with_connection_sync(
+            self._link_identities_tx, (first[0], str(first[1])), (second[0], str(second[1]))
+        )
+    
+    def resolve_identity_sync(self, platform: str, external_id: Any) -> Optional[str]:
+        """Canonical user uuid for the identity (sync)"""
+        return self._run_with_connection_sync(self._resolve_identity, platform, str(external_id))
+    
+    def get_linked_identities_sync(self, platform: str, external_id: Any) -> Dict[str, List[str]]:
+        """Other identities of the same user, grouped by platform (sync)"""
+        return self._run_with_connection_sync(self._get_linked_identities, platform, str(external_id))
+    
+    def get_identity_counters_sync(self) -> Dict[str, int]:
+        """Identity graph counters (sync)"""
+        return self._run_with_connection_sync(self._get_identity_counters)
+    
     async def get_categories(self) -> List[Dict]:
         """Get all active categories"""
         pool = await self.get_pool()
@@ -557,6 +883,28 @@ class PostgreSQLService:
             logger.error(f"Error getting card photos: {e}")
             return []
     
+    async def get_cards_photos(self, card_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Get photos for several cards in one query: {card_id: photos}"""
+        if not card_ids:
+            return {}
+        try:
+            query = """
+                SELECT id, card_id, photo_url, photo_file_id, caption, is_main, position, file_id, created_at
+                FROM card_photos 
+                WHERE card_id = ANY($1::int[])
+                ORDER BY card_id, position ASC, created_at ASC
+            """
+            pool = await self.get_pool()
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(query, [int(card_id) for card_id in card_ids])
+            result: Dict[int, List[Dict]] = {}
+            for row in rows:
+                result.setdefault(row['card_id'], []).append(dict(row))
+            return result
+        except Exception as e:
+            logger.error(f"Error getting photos for cards {card_ids}: {e}")
+            return {}
+    
     @safe_db_query
     async def add_to_favorites(self, user_id: int, card_id: int) -> bool:
         """Add card to user favorites"""
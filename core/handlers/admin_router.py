@@ -119,6 +119,32 @@ async def search_users_handler(message: Message, state: FSMContext):
         )
 
 
+SEARCH_PAGE_SIZE = 10
+
+
+def _render_search_results(query: str, users: list, offset: int = 0) -> str:
+    """Format a page of user search results."""
+    if not users:
+        return f"❌ Пользователи по запросу '{query}' не найдены."
+    text = f"🔍 <b>Результаты поиска:</b> '{query}'\n\n"
+    for i, user in enumerate(users, offset + 1):
+        status_emoji = "🚫" if user['is_banned'] else "✅"
+        text += (
+            f"{i}. {status_emoji} <b>{user['full_name'] or 'Без имени'}</b>\n"
+            f"   ID: <code>{user['telegram_id']}</code>\n"
+            f"   @{user['username'] or 'Нет username'}\n"
+            f"   ⭐ Карма: {user['karma_points']} (Уровень {user['level']})\n"
+            f"   🎭 Роль: {user['role']}\n\n"
+        )
+    return text
+
+
+def _search_more_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="➡️ Показать еще", callback_data="admin:search_more")
+    ]])
+
+
 @router.message(AdminStates.searching_users)
 async def process_user_search(message: Message, state: FSMContext):
     """Process user search query."""
@@ -128,31 +154,22 @@ async def process_user_search(message: Message, state: FSMContext):
             await message.answer("❌ Пожалуйста, введите поисковый запрос.")
             return
         
-        # Search users
-        users = await admin_service.search_users(query, limit=10)
+        # Search users (first page, keyset cursor kept in FSM for "show more")
+        page = await admin_service.search_users_page(query, limit=SEARCH_PAGE_SIZE)
+        users = page['users']
+        text = _render_search_results(query, users)
         
-        if not users:
-            text = f"❌ Пользователи по запросу '{query}' не найдены."
-        else:
-            text = f"🔍 <b>Результаты поиска:</b> '{query}'\n\n"
-            for i, user in enumerate(users, 1):
-                status_emoji = "🚫" if user['is_banned'] else "✅"
-                text += (
-                    f"{i}. {status_emoji} <b>{user['full_name'] or 'Без имени'}</b>\n"
-                    f"   ID: <code>{user['telegram_id']}</code>\n"
-                    f"   @{user['username'] or 'Нет username'}\n"
-                    f"   ⭐ Карма: {user['karma_points']} (Уровень {user['level']})\n"
-                    f"   🎭 Роль: {user['role']}\n\n"
-                )
+        await state.set_state(AdminStates.viewing_dashboard)
+        await state.update_data(
+            search_query=query, search_cursor=page['next_cursor'], search_offset=len(users)
+        )
         
         await message.answer(
             text,
-            reply_markup=get_admin_keyboard(),
+            reply_markup=_search_more_keyboard() if page['next_cursor'] else get_admin_keyboard(),
             parse_mode='HTML'
         )
         
-        await state.set_state(AdminStates.viewing_dashboard)
-        
     except Exception as e:
         logger.error(f"Error in process_user_search: {str(e)}", exc_info=True)
         await message.answer(
@@ -161,6 +178,32 @@ async def process_user_search(message: Message, state: FSMContext):
         )
 
 
+@router.callback_query(F.data == "admin:search_more")
+async def search_more_handler(callback: CallbackQuery, state: FSMContext):
+    """Show the next page of the last user search."""
+    data = await state.get_data()
+    query, cursor = data.get('search_query'), data.get('search_cursor')
+    if not query or not cursor:
+        await callback.answer("Больше результатов нет")
+        return
+    
+    try:
+        offset = data.get('search_offset', 0)
+        page = await admin_service.search_users_page(query, limit=SEARCH_PAGE_SIZE, cursor=cursor)
+        await state.update_data(search_cursor=page['next_cursor'], search_offset=offset + len(page['users']))
+        
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer(
+            _render_search_results(query, page['users'], offset),
+            reply_markup=_search_more_keyboard() if page['next_cursor'] else get_admin_keyboard(),
+            parse_mode='HTML'
+        )
+        await callback.answer()
+    except Exception as e:
+        logger.error(f"Error in search_more_handler: {str(e)}", exc_info=True)
+        await callback.answer("❌ Ошибка при поиске", show_alert=True)
+
+
 @router.message(F.text.in_(["⚡ Управление кармой", "⚡ Karma Management"]))
 async def karma_management_handler(message: Message, state: FSMContext):
     """Handle karma management."""
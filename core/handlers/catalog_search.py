@@ -0,0 +1,126 @@
+"""
+Catalog search handlers: /search command and inline mode
+"""
+import html
+import logging
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Message,
+)
+
+from ..services.card_renderer import card_service
+from ..services.catalog_search import catalog_search_service
+from ..services.profile import profile_service
+from ..utils.locales_v2 import format_text, get_text
+
+logger = logging.getLogger(__name__)
+
+router = Router(name="catalog_search")
+
+INLINE_RESULTS = 20
+# Telegram кэширует ответ на одинаковый inline-запрос на своей стороне
+INLINE_CACHE_TIME = 60
+
+
+class CatalogSearchStates(StatesGroup):
+    waiting_query = State()
+
+
+async def _user_context(user_id: int) -> tuple[str, int | None]:
+    """Язык и город пользователя (город — фильтр поиска)"""
+    try:
+        lang = await profile_service.get_lang(user_id) or 'ru'
+    except Exception:
+        lang = 'ru'
+    try:
+        city_id = await profile_service.get_city_id(user_id)
+    except Exception:
+        city_id = None
+    return lang, city_id
+
+
+def _card_keyboard(card_id) -> InlineKeyboardMarkup:
+    """Те же действия, что и у карточки в каталоге"""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="📱 QR", callback_data=f"qr_create:{card_id}"),
+        InlineKeyboardButton(text="📷 Фото", callback_data=f"gallery:{card_id}"),
+        InlineKeyboardButton(text="⭐", callback_data=f"favorite:{card_id}"),
+        InlineKeyboardButton(text="ℹ️", callback_data=f"act:view:{card_id}"),
+    ]])
+
+
+async def _answer_search(message: Message, query: str) -> None:
+    lang, city_id = await _user_context(message.from_user.id)
+    cards = await catalog_search_service.search(query, city_id=city_id)
+    if not cards:
+        await message.answer(format_text('catalog_search_empty', lang, query=html.escape(query)))
+        return
+
+    await message.answer(f"{get_text('catalog_found', lang)}: {len(cards)}")
+    for i, (card, text) in enumerate(zip(cards, card_service.render_cards(cards, lang)), 1):
+        await message.answer(f"**{i}.** {text}", reply_markup=_card_keyboard(card.get('id')))
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext):
+    """/search <запрос> — сразу ищем; без аргумента — спрашиваем запрос"""
+    if command.args and command.args.strip():
+        await state.clear()
+        await _answer_search(message, command.args.strip())
+        return
+    lang, _ = await _user_context(message.from_user.id)
+    await state.set_state(CatalogSearchStates.waiting_query)
+    await message.answer(get_text('catalog_search_prompt', lang))
+
+
+@router.message(CatalogSearchStates.waiting_query, F.text)
+async def process_search_query(message: Message, state: FSMContext):
+    await state.clear()
+    await _answer_search(message, message.text.strip())
+
+
+@router.inline_query()
+async def inline_catalog_search(inline_query: InlineQuery):
+    """@bot <запрос> — карточки каталога прямо в любом чате"""
+    query = inline_query.query.strip()
+    if not query:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    lang, city_id = await _user_context(inline_query.from_user.id)
+    try:
+        cards = await catalog_search_service.search(query, city_id=city_id, limit=INLINE_RESULTS)
+        texts = card_service.render_cards(cards, lang)
+        results = [
+            InlineQueryResultArticle(
+                id=str(card.get('id')),
+                title=card.get('title') or 'Без названия',
+                description=" · ".join(
+                    str(v) for v in (card.get('discount_text'), card.get('address')) if v
+                ) or None,
+                input_message_content=InputTextMessageContent(message_text=text),
+            )
+            for card, text in zip(cards, texts)
+        ]
+        # Город берется из профиля, поэтому результаты персональные
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+    except Exception as e:
+        logger.error(f"Inline catalog search failed for '{query}': {e}", exc_info=True)
+        await inline_query.answer([], cache_time=1, is_personal=True)
+
+
+def get_catalog_search_router() -> Router:
+    """Get catalog search router (always enabled)"""
+    return router
+
+
+__all__ = ['router', 'get_catalog_search_router', 'CatalogSearchStates']
@@ -37,33 +37,6 @@ from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-# Odoo helpers (pure functions, no side effects)
-def _map_slug_to_odoo_category(slug: str) -> str:
-    m = {
-        'restaurants': 'restaurant',
-        'spa': 'spa',
-        'transport': 'transport',
-        'hotels': 'hotel',
-        'tours': 'tours',
-        'shops': 'retail',
-    }
-    return m.get(slug, 'retail')
-
-def _merge_cards_without_duplicates(local_cards: list[dict], remote_cards: list[dict]) -> list[dict]:
-    seen: set[tuple[str, str]] = set()
-    merged: list[dict] = []
-    for c in local_cards:
-        key = (str(c.get('title') or '').strip().lower(), str(c.get('address') or '').strip().lower())
-        seen.add(key)
-        merged.append(c)
-    for c in remote_cards:
-        key = (str(c.get('title') or '').strip().lower(), str(c.get('address') or '').strip().lower())
-        if key in seen:
-            continue
-        seen.add(key)
-        merged.append(c)
-    return merged
-
 # Router for category handlers
 category_router = Router(name="category_router")
 
@@ -170,32 +143,6 @@ async def show_catalog_page(bot: Bot, chat_id: int, lang: str, slug: str, sub_sl
             # Возвращаем пустой список при ошибке
             all_cards = []
 
-        # Optionally enrich from Odoo without changing UI. Only when sub_slug == 'all'.
-        if sub_slug == "all":
-            try:
-                from core.services import odoo_api
-                if odoo_api.is_configured:
-                    od = await odoo_api.get_cards_by_category(category=_map_slug_to_odoo_category(slug))
-                    if od.get('success') and isinstance(od.get('cards'), list):
-                        odoo_cards_raw = od['cards']
-                        odoo_cards: list[dict] = []
-                        for c in odoo_cards_raw:
-                            try:
-                                odoo_cards.append({
-                                    'title': c.get('name') or 'Без названия',
-                                    'description': c.get('description') or '',
-                                    'address': c.get('address') or '',
-                                    'contact': c.get('phone') or '',
-                                    'discount_text': (f"Cashback {c.get('cashback_percent')}%" if c.get('cashback_percent') is not None else None),
-                                    'photos_count': len(c.get('photos') or []),
-                                })
-                            except Exception:
-                                continue
-                        if odoo_cards:
-                            all_cards = _merge_cards_without_duplicates(all_cards, odoo_cards)
-            except Exception:
-                # Do not fail catalog rendering if Odoo is unreachable
-                pass
         if city_id is not None and all_cards and 'city_id' in all_cards[0]:
             all_cards = [c for c in all_cards if c.get('city_id') == city_id]
         if sub_slug != "all" and all_cards and 'sub_slug' in all_cards[0]:
@@ -220,10 +167,20 @@ async def show_catalog_page(bot: Bot, chat_id: int, lang: str, slug: str, sub_sl
             # Сначала отправляем заголовок
             await bot.send_message(chat_id, header)
             
+            # Тексты всей страницы одним batch-вызовом (общий кэш для всех пользователей категории)
+            card_texts = card_service.render_cards(cards_page, lang)
+            
+            # Фото всей страницы — одним запросом
+            page_ids = [card.get('id') for card in cards_page if card.get('id')]
+            try:
+                photos_by_card = await db_v2.get_cards_photos(page_ids)
+            except Exception as e:
+                logger.error(f"ДИАГНОСТИКА: Ошибка получения фото для страницы {page_ids}: {e}")
+                photos_by_card = {}
+            
             # Затем отправляем каждую карточку отдельно
-            for i, card in enumerate(cards_page, 1):
+            for i, (card, card_text) in enumerate(zip(cards_page, card_texts), 1):
                 try:
-                    card_text = card_service.render_card(card, lang)
                     text = f"**{i}.** {card_text}"
                     logger.warning(f"ДИАГНОСТИКА: Карточка {i} отрендерена успешно")
                     
@@ -236,16 +193,8 @@ async def show_catalog_page(bot: Bot, chat_id: int, lang: str, slug: str, sub_sl
                     ]
                     kb = InlineKeyboardMarkup(inline_keyboard=[card_buttons])
                     
-                    # Пытаемся получить фото для карточки
-                    card_id = card.get('id')
-                    photos = []
-                    if card_id:
-                        try:
-                            photos = await db_v2.get_card_photos(card_id)
-                            logger.warning(f"ДИАГНОСТИКА: Получено {len(photos)} фото для карточки {card_id}")
-                        except Exception as e:
-                            logger.error(f"ДИАГНОСТИКА: Ошибка получения фото для карточки {card_id}: {e}")
-                            photos = []
+                    # Фото карточки из общего запроса страницы
+                    photos = photos_by_card.get(card.get('id'), [])
                     
                     # Отправляем карточку с фото или без
                     if photos and photos[0].get('file_id'):
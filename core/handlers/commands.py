@@ -28,6 +28,7 @@ async def set_commands(bot: Bot) -> None:
         ("add_card", "commands.add_card"),
         ("webapp", "commands.webapp"),
         ("city", "commands.city"),
+        ("search", "commands.search"),
         ("help", "commands.help"),
         ("policy", "commands.policy"),
         ("clear_cache", "commands.clear_cache"),
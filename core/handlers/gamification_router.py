@@ -12,9 +12,14 @@ from core.utils.locales_v2 import get_text
 logger = logging.getLogger(__name__)
 router = Router(name="gamification_router")
 
-@router.message(F.text.in_([
-    "🏆 Достижения", "🏆 Achievements", "🏆 Thành tựu", "🏆 업적"
-]))
+# Апдейты, по которым роутер подгружается лениво (LazyRouter.from_module в main_v2);
+# значение — литерал: читается из исходника без импорта модуля
+LAZY_TRIGGERS = {
+    "texts": ["🏆 Достижения", "🏆 Achievements", "🏆 Thành tựu", "🏆 업적"],
+    "callback_prefixes": ["achievements_", "back_to_achievements"],
+}
+
+@router.message(F.text.in_(LAZY_TRIGGERS["texts"]))
 async def handle_achievements_menu(message: Message, state: FSMContext):
     """Показать меню достижений"""
     try:
@@ -11,6 +11,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from core.services.loyalty_service import LoyaltyService, ActivityType
+from core.services.gamification_service import gamification_service
 from core.database import get_db
 from core.models.loyalty_models import LoyaltyBalance
 
@@ -149,6 +150,8 @@ async def claim_activity(callback: CallbackQuery):
         transaction = await service.record_activity(user_id, activity_enum)
         
         if transaction:
+            if activity_enum in (ActivityType.DAILY_CHECKIN, ActivityType.GEO_CHECKIN):
+                await gamification_service.check_and_award_achievements(callback.from_user.id)
             await callback.answer(
                 f"+{transaction.points} баллов за активность!",
                 show_alert=True
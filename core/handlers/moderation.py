@@ -14,6 +14,7 @@ import logging
 from ..settings import settings
 from ..database.db_v2 import db_v2
 from ..services.admins import admins_service
+from ..services.card_renderer import invalidate_card_render
 
 logger = logging.getLogger(__name__)
 
@@ -371,7 +372,7 @@ async def feature_card(callback: CallbackQuery, state: FSMContext):
     
     card_id = int(callback.data.split(":")[1])
     
-    # Update card status and mark as featured
+    # Update card status and mark as featured (commit on leaving the block)
     with db_v2.get_connection() as conn:
         cursor = conn.execute("""
             UPDATE cards_v2 
@@ -380,17 +381,21 @@ async def feature_card(callback: CallbackQuery, state: FSMContext):
             WHERE id = ?
         """, (card_id,))
         
-        if cursor.rowcount > 0:
+        updated = cursor.rowcount > 0
+        if updated:
             # Log moderation action
             conn.execute("""
                 INSERT INTO moderation_log (card_id, moderator_id, action, comment)
                 VALUES (?, ?, 'feature', 'Отмечено как рекомендуемое')
             """, (card_id, callback.from_user.id))
-            
-            await callback.answer("⭐ Карточка отмечена как рекомендуемая!")
-            await show_next_card(callback, state)
-        else:
-            await callback.answer("❌ Ошибка при обновлении карточки")
+    
+    if updated:
+        # Кэш сбрасываем после коммита: иначе параллельный рендер закэширует старую версию
+        invalidate_card_render(card_id)
+        await callback.answer("⭐ Карточка отмечена как рекомендуемая!")
+        await show_next_card(callback, state)
+    else:
+        await callback.answer("❌ Ошибка при обновлении карточки")
 
 # Show next card
 @moderation_router.callback_query(F.data == "mod_next")
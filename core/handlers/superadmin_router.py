@@ -3,11 +3,13 @@ Router for SuperAdmin panel functionality.
 Handles all super administrative operations including card generation, data deletion, and system management.
 """
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from typing import Optional, Union, Any, Dict
 import logging
+import os
+import tempfile
 
 # Create router with a name
 router = Router(name='superadmin_router')
@@ -97,7 +99,8 @@ async def generate_cards_handler(message: Message, state: FSMContext):
             "<code>/generate [количество]</code>\n\n"
             "Примеры:\n"
             "• <code>/generate 100</code> - создать 100 карт\n"
-            "• <code>/generate 1000</code> - создать 1000 карт\n\n"
+            "• <code>/generate 1000</code> - создать 1000 карт\n"
+            "• <code>/generate 100 pdf</code> - и лист QR-кодов для печати\n\n"
             "⚠️ Максимальное количество за раз: 10000 карт"
         )
         
@@ -139,7 +142,12 @@ async def process_card_generation(message: Message, state: FSMContext):
             return
         
         # Generate cards
-        result = await superadmin_service.generate_cards(count, message.from_user.id)
+        pdf_path = None
+        if len(parts) > 2 and parts[2].lower() == 'pdf':
+            fd, pdf_path = tempfile.mkstemp(prefix="cards_", suffix=".pdf")
+            os.close(fd)
+        
+        result = await superadmin_service.generate_cards(count, message.from_user.id, pdf_path=pdf_path)
         
         if result['success']:
             text = (
@@ -157,6 +165,16 @@ async def process_card_generation(message: Message, state: FSMContext):
             parse_mode='HTML'
         )
         
+        # Отправляем файлы и удаляем временные копии
+        for path in (result.get('csv_path'), pdf_path):
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                if result['success'] and os.path.getsize(path) > 0:
+                    await message.answer_document(FSInputFile(path))
+            finally:
+                os.remove(path)
+        
         await state.set_state(SuperAdminStates.viewing_dashboard)
         
     except Exception as e:
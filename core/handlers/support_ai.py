@@ -2,24 +2,25 @@
 Обработчик AI-ассистента "Карма"
 """
 import logging
+import time
 from aiogram import Router, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from core.fsm.support_states import SupportStates
-from core.services.support_ai_service import SupportAIService
+from core.services.support_ai_service import support_ai_service
 from core.services.report_service import ReportService
 from core.services.stt_service import STTService
 from core.ui.kb_support_ai import kb_ai_controls
 from core.utils.rate_limit import rate_limiter
-from core.i18n import get_text
+from core.utils.locales_v2 import get_text
 from core.settings import settings
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 # Инициализация сервисов
-support_ai = SupportAIService()
+support_ai = support_ai_service
 report_service = ReportService()
 stt_service = STTService()
 
@@ -50,6 +51,43 @@ async def cmd_support(message: Message, state: FSMContext):
         await message.answer("❌ Ошибка запуска AI. Попробуйте позже.")
 
 
+@router.message(Command("export_report"))
+async def cmd_export_report(message: Message, command: CommandObject):
+    """Выгрузка продаж файлом: /export_report [период] [csv|xlsx]"""
+    try:
+        args = (command.args or "").split()
+        fmt = next((arg.lower() for arg in args if arg.lower() in ("csv", "xlsx")), "csv")
+        period = " ".join(arg for arg in args if arg.lower() not in ("csv", "xlsx")) or "неделя"
+        
+        status = await message.answer("⏳ Готовлю выгрузку...")
+        last_update = time.monotonic()
+        
+        async def on_progress(rows: int):
+            nonlocal last_update
+            # Не чаще раза в 2 секунды, чтобы не упереться в лимиты Telegram
+            if time.monotonic() - last_update < 2:
+                return
+            last_update = time.monotonic()
+            try:
+                await status.edit_text(f"⏳ Выгружено строк: {rows}")
+            except Exception:
+                pass
+        
+        result = await report_service.send_report_document(
+            message.bot, message.chat.id, message.from_user.id,
+            {"period": period}, fmt=fmt, progress=on_progress
+        )
+        
+        if result["success"]:
+            await status.edit_text(f"✅ Выгрузка готова: {result['rows']} строк")
+        else:
+            await status.edit_text("❌ Не удалось сформировать выгрузку.")
+        
+    except Exception as e:
+        logger.error(f"Error in export_report command: {e}")
+        await message.answer("❌ Ошибка выгрузки. Попробуйте позже.")
+
+
 @router.callback_query(F.data == "support_ai_start")
 async def support_ai_start(cb: CallbackQuery, state: FSMContext):
     """Запуск AI-ассистента"""
@@ -14,7 +14,14 @@ from core.security.roles import get_user_role
 logger = logging.getLogger(__name__)
 router = Router(name="tariff_admin_router")
 
-@router.message(F.text == "💰 Управление тарифами")
+# Апдейты, по которым роутер подгружается лениво (LazyRouter.from_module в main_v2);
+# значение — литерал: читается из исходника без импорта модуля
+LAZY_TRIGGERS = {
+    "texts": ["💰 Управление тарифами"],
+    "callback_prefixes": ["tariff_view:", "tariff_subscribers:", "tariff_stats", "tariff_management"],
+}
+
+@router.message(F.text.in_(LAZY_TRIGGERS["texts"]))
 async def handle_tariff_management(message: Message, state: FSMContext):
     """Обработчик кнопки управления тарифами (только для админов)"""
     try:
@@ -17,7 +17,17 @@ from core.utils.locales_v2 import get_text
 logger = logging.getLogger(__name__)
 router = Router(name="tariffs_user_router")
 
-@router.message(Command("tariffs"))
+# Апдейты, по которым роутер подгружается лениво (LazyRouter.from_module в main_v2);
+# значение — литерал: читается из исходника без импорта модуля
+LAZY_TRIGGERS = {
+    "commands": ["tariffs"],
+    "callback_prefixes": [
+        "tariff_info:", "tariff_apply:", "tariff_confirm:",
+        "back_to_tariffs", "tariff_help", "back_to_main",
+    ],
+}
+
+@router.message(Command(*LAZY_TRIGGERS["commands"]))
 async def handle_tariffs_command(message: Message, state: FSMContext):
     """Команда /tariffs - показать все доступные тарифы для пользователей"""
     try:
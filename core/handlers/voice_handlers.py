@@ -80,13 +80,15 @@ async def _handle_voice_error(message: Message, error_code: str):
         "download_error": "❌ Ошибка загрузки файла",
         "conversion_error": "❌ Ошибка конвертации аудио",
         "transcription_error": "❌ Ошибка распознавания речи",
+        "stt_busy": "⏳ Сервис распознавания перегружен, попробуйте через минуту",
+        "stt_timeout": "⏳ Распознавание заняло слишком много времени, попробуйте еще раз",
         "processing_error": "❌ Ошибка обработки"
     }
     
     error_text = error_messages.get(error_code, "❌ Неизвестная ошибка")
     
     # Для некоторых ошибок показываем кнопку повтора
-    if error_code in ["couldnt_understand", "transcription_error"]:
+    if error_code in ["couldnt_understand", "transcription_error", "stt_busy", "stt_timeout"]:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(
                 text=get_text('voice.btn_retry', 'ru'),
@@ -4,7 +4,7 @@
 QR Code model for KARMABOT1
 """
 
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -48,6 +48,16 @@ class QRCode(Base):
     user = relationship("User", back_populates="qr_codes")
     partner = relationship("PartnerV2", back_populates="redeemed_qr_codes")
     
+    __table_args__ = (
+        # Redemption only ever touches unused codes
+        Index(
+            "idx_qr_codes_unused",
+            "qr_id", "expires_at",
+            postgresql_where=text("NOT is_used"),
+            sqlite_where=text("is_used = 0"),
+        ),
+    )
+    
     def __repr__(self):
         return f"<QRCode(id={self.id}, qr_id={self.qr_id}, user_id={self.user_id}, discount_type={self.discount_type})>"
     
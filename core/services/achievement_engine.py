@@ -0,0 +1,514 @@
+"""
+Событийный движок достижений.
+
+Вместо пересчёта всех достижений по сырым таблицам (referrals,
+user_activities, ...) движок принимает доменные события, обновляет компактные
+счётчики пользователя в таблице user_achievement_counters и выдаёт все
+достигнутые, но ещё не выданные пороги. Обработка одного события — O(1)
+независимо от длины истории пользователя.
+
+Счётчик, которого у пользователя ещё нет, заполняется из исходной таблицы
+(COUNTER_SEEDS). Карты считаются по cards_binding: туда пишут привязка карты
+(CardService.bind_card, PlasticCardsService), и по ней же считались карточные
+достижения в CardService; в user_cards лежат только старые карты по uid_hash.
+
+На SQLite таблицы счётчиков нет: значения берутся напрямую из исходных таблиц
+(COUNTER_SOURCES_SQLITE), пороги и формат achievement_data те же.
+
+Оконные достижения (серии, ранние/ночные входы, места) считаются по
+user_activities в GamificationService.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+
+import asyncpg
+
+from core.models.achievement_models import AchievementType, DEFAULT_ACHIEVEMENTS
+from core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AchievementEvent(Enum):
+    """Доменные события, влияющие на достижения"""
+    POINTS_CREDITED = "points_credited"  # Начислены карма/баллы
+    CARD_BOUND = "card_bound"  # Привязана карта
+    CARD_UNBOUND = "card_unbound"  # Карта отвязана или заблокирована
+    REFERRAL_ADDED = "referral_added"  # Добавлен реферал (user_id = пригласивший)
+
+
+# Имена счётчиков в user_achievement_counters
+COUNTER_KARMA = "karma"
+COUNTER_LOYALTY_POINTS = "loyalty_points"
+COUNTER_CARDS = "cards"
+COUNTER_REFERRALS = "referrals"
+
+# Значение счётчика по исходной таблице (уже учитывает текущее событие)
+COUNTER_SEEDS = {
+    COUNTER_KARMA: "SELECT COALESCE(karma_points, 0) FROM users WHERE telegram_id = $1",
+    COUNTER_LOYALTY_POINTS: "SELECT COALESCE(points_balance, 0) FROM users WHERE telegram_id = $1",
+    COUNTER_CARDS: "SELECT COUNT(*) FROM cards_binding WHERE telegram_id = $1 AND status = 'active'",
+    COUNTER_REFERRALS: "SELECT COUNT(*) FROM referrals WHERE inviter_id = $1",
+}
+
+# Те же источники для SQLite, где значения не хранятся, а читаются при каждом событии
+COUNTER_SOURCES_SQLITE = {counter: sql.replace("$1", "?") for counter, sql in COUNTER_SEEDS.items()}
+
+
+@dataclass(frozen=True)
+class AchievementThreshold:
+    """Порог счётчика, при достижении которого выдаётся достижение"""
+    counter: str
+    threshold: int
+    achievement_type: str
+    data_key: str
+    message: str
+
+
+def _default_threshold(achievement_type: AchievementType, counter: str, requirement_key: str) -> AchievementThreshold:
+    """Порог из DEFAULT_ACHIEVEMENTS (одно достижение на тип)"""
+    achievement = DEFAULT_ACHIEVEMENTS[achievement_type]
+    return AchievementThreshold(
+        counter=counter,
+        threshold=int(achievement.requirements[requirement_key]),
+        achievement_type=achievement_type.value,
+        data_key="target",
+        message=f"🎉 {achievement.icon} {achievement.name}!",
+    )
+
+
+# Ступенчатые пороги сохраняют формат achievement_data старых проверок
+# (KarmaService._check_karma_milestone_achievements, CardService._check_card_achievements),
+# чтобы уже выданные достижения не дублировались. Строки GamificationService в формате
+# {"target", "achieved"} засчитываются как выданный порог target (см. awarded_keys).
+ACHIEVEMENT_THRESHOLDS: List[AchievementThreshold] = [
+    *[
+        AchievementThreshold(COUNTER_KARMA, milestone, AchievementType.KARMA_MILESTONE.value,
+                             "karma", f"💎 Достижение! У вас {milestone} кармы!")
+        for milestone in (1000, 2500, 5000, 10000, 25000)
+    ],
+    AchievementThreshold(COUNTER_CARDS, 1, "first_card", "card_count", "🎉 Первая карта привязана!"),
+    *[
+        AchievementThreshold(COUNTER_CARDS, count, "card_collector", "card_count",
+                             f"🏆 Коллекционер карт: {count} карт!")
+        for count in (5, 10, 25)
+    ],
+    _default_threshold(AchievementType.LOYALTY_CHAMPION, COUNTER_LOYALTY_POINTS, "loyalty_points"),
+    _default_threshold(AchievementType.REFERRAL_MASTER, COUNTER_REFERRALS, "referrals"),
+]
+
+# Типы достижений, которые полностью обслуживаются счётчиками
+COUNTER_BACKED_TYPES = {
+    AchievementType.KARMA_MILESTONE,
+    AchievementType.CARD_COLLECTOR,
+    AchievementType.LOYALTY_CHAMPION,
+    AchievementType.REFERRAL_MASTER,
+}
+
+
+def _build_threshold_index(thresholds: List[AchievementThreshold]) -> Dict[str, Tuple[List[int], List[AchievementThreshold]]]:
+    """Сгруппировать пороги по счётчику, отсортировав по значению (для bisect)"""
+    grouped: Dict[str, List[AchievementThreshold]] = {}
+    for item in thresholds:
+        grouped.setdefault(item.counter, []).append(item)
+    index = {}
+    for counter, items in grouped.items():
+        items.sort(key=lambda t: t.threshold)
+        index[counter] = ([t.threshold for t in items], items)
+    return index
+
+
+def reached_thresholds(index: Dict[str, Tuple[List[int], List[AchievementThreshold]]],
+                       counter: str, value: int) -> List[AchievementThreshold]:
+    """Все пороги счётчика, достигнутые значением value"""
+    if counter not in index:
+        return []
+    values, items = index[counter]
+    return items[:bisect_right(values, value)]
+
+
+def award_key(threshold: AchievementThreshold) -> Tuple[str, Optional[str]]:
+    """Ключ дедупликации порога: тип и значение порога (None — одно достижение на тип)"""
+    if threshold.data_key == "target":
+        return threshold.achievement_type, None
+    return threshold.achievement_type, str(threshold.threshold)
+
+
+def awarded_keys(rows: Iterable[Tuple[str, Any]], data_keys: Iterable[str]) -> Set[Tuple[str, Optional[str]]]:
+    """
+    Ключи уже выданных достижений по строкам (achievement_type, achievement_data)
+
+    Порог считается выданным, если в achievement_data есть его data_key либо
+    "target" (формат GamificationService) с тем же значением.
+    """
+    keys = set()
+    lookup = [*data_keys, "target"]
+    for achievement_type, raw in rows:
+        keys.add((achievement_type, None))
+        try:
+            data = json.loads(raw) if isinstance(raw, (str, bytes)) else (raw or {})
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        for key in lookup:
+            if data.get(key) is not None:
+                keys.add((achievement_type, str(data[key])))
+    return keys
+
+
+class AchievementEngine:
+    """Инкрементальный движок достижений на доменных событиях"""
+
+    def __init__(self, thresholds: Optional[List[AchievementThreshold]] = None):
+        """Initialize with database connection."""
+        self.database_url = os.getenv("DATABASE_URL", "")
+        self.thresholds = thresholds or ACHIEVEMENT_THRESHOLDS
+        self._index = _build_threshold_index(self.thresholds)
+        self._data_keys = sorted({t.data_key for t in self.thresholds if t.data_key != "target"})
+
+    async def get_connection(self) -> asyncpg.Connection:
+        """Get database connection."""
+        return await asyncpg.connect(self.database_url)
+
+    def get_sqlite_connection(self):
+        """Синхронное SQLite-соединение (тот же путь к БД, что у PaymentService)"""
+        from core.database.db_v2 import get_connection
+        return get_connection()
+
+    @property
+    def uses_postgresql(self) -> bool:
+        """Счётчики хранятся только в PostgreSQL; на SQLite значения читаются из источников"""
+        return self.database_url.startswith("postgresql")
+
+    async def handle_event(self, event: AchievementEvent, user_id: int, **payload: Any) -> List[Dict[str, Any]]:
+        """
+        Обработать доменное событие и выдать достигнутые, но ещё не выданные достижения
+
+        Args:
+            event: Тип события
+            user_id: Telegram user ID
+            **payload: Данные события:
+                POINTS_CREDITED — counter ('karma' | 'loyalty_points') и total (новое значение)
+                    либо amount (приращение);
+                CARD_BOUND, CARD_UNBOUND — card_count (текущее число карт, необязательно);
+                REFERRAL_ADDED — без данных.
+
+        Returns:
+            list: Новые достижения
+        """
+        try:
+            if not self.uses_postgresql:
+                return await asyncio.to_thread(self._handle_event_sqlite, event, user_id, payload)
+            conn = await self.get_connection()
+            try:
+                async with conn.transaction():
+                    values = await self._apply_event(conn, event, user_id, payload)
+                    return await self._award_reached(conn, user_id, values)
+            finally:
+                await conn.close()
+        except Exception as e:
+            logger.error(f"Error handling achievement event {event.value} for user {user_id}: {str(e)}")
+            return []
+
+    async def award_reached(self, user_id: int, conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
+        """
+        Выдать все достижения на счётчиках, пороги которых уже достигнуты
+
+        Отсутствующие счётчики читаются из исходных таблиц без записи, поэтому
+        пользователи, прошедшие порог до появления счётчиков, тоже получают достижение.
+        """
+        if not self.uses_postgresql:
+            try:
+                return await asyncio.to_thread(self._award_reached_sqlite, user_id)
+            except Exception as e:
+                logger.error(f"Error awarding reached achievements for user {user_id}: {str(e)}")
+                return []
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = await self.get_connection()
+            try:
+                values = await self.get_counters(user_id, conn)
+                for counter in COUNTER_SEEDS:
+                    if counter not in values:
+                        seeded = await self._source_value(conn, user_id, counter)
+                        if seeded is not None:
+                            values[counter] = seeded
+                return await self._award_reached(conn, user_id, values)
+            finally:
+                if own_conn:
+                    await conn.close()
+        except Exception as e:
+            logger.error(f"Error awarding reached achievements for user {user_id}: {str(e)}")
+            return []
+
+    async def get_counters(self, user_id: int, conn: Optional[asyncpg.Connection] = None) -> Dict[str, int]:
+        """Получить все счётчики пользователя одним запросом"""
+        own_conn = conn is None
+        try:
+            if own_conn:
+                conn = await self.get_connection()
+            try:
+                rows = await conn.fetch("""
+                    SELECT counter, value FROM user_achievement_counters WHERE user_id = $1
+                """, user_id)
+                return {row['counter']: int(row['value']) for row in rows}
+            finally:
+                if own_conn:
+                    await conn.close()
+        except Exception as e:
+            logger.error(f"Error getting achievement counters for user {user_id}: {str(e)}")
+            return {}
+
+    def reached(self, counters: Dict[str, int]) -> List[Tuple[AchievementThreshold, int]]:
+        """Все пороги, достигнутые текущими значениями счётчиков"""
+        result = []
+        for counter, value in counters.items():
+            for threshold in reached_thresholds(self._index, counter, value):
+                result.append((threshold, value))
+        return result
+
+    def _pending(self, values: Dict[str, int], rows: Iterable[Tuple[str, Any]]) -> List[Tuple[AchievementThreshold, int]]:
+        """Достигнутые пороги без уже выданных"""
+        awarded = awarded_keys(rows, self._data_keys)
+        return [(threshold, value) for threshold, value in self.reached(values)
+                if award_key(threshold) not in awarded]
+
+    async def _award_reached(self, conn: asyncpg.Connection, user_id: int,
+                             values: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Выдать достигнутые пороги; выданные достижения читаются одним запросом"""
+        types = sorted({threshold.achievement_type for threshold, _ in self.reached(values)})
+        if not types:
+            return []
+        rows = await conn.fetch("""
+            SELECT achievement_type, achievement_data FROM user_achievements
+            WHERE user_id = $1 AND achievement_type = ANY($2::text[])
+        """, user_id, types)
+        awarded = []
+        for threshold, value in self._pending(values, [(r['achievement_type'], r['achievement_data']) for r in rows]):
+            if await self._award(conn, user_id, threshold, value):
+                awarded.append(self._as_dict(threshold, value))
+        return awarded
+
+    async def _apply_event(self, conn: asyncpg.Connection, event: AchievementEvent,
+                           user_id: int, payload: Dict[str, Any]) -> Dict[str, int]:
+        """Применить событие к счётчикам; вернуть новые значения изменённых счётчиков"""
+        if event == AchievementEvent.POINTS_CREDITED:
+            counter = payload.get("counter", COUNTER_KARMA)
+            if payload.get("total") is not None:
+                return dict([await self._set(conn, user_id, counter, int(payload["total"]))])
+            return dict([await self._incr(conn, user_id, counter, int(payload.get("amount", 0)))])
+
+        if event in (AchievementEvent.CARD_BOUND, AchievementEvent.CARD_UNBOUND):
+            # Счётчик карт всегда равен фактическому числу активных привязок
+            card_count = payload.get("card_count")
+            if card_count is None:
+                card_count = await self._source_value(conn, user_id, COUNTER_CARDS)
+            if card_count is None:
+                return {}
+            return dict([await self._set(conn, user_id, COUNTER_CARDS, int(card_count))])
+
+        if event == AchievementEvent.REFERRAL_ADDED:
+            return dict([await self._incr(conn, user_id, COUNTER_REFERRALS, 1)])
+
+        return {}
+
+    async def _source_value(self, conn: asyncpg.Connection, user_id: int, counter: str) -> Optional[int]:
+        """Значение счётчика по исходной таблице; None, если источник недоступен"""
+        seed_sql = COUNTER_SEEDS.get(counter)
+        if not seed_sql:
+            return None
+        try:
+            async with conn.transaction():  # savepoint: ошибка источника не прерывает событие
+                seeded = await conn.fetchval(seed_sql, user_id)
+        except Exception as e:
+            logger.warning(f"Could not read achievement counter '{counter}' source for user {user_id}: {str(e)}")
+            return None
+        return int(seeded or 0)
+
+    async def _incr(self, conn: asyncpg.Connection, user_id: int, counter: str, delta: int) -> Tuple[str, int]:
+        """Атомарно увеличить счётчик, вернуть (counter, new); отсутствующий — заполнить из источника"""
+        new_value = await conn.fetchval("""
+            UPDATE user_achievement_counters
+            SET value = value + $3, updated_at = NOW()
+            WHERE user_id = $1 AND counter = $2
+            RETURNING value
+        """, user_id, counter, delta)
+        if new_value is None:
+            seeded = await self._source_value(conn, user_id, counter)
+            # Параллельное событие могло создать строку первым — тогда просто прибавляем
+            new_value = await conn.fetchval("""
+                INSERT INTO user_achievement_counters (user_id, counter, value, updated_at)
+                VALUES ($1, $2, $3, NOW())
+                ON CONFLICT (user_id, counter) DO UPDATE
+                SET value = user_achievement_counters.value + $4, updated_at = NOW()
+                RETURNING value
+            """, user_id, counter, delta if seeded is None else seeded, delta)
+        return counter, int(new_value)
+
+    async def _set(self, conn: asyncpg.Connection, user_id: int, counter: str, value: int) -> Tuple[str, int]:
+        """Установить абсолютное значение счётчика, вернуть (counter, new)"""
+        new_value = await conn.fetchval("""
+            INSERT INTO user_achievement_counters (user_id, counter, value, updated_at)
+            VALUES ($1, $2, $3, NOW())
+            ON CONFLICT (user_id, counter) DO UPDATE
+            SET value = EXCLUDED.value, updated_at = NOW()
+            RETURNING value
+        """, user_id, counter, value)
+        return counter, int(new_value)
+
+    @staticmethod
+    def _achievement_data(threshold: AchievementThreshold, value: int) -> Tuple[str, Optional[str]]:
+        """achievement_data и значение порога для дедупликации"""
+        if threshold.data_key == "target":
+            # Одно достижение на тип, формат как у GamificationService.check_and_award_achievements
+            return json.dumps({"target": threshold.threshold, "achieved": value}), None
+        return json.dumps({threshold.data_key: threshold.threshold}), str(threshold.threshold)
+
+    async def _award(self, conn: asyncpg.Connection, user_id: int,
+                     threshold: AchievementThreshold, value: int) -> bool:
+        """Выдать достижение, если его ещё нет; вернуть True при выдаче"""
+        data, milestone = self._achievement_data(threshold, value)
+        # Повторная проверка в том же запросе защищает от параллельных событий
+        inserted = await conn.fetchval("""
+            INSERT INTO user_achievements (user_id, achievement_type, achievement_data, earned_at)
+            SELECT $1, $2, $3, NOW()
+            WHERE NOT EXISTS (
+                SELECT 1 FROM user_achievements
+                WHERE user_id = $1 AND achievement_type = $2
+                  AND ($5::text IS NULL
+                       OR achievement_data::json->>$4 = $5
+                       OR achievement_data::json->>'target' = $5)
+            )
+            RETURNING id
+        """, user_id, threshold.achievement_type, data, threshold.data_key, milestone)
+        if inserted is None:
+            return False
+
+        await conn.execute("""
+            INSERT INTO user_notifications (user_id, message, notification_type, created_at)
+            VALUES ($1, $2, 'achievement', NOW())
+        """, user_id, threshold.message)
+
+        logger.info(f"Achievement {threshold.achievement_type} ({threshold.threshold}) awarded to user {user_id} at {value}")
+        return True
+
+    # --- SQLite: значения счётчиков читаются из исходных таблиц ---
+
+    def _handle_event_sqlite(self, event: AchievementEvent, user_id: int,
+                             payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Синхронная обработка события на SQLite (вызывается в отдельном потоке)"""
+        if event == AchievementEvent.POINTS_CREDITED:
+            counter = payload.get("counter", COUNTER_KARMA)
+            known = payload.get("total")
+        elif event in (AchievementEvent.CARD_BOUND, AchievementEvent.CARD_UNBOUND):
+            counter, known = COUNTER_CARDS, payload.get("card_count")
+        elif event == AchievementEvent.REFERRAL_ADDED:
+            counter, known = COUNTER_REFERRALS, None
+        else:
+            return []
+
+        conn = self.get_sqlite_connection()
+        try:
+            value = int(known) if known is not None else self._source_value_sqlite(conn, user_id, counter)
+            if value is None:
+                return []
+            return self._award_reached_sqlite_conn(conn, user_id, {counter: value})
+        finally:
+            conn.close()
+
+    def _award_reached_sqlite(self, user_id: int) -> List[Dict[str, Any]]:
+        """award_reached для SQLite: все счётчики из исходных таблиц"""
+        conn = self.get_sqlite_connection()
+        try:
+            values = {}
+            for counter in COUNTER_SOURCES_SQLITE:
+                value = self._source_value_sqlite(conn, user_id, counter)
+                if value is not None:
+                    values[counter] = value
+            return self._award_reached_sqlite_conn(conn, user_id, values)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _source_value_sqlite(conn, user_id: int, counter: str) -> Optional[int]:
+        """Значение счётчика по исходной таблице SQLite; None, если источник недоступен"""
+        try:
+            row = conn.execute(COUNTER_SOURCES_SQLITE[counter], (user_id,)).fetchone()
+        except Exception as e:
+            logger.warning(f"Could not read achievement counter '{counter}' source for user {user_id}: {str(e)}")
+            return None
+        return int(row[0] or 0) if row else 0
+
+    def _award_reached_sqlite_conn(self, conn, user_id: int, values: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Выдать достигнутые пороги в SQLite одной транзакцией"""
+        types = sorted({threshold.achievement_type for threshold, _ in self.reached(values)})
+        if not types:
+            return []
+        rows = conn.execute(f"""
+            SELECT achievement_type, achievement_data FROM user_achievements
+            WHERE user_id = ? AND achievement_type IN ({", ".join("?" * len(types))})
+        """, (user_id, *types)).fetchall()
+        awarded = []
+        try:
+            for threshold, value in self._pending(values, [(row[0], row[1]) for row in rows]):
+                data, _ = self._achievement_data(threshold, value)
+                conn.execute("""
+                    INSERT INTO user_achievements (user_id, achievement_type, achievement_data)
+                    VALUES (?, ?, ?)
+                """, (user_id, threshold.achievement_type, data))
+                conn.execute("""
+                    INSERT INTO user_notifications (user_id, message, notification_type)
+                    VALUES (?, ?, 'achievement')
+                """, (user_id, threshold.message))
+                awarded.append(self._as_dict(threshold, value))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        for item in awarded:
+            logger.info(f"Achievement {item['achievement_type']} ({item['threshold']}) awarded to user {user_id} at {item['value']}")
+        return awarded
+
+    def _as_dict(self, threshold: AchievementThreshold, value: int) -> Dict[str, Any]:
+        """Описание выданного достижения для вызывающего кода"""
+        result = {
+            'achievement_type': threshold.achievement_type,
+            'threshold': threshold.threshold,
+            'value': value,
+            'message': threshold.message,
+        }
+        try:
+            achievement = DEFAULT_ACHIEVEMENTS.get(AchievementType(threshold.achievement_type))
+        except ValueError:
+            achievement = None
+        if achievement:
+            result.update({
+                'name': achievement.name,
+                'description': achievement.description,
+                'icon': achievement.icon,
+                'rarity': achievement.rarity.value,
+                'points_reward': achievement.points_reward
+            })
+        return result
+
+
+# Create singleton instance
+achievement_engine = AchievementEngine()
+
+
+# Export functions
+__all__ = [
+    'AchievementEvent',
+    'AchievementThreshold',
+    'ACHIEVEMENT_THRESHOLDS',
+    'COUNTER_BACKED_TYPES',
+    'AchievementEngine',
+    'achievement_engine'
+]
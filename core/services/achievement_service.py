@@ -211,6 +211,9 @@ class AchievementService:
         """
         Check and award karma milestone achievements.
         
+        The event-driven achievement engine stores the karma counter and awards
+        every reached milestone that the user does not have yet.
+        
         Args:
             user_id: Telegram user ID
             karma_points: Current karma points
@@ -218,38 +221,19 @@ class AchievementService:
         Returns:
             list: List of awarded achievement types
         """
-        try:
-            milestones = [1000, 2500, 5000, 10000, 25000]
-            awarded = []
-            
-            for milestone in milestones:
-                if karma_points >= milestone:
-                    success = await self.add_achievement(
-                        user_id, 
-                        "karma_milestone", 
-                        {"karma": milestone}
-                    )
-                    
-                    if success:
-                        awarded.append(f"karma_milestone_{milestone}")
-                        
-                        # Add notification
-                        from core.services.notification_service import notification_service
-                        await notification_service.add_notification(
-                            user_id,
-                            f"💎 Достижение! У вас {milestone} кармы!",
-                            "achievement"
-                        )
-            
-            return awarded
-        except Exception as e:
-            logger.error(f"Error checking karma milestone achievements for user {user_id}: {str(e)}")
-            return []
+        from core.services.achievement_engine import achievement_engine, AchievementEvent, COUNTER_KARMA
+        awarded = await achievement_engine.handle_event(
+            AchievementEvent.POINTS_CREDITED, user_id, counter=COUNTER_KARMA, total=karma_points
+        )
+        return [f"{item['achievement_type']}_{item['threshold']}" for item in awarded]
     
     async def check_card_achievements(self, user_id: int, card_count: int) -> List[str]:
         """
         Check and award card-related achievements.
         
+        The achievement engine sets the card counter to card_count (the actual
+        number of bound cards) and awards only milestones not awarded yet.
+        
         Args:
             user_id: Telegram user ID
             card_count: Number of cards user has
@@ -257,51 +241,17 @@ class AchievementService:
         Returns:
             list: List of awarded achievement types
         """
-        try:
-            awarded = []
-            
-            # First card achievement
-            if card_count == 1:
-                success = await self.add_achievement(
-                    user_id, 
-                    "first_card", 
-                    {"card_count": 1}
-                )
-                
-                if success:
-                    awarded.append("first_card")
-                    
-                    # Add notification
-                    from core.services.notification_service import notification_service
-                    await notification_service.add_notification(
-                        user_id,
-                        "🎉 Первая карта привязана!",
-                        "achievement"
-                    )
-            
-            # Multiple cards achievements
-            elif card_count in [5, 10, 25]:
-                success = await self.add_achievement(
-                    user_id, 
-                    "card_collector", 
-                    {"card_count": card_count}
-                )
-                
-                if success:
-                    awarded.append(f"card_collector_{card_count}")
-                    
-                    # Add notification
-                    from core.services.notification_service import notification_service
-                    await notification_service.add_notification(
-                        user_id,
-                        f"🏆 Коллекционер карт: {card_count} карт!",
-                        "achievement"
-                    )
-            
-            return awarded
-        except Exception as e:
-            logger.error(f"Error checking card achievements for user {user_id}: {str(e)}")
-            return []
+        from core.services.achievement_engine import achievement_engine, AchievementEvent
+        awarded = await achievement_engine.handle_event(
+            AchievementEvent.CARD_BOUND, user_id, card_count=card_count
+        )
+        result = []
+        for item in awarded:
+            if item['achievement_type'] == 'first_card':
+                result.append('first_card')
+            else:
+                result.append(f"{item['achievement_type']}_{item['threshold']}")
+        return result
 
 
 # Create singleton instance
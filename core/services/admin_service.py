@@ -6,12 +6,20 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 import asyncpg
 import os
+import sqlite3
 from core.utils.logger import get_logger
 from core.services.user_service import karma_service
 from core.services.notification_service import notification_service
 
 logger = get_logger(__name__)
 
+# Сколько самых новых совпадений (триграммных и префиксных) ранжируется на запрос;
+# точные совпадения username попадают в ранжирование всегда
+SEARCH_CANDIDATES = 2000
+
+# Выражение GIN-индекса idx_users_search_name_trgm (ensure_users_search_index)
+USERS_SEARCH_NAME = "lower(coalesce(username, '') || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, ''))"
+
 
 class AdminService:
     """Service for administrative operations."""
@@ -35,54 +43,213 @@ class AdminService:
         Returns:
             list: List of matching users
         """
+        page = await self.search_users_page(query, limit=limit)
+        return page['users']
+    
+    async def search_users_page(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Indexed, ranked user search with keyset pagination.
+        
+        PostgreSQL uses the pg_trgm GIN expression index over the lowercased
+        names (substring and fuzzy match ranked by similarity, username prefix and
+        exact matches boosted); SQLite uses the users_search_fts FTS5 table ranked
+        by bm25. Exact username matches are always ranked; of the substring and
+        prefix matches only the SEARCH_CANDIDATES newest are, so very common names
+        stay cheap. Queries shorter than three characters fall back to a username
+        prefix lookup.
+        
+        Args:
+            query: Search query (telegram_id, @username or name)
+            limit: Page size
+            cursor: next_cursor from the previous page
+            
+        Returns:
+            dict: {'users': [...], 'next_cursor': str | None}
+        """
+        query = (query or '').strip()
+        if query.startswith('@'):
+            query = query[1:]
+        if not query:
+            return {'users': [], 'next_cursor': None}
+        
+        after = self._decode_search_cursor(cursor)
         try:
-            conn = await self.get_connection()
-            try:
-                # Try to parse as telegram_id first
-                try:
-                    telegram_id = int(query)
-                    users = await conn.fetch("""
-                        SELECT telegram_id, username, first_name, last_name, 
-                               karma_points, level, role, is_banned, created_at
-                        FROM users 
-                        WHERE telegram_id = $1
-                        LIMIT $2
-                    """, telegram_id, limit)
-                except ValueError:
-                    # Search by text fields
-                    search_pattern = f"%{query}%"
-                    users = await conn.fetch("""
-                        SELECT telegram_id, username, first_name, last_name, 
-                               karma_points, level, role, is_banned, created_at
-                        FROM users 
-                        WHERE username ILIKE $1 
-                           OR first_name ILIKE $1 
-                           OR last_name ILIKE $1
-                        ORDER BY karma_points DESC
-                        LIMIT $2
-                    """, search_pattern, limit)
-                
-                result = []
-                for user in users:
-                    result.append({
-                        'telegram_id': user['telegram_id'],
-                        'username': user['username'],
-                        'first_name': user['first_name'],
-                        'last_name': user['last_name'],
-                        'full_name': f"{user['first_name'] or ''} {user['last_name'] or ''}".strip(),
-                        'karma_points': user['karma_points'],
-                        'level': user['level'],
-                        'role': user['role'],
-                        'is_banned': user['is_banned'],
-                        'created_at': user['created_at']
-                    })
-                
-                return result
-            finally:
-                await conn.close()
+            if self.database_url.startswith("postgres"):
+                rows = await self._search_users_pg(query, limit + 1, after)
+            else:
+                rows = self._search_users_sqlite(query, limit + 1, after)
         except Exception as e:
             logger.error(f"Error searching users: {str(e)}")
-            return []
+            return {'users': [], 'next_cursor': None}
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = f"{last['_score']!r}:{last['_key']}"
+        return {'users': [self._format_search_row(row) for row in rows], 'next_cursor': next_cursor}
+    
+    @staticmethod
+    def _decode_search_cursor(cursor: Optional[str]) -> Optional[tuple]:
+        if not cursor:
+            return None
+        try:
+            score, key = cursor.split(':', 1)
+            return float(score), int(key)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _like_escape(text: str) -> str:
+        return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    
+    @staticmethod
+    def _format_search_row(user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'telegram_id': user.get('telegram_id') or user.get('user_id'),
+            'username': user.get('username'),
+            'first_name': user.get('first_name'),
+            'last_name': user.get('last_name'),
+            'full_name': f"{user.get('first_name') or ''} {user.get('last_name') or ''}".strip(),
+            'karma_points': user.get('karma_points') or 0,
+            'level': user.get('level') or 1,
+            'role': user.get('role') or 'user',
+            'is_banned': bool(user.get('is_banned')),
+            'created_at': user.get('created_at')
+        }
+    
+    async def _search_users_pg(self, query: str, limit: int, after: Optional[tuple]) -> List[Dict[str, Any]]:
+        conn = await self.get_connection()
+        try:
+            if query.isdigit():
+                rows = await conn.fetch("""
+                    SELECT telegram_id, username, first_name, last_name,
+                           karma_points, level, role, is_banned, created_at,
+                           1.0::real AS _score, telegram_id AS _key
+                    FROM users
+                    WHERE telegram_id = $1
+                """, int(query))
+                return [dict(row) for row in rows] if after is None else []
+            
+            q = query.lower()
+            prefix = self._like_escape(q) + '%'
+            after_score, after_key = after if after else (None, None)
+            
+            if len(q) < 3:
+                # Триграммный индекс не работает для 1-2 символов: префикс по username
+                rows = await conn.fetch("""
+                    SELECT telegram_id, username, first_name, last_name,
+                           karma_points, level, role, is_banned, created_at,
+                           1.0::real AS _score, telegram_id AS _key
+                    FROM users
+                    WHERE lower(username) LIKE $1
+                      AND ($2::bigint IS NULL OR telegram_id < $2)
+                    ORDER BY telegram_id DESC
+                    LIMIT $3
+                """, prefix, after_key, limit)
+                return [dict(row) for row in rows]
+            
+            rows = await conn.fetch(f"""
+                SELECT * FROM (
+                    SELECT telegram_id, username, first_name, last_name,
+                           karma_points, level, role, is_banned, created_at,
+                           (similarity({USERS_SEARCH_NAME}, $1)
+                            + CASE WHEN lower(coalesce(username, '')) = $1 THEN 2.0
+                                   WHEN lower(coalesce(username, '')) LIKE $2 THEN 1.0
+                                   WHEN (' ' || {USERS_SEARCH_NAME}) LIKE $3 THEN 0.5
+                                   ELSE 0 END)::real AS _score,
+                           telegram_id AS _key
+                    FROM users
+                    JOIN (
+                        -- Точные совпадения username — всегда
+                        (SELECT telegram_id FROM users WHERE lower(username) = $1)
+                        UNION
+                        -- Префикс username и кандидаты из GIN-индекса — не больше SEARCH_CANDIDATES самых новых
+                        (SELECT telegram_id FROM users WHERE lower(username) LIKE $2
+                         ORDER BY telegram_id DESC LIMIT $8)
+                        UNION
+                        (SELECT telegram_id FROM users
+                         WHERE {USERS_SEARCH_NAME} LIKE $4 OR {USERS_SEARCH_NAME} % $1
+                         ORDER BY telegram_id DESC LIMIT $8)
+                    ) candidates USING (telegram_id)
+                ) ranked
+                WHERE $5::real IS NULL OR (_score, _key) < ($5::real, $6::bigint)
+                ORDER BY _score DESC, _key DESC
+                LIMIT $7
+            """, q, prefix, '% ' + prefix, '%' + self._like_escape(q) + '%',
+                after_score, after_key, limit, SEARCH_CANDIDATES)
+            return [dict(row) for row in rows]
+        finally:
+            await conn.close()
+    
+    def _search_users_sqlite(self, query: str, limit: int, after: Optional[tuple]) -> List[Dict[str, Any]]:
+        from core.database.db_v2 import get_connection
+        
+        conn = get_connection()
+        conn.row_factory = sqlite3.Row
+        try:
+            after_score, after_key = after if after else (None, None)
+            if query.isdigit():
+                rows = conn.execute(
+                    "SELECT *, 1.0 AS _score, rowid AS _key FROM users WHERE telegram_id = ?",
+                    (int(query),)
+                ).fetchall()
+                return [dict(row) for row in rows] if after is None else []
+            
+            q = query.lower()
+            prefix = self._like_escape(q) + '%'
+            if len(q) < 3:
+                rows = conn.execute("""
+                    SELECT *, 1.0 AS _score, rowid AS _key FROM users
+                    WHERE username LIKE ? ESCAPE '\\'
+                      AND (? IS NULL OR rowid < ?)
+                    ORDER BY rowid DESC
+                    LIMIT ?
+                """, (prefix, after_key, after_key, limit)).fetchall()
+                return [dict(row) for row in rows]
+            
+            # Trigram FTS5: фраза в кавычках = подстрока. bm25 считается только по
+            # SEARCH_CANDIDATES самым новым совпадениям, username весит больше имени.
+            # Префикс username (+1000) и точное совпадение (+1000 сверху) ранжируются
+            # выше любого bm25; точные совпадения берутся всегда
+            rows = conn.execute("""
+                SELECT u.*, f._score, f._key FROM (
+                    SELECT _key, _score FROM (
+                        SELECT _key, SUM(_score) AS _score FROM (
+                            SELECT * FROM (
+                                SELECT rowid AS _key, -bm25(users_search_fts, 4.0, 1.0, 1.0) AS _score
+                                FROM users_search_fts
+                                WHERE users_search_fts MATCH ?
+                                ORDER BY rowid DESC
+                                LIMIT ?
+                            )
+                            UNION ALL
+                            SELECT * FROM (
+                                SELECT rowid AS _key, 1000.0 AS _score FROM users
+                                WHERE username LIKE ? ESCAPE '\\'
+                                ORDER BY rowid DESC
+                                LIMIT ?
+                            )
+                            UNION ALL
+                            SELECT rowid AS _key, 1000.0 AS _score FROM users
+                            WHERE username = ? COLLATE NOCASE
+                        )
+                        GROUP BY _key
+                    )
+                    WHERE ? IS NULL OR _score < ? OR (_score = ? AND _key < ?)
+                    ORDER BY _score DESC, _key DESC
+                    LIMIT ?
+                ) f
+                JOIN users u ON u.rowid = f._key
+                ORDER BY f._score DESC, f._key DESC
+            """, (
+                '"' + q.replace('"', '""') + '"', SEARCH_CANDIDATES,
+                prefix, SEARCH_CANDIDATES, q,
+                after_score, after_score, after_score, after_key, limit
+            )).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
     
     async def get_user_details(self, user_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -4,12 +4,14 @@
 """
 import asyncio
 import logging
+import time
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 import json
 
 from .cache import cache_service
+from core.utils.geo import resolve_city_id
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +73,10 @@ class AnalyticsService:
     def __init__(self):
         self.cache_ttl = 300  # 5 минут для аналитики
         self.is_initialized = False
+        self._rolled_through: Optional[str] = None  # последний закрытый день в analytics_daily
+        self.live_ttl = 5  # секунд: метрики дашборда (gather) делят один расчет текущего дня
+        self._live_cache: Optional[Tuple[float, str, Dict[Tuple[str, str, str], Dict[str, Any]]]] = None
+        self._place_cities: Dict[int, Optional[int]] = {}  # город заведений без partner_places.city_id
     
     async def initialize(self):
         """Инициализация сервиса аналитики"""
@@ -80,6 +86,7 @@ class AnalyticsService:
         try:
             # Создаем базовые индексы для аналитики
             await self._create_analytics_indexes()
+            await self.refresh_daily_rollups()
             self.is_initialized = True
             logger.info("📊 Analytics service initialized successfully")
             
@@ -94,6 +101,9 @@ class AnalyticsService:
             indexes = [
                 "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
                 "CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active)",
+                "CREATE INDEX IF NOT EXISTS idx_users_points_balance ON users(points_balance)",
+                "CREATE INDEX IF NOT EXISTS idx_points_history_created_at ON points_history(created_at)",
+                "CREATE INDEX IF NOT EXISTS idx_partner_sales_created_at ON partner_sales(created_at)",
                 "CREATE INDEX IF NOT EXISTS idx_partners_status ON partners_v2(status)",
                 "CREATE INDEX IF NOT EXISTS idx_points_history_type ON points_history(transaction_type)",
                 "CREATE INDEX IF NOT EXISTS idx_cards_category_status ON cards_v2(category_id, status)",
@@ -108,6 +118,241 @@ class AnalyticsService:
         except Exception as e:
             logger.error(f"❌ Failed to create analytics indexes: {e}")
     
+    # --- Daily rollups -------------------------------------------------
+    
+    def _aggregate_days(self, conn, start_day: str, end_day: str) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """Агрегировать сырые таблицы за дни [start_day, end_day) в строки analytics_daily"""
+        rows: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        
+        def bucket(day: str, dimension: str, dimension_id: Any = '') -> Dict[str, Any]:
+            key = (day, dimension, '' if dimension_id is None else str(dimension_id))
+            if key not in rows:
+                rows[key] = {
+                    'signups': 0, 'actives': 0, 'transactions': 0,
+                    'points_earned': 0, 'points_spent': 0, 'points_abs_total': 0,
+                    'revenue': 0.0
+                }
+            return rows[key]
+        
+        # Регистрации
+        cursor = conn.execute("""
+            SELECT substr(created_at, 1, 10) AS day, COUNT(*)
+            FROM users
+            WHERE created_at >= ? AND created_at < ?
+            GROUP BY day
+        """, (start_day, end_day))
+        for day, signups in cursor.fetchall():
+            bucket(day, 'all')['signups'] = signups
+        
+        # Операции с баллами: итог дня и разбивка по типу транзакции
+        cursor = conn.execute("""
+            SELECT substr(created_at, 1, 10) AS day, transaction_type,
+                   COUNT(*),
+                   SUM(CASE WHEN change_amount > 0 THEN change_amount ELSE 0 END),
+                   SUM(CASE WHEN change_amount < 0 THEN ABS(change_amount) ELSE 0 END),
+                   SUM(ABS(change_amount))
+            FROM points_history
+            WHERE created_at >= ? AND created_at < ?
+            GROUP BY day, transaction_type
+        """, (start_day, end_day))
+        for day, tx_type, count, earned, spent, abs_total in cursor.fetchall():
+            for target in (bucket(day, 'all'), bucket(day, 'tx_type', tx_type)):
+                target['transactions'] += count
+                target['points_earned'] += earned or 0
+                target['points_spent'] += spent or 0
+                target['points_abs_total'] += abs_total or 0
+        
+        # Активные за день — пользователи хотя бы с одной операцией
+        cursor = conn.execute("""
+            SELECT substr(created_at, 1, 10) AS day, COUNT(DISTINCT user_id)
+            FROM points_history
+            WHERE created_at >= ? AND created_at < ?
+            GROUP BY day
+        """, (start_day, end_day))
+        for day, actives in cursor.fetchall():
+            bucket(day, 'all')['actives'] = actives
+        
+        # Продажи партнеров: выручка, разбивка по партнеру и по городу заведения.
+        # Если city_id заведения не заполнен, город определяется по адресу/координатам.
+        try:
+            cursor = conn.execute("""
+                SELECT substr(ps.created_at, 1, 10) AS day, ps.partner_id,
+                       ps.place_id, pp.city_id, pp.address, pp.geo_lat, pp.geo_lon,
+                       COUNT(*), SUM(ps.points_earned), SUM(ps.points_spent), SUM(ps.amount_gross)
+                FROM partner_sales ps
+                LEFT JOIN partner_places pp ON pp.id = ps.place_id
+                WHERE ps.created_at >= ? AND ps.created_at < ?
+                GROUP BY day, ps.partner_id, ps.place_id
+            """, (start_day, end_day))
+            sales_rows = cursor.fetchall()
+        except Exception as e:
+            logger.warning(f"⚠️ Partner sales rollup skipped: {e}")
+            sales_rows = []
+        for day, partner_id, place_id, city_id, address, lat, lon, count, earned, spent, revenue in sales_rows:
+            if city_id is None and place_id is not None:
+                if place_id not in self._place_cities:
+                    self._place_cities[place_id] = resolve_city_id(address, lat, lon)
+                city_id = self._place_cities[place_id]
+            bucket(day, 'all')['revenue'] += float(revenue or 0)
+            for target in (bucket(day, 'partner', partner_id), bucket(day, 'city', city_id)):
+                target['transactions'] += count
+                target['points_earned'] += earned or 0
+                target['points_spent'] += spent or 0
+                target['revenue'] += float(revenue or 0)
+        
+        return rows
+    
+    async def refresh_daily_rollups(self, days_back: int = 0) -> int:
+        """
+        Инкрементально дозаполнить analytics_daily закрытыми днями (до вчера включительно).
+        
+        Args:
+            days_back: Дополнительно пересчитать столько последних закрытых дней
+                (для поздно пришедших данных)
+        
+        Returns:
+            int: Количество записанных строк
+        """
+        today = datetime.now().date()
+        yesterday = (today - timedelta(days=1)).isoformat()
+        if days_back == 0 and self._rolled_through == yesterday:
+            return 0
+        
+        try:
+            from core.database.db_v2 import get_connection
+            
+            with get_connection() as conn:
+                cursor = conn.execute("SELECT MAX(day) FROM analytics_daily WHERE dimension = 'all'")
+                last_day = cursor.fetchone()[0]
+                
+                if last_day:
+                    start = datetime.fromisoformat(last_day).date() + timedelta(days=1)
+                else:
+                    # Первый запуск: полный бэкфилл с самой ранней записи
+                    cursor = conn.execute("""
+                        SELECT MIN(day) FROM (
+                            SELECT MIN(substr(created_at, 1, 10)) AS day FROM users
+                            UNION ALL
+                            SELECT MIN(substr(created_at, 1, 10)) FROM points_history
+                        )
+                    """)
+                    first_day = cursor.fetchone()[0]
+                    start = datetime.fromisoformat(first_day).date() if first_day else today
+                if days_back:
+                    start = min(start, today - timedelta(days=days_back))
+                
+                if start >= today:
+                    self._rolled_through = yesterday
+                    return 0
+                
+                rows = self._aggregate_days(conn, start.isoformat(), today.isoformat())
+                
+                # Закрытые дни пишем всегда, даже пустые, чтобы MAX(day) продвигался
+                day = start
+                while day < today:
+                    key = (day.isoformat(), 'all', '')
+                    rows.setdefault(key, {
+                        'signups': 0, 'actives': 0, 'transactions': 0,
+                        'points_earned': 0, 'points_spent': 0, 'points_abs_total': 0,
+                        'revenue': 0.0
+                    })
+                    day += timedelta(days=1)
+                
+                conn.execute(
+                    "DELETE FROM analytics_daily WHERE day >= ? AND day < ?",
+                    (start.isoformat(), today.isoformat())
+                )
+                conn.executemany("""
+                    INSERT INTO analytics_daily (
+                        day, dimension, dimension_id, signups, actives, transactions,
+                        points_earned, points_spent, points_abs_total, revenue
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (day, dimension, dimension_id, m['signups'], m['actives'], m['transactions'],
+                     m['points_earned'], m['points_spent'], m['points_abs_total'], m['revenue'])
+                    for (day, dimension, dimension_id), m in rows.items()
+                ])
+                conn.commit()
+                
+                self._rolled_through = yesterday
+                logger.info(f"📊 Analytics rollups refreshed: {start.isoformat()}..{yesterday}, {len(rows)} rows")
+                return len(rows)
+                
+        except Exception as e:
+            logger.error(f"❌ Error refreshing analytics rollups: {e}")
+            return 0
+    
+    @staticmethod
+    def _window_start(today, days: int) -> str:
+        """Первый день окна из `days` дней, включая сегодняшний"""
+        return (today - timedelta(days=days - 1)).isoformat()
+    
+    def _live_today(self, conn) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """Агрегаты текущего (неполного) дня: один расчет на запрос, не чаще раза в live_ttl секунд"""
+        today = datetime.now().date().isoformat()
+        now = time.monotonic()
+        if self._live_cache and self._live_cache[1] == today and now < self._live_cache[0]:
+            return self._live_cache[2]
+        live = self._aggregate_days(conn, today, (datetime.now().date() + timedelta(days=1)).isoformat())
+        self._live_cache = (now + self.live_ttl, today, live)
+        return live
+    
+    def _rollup_totals(self, conn, dimension: str = 'all', since_day: Optional[str] = None,
+                       live: Optional[Dict[Tuple[str, str, str], Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """Суммы analytics_daily по dimension_id начиная с since_day плюс живой текущий день (live из _live_today)"""
+        query = """
+            SELECT dimension_id, SUM(signups), SUM(actives), SUM(transactions),
+                   SUM(points_earned), SUM(points_spent), SUM(points_abs_total), SUM(revenue)
+            FROM analytics_daily
+            WHERE dimension = ?
+        """
+        params: List[Any] = [dimension]
+        if since_day:
+            query += " AND day >= ?"
+            params.append(since_day)
+        query += " GROUP BY dimension_id"
+        
+        fields = ('signups', 'actives', 'transactions', 'points_earned', 'points_spent', 'points_abs_total', 'revenue')
+        totals: Dict[str, Dict[str, Any]] = {}
+        for row in conn.execute(query, params).fetchall():
+            totals[row[0]] = {field: (row[i + 1] or 0) for i, field in enumerate(fields)}
+        
+        if live is None:
+            live = self._live_today(conn)
+        for (_, live_dimension, dimension_id), metrics in live.items():
+            if live_dimension != dimension:
+                continue
+            target = totals.setdefault(dimension_id, {field: 0 for field in fields})
+            for field in fields:
+                target[field] += metrics[field]
+        return totals
+    
+    async def get_split_metrics(self, dimension: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Разбивка за период из роллапов: dimension = 'partner' | 'city' | 'tx_type'"""
+        cache_key = f"analytics:split:{dimension}:{days}"
+        
+        cached = await cache_service.get(cache_key)
+        if cached:
+            return json.loads(cached)
+        
+        try:
+            await self.refresh_daily_rollups()
+            from core.database.db_v2 import get_connection
+            
+            since_day = self._window_start(datetime.now().date(), days)
+            with get_connection() as conn:
+                totals = self._rollup_totals(conn, dimension, since_day)
+            
+            result = [{'id': dimension_id, **metrics} for dimension_id, metrics in totals.items()]
+            result.sort(key=lambda item: (item['revenue'], item['transactions']), reverse=True)
+            
+            await cache_service.set(cache_key, json.dumps(result), ex=self.cache_ttl)
+            return result
+            
+        except Exception as e:
+            logger.error(f"❌ Error getting {dimension} split metrics: {e}")
+            return []
+    
     async def get_user_metrics(self, days: int = 30) -> UserMetrics:
         """Получить метрики пользователей"""
         cache_key = f"analytics:user_metrics:{days}"
@@ -119,33 +364,34 @@ class AnalyticsService:
             return UserMetrics(**data)
         
         try:
+            await self.refresh_daily_rollups()
             from core.database.db_v2 import get_connection
             
+            today = datetime.now().date()
+            week_start = self._window_start(today, 7)
+            period_start = self._window_start(today, days)
+            month_ago = datetime.now() - timedelta(days=30)
+            week_ago = datetime.now() - timedelta(days=7)
+            
             with get_connection() as conn:
-                # Общее количество пользователей
-                cursor = conn.execute("SELECT COUNT(*) FROM users")
-                total_users = cursor.fetchone()[0]
-                
-                # Активные пользователи за последние N дней
-                active_date = datetime.now() - timedelta(days=days)
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE last_active >= ?",
-                    (active_date.isoformat(),)
-                )
-                active_users = cursor.fetchone()[0]
-                
-                # Новые пользователи за период
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE created_at >= ?",
-                    (active_date.isoformat(),)
-                )
-                new_users = cursor.fetchone()[0]
+                # Регистрации из роллапов (+ текущий день вживую, один раз на запрос)
+                live = self._live_today(conn)
+                week = self._rollup_totals(conn, since_day=week_start, live=live).get('', {})
+                period = self._rollup_totals(conn, since_day=period_start, live=live).get('', {})
+                today_totals = self._rollup_totals(conn, since_day=today.isoformat(), live=live).get('', {})
                 
-                # Средние баллы на пользователя
-                cursor = conn.execute("SELECT AVG(points_balance) FROM users")
-                avg_points = cursor.fetchone()[0] or 0
-                
-                # Топ пользователи по баллам
+                # Всего пользователей и уникальные активные (не аддитивны по дням) — один проход по users
+                cursor = conn.execute("""
+                    SELECT
+                        COUNT(*),
+                        SUM(CASE WHEN last_active >= ? THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN last_active >= ? THEN 1 ELSE 0 END),
+                        AVG(points_balance)
+                    FROM users
+                """, (week_ago.isoformat(), month_ago.isoformat()))
+                total_users, active_users_7d, active_users_30d, avg_points = cursor.fetchone()
+                
+                # Топ пользователи по баллам (индекс idx_users_points_balance)
                 cursor = conn.execute("""
                     SELECT telegram_id, username, first_name, points_balance 
                     FROM users 
@@ -162,43 +408,14 @@ class AnalyticsService:
                     for row in cursor.fetchall()
                 ]
                 
-                # Метрики за разные периоды
-                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                week_ago = datetime.now() - timedelta(days=7)
-                month_ago = datetime.now() - timedelta(days=30)
-                
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE created_at >= ?",
-                    (today.isoformat(),)
-                )
-                new_users_today = cursor.fetchone()[0]
-                
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE created_at >= ?",
-                    (week_ago.isoformat(),)
-                )
-                new_users_7d = cursor.fetchone()[0]
-                
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE last_active >= ?",
-                    (week_ago.isoformat(),)
-                )
-                active_users_7d = cursor.fetchone()[0]
-                
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM users WHERE last_active >= ?",
-                    (month_ago.isoformat(),)
-                )
-                active_users_30d = cursor.fetchone()[0]
-                
                 metrics = UserMetrics(
-                    total_users=total_users,
-                    active_users_7d=active_users_7d,
-                    active_users_30d=active_users_30d,
-                    new_users_today=new_users_today,
-                    new_users_7d=new_users_7d,
-                    new_users_30d=new_users,
-                    avg_points_per_user=float(avg_points),
+                    total_users=int(total_users or 0),
+                    active_users_7d=int(active_users_7d or 0),
+                    active_users_30d=int(active_users_30d or 0),
+                    new_users_today=int(today_totals.get('signups', 0)),
+                    new_users_7d=int(week.get('signups', 0)),
+                    new_users_30d=int(period.get('signups', 0)),
+                    avg_points_per_user=float(avg_points or 0),
                     top_users_by_points=top_users
                 )
                 
@@ -295,72 +512,35 @@ class AnalyticsService:
             return TransactionMetrics(**data)
         
         try:
+            await self.refresh_daily_rollups()
             from core.database.db_v2 import get_connection
             
+            today = datetime.now().date()
             with get_connection() as conn:
-                # Общее количество транзакций
-                cursor = conn.execute("SELECT COUNT(*) FROM points_history")
-                total_transactions = cursor.fetchone()[0]
-                
-                # Транзакции за период
-                period_start = datetime.now() - timedelta(days=days)
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM points_history WHERE created_at >= ?",
-                    (period_start.isoformat(),)
+                live = self._live_today(conn)
+                all_time = self._rollup_totals(conn, live=live).get('', {})
+                today_totals = self._rollup_totals(conn, since_day=today.isoformat(), live=live).get('', {})
+                week = self._rollup_totals(conn, since_day=self._window_start(today, 7), live=live).get('', {})
+                period = self._rollup_totals(conn, since_day=self._window_start(today, days), live=live).get('', {})
+                by_type = self._rollup_totals(conn, 'tx_type', live=live)
+                
+                total_transactions = int(all_time.get('transactions', 0))
+                avg_transaction_value = (
+                    all_time.get('points_abs_total', 0) / total_transactions if total_transactions else 0
                 )
-                period_transactions = cursor.fetchone()[0]
-                
-                # Транзакции за сегодня
-                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM points_history WHERE created_at >= ?",
-                    (today.isoformat(),)
-                )
-                transactions_today = cursor.fetchone()[0]
-                
-                # Транзакции за неделю
-                week_ago = datetime.now() - timedelta(days=7)
-                cursor = conn.execute(
-                    "SELECT COUNT(*) FROM points_history WHERE created_at >= ?",
-                    (week_ago.isoformat(),)
-                )
-                transactions_7d = cursor.fetchone()[0]
-                
-                # Общие баллы
-                cursor = conn.execute("""
-                    SELECT 
-                        SUM(CASE WHEN change_amount > 0 THEN change_amount ELSE 0 END) as earned,
-                        SUM(CASE WHEN change_amount < 0 THEN ABS(change_amount) ELSE 0 END) as spent
-                    FROM points_history
-                """)
-                row = cursor.fetchone()
-                total_points_earned = row[0] or 0
-                total_points_spent = row[1] or 0
-                
-                # Среднее значение транзакции
-                cursor = conn.execute("SELECT AVG(ABS(change_amount)) FROM points_history")
-                avg_transaction_value = cursor.fetchone()[0] or 0
-                
-                # Топ типы транзакций
-                cursor = conn.execute("""
-                    SELECT transaction_type, COUNT(*) as count
-                    FROM points_history
-                    GROUP BY transaction_type
-                    ORDER BY count DESC
-                    LIMIT 10
-                """)
-                top_transaction_types = [
-                    {'type': row[0], 'count': row[1]}
-                    for row in cursor.fetchall()
-                ]
+                top_transaction_types = sorted(
+                    ({'type': tx_type or None, 'count': int(m['transactions'])} for tx_type, m in by_type.items()),
+                    key=lambda item: item['count'],
+                    reverse=True
+                )[:10]
                 
                 metrics = TransactionMetrics(
                     total_transactions=total_transactions,
-                    transactions_today=transactions_today,
-                    transactions_7d=transactions_7d,
-                    transactions_30d=period_transactions,
-                    total_points_earned=total_points_earned,
-                    total_points_spent=total_points_spent,
+                    transactions_today=int(today_totals.get('transactions', 0)),
+                    transactions_7d=int(week.get('transactions', 0)),
+                    transactions_30d=int(period.get('transactions', 0)),
+                    total_points_earned=int(all_time.get('points_earned', 0)),
+                    total_points_spent=int(all_time.get('points_spent', 0)),
                     avg_transaction_value=float(avg_transaction_value),
                     top_transaction_types=top_transaction_types
                 )
@@ -385,9 +565,17 @@ class AnalyticsService:
             return BusinessMetrics(**data)
         
         try:
+            await self.refresh_daily_rollups()
             from core.database.db_v2 import get_connection
             
+            today = datetime.now().date()
             with get_connection() as conn:
+                # Выручка из роллапов продаж партнеров (+ текущий день вживую, один раз на запрос)
+                live = self._live_today(conn)
+                revenue_today = self._rollup_totals(conn, since_day=today.isoformat(), live=live).get('', {}).get('revenue', 0)
+                revenue_7d = self._rollup_totals(conn, since_day=self._window_start(today, 7), live=live).get('', {}).get('revenue', 0)
+                revenue_30d = self._rollup_totals(conn, since_day=self._window_start(today, days), live=live).get('', {}).get('revenue', 0)
+                
                 # Топ категории по количеству карт
                 cursor = conn.execute("""
                     SELECT c.name, COUNT(cards.id) as card_count
@@ -403,11 +591,10 @@ class AnalyticsService:
                     for row in cursor.fetchall()
                 ]
                 
-                # Базовые метрики (заглушки для демонстрации)
                 metrics = BusinessMetrics(
-                    revenue_today=0.0,  # TODO: Реализовать расчет выручки
-                    revenue_7d=0.0,
-                    revenue_30d=0.0,
+                    revenue_today=float(revenue_today),
+                    revenue_7d=float(revenue_7d),
+                    revenue_30d=float(revenue_30d),
                     conversion_rate=0.0,  # TODO: Реализовать расчет конверсии
                     retention_rate_7d=0.0,  # TODO: Реализовать расчет удержания
                     retention_rate_30d=0.0,
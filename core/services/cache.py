@@ -11,7 +11,7 @@ except Exception:
 
 class BaseCacheService:
     async def get(self, key: str) -> Optional[str]: ...
-    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> None: ...
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> bool: ...
     async def delete(self, key: str) -> int: ...
     async def incr(self, key: str) -> int: ...
     async def expire(self, key: str, ttl: int) -> bool: ...
@@ -24,11 +24,14 @@ class _MemoryCache(BaseCacheService):
     async def get(self, key: str) -> Optional[str]:
         return self._store.get(key)
 
-    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> None:
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> bool:
+        if nx and key in self._store:
+            return False
         self._store[key] = value
         if ex:
             loop = asyncio.get_running_loop()
             loop.call_later(ex, lambda: self._store.pop(key, None))
+        return True
 
     async def delete(self, key: str) -> int:
         return 1 if self._store.pop(key, None) is not None else 0
@@ -55,8 +58,8 @@ class _RedisCache(BaseCacheService):
     async def get(self, key: str) -> Optional[str]:
         return await self.client.get(key)
 
-    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> None:
-        await self.client.set(key, value, ex=ex)
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> bool:
+        return bool(await self.client.set(key, value, ex=ex, nx=nx))
 
     async def delete(self, key: str) -> int:
         return await self.client.delete(key)
@@ -101,8 +104,8 @@ class _CacheFacade(BaseCacheService):
     async def get(self, key: str) -> Optional[str]:
         return await (await self._svc()).get(key)
 
-    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> None:
-        return await (await self._svc()).set(key, value, ex=ex)
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> bool:
+        return await (await self._svc()).set(key, value, ex=ex, nx=nx)
 
     async def delete(self, key: str) -> int:
         return await (await self._svc()).delete(key)
@@ -2,13 +2,15 @@
 Unified card rendering service with template support
 Implements Protocol pattern for extensibility and backward compatibility
 """
-from typing import Protocol, Dict, Any, Optional
+from typing import Protocol, Dict, Any, Optional, List, Hashable, Set
 from abc import abstractmethod
+from collections import OrderedDict
 from pathlib import Path
 import logging
 
-from ..utils.locales_v2 import get_text, get_all_texts
+from ..utils.locales_v2 import get_text, get_all_texts, get_catalog_version
 from ..settings import settings
+from .invalidation_bus import invalidation_bus
 
 logger = logging.getLogger(__name__)
 
@@ -261,19 +263,86 @@ class LegacyCardRenderer:
         """Legacy preview format"""
         return self.render_card(card, lang)
 
+RENDER_CACHE_SIZE = 4096
+
 class CardRenderingService:
     """Main service for card rendering with pluggable renderers"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = RENDER_CACHE_SIZE):
         self._renderers = {
             'default': DefaultCardRenderer(),
             'legacy': LegacyCardRenderer()
         }
         self._current_renderer = 'default'
+        
+        # LRU готовых текстов: одна и та же страница каталога рендерится один раз для всех пользователей
+        self._cache_size = cache_size
+        self._render_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._cache_keys_by_card: Dict[Hashable, Set[tuple]] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+    
+    def _cache_key(self, card: Dict[str, Any], lang: str, renderer_name: str, kind: str,
+                   catalog_version: Optional[int] = None) -> Optional[tuple]:
+        """(card_id, updated_at, lang, renderer); карточки без id (например, из Odoo) не кэшируются"""
+        card_id = card.get('id')
+        if card_id is None:
+            return None
+        return (
+            kind, card_id, str(card.get('updated_at')), card.get('photos_count'),
+            lang, renderer_name, get_catalog_version() if catalog_version is None else catalog_version
+        )
+    
+    def _cache_get(self, key: tuple) -> Optional[str]:
+        text = self._render_cache.get(key)
+        if text is None:
+            self._cache_misses += 1
+            return None
+        self._render_cache.move_to_end(key)
+        self._cache_hits += 1
+        return text
+    
+    def _cache_get_many(self, keys: List[Optional[tuple]]) -> Dict[tuple, str]:
+        """Найденные в кэше тексты для набора ключей (один проход по LRU)"""
+        cache = self._render_cache
+        found = {key: cache[key] for key in keys if key is not None and key in cache}
+        for key in found:
+            cache.move_to_end(key)
+        self._cache_hits += len(found)
+        self._cache_misses += len(keys) - len(found)
+        return found
+    
+    def _cache_put(self, key: tuple, text: str) -> None:
+        self._render_cache[key] = text
+        self._cache_keys_by_card.setdefault(key[1], set()).add(key)
+        while len(self._render_cache) > self._cache_size:
+            old_key, _ = self._render_cache.popitem(last=False)
+            keys = self._cache_keys_by_card.get(old_key[1])
+            if keys is not None:
+                keys.discard(old_key)
+                if not keys:
+                    del self._cache_keys_by_card[old_key[1]]
+    
+    def invalidate_card(self, card_id: Hashable) -> None:
+        """Сбросить отрендеренные тексты карточки (правка, модерация, удаление)"""
+        for key in self._cache_keys_by_card.pop(card_id, ()):
+            self._render_cache.pop(key, None)
+    
+    def clear_cache(self) -> None:
+        self._render_cache.clear()
+        self._cache_keys_by_card.clear()
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._render_cache),
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+        }
     
     def register_renderer(self, name: str, renderer: CardRenderer):
         """Register custom renderer"""
         self._renderers[name] = renderer
+        self.clear_cache()
     
     def set_renderer(self, name: str):
         """Switch active renderer"""
@@ -286,32 +355,88 @@ class CardRenderingService:
         """Get current active renderer"""
         return self._renderers[self._current_renderer]
     
-    def render_card(self, card: Dict[str, Any], lang: str = 'ru', renderer: Optional[str] = None) -> str:
-        """Render card using specified or current renderer"""
+    def _resolve_renderer(self, renderer: Optional[str]) -> str:
         renderer_name = renderer or self._current_renderer
-        
         if renderer_name not in self._renderers:
             renderer_name = 'default'
+        return renderer_name
+    
+    def render_card(self, card: Dict[str, Any], lang: str = 'ru', renderer: Optional[str] = None) -> str:
+        """Render card using specified or current renderer"""
+        renderer_name = self._resolve_renderer(renderer)
+        
+        key = self._cache_key(card, lang, renderer_name, 'card')
+        if key is not None:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
         
         try:
-            return self._renderers[renderer_name].render_card(card, lang)
+            text = self._renderers[renderer_name].render_card(card, lang)
         except Exception as e:
             logger.error(f"Card rendering failed with {renderer_name}: {e}")
-            # Fallback to legacy renderer
+            # Fallback to legacy renderer (не кэшируем, чтобы повторить попытку)
             return self._renderers['legacy'].render_card(card, lang)
+        
+        if key is not None:
+            self._cache_put(key, text)
+        return text
+    
+    def render_cards(self, cards: List[Dict[str, Any]], lang: str = 'ru', renderer: Optional[str] = None) -> List[str]:
+        """
+        Batch-рендер страницы карточек, порядок сохраняется
+
+        Ключи страницы строятся с одной версией каталога и ищутся в кэше за один
+        проход; рендерятся только промахи, результат кладется в кэш разом.
+        """
+        renderer_name = self._resolve_renderer(renderer)
+        version = get_catalog_version()
+        keys = [self._cache_key(card, lang, renderer_name, 'card', version) for card in cards]
+        found = self._cache_get_many(keys)
+        
+        active = self._renderers[renderer_name]
+        texts: List[str] = []
+        rendered: Dict[tuple, str] = {}
+        for card, key in zip(cards, keys):
+            if key is not None and key in found:
+                texts.append(found[key])
+                continue
+            if key is not None and key in rendered:  # одна карточка дважды на странице
+                texts.append(rendered[key])
+                continue
+            try:
+                text = active.render_card(card, lang)
+            except Exception as e:
+                logger.error(f"Card rendering failed with {renderer_name}: {e}")
+                texts.append(self._renderers['legacy'].render_card(card, lang))
+                continue
+            if key is not None:
+                rendered[key] = text
+            texts.append(text)
+        
+        for key, text in rendered.items():
+            self._cache_put(key, text)
+        return texts
     
     def render_card_preview(self, card: Dict[str, Any], lang: str = 'ru', renderer: Optional[str] = None) -> str:
         """Render card preview"""
-        renderer_name = renderer or self._current_renderer
+        renderer_name = self._resolve_renderer(renderer)
         
-        if renderer_name not in self._renderers:
-            renderer_name = 'default'
+        key = self._cache_key(card, lang, renderer_name, 'preview')
+        if key is not None:
+            cached = self._cache_get(key)
+            if cached is not None:
+                return cached
         
         try:
-            return self._renderers[renderer_name].render_card_preview(card, lang)
+            text = self._renderers[renderer_name].render_card_preview(card, lang)
         except Exception as e:
             logger.error(f"Card preview rendering failed with {renderer_name}: {e}")
             return self._renderers['legacy'].render_card_preview(card, lang)
+        
+        if key is not None:
+            self._cache_put(key, text)
+        return text
     
     def render_cards_list(self, cards: list, lang: str = 'ru', max_cards: int = 10) -> str:
         """Render list of cards with pagination"""
@@ -322,10 +447,10 @@ class CardRenderingService:
         # Limit cards for performance
         display_cards = cards[:max_cards]
         
-        result = []
-        for i, card in enumerate(display_cards, 1):
-            card_text = self.render_card(card, lang)
-            result.append(f"**{i}.** {card_text}")
+        result = [
+            f"**{i}.** {card_text}"
+            for i, card_text in enumerate(self.render_cards(display_cards, lang), 1)
+        ]
         
         if len(cards) > max_cards:
             result.append(f"\n... и еще {len(cards) - max_cards} карточек")
@@ -348,6 +473,21 @@ def render_cards_list(cards: list, lang: str = 'ru') -> str:
     """Render list of cards"""
     return card_service.render_cards_list(cards, lang)
 
+def invalidate_card_render(card_id) -> None:
+    """Drop cached renders of a card after edit/moderation"""
+    card_service.invalidate_card(card_id)
+
+def _on_cards_invalidated(card_ids) -> None:
+    if card_ids is None:
+        card_service.clear_cache()
+        return
+    for card_id in card_ids:
+        card_service.invalidate_card(card_id)
+
+invalidation_bus.register('card', _on_cards_invalidated)
+# Название и эмодзи категории входят в текст карточки
+invalidation_bus.register('category', lambda _ids: card_service.clear_cache())
+
 # Export main components
 __all__ = [
     'CardRenderer',
@@ -357,5 +497,6 @@ __all__ = [
     'card_service',
     'render_card',
     'render_card_preview', 
-    'render_cards_list'
+    'render_cards_list',
+    'invalidate_card_render'
 ]
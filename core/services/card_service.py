@@ -2,13 +2,16 @@
 Card service module for handling plastic cards operations.
 Including card generation, QR codes, and card binding.
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Mapping, Optional, Sequence
 from datetime import datetime
+import asyncio
 import asyncpg
+import csv
 import os
 import qrcode
 import io
 import base64
+import tempfile
 from core.utils.logger import get_logger
 from core.settings import settings
 
@@ -101,13 +104,25 @@ class CardService:
             logger.error(f"Error getting next card number: {str(e)}")
             return settings.cards.start_number
     
-    async def generate_cards(self, count: int, created_by: int) -> Dict[str, Any]:
+    async def generate_cards(
+        self,
+        count: int,
+        created_by: int,
+        csv_path: Optional[str] = None,
+        pdf_path: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Generate new plastic cards according to TZ.
         
+        The number range is reserved under a transaction-scoped advisory lock,
+        rows are bulk-loaded with COPY into a temp table and inserted with
+        ON CONFLICT DO NOTHING, and the created cards are streamed to CSV.
+        
         Args:
             count: Number of cards to generate (1-10000)
             created_by: Admin who created the cards
+            csv_path: Where to write the CSV (a temp file by default)
+            pdf_path: Optional path for a print-ready PDF sheet of QR codes
             
         Returns:
             dict: Generation result
@@ -123,62 +138,80 @@ class CardService:
             
             conn = await self.get_connection()
             try:
-                # Get starting card number
-                start_number = await self.get_next_card_number()
-                
-                cards_data = []
-                created_count = 0
-                
-                for i in range(count):
-                    card_number = start_number + i
-                    card_id = self.generate_card_id(card_number)
-                    card_id_printable = self.generate_card_id_printable(card_number)
-                    qr_url = self.generate_qr_url(card_id)
+                async with conn.transaction():
+                    # Reserve the number range: concurrent generations queue on this lock
+                    await conn.execute("SELECT pg_advisory_xact_lock(hashtext('cards_generated'))")
+                    start_number = await self._next_card_number(conn)
                     
-                    # Check if card already exists
-                    existing = await conn.fetchrow(
-                        "SELECT id FROM cards_generated WHERE card_id = $1",
-                        card_id
+                    await conn.execute("""
+                        CREATE TEMP TABLE cards_generated_batch (
+                            card_id VARCHAR(20),
+                            card_id_printable VARCHAR(20),
+                            qr_url TEXT,
+                            created_by BIGINT
+                        ) ON COMMIT DROP
+                    """)
+                    await conn.copy_records_to_table(
+                        'cards_generated_batch',
+                        records=(
+                            (
+                                self.generate_card_id(number),
+                                self.generate_card_id_printable(number),
+                                self.generate_qr_url(self.generate_card_id(number)),
+                                created_by
+                            )
+                            for number in range(start_number, start_number + count)
+                        ),
+                        columns=['card_id', 'card_id_printable', 'qr_url', 'created_by']
                     )
                     
-                    if existing:
-                        logger.warning(f"Card {card_id} already exists, skipping")
-                        continue
+                    created = await conn.fetch("""
+                        INSERT INTO cards_generated (card_id, card_id_printable, qr_url, created_by, created_at)
+                        SELECT card_id, card_id_printable, qr_url, created_by, NOW()
+                        FROM cards_generated_batch
+                        ORDER BY length(card_id), card_id
+                        ON CONFLICT (card_id) DO NOTHING
+                        RETURNING card_id, card_id_printable, qr_url
+                    """)
                     
-                    # Create card
-                    await conn.execute("""
-                        INSERT INTO cards_generated 
-                        (card_id, card_id_printable, qr_url, created_by, created_at)
-                        VALUES ($1, $2, $3, $4, NOW())
-                    """, card_id, card_id_printable, qr_url, created_by)
+                    created_count = len(created)
+                    if created_count < count:
+                        logger.warning(f"{count - created_count} cards already existed, skipped")
                     
-                    cards_data.append({
-                        'card_id': card_id,
-                        'card_id_printable': card_id_printable,
-                        'qr_url': qr_url
-                    })
+                    if not created:
+                        return {
+                            'success': False,
+                            'message': 'Все карты из диапазона уже существуют.',
+                            'error_code': 'nothing_created'
+                        }
                     
-                    created_count += 1
-                
-                # Log admin action
-                await conn.execute("""
-                    INSERT INTO admin_logs 
-                    (admin_id, action, details, created_at)
-                    VALUES ($1, 'generate_cards', $2, NOW())
-                """, created_by, f"Создано {created_count} карт, диапазон: {cards_data[0]['card_id']}-{cards_data[-1]['card_id']}")
-                
-                logger.info(f"Generated {created_count} cards for admin {created_by}")
-                
-                return {
-                    'success': True,
-                    'message': f'Успешно создано {created_count} карт',
-                    'created_count': created_count,
-                    'cards_data': cards_data,
-                    'range': f"{cards_data[0]['card_id_printable']} - {cards_data[-1]['card_id_printable']}" if cards_data else "Нет карт"
-                }
+                    card_range = f"{created[0]['card_id_printable']} - {created[-1]['card_id_printable']}"
+                    
+                    # Log admin action
+                    await conn.execute("""
+                        INSERT INTO admin_logs 
+                        (admin_id, action, details, created_at)
+                        VALUES ($1, 'generate_cards', $2, NOW())
+                    """, created_by, f"Создано {created_count} карт, диапазон: {created[0]['card_id']}-{created[-1]['card_id']}")
                 
             finally:
                 await conn.close()
+            
+            csv_path = await asyncio.to_thread(self.write_cards_csv, created, csv_path)
+            if pdf_path:
+                await asyncio.to_thread(self.write_cards_pdf, created, pdf_path)
+            
+            logger.info(f"Generated {created_count} cards for admin {created_by}")
+            
+            return {
+                'success': True,
+                'message': f'Успешно создано {created_count} карт',
+                'created_count': created_count,
+                'range': card_range,
+                'csv_path': csv_path,
+                'pdf_path': pdf_path
+            }
+            
         except Exception as e:
             logger.error(f"Error generating cards: {str(e)}")
             return {
@@ -187,6 +220,91 @@ class CardService:
                 'error_code': 'generation_error'
             }
     
+    async def _next_card_number(self, conn: asyncpg.Connection) -> int:
+        """Next free card number, read on the caller's connection."""
+        result = await conn.fetchval("""
+            SELECT MAX(CAST(SUBSTRING(card_id FROM $2) AS BIGINT))
+            FROM cards_generated 
+            WHERE card_id LIKE $1
+        """, f"{settings.cards.prefix}%", len(settings.cards.prefix) + 1)
+        
+        return settings.cards.start_number if result is None else result + 1
+    
+    def write_cards_csv(self, cards: Iterable[Mapping[str, Any]], path: Optional[str] = None) -> str:
+        """
+        Stream cards to a CSV file row by row.
+        
+        Args:
+            cards: Rows with card_id, card_id_printable and qr_url
+            path: Target file (a temp file by default)
+            
+        Returns:
+            str: Path of the written CSV
+        """
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="cards_", suffix=".csv")
+            os.close(fd)
+        
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(['card_id', 'card_id_printable', 'qr_url'])
+            for card in cards:
+                writer.writerow([card['card_id'], card['card_id_printable'], card['qr_url']])
+        
+        return path
+    
+    def write_cards_pdf(self, cards: Sequence[Mapping[str, Any]], path: str) -> str:
+        """
+        Render a print-ready A4 PDF (300 dpi) with a grid of card QR codes.
+        
+        Pages are appended in small batches, so memory stays bounded
+        regardless of the number of cards.
+        
+        Args:
+            cards: Rows with card_id_printable and qr_url
+            path: Target PDF file
+            
+        Returns:
+            str: Path of the written PDF
+        """
+        from PIL import Image, ImageDraw, ImageFont
+        
+        page_width, page_height = 2480, 3508  # A4 @ 300 dpi
+        columns, rows, margin = 4, 6, 120
+        cell_width = (page_width - 2 * margin) // columns
+        cell_height = (page_height - 2 * margin) // rows
+        qr_size = min(cell_width, cell_height) - 90
+        per_page = columns * rows
+        font = ImageFont.load_default()
+        
+        def render_page(page_cards: Sequence[Mapping[str, Any]]) -> "Image.Image":
+            page = Image.new("1", (page_width, page_height), 1)
+            draw = ImageDraw.Draw(page)
+            for index, card in enumerate(page_cards):
+                x = margin + (index % columns) * cell_width
+                y = margin + (index // columns) * cell_height
+                qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=2)
+                qr.add_data(card['qr_url'])
+                qr.make(fit=True)
+                qr_img = qr.make_image(fill_color="black", back_color="white").get_image().convert("1")
+                qr_img = qr_img.resize((qr_size, qr_size), Image.NEAREST)
+                page.paste(qr_img, (x + (cell_width - qr_size) // 2, y))
+                draw.text((x + (cell_width - qr_size) // 2, y + qr_size + 20), card['card_id_printable'], fill=0, font=font)
+            return page
+        
+        pages_per_batch = 10
+        first = True
+        for offset in range(0, len(cards), per_page * pages_per_batch):
+            batch = cards[offset:offset + per_page * pages_per_batch]
+            pages = [render_page(batch[i:i + per_page]) for i in range(0, len(batch), per_page)]
+            pages[0].save(
+                path, "PDF", resolution=300.0,
+                save_all=True, append_images=pages[1:], append=not first
+            )
+            first = False
+        
+        return path
+    
     async def get_card(self, card_id: str) -> Optional[Dict[str, Any]]:
         """
         Get card information by ID.
@@ -296,7 +414,7 @@ class CardService:
                 """, user_id, f"💳 Карта {card['card_id_printable']} успешно привязана! Получено {settings.karma.card_bind_bonus} кармы")
                 
                 # Check achievements
-                await self._check_card_achievements(user_id)
+                await self._check_card_achievements(user_id, conn)
                 
                 logger.info(f"Card {card_id} bound to user {user_id}")
                 
@@ -421,61 +539,14 @@ class CardService:
                 'error_code': 'blocking_error'
             }
     
-    async def _check_card_achievements(self, user_id: int):
-        """Check and award card-related achievements"""
-        try:
-            conn = await self.get_connection()
-            try:
-                # Get user's card count
-                card_count = await conn.fetchval("""
-                    SELECT COUNT(*) FROM cards_binding 
-                    WHERE telegram_id = $1 AND status = 'active'
-                """, user_id)
-                
-                # First card achievement
-                if card_count == 1:
-                    existing = await conn.fetchrow("""
-                        SELECT id FROM user_achievements 
-                        WHERE user_id = $1 AND achievement_type = 'first_card'
-                    """, user_id)
-                    
-                    if not existing:
-                        await conn.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_type, achievement_data, earned_at)
-                            VALUES ($1, 'first_card', $2, NOW())
-                        """, user_id, '{"card_count": 1}')
-                        
-                        await conn.execute("""
-                            INSERT INTO user_notifications (user_id, message, notification_type, created_at)
-                            VALUES ($1, $2, 'achievement', NOW())
-                        """, user_id, "🎉 Первая карта привязана!")
-                        
-                        logger.info(f"First card achievement awarded to user {user_id}")
-                
-                # Multiple cards achievements
-                elif card_count in [5, 10, 25]:
-                    existing = await conn.fetchrow("""
-                        SELECT id FROM user_achievements 
-                        WHERE user_id = $1 AND achievement_type = 'card_collector' 
-                        AND achievement_data::json->>'card_count' = $2
-                    """, user_id, str(card_count))
-                    
-                    if not existing:
-                        await conn.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_type, achievement_data, earned_at)
-                            VALUES ($1, 'card_collector', $2, NOW())
-                        """, user_id, f'{{"card_count": {card_count}}}')
-                        
-                        await conn.execute("""
-                            INSERT INTO user_notifications (user_id, message, notification_type, created_at)
-                            VALUES ($1, $2, 'achievement', NOW())
-                        """, user_id, f"🏆 Коллекционер карт: {card_count} карт!")
-                        
-                        logger.info(f"Card collector achievement awarded to user {user_id} for {card_count} cards")
-            finally:
-                await conn.close()
-        except Exception as e:
-            logger.error(f"Error checking card achievements for user {user_id}: {str(e)}")
+    async def _check_card_achievements(self, user_id: int, conn: asyncpg.Connection):
+        """Report the actual bound-card count to the achievement engine"""
+        from core.services.achievement_engine import achievement_engine, AchievementEvent
+        card_count = await conn.fetchval("""
+            SELECT COUNT(*) FROM cards_binding 
+            WHERE telegram_id = $1 AND status = 'active'
+        """, user_id)
+        await achievement_engine.handle_event(AchievementEvent.CARD_BOUND, user_id, card_count=card_count)
 
 
 # Create singleton instance
@@ -0,0 +1,96 @@
+"""
+Catalog Search Service - полнотекстовый поиск заведений по каталогу
+
+Кандидатов отбирает индекс БД (FTS5 trigram в SQLite, pg_trgm в PostgreSQL) с
+фильтрами по городу и категории, затем сервис переранжирует их по триграммной
+похожести слов — так запрос с опечаткой ("pizzza", "cafee") все равно находит
+заведение, а совпадения в названии весят больше, чем в описании или адресе.
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.database.db_adapter import db_v2
+from core.utils.trigrams import best_similarity, normalize, words
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 10
+MIN_CANDIDATES = 50
+TITLE_WEIGHT = 3.0
+# Слово запроса должно хоть где-то совпасть не хуже этого порога
+MIN_WORD_SIMILARITY = 0.3
+
+
+class CatalogSearchService:
+    """Поиск карточек по названию, описанию, адресу и тексту скидки"""
+
+    @staticmethod
+    def parse_query(raw: str) -> Tuple[str, Optional[str]]:
+        """Отделить фильтр категории вида `#restaurants` от текста запроса"""
+        category_slug = None
+        parts = []
+        for part in (raw or "").split():
+            if part.startswith("#") and len(part) > 1:
+                category_slug = part[1:].lower()
+            else:
+                parts.append(part)
+        return " ".join(parts), category_slug
+
+    @staticmethod
+    def rank(cards: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        """Переранжировать кандидатов с учетом опечаток, отбросив нерелевантных"""
+        terms = words(query)
+        if not terms:
+            return []
+        scored = []
+        for position, card in enumerate(cards):
+            title = normalize(card.get('title') or '')
+            other = normalize(" ".join(
+                str(card.get(field) or '') for field in ('description', 'address', 'discount_text')
+            ))
+            title_tokens, other_tokens = words(title), words(other)
+            score = 0.0
+            for term in terms:
+                if term in title:
+                    score += TITLE_WEIGHT
+                    continue
+                if term in other:
+                    score += 1.0
+                    continue
+                in_title = best_similarity(term, title_tokens)
+                in_other = best_similarity(term, other_tokens)
+                if max(in_title, in_other) < MIN_WORD_SIMILARITY:
+                    break
+                score += max(in_title * TITLE_WEIGHT, in_other)
+            else:
+                scored.append((-score, position, card))
+        scored.sort(key=lambda item: item[:2])
+        return [card for _, _, card in scored]
+
+    async def search(self, query: str, city_id: Optional[int] = None,
+                     category_slug: Optional[str] = None, limit: int = SEARCH_LIMIT) -> List[Dict[str, Any]]:
+        """Найти опубликованные карточки; `#slug` в запросе задает категорию"""
+        text, parsed_slug = self.parse_query(query)
+        category_slug = category_slug or parsed_slug
+        if not words(text):
+            return []
+        started = time.perf_counter()
+        try:
+            candidates = await db_v2.search_cards(
+                text, city_id=city_id, category_slug=category_slug,
+                limit=max(limit * 5, MIN_CANDIDATES)
+            )
+        except Exception as e:
+            logger.error(f"Catalog search failed for '{text}': {e}")
+            return []
+        results = self.rank(candidates, text)[:limit]
+        logger.debug(
+            f"Catalog search '{text}' city={city_id} category={category_slug}: "
+            f"{len(results)}/{len(candidates)} in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return results
+
+
+# Создаем экземпляр сервиса
+catalog_search_service = CatalogSearchService()
@@ -11,6 +11,7 @@ from core.models.achievement_models import (
     Achievement, AchievementType, AchievementRarity, UserAchievement,
     DEFAULT_ACHIEVEMENTS, RARITY_COLORS, get_progress_bar, format_achievement_progress
 )
+from core.services.achievement_engine import achievement_engine, COUNTER_BACKED_TYPES
 
 logger = get_logger(__name__)
 
@@ -186,9 +187,10 @@ class GamificationService:
                 return current_referrals, 10
             
             elif achievement_type == AchievementType.CARD_COLLECTOR:
-                # Получаем количество карт
+                # Получаем количество карт (тот же источник, что у achievement_engine)
                 cards_result = await conn.fetchrow("""
-                    SELECT COUNT(*) as count FROM user_cards WHERE user_id = $1
+                    SELECT COUNT(*) as count FROM cards_binding
+                    WHERE telegram_id = $1 AND status = 'active'
                 """, user_id)
                 current_cards = cards_result['count'] if cards_result else 0
                 return current_cards, 5
@@ -298,6 +300,12 @@ class GamificationService:
         """
         Проверить и наградить достижения
         
+        Достижения на счётчиках (карма, баллы, карты, рефералы) выдаёт
+        achievement_engine в своём формате achievement_data, со своей
+        дедупликацией; сканирование истории через _calculate_progress остаётся
+        для достижений по чекинам (серии, ранние и ночные входы, места,
+        выходные, месяц, год).
+        
         Args:
             user_id: Telegram user ID
             
@@ -309,43 +317,51 @@ class GamificationService:
             try:
                 new_achievements = []
                 
+                # Достижения на счётчиках: все достигнутые, но не выданные пороги
+                for item in await achievement_engine.award_reached(user_id, conn):
+                    if 'name' in item:  # first_card не входит в каталог DEFAULT_ACHIEVEMENTS
+                        new_achievements.append({
+                            key: item[key] for key in
+                            ('achievement_type', 'name', 'description', 'icon', 'rarity', 'points_reward')
+                        })
+                
+                # Уже полученные достижения — одним запросом
+                earned_rows = await conn.fetch("""
+                    SELECT DISTINCT achievement_type FROM user_achievements WHERE user_id = $1
+                """, user_id)
+                earned_types = {row['achievement_type'] for row in earned_rows}
+                
                 for achievement_type, achievement in self.achievements.items():
-                    # Проверяем, получено ли уже достижение
-                    existing = await conn.fetchrow("""
-                        SELECT id FROM user_achievements 
-                        WHERE user_id = $1 AND achievement_type = $2
-                    """, user_id, achievement_type.value)
-                    
-                    if existing:
+                    if achievement_type in COUNTER_BACKED_TYPES or achievement_type.value in earned_types:
                         continue
                     
-                    # Вычисляем прогресс
+                    # Вычисляем прогресс по истории
                     current, target = await self._calculate_progress(conn, user_id, achievement_type)
+                    if current < target:
+                        continue
                     
-                    # Проверяем, достигнута ли цель
-                    if current >= target:
-                        # Награждаем достижением
-                        await conn.execute("""
-                            INSERT INTO user_achievements (user_id, achievement_type, achievement_data, earned_at)
-                            VALUES ($1, $2, $3, NOW())
-                        """, user_id, achievement_type.value, json.dumps({"target": target, "achieved": current}))
-                        
-                        # Добавляем уведомление
-                        await conn.execute("""
-                            INSERT INTO user_notifications (user_id, message, notification_type, created_at)
-                            VALUES ($1, $2, 'achievement', NOW())
-                        """, user_id, f"🎉 {achievement.icon} {achievement.name}!")
-                        
-                        new_achievements.append({
-                            'achievement_type': achievement_type.value,
-                            'name': achievement.name,
-                            'description': achievement.description,
-                            'icon': achievement.icon,
-                            'rarity': achievement.rarity.value,
-                            'points_reward': achievement.points_reward
-                        })
-                        
-                        logger.info(f"New achievement awarded: {achievement.name} to user {user_id}")
+                    # Награждаем достижением
+                    await conn.execute("""
+                        INSERT INTO user_achievements (user_id, achievement_type, achievement_data, earned_at)
+                        VALUES ($1, $2, $3, NOW())
+                    """, user_id, achievement_type.value, json.dumps({"target": target, "achieved": current}))
+                    
+                    # Добавляем уведомление
+                    await conn.execute("""
+                        INSERT INTO user_notifications (user_id, message, notification_type, created_at)
+                        VALUES ($1, $2, 'achievement', NOW())
+                    """, user_id, f"🎉 {achievement.icon} {achievement.name}!")
+                    
+                    new_achievements.append({
+                        'achievement_type': achievement_type.value,
+                        'name': achievement.name,
+                        'description': achievement.description,
+                        'icon': achievement.icon,
+                        'rarity': achievement.rarity.value,
+                        'points_reward': achievement.points_reward
+                    })
+                    
+                    logger.info(f"New achievement awarded: {achievement.name} to user {user_id}")
                 
                 return new_achievements
             finally:
@@ -0,0 +1,327 @@
+"""
+Шина инвалидации кэшей
+
+События типизированы (card, partner, user, tariff, category) и несут id
+затронутых записей; ids=None означает "сбросить все". Локальные кэши (L1,
+read-модели, кэш рендера карточек, ключи в Redis) подписываются через
+register(). publish() сбрасывает их сразу и рассылает событие остальным
+инстансам через транспорт:
+  - PGNotifyListener (core/services/pg_notify.py): LISTEN/NOTIFY. Для видов
+    из TRIGGER_BACKED_KINDS событие шлет только триггер таблицы (publish()
+    лишь сбрасывает локальные кэши), иначе каждая запись приходила бы дважды;
+    origin триггер берет из настройки сессии ORIGIN_SETTING, поэтому свою
+    запись инстанс повторно не обрабатывает;
+  - RedisPubSubListener: pub/sub для SQLite-развертываний.
+
+Входящие события за окно INVALIDATION_COALESCE_WINDOW (по умолчанию 0.05 с)
+объединяются: пачка NOTIFY от массового UPDATE дает один вызов обработчика.
+Пропущенные за время обрыва события не восстановить, поэтому после
+переподключения транспорта кэши всех видов сбрасываются целиком (resync).
+
+Payload: {"type": "card", "ids": [1, 2] | null, "origin": "<instance id>"}
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Union
+
+try:
+    import redis.asyncio as aioredis  # type: ignore
+except Exception:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+EVENT_KINDS = ("card", "partner", "user", "tariff", "category")
+CHANNEL = "cache_invalidation"
+
+# Виды событий, которые шлют триггеры PostgreSQL (CACHE_INVALIDATION_TRIGGERS в migrations.py)
+TRIGGER_BACKED_KINDS = frozenset({"card", "partner", "tariff", "category"})
+# Настройка сессии PostgreSQL с id инстанса: триггер кладет ее в origin
+ORIGIN_SETTING = "karmabot.instance_id"
+
+# Payload'ы старых триггеров: {"type": "catalog", ...} и {"type": "partner_cab", "partner_profile_id": ...}
+_LEGACY_KINDS = {"catalog": "card", "partner_cab": "partner"}
+
+Ids = Optional[FrozenSet[int]]
+Handler = Callable[[Ids], Optional[Awaitable[None]]]
+
+
+def _to_ids(ids: Union[None, int, Iterable[Any]]) -> Ids:
+    if ids is None:
+        return None
+    if isinstance(ids, (int, str)):
+        return frozenset({int(ids)})
+    return frozenset(int(i) for i in ids)
+
+
+class InvalidationBus:
+    """Рассылка событий инвалидации по локальным кэшам и другим инстансам"""
+
+    def __init__(self, window: Optional[float] = None):
+        self.window = float(os.getenv("INVALIDATION_COALESCE_WINDOW", "0.05")) if window is None else window
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._handlers: Dict[str, List[Handler]] = {kind: [] for kind in EVENT_KINDS}
+        self._pending: Dict[str, Optional[Set[int]]] = {}
+        self._flush_scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._transport = None
+        self._stats = {'published': 0, 'received': 0, 'coalesced': 0, 'dispatched': 0, 'resyncs': 0, 'errors': 0}
+
+    def register(self, kind: str, handler: Handler) -> Handler:
+        """Подписать кэш на события вида kind; handler(ids) может быть корутиной"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown invalidation event kind: {kind}")
+        self._handlers[kind].append(handler)
+        return handler
+
+    # --- Публикация ---
+    async def publish(self, kind: str, ids: Union[None, int, Iterable[Any]] = None) -> None:
+        """Сбросить локальные кэши и разослать событие другим инстансам"""
+        ids = _to_ids(ids)
+        self._stats['published'] += 1
+        await self._await_all(self._dispatch(kind, ids))
+        await self._send(kind, ids)
+
+    def publish_nowait(self, kind: str, ids: Union[None, int, Iterable[Any]] = None) -> None:
+        """publish() из синхронного кода: синхронные обработчики отрабатывают сразу, остальное — в фоне"""
+        ids = _to_ids(ids)
+        self._stats['published'] += 1
+        awaitables = self._dispatch(kind, ids)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Нет цикла событий: асинхронные обработчики и рассылку выполнить негде
+            for awaitable in awaitables:
+                if inspect.iscoroutine(awaitable):
+                    awaitable.close()
+            return
+        if awaitables:
+            self._spawn(self._await_all(awaitables))
+        if self._transport is not None:
+            self._spawn(self._send(kind, ids))
+
+    def encode(self, kind: str, ids: Ids) -> str:
+        return json.dumps({"type": kind, "ids": sorted(ids) if ids is not None else None, "origin": self.instance_id})
+
+    async def _send(self, kind: str, ids: Ids) -> None:
+        if self._transport is None:
+            return
+        if ids is not None and kind in getattr(self._transport, 'trigger_kinds', ()):
+            # Запись в таблицу уже разослал триггер (с origin этого инстанса)
+            return
+        try:
+            await self._transport.send(self.encode(kind, ids))
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Invalidation event {kind} not broadcast: {e}")
+
+    # --- Прием ---
+    def handle_payload(self, payload: str) -> None:
+        """Разобрать payload транспорта и поставить событие в очередь"""
+        try:
+            data = json.loads(payload)
+            if data.get("origin") == self.instance_id:
+                return
+            kind = _LEGACY_KINDS.get(data.get("type"), data.get("type"))
+            if kind not in self._handlers:
+                logger.debug(f"Invalidation payload of unknown type ignored: {payload}")
+                return
+            if "ids" in data:
+                ids = _to_ids(data["ids"])
+            elif data.get("id") is not None:
+                ids = _to_ids(data["id"])
+            elif kind == "partner" and data.get("partner_profile_id") not in (None, "*"):
+                ids = _to_ids(data["partner_profile_id"])
+            else:
+                ids = None
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.warning(f"Invalidation payload error: {e}; payload={payload!r}")
+            return
+        self._stats['received'] += 1
+        self.emit(kind, ids)
+
+    def emit(self, kind: str, ids: Ids) -> None:
+        """Поставить событие в окно объединения; обработчики вызовет flush()"""
+        if kind in self._pending:
+            self._stats['coalesced'] += 1
+            pending = self._pending[kind]
+            if pending is not None:
+                if ids is None:
+                    self._pending[kind] = None
+                else:
+                    pending.update(ids)
+        else:
+            self._pending[kind] = None if ids is None else set(ids)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_later(self.window, lambda: self._spawn(self.flush()))
+
+    def resync(self) -> None:
+        """После обрыва транспорта: события могли потеряться, сбрасываем все кэши"""
+        self._stats['resyncs'] += 1
+        logger.info("Invalidation transport reconnected, flushing all caches")
+        for kind in EVENT_KINDS:
+            self.emit(kind, None)
+
+    async def flush(self) -> None:
+        """Доставить накопленные события обработчикам"""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        awaitables: List[Awaitable[None]] = []
+        for kind, ids in pending.items():
+            awaitables.extend(self._dispatch(kind, None if ids is None else frozenset(ids)))
+        await self._await_all(awaitables)
+
+    # --- Доставка ---
+    def _dispatch(self, kind: str, ids: Ids) -> List[Awaitable[None]]:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown invalidation event kind: {kind}")
+        self._stats['dispatched'] += 1
+        awaitables = []
+        for handler in self._handlers[kind]:
+            try:
+                result = handler(ids)
+                if inspect.isawaitable(result):
+                    awaitables.append(result)
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.warning(f"Invalidation handler {getattr(handler, '__qualname__', handler)} failed for {kind}: {e}")
+        return awaitables
+
+    async def _await_all(self, awaitables: List[Awaitable[None]]) -> None:
+        for result in await asyncio.gather(*awaitables, return_exceptions=True):
+            if isinstance(result, Exception):
+                self._stats['errors'] += 1
+                logger.warning(f"Async invalidation handler failed: {result}")
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # --- Транспорт ---
+    def _create_transport(self):
+        from .pg_notify import PGNotifyListener, _get_db_url, _is_postgres, _pg_notify_enabled, asyncpg
+        db_url = _get_db_url()
+        if _is_postgres(db_url):
+            if asyncpg is not None and _pg_notify_enabled():
+                return PGNotifyListener(db_url, self)
+        redis_url = os.getenv("REDIS_URL") or os.getenv("UPSTASH_REDIS_URL") or os.getenv("KV_URL")
+        if redis_url and aioredis is not None:
+            return RedisPubSubListener(redis_url, self)
+        return None
+
+    async def start(self) -> None:
+        """Запустить транспорт; без PG NOTIFY и Redis шина работает только в процессе"""
+        if self._transport is not None:
+            return
+        self._transport = self._create_transport()
+        if self._transport is None:
+            logger.info("Invalidation bus: no transport configured, local invalidation only")
+            return
+        await self._transport.start()
+
+    async def stop(self) -> None:
+        transport, self._transport = self._transport, None
+        if transport is not None:
+            await transport.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'pending': len(self._pending),
+                'transport': type(self._transport).__name__ if self._transport else None}
+
+
+class ReconnectingListener:
+    """Основа транспорта: сессия подписки в цикле переподключения с экспоненциальной паузой"""
+
+    def __init__(self, bus: InvalidationBus, channel: str = CHANNEL, min_delay: float = 1.0, max_delay: float = 30.0):
+        self.bus = bus
+        self.channel = channel
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._delay = min_delay
+        self._sessions = 0
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=2)
+            except Exception:
+                self._task.cancel()
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{type(self).__name__} disconnected: {e}; reconnecting in {self._delay:.0f}s")
+            if self._stop.is_set():
+                break
+            await self._wait_any(self._delay)
+            self._delay = min(self._delay * 2, self.max_delay)
+
+    def _on_connected(self) -> None:
+        """Вызывается сессией после подписки"""
+        if self._sessions:
+            self.bus.resync()
+        self._sessions += 1
+        self._delay = self.min_delay
+
+    async def _wait_any(self, timeout: float, *events: asyncio.Event) -> None:
+        """Ждать stop, одно из событий или таймаут"""
+        waiters = [asyncio.ensure_future(event.wait()) for event in (self._stop, *events)]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _session(self) -> None:
+        raise NotImplementedError
+
+    async def send(self, payload: str) -> None:
+        raise NotImplementedError
+
+
+class RedisPubSubListener(ReconnectingListener):
+    """Транспорт шины через Redis pub/sub (SQLite-развертывания без LISTEN/NOTIFY)"""
+
+    def __init__(self, url: str, bus: InvalidationBus, channel: str = CHANNEL):
+        super().__init__(bus, channel)
+        self._client = aioredis.from_url(url, decode_responses=True)
+
+    async def send(self, payload: str) -> None:
+        await self._client.publish(self.channel, payload)
+
+    async def _session(self) -> None:
+        pubsub = self._client.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            self._on_connected()
+            logger.info(f"✅ Redis SUBSCRIBE started on channel '{self.channel}'")
+            while not self._stop.is_set():
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    self.bus.handle_payload(message["data"])
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+
+invalidation_bus = InvalidationBus()
@@ -15,6 +15,7 @@ from core.logger import get_logger
 from core.models.card import Card
 from core.models.partner import Partner, ModerationLog
 from core.common.exceptions import NotFoundError, ValidationError, BusinessLogicError
+from core.services.card_renderer import invalidate_card_render
 
 logger = get_logger(__name__)
 
@@ -125,6 +126,7 @@ class ModerationService:
             await self._update_moderation_stats(moderator_id, 'approve')
             
             await self.db.commit()
+            invalidate_card_render(card_id)
             
             logger.info(f"Card {card_id} approved by moderator {moderator_id}")
             
@@ -198,6 +200,7 @@ class ModerationService:
             await self._update_moderation_stats(moderator_id, 'reject')
             
             await self.db.commit()
+            invalidate_card_render(card_id)
             
             logger.info(f"Card {card_id} rejected by moderator {moderator_id}: {reason}")
             
@@ -267,6 +270,7 @@ class ModerationService:
             await self._update_moderation_stats(moderator_id, 'feature')
             
             await self.db.commit()
+            invalidate_card_render(card_id)
             
             logger.info(f"Card {card_id} featured by moderator {moderator_id}")
             
@@ -333,6 +337,7 @@ class ModerationService:
             await self._update_moderation_stats(moderator_id, 'archive')
             
             await self.db.commit()
+            invalidate_card_render(card_id)
             
             logger.info(f"Card {card_id} archived by moderator {moderator_id}")
             
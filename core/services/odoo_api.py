@@ -1,16 +1,41 @@
 from __future__ import annotations
 
 import os
+import time
 import asyncio
 import logging
-from typing import Any, Dict, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
 
 import xmlrpc.client
 
+from core.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
 
 logger = logging.getLogger(__name__)
 
 
+class _TimeoutMixin:
+    """Таймаут сокета для xmlrpc-транспорта (по умолчанию его нет вовсе)"""
+    timeout: Optional[float] = None
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+
+class _KeepAliveTransport(_TimeoutMixin, xmlrpc.client.Transport):
+    """HTTP/1.1 транспорт: одно соединение на прокси переиспользуется между вызовами"""
+
+
+class _KeepAliveSafeTransport(_TimeoutMixin, xmlrpc.client.SafeTransport):
+    """То же для HTTPS"""
+
+
 class OdooKarmasystemAPI:
     """
     Async-friendly XML-RPC client for Odoo.
@@ -20,6 +45,16 @@ class OdooKarmasystemAPI:
       - ODOO_DB (e.g., 'postgres' or 'odoo')
       - ODOO_USERNAME (e.g., 'user@example.com')
       - ODOO_PASSWORD
+      - ODOO_POOL_SIZE (threads / keep-alive connections, default 4)
+      - ODOO_TIMEOUT (seconds per RPC, default 10)
+      - ODOO_CACHE_TTL (seconds for cached reads, default 60)
+      - ODOO_CACHE_MAX_ENTRIES (cached reads kept, least recently used evicted, default 2048)
+      - ODOO_CATALOG_WAIT (max seconds a catalog render waits for Odoo, default 0.8)
+
+    ServerProxy is not thread-safe, so every worker thread of a bounded pool owns
+    its own proxies with a keep-alive transport. Read methods are cached with a
+    TTL and identical concurrent calls share one RPC. A circuit breaker stops
+    calling Odoo after repeated transport failures.
 
     All methods are safe: they catch exceptions and return {success: False} on failure.
     """
@@ -31,27 +66,84 @@ class OdooKarmasystemAPI:
         self._username = username or os.getenv("ODOO_USERNAME") or ""
         self._password = password or os.getenv("ODOO_PASSWORD") or ""
         self._uid: Optional[int] = None
-        self._common: Optional[xmlrpc.client.ServerProxy] = None
-        self._models: Optional[xmlrpc.client.ServerProxy] = None
+        self._pool_size = int(os.getenv("ODOO_POOL_SIZE", "4"))
+        self._timeout = float(os.getenv("ODOO_TIMEOUT", "10"))
+        self._cache_ttl = float(os.getenv("ODOO_CACHE_TTL", "60"))
+        self._cache_max_entries = max(1, int(os.getenv("ODOO_CACHE_MAX_ENTRIES", "2048")))
+        self._catalog_wait = float(os.getenv("ODOO_CATALOG_WAIT", "0.8"))
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._breaker = CircuitBreaker(
+            "odoo",
+            failure_threshold=int(os.getenv("ODOO_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("ODOO_BREAKER_RESET", "30")),
+        )
+        # key -> (expires_at, result) в порядке использования; просроченные записи
+        # отдаются, если Odoo недоступен, а сверх ODOO_CACHE_MAX_ENTRIES вытесняются самые старые
+        self._cache: OrderedDict[Hashable, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'stale': 0}
+        self._card_fields: Optional[List[str]] = None
 
     @property
     def is_configured(self) -> bool:
         return bool(self._base and self._db and self._username and self._password)
 
     # --- Internal helpers ---
+    def _make_transport(self) -> xmlrpc.client.Transport:
+        transport = _KeepAliveSafeTransport() if self._base.startswith("https") else _KeepAliveTransport()
+        transport.timeout = self._timeout
+        return transport
+
     def _common_proxy(self) -> xmlrpc.client.ServerProxy:
-        return xmlrpc.client.ServerProxy(f"{self._base}/xmlrpc/2/common")
+        """Прокси текущего потока для /common"""
+        if getattr(self._local, "common", None) is None:
+            self._local.common = xmlrpc.client.ServerProxy(
+                f"{self._base}/xmlrpc/2/common", transport=self._make_transport()
+            )
+        return self._local.common
 
     def _models_proxy(self) -> xmlrpc.client.ServerProxy:
-        return xmlrpc.client.ServerProxy(f"{self._base}/xmlrpc/2/object")
+        """Прокси текущего потока для /object"""
+        if getattr(self._local, "models", None) is None:
+            self._local.models = xmlrpc.client.ServerProxy(
+                f"{self._base}/xmlrpc/2/object", transport=self._make_transport()
+            )
+        return self._local.models
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix="odoo-rpc")
+            return self._executor
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполнить блокирующий RPC в пуле под защитой circuit breaker"""
+        self._breaker.before_call()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(self._get_executor(), partial(fn, *args)), self._timeout
+            )
+        except xmlrpc.client.Fault:
+            # Odoo ответил (например, модели нет) — сервис жив
+            self._breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            # Вызывающего отменили — о здоровье Odoo это ничего не говорит
+            self._breaker.release()
+            raise
+        except Exception:
+            self._breaker.record_failure()
+            raise
+        self._breaker.record_success()
+        return result
 
     def _authenticate_blocking(self) -> int:
-        common = self._common_proxy()
-        uid = common.authenticate(self._db, self._username, self._password, {})
+        uid = self._common_proxy().authenticate(self._db, self._username, self._password, {})
         if not uid:
             raise RuntimeError("Odoo authentication failed")
-        self._common = common
-        self._models = self._models_proxy()
         self._uid = int(uid)
         return self._uid
 
@@ -62,19 +154,86 @@ class OdooKarmasystemAPI:
         if self._uid:
             return True
         try:
-            await asyncio.to_thread(self._authenticate_blocking)
+            await self._call(self._authenticate_blocking)
             return True
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error("Odoo auth error: %s", e)
             return False
 
-    def _execute_kw_blocking(self, model: str, method: str, *args: Any, **kwargs: Any) -> Any:
-        if not self._models or self._uid is None:
+    def _execute_kw_blocking(self, model: str, method: str, args: list, kwargs: Dict[str, Any]) -> Any:
+        if self._uid is None:
             raise RuntimeError("Odoo client not authenticated")
-        return self._models.execute_kw(self._db, self._uid, self._password, model, method, list(args), kwargs)
+        return self._models_proxy().execute_kw(self._db, self._uid, self._password, model, method, args, kwargs)
+
+    async def _execute_kw(self, model: str, method: str, args: Sequence[Any] = (),
+                          kwargs: Optional[Mapping[str, Any]] = None) -> Any:
+        """execute_kw: args — позиционные аргументы метода модели, kwargs — именованные (fields, limit, order, context)"""
+        return await self._call(self._execute_kw_blocking, model, method, list(args), dict(kwargs or {}))
+
+    async def _cached(self, key: Hashable, fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                      ttl: Optional[float] = None, wait: Optional[float] = None) -> Dict[str, Any]:
+        """
+        TTL-кэш с объединением одинаковых одновременных запросов.
+
+        wait ограничивает ожидание вызывающего: запрос продолжается в фоне и
+        наполнит кэш, а вызывающий получит устаревший ответ или {success: False}.
+        """
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached:
+            self._cache.move_to_end(key)
+        if cached and cached[0] > now:
+            self._stats['hits'] += 1
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats['misses'] += 1
+            ttl = self._cache_ttl if ttl is None else ttl
+
+            async def _fetch() -> Dict[str, Any]:
+                result = await fetch()
+                if result.get("success"):
+                    self._store(key, ttl, result)
+                return result
+
+            task = asyncio.ensure_future(_fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, _k=key: self._inflight.pop(_k, None))
+        else:
+            self._stats['coalesced'] += 1
 
-    async def _execute_kw(self, model: str, method: str, *args: Any, **kwargs: Any) -> Any:
-        return await asyncio.to_thread(self._execute_kw_blocking, model, method, *args, **kwargs)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), wait)
+        except asyncio.TimeoutError:
+            result = {"success": False, "error": "timeout"}
+        if not result.get("success") and cached:
+            self._stats['stale'] += 1
+            return cached[1]
+        return result
+
+    def _store(self, key: Hashable, ttl: float, result: Dict[str, Any]) -> None:
+        self._cache[key] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate_cache(self, kind: Optional[str] = None, key: Optional[str] = None) -> None:
+        """Сбросить кэш чтений целиком, по виду ключа ('cards', 'points') или одну запись"""
+        if kind is None:
+            self._cache.clear()
+            return
+        if key is not None:
+            self._cache.pop((kind, key), None)
+            return
+        for key in [k for k in self._cache if isinstance(k, tuple) and k[0] == kind]:
+            self._cache.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'cached': len(self._cache), 'inflight': len(self._inflight),
+                'breaker': self._breaker.get_stats()}
 
     # --- Public API (safe) ---
     async def register_partner(
@@ -95,7 +254,7 @@ class OdooKarmasystemAPI:
                 'phone': phone or '',
                 'customer_rank': 1,
             }
-            partner_id = await self._execute_kw('res.partner', 'create', vals)
+            partner_id = await self._execute_kw('res.partner', 'create', [vals])
             return {"success": True, "partner_id": partner_id}
         except Exception as e:
             logger.error("register_partner failed: %s", e)
@@ -114,11 +273,11 @@ class OdooKarmasystemAPI:
             # Ensure a partner exists for the user
             name = telegram_username or f"tg:{telegram_user_id}"
             partner_vals = {'name': name, 'phone': phone or '', 'customer_rank': 1}
-            partner_id = await self._execute_kw('res.partner', 'create', partner_vals)
+            partner_id = await self._execute_kw('res.partner', 'create', [partner_vals])
             # Optionally write to a loyalty model if present
             try:
                 loy_vals = {'telegram_id': str(telegram_user_id), 'phone': phone or '', 'points': 0, 'partner_id': partner_id}
-                await self._execute_kw('karma.loyalty', 'create', loy_vals)
+                await self._execute_kw('karma.loyalty', 'create', [loy_vals])
             except Exception:
                 pass
             return {"success": True, "partner_id": partner_id}
@@ -145,7 +304,8 @@ class OdooKarmasystemAPI:
                     'customer_telegram_id': str(customer_telegram_id),
                     'points_used': int(points_to_use),
                 }
-                txn_id = await self._execute_kw('karmasystem.transaction', 'create', vals)
+                txn_id = await self._execute_kw('karmasystem.transaction', 'create', [vals])
+                self._cache.pop(("points", str(customer_telegram_id)), None)
                 return {"success": True, "transaction_id": txn_id}
             except Exception:
                 # Graceful fallback if model doesn't exist
@@ -154,43 +314,103 @@ class OdooKarmasystemAPI:
             logger.error("process_transaction failed: %s", e)
             return {"success": False, "error": str(e)}
 
-    async def get_cards_by_category(self, *, category: str) -> Dict[str, Any]:
+    async def get_cards_by_category(self, *, category: str, wait: Optional[float] = None) -> Dict[str, Any]:
+        """Cached read; waits at most `wait` (default ODOO_CATALOG_WAIT) so rendering never blocks on Odoo."""
+        if not self.is_configured:
+            return {"success": False, "error": "not_configured"}
+        return await self._cached(
+            ("cards", category),
+            partial(self._fetch_cards_by_category, category),
+            wait=self._catalog_wait if wait is None else wait,
+        )
+
+    async def _fetch_cards_by_category(self, category: str) -> Dict[str, Any]:
         try:
             if not await self._ensure_auth():
-                return {"success": False, "error": "not_configured"}
+                return {"success": False, "error": "unavailable"}
             # Attempt to read cards from a model if present
             try:
                 domain = [["category", "=", category]]
                 fields = ["id", "name", "description", "address", "phone", "average_check", "cashback_percent", "latitude", "longitude"]
-                records = await self._execute_kw('karmasystem.partner.card', 'search_read', domain, {'fields': fields, 'limit': 100})
+                records = await self._execute_kw('karmasystem.partner.card', 'search_read', [domain], {'fields': fields, 'limit': 100})
                 return {"success": True, "cards": records}
-            except Exception:
+            except xmlrpc.client.Fault:
                 return {"success": True, "cards": []}
+        except CircuitOpenError:
+            return {"success": False, "error": "circuit_open"}
         except Exception as e:
             logger.error("get_cards_by_category failed: %s", e)
             return {"success": False, "error": str(e)}
 
+    # Поля karmasystem.partner.card, которые переносятся в cards_v2 (берутся те, что есть в модели)
+    PARTNER_CARD_SYNC_FIELDS = (
+        "id", "name", "description", "address", "phone", "category", "discount_text",
+        "cashback_percent", "google_maps_url", "latitude", "longitude", "status", "active", "write_date",
+    )
+
+    async def get_partner_cards_changed(self, *, since: Optional[str] = None, after_id: int = 0,
+                                        limit: int = 200) -> Dict[str, Any]:
+        """
+        Uncached batch of partner cards changed after the (write_date, id) watermark,
+        ordered by write_date, id. Archived cards are included so they can be hidden locally.
+        """
+        if not self.is_configured:
+            return {"success": False, "error": "not_configured"}
+        try:
+            if not await self._ensure_auth():
+                return {"success": False, "error": "unavailable"}
+            if self._card_fields is None:
+                available = await self._execute_kw('karmasystem.partner.card', 'fields_get', [], {'attributes': ['type']})
+                self._card_fields = [f for f in self.PARTNER_CARD_SYNC_FIELDS if f in available]
+            domain: list = []
+            if since:
+                # Keyset по (write_date, id): записи с одинаковым write_date не теряются между батчами
+                domain = ['|', ('write_date', '>', since), '&', ('write_date', '=', since), ('id', '>', int(after_id))]
+            kwargs: Dict[str, Any] = {'fields': self._card_fields, 'order': 'write_date asc, id asc', 'limit': int(limit)}
+            if 'active' in self._card_fields:
+                kwargs['context'] = {'active_test': False}
+            records = await self._execute_kw('karmasystem.partner.card', 'search_read', [domain], kwargs)
+            return {"success": True, "cards": records}
+        except xmlrpc.client.Fault as e:
+            return {"success": False, "error": f"model_missing: {e.faultString}"}
+        except CircuitOpenError:
+            return {"success": False, "error": "circuit_open"}
+        except Exception as e:
+            logger.error("get_partner_cards_changed failed: %s", e)
+            return {"success": False, "error": str(e)}
+
     async def get_user_points(self, *, telegram_user_id: str) -> Dict[str, Any]:
+        if not self.is_configured:
+            return {"success": False, "error": "not_configured"}
+        return await self._cached(
+            ("points", str(telegram_user_id)),
+            partial(self._fetch_user_points, str(telegram_user_id)),
+            ttl=min(self._cache_ttl, 15.0),
+        )
+
+    async def _fetch_user_points(self, telegram_user_id: str) -> Dict[str, Any]:
         try:
             if not await self._ensure_auth():
-                return {"success": False, "error": "not_configured"}
+                return {"success": False, "error": "unavailable"}
             try:
                 # Try modern field name
                 domain = [["telegram_id", "=", str(telegram_user_id)]]
                 fields = ["points"]
-                recs = await self._execute_kw('karma.loyalty', 'search_read', domain, {'fields': fields, 'limit': 1})
+                recs = await self._execute_kw('karma.loyalty', 'search_read', [domain], {'fields': fields, 'limit': 1})
                 if recs:
                     pts = int(recs[0].get('points') or 0)
                     return {"success": True, "available_points": pts}
                 # Try alternative field
                 domain2 = [["telegram_user_id", "=", str(telegram_user_id)]]
-                recs2 = await self._execute_kw('karma.loyalty', 'search_read', domain2, {'fields': fields, 'limit': 1})
+                recs2 = await self._execute_kw('karma.loyalty', 'search_read', [domain2], {'fields': fields, 'limit': 1})
                 if recs2:
                     pts = int(recs2[0].get('points') or 0)
                     return {"success": True, "available_points": pts}
                 return {"success": True, "available_points": 0}
-            except Exception:
+            except xmlrpc.client.Fault:
                 return {"success": True, "available_points": 0}
+        except CircuitOpenError:
+            return {"success": False, "error": "circuit_open"}
         except Exception as e:
             logger.error("get_user_points failed: %s", e)
             return {"success": False, "error": str(e)}
@@ -229,11 +449,11 @@ class OdooKarmasystemAPI:
                 if not await self.has_partner_card_model():
                     return {"success": False, "error": "model_missing"}
                 # Ensure partner exists (by name or phone). Simplified: create if missing.
-                pid = await self._execute_kw('res.partner', 'create', {
+                pid = await self._execute_kw('res.partner', 'create', [{
                     'name': partner_name or (title or 'KARMASYSTEM Partner'),
                     'phone': phone or '',
                     'customer_rank': 1,
-                })
+                }])
                 vals = {
                     'name': title,
                     'description': description or '',
@@ -244,7 +464,8 @@ class OdooKarmasystemAPI:
                     'discount_text': discount_text or '',
                     'partner_id': pid,
                 }
-                card_id = await self._execute_kw('karmasystem.partner.card', 'create', vals)
+                card_id = await self._execute_kw('karmasystem.partner.card', 'create', [vals])
+                self.invalidate_cache("cards")
                 return {"success": True, "card_id": card_id}
             except Exception:
                 return {"success": False, "error": "model_missing"}
@@ -265,7 +486,8 @@ class OdooKarmasystemAPI:
             try:
                 if not await self.has_partner_card_model():
                     return {"success": False, "error": "model_missing"}
-                await self._execute_kw('karmasystem.partner.card', 'write', [int(card_id)], {'status': status})
+                await self._execute_kw('karmasystem.partner.card', 'write', [[int(card_id)], {'status': status}])
+                self.invalidate_cache("cards")
                 return {"success": True}
             except Exception:
                 return {"success": False, "error": "model_missing"}
@@ -0,0 +1,168 @@
+"""
+Фоновая синхронизация карточек партнеров из Odoo в cards_v2
+
+Каталог читает только локальную БД. Сервис забирает батчами записи
+karmasystem.partner.card, измененные после водяного знака (write_date, id),
+делает upsert в cards_v2 с origin='odoo' и публикует события 'card' в шину инвалидации.
+Карточки, созданные в боте и отправленные в Odoo (origin='local'), не трогаются.
+Карточки с категорией, которой еще нет в боте, откладываются в sync_parked_records:
+водяной знак идет дальше, а отложенные записи повторяются в начале каждого прохода.
+Удаленные в Odoo записи по write_date не видны — скрывать их нужно архивированием.
+
+Env:
+  - ODOO_SYNC_INTERVAL (seconds between passes, default 300)
+  - ODOO_SYNC_BATCH (records per XML-RPC call, default 200)
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SYNC_SOURCE = "odoo.partner_card"
+# Системный партнер-владелец карточек из Odoo (partner_id в cards_v2 обязателен)
+ODOO_PARTNER_TG_ID = 0
+
+# Категории Odoo -> slug категорий бота; карточки из бота приходят уже со slug
+ODOO_CATEGORY_TO_SLUG = {
+    'restaurant': 'restaurants',
+    'spa': 'spa',
+    'transport': 'transport',
+    'hotel': 'hotels',
+    'tours': 'tours',
+    'retail': 'shops',
+}
+# Статусы, которые допускает CHECK cards_v2 в PostgreSQL; 'approved' там нет,
+# одобренная в Odoo карточка уже видна в каталоге
+CARD_STATUSES = frozenset({'draft', 'pending', 'published', 'rejected', 'archived'})
+ODOO_STATUS_TO_STATUS = {'approved': 'published'}
+
+
+def _text(value: Any) -> Optional[str]:
+    # XML-RPC отдает False для пустых полей Odoo
+    if not isinstance(value, str):
+        return None
+    return value.strip() or None
+
+
+def _coordinate(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) and value else None
+
+
+def map_odoo_card(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Запись karmasystem.partner.card -> поля cards_v2; None, если категория не задана"""
+    category = (_text(record.get('category')) or '').lower()
+    slug = ODOO_CATEGORY_TO_SLUG.get(category, category)
+    if not slug:
+        return None
+    if record.get('active') is False:
+        status = 'archived'
+    else:
+        status = _text(record.get('status')) or 'published'
+        status = ODOO_STATUS_TO_STATUS.get(status, status)
+        status = status if status in CARD_STATUSES else 'published'
+    cashback = record.get('cashback_percent')
+    discount_text = _text(record.get('discount_text'))
+    if discount_text is None and cashback not in (None, False):
+        discount_text = f"Cashback {cashback}%"
+    return {
+        'odoo_card_id': int(record['id']),
+        'category_slug': slug,
+        'title': _text(record.get('name')) or 'Без названия',
+        'description': _text(record.get('description')),
+        'contact': _text(record.get('phone')),
+        'address': _text(record.get('address')),
+        'google_maps_url': _text(record.get('google_maps_url')),
+        'discount_text': discount_text,
+        'latitude': _coordinate(record.get('latitude')),
+        'longitude': _coordinate(record.get('longitude')),
+        'status': status,
+    }
+
+
+class OdooCardSyncService:
+    """Инкрементальная синхронизация karmasystem.partner.card -> cards_v2"""
+
+    def __init__(self, api=None, db=None):
+        self._api = api
+        self._db = db
+        self.interval = float(os.getenv("ODOO_SYNC_INTERVAL", "300"))
+        self.batch_size = max(1, int(os.getenv("ODOO_SYNC_BATCH", "200")))
+        self._lock = asyncio.Lock()
+        self._stats = {'runs': 0, 'batches': 0, 'cards': 0, 'skipped': 0, 'errors': 0}
+
+    @property
+    def api(self):
+        if self._api is None:
+            from core.services.odoo_api import odoo_api
+            self._api = odoo_api
+        return self._api
+
+    @property
+    def db(self):
+        if self._db is None:
+            from core.database.db_v2 import db_v2
+            self._db = db_v2
+        return self._db
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.api.is_configured
+
+    async def sync_once(self) -> int:
+        """Забрать все изменения с последнего водяного знака; возвращает число обновленных карточек"""
+        async with self._lock:
+            self._stats['runs'] += 1
+            since, after_id = await self.db.get_sync_watermark(SYNC_SOURCE)
+            total = 0
+            retried = await self.db.retry_parked_odoo_cards(partner_tg_id=ODOO_PARTNER_TG_ID, source=SYNC_SOURCE)
+            if retried:
+                total += len(retried)
+                await self._invalidate(retried)
+            while True:
+                result = await self.api.get_partner_cards_changed(since=since, after_id=after_id, limit=self.batch_size)
+                if not result.get('success'):
+                    self._stats['errors'] += 1
+                    logger.warning(f"Odoo card sync stopped at ({since}, {after_id}): {result.get('error')}")
+                    break
+                records = result.get('cards') or []
+                if not records:
+                    break
+                since, after_id = str(records[-1]['write_date']), int(records[-1]['id'])
+                cards = [card for card in map(map_odoo_card, records) if card]
+                changed = await self.db.upsert_odoo_cards(
+                    cards, partner_tg_id=ODOO_PARTNER_TG_ID, source=SYNC_SOURCE, watermark=(since, after_id)
+                )
+                self._stats['batches'] += 1
+                self._stats['skipped'] += len(records) - len(changed)
+                if changed:
+                    total += len(changed)
+                    await self._invalidate(changed)
+                if len(records) < self.batch_size:
+                    break
+            self._stats['cards'] += total
+            if total:
+                logger.info(f"Odoo card sync: {total} cards updated, watermark ({since}, {after_id})")
+            return total
+
+    async def _invalidate(self, card_ids: List[int]) -> None:
+        # Подписчики 'card': кэш рендера и страницы каталога, у всех инстансов
+        from core.services.invalidation_bus import invalidation_bus
+        await invalidation_bus.publish('card', card_ids)
+
+    async def run_forever(self) -> None:
+        """Фоновая задача: проход синхронизации каждые ODOO_SYNC_INTERVAL секунд"""
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                self._stats['errors'] += 1
+                logger.error(f"Odoo card sync failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+
+odoo_card_sync_service = OdooCardSyncService()
@@ -3,12 +3,17 @@ Payment Service - обработка платежей с ИСПРАВЛЕННО
 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: ЛИБО ТРАТИШЬ, ЛИБО НАКАПЛИВАЕШЬ
 """
 import math
+import time
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Метаданные заведений и конфигурация лояльности меняются редко
+PLACE_CACHE_TTL = 60
+CONFIG_CACHE_TTL = 300
+
 class PaymentService:
     """Сервис для обработки платежей с исправленной логикой баллов"""
     
@@ -16,6 +21,8 @@ class PaymentService:
         self.redeem_rate = 5000.0  # 1 балл = 5000 VND
         self.min_purchase_for_points = 10000  # Минимальная покупка для начисления
         self.max_discount_percent = 40.0  # Максимальная скидка за баллы
+        self._place_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._config_cache: Optional[Tuple[float, Dict[str, Any]]] = None
     
     async def process_sale(self, partner_id: int, place_id: int, operator_id: int,
                           user_id: int, amount_gross: float, points_to_spend: int = 0,
@@ -23,17 +30,19 @@ class PaymentService:
         """
         Обработка продажи с ИСПРАВЛЕННОЙ логикой баллов
         КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: ЛИБО ТРАТИШЬ, ЛИБО НАКАПЛИВАЕШЬ
+        
+        Данные заведения и конфигурация берутся из кэша, льготы считаются
+        в процессе, а продажа, баланс, история и уведомление пишутся
+        одной транзакцией на одном соединении.
         """
         try:
-            from core.services.loyalty_service import loyalty_service
             from core.database.db_v2 import get_connection
             
-            # Получаем данные заведения
+            # Получаем данные заведения и конфигурацию системы (кэш)
             place_data = await self._get_place_data(place_id)
             if not place_data:
                 raise ValueError("Заведение не найдено")
             
-            # Получаем конфигурацию системы
             config = await self._get_loyalty_config()
             
             # ИСПРАВЛЕННАЯ логика начисления
@@ -43,85 +52,148 @@ class PaymentService:
                 redeem_rate=config['redeem_rate'],
                 points_to_spend=points_to_spend
             )
+            net_points_change = points_transaction['net_change']  # earned - spent
             
-            # Рассчитываем льготы
-            calculation = await loyalty_service.calculate_purchase_benefits(
-                user_id, place_id, amount_gross, points_to_spend
-            )
-            
-            with get_connection() as conn:
-                try:
-                    # Создаем продажу
-                    sale_id = await self._create_partner_sale(
-                        partner_id=partner_id,
-                        place_id=place_id,
-                        operator_telegram_id=operator_id,
-                        user_telegram_id=user_id,
-                        amount_gross=amount_gross,
-                        base_discount_pct=calculation['base_discount_pct'],
-                        extra_discount_pct=calculation['extra_discount_pct'],
-                        extra_value=calculation['amount_user_subsidy'],
-                        amount_partner_due=calculation['amount_partner_due'],
-                        amount_user_subsidy=calculation['amount_user_subsidy'],
-                        points_spent=points_transaction['points_spent'],
-                        points_earned=points_transaction['points_earned'],  # Может быть 0!
-                        redeem_rate=config['redeem_rate'],
-                        qr_token=qr_token,
-                        conn=conn
-                    )
-                    
-                    # Обновляем баланс баллов ТОЛЬКО ОДИН РАЗ
-                    net_points_change = points_transaction['net_change']  # earned - spent
-                    
-                    if net_points_change != 0:
-                        await loyalty_service.update_user_points_balance(user_id, net_points_change)
-                    
-                    # Логируем операции отдельно для прозрачности
-                    if points_transaction['points_spent'] > 0:
-                        await loyalty_service.add_points_history(
-                            user_id=user_id,
-                            change_amount=-points_transaction['points_spent'],
-                            reason=f"Оплата в {place_data['title']}",
-                            transaction_type="spent",
-                            sale_id=sale_id
-                        )
-                    
-                    # НАЧИСЛЯЕМ ТОЛЬКО ЕСЛИ НЕ ТРАТИЛИ
-                    if points_transaction['points_earned'] > 0:
-                        await loyalty_service.add_points_history(
-                            user_id=user_id,
-                            change_amount=points_transaction['points_earned'],
-                            reason=f"Покупка в {place_data['title']} (+{place_data.get('loyalty_accrual_pct', 5.0)}%) БЕЗ трат",
-                            transaction_type="earned",
-                            sale_id=sale_id
-                        )
-                    
-                    # Уведомляем с КОРРЕКТНОЙ информацией
-                    notification_text = self.format_sale_notification(
-                        place=place_data,
-                        amount_gross=amount_gross,
-                        calculation=calculation,
-                        points_transaction=points_transaction
+            conn = get_connection()
+            try:
+                # Баланс читаем в той же транзакции, что и списание
+                cursor = conn.execute(
+                    "SELECT points_balance FROM users WHERE telegram_id = ?", (user_id,)
+                )
+                row = cursor.fetchone()
+                user_points = row[0] if row and row[0] else 0
+                
+                # Рассчитываем льготы
+                calculation = self._calculate_benefits(
+                    place_data, config, amount_gross, user_points, points_to_spend
+                )
+                
+                # Создаем продажу
+                sale_id = await self._create_partner_sale(
+                    partner_id=partner_id,
+                    place_id=place_id,
+                    operator_telegram_id=operator_id,
+                    user_telegram_id=user_id,
+                    amount_gross=amount_gross,
+                    base_discount_pct=calculation['base_discount_pct'],
+                    extra_discount_pct=calculation['extra_discount_pct'],
+                    extra_value=calculation['amount_user_subsidy'],
+                    amount_partner_due=calculation['amount_partner_due'],
+                    amount_user_subsidy=calculation['amount_user_subsidy'],
+                    points_spent=points_transaction['points_spent'],
+                    points_earned=points_transaction['points_earned'],  # Может быть 0!
+                    redeem_rate=config['redeem_rate'],
+                    qr_token=qr_token,
+                    conn=conn
+                )
+                
+                now = datetime.now().isoformat()
+                
+                # Обновляем баланс баллов ТОЛЬКО ОДИН РАЗ
+                if net_points_change != 0:
+                    conn.execute(
+                        "UPDATE users SET points_balance = points_balance + ?, updated_at = ? WHERE telegram_id = ?",
+                        (net_points_change, now, user_id)
                     )
-                    
-                    await self._add_notification(user_id, notification_text, "points_change", conn)
-                    
-                    conn.commit()
-                    return {
-                        'sale_id': sale_id,
-                        'calculation': calculation,
-                        'points_transaction': points_transaction,
-                        'notification': notification_text
-                    }
-                    
-                except Exception as e:
-                    conn.rollback()
-                    raise e
+                
+                # Логируем операции отдельно для прозрачности (одним executemany)
+                history_rows = []
+                if points_transaction['points_spent'] > 0:
+                    history_rows.append((
+                        user_id, -points_transaction['points_spent'],
+                        f"Оплата в {place_data['title']}", "spent", sale_id, None, now
+                    ))
+                
+                # НАЧИСЛЯЕМ ТОЛЬКО ЕСЛИ НЕ ТРАТИЛИ
+                if points_transaction['points_earned'] > 0:
+                    history_rows.append((
+                        user_id, points_transaction['points_earned'],
+                        f"Покупка в {place_data['title']} (+{place_data.get('loyalty_accrual_pct', 5.0)}%) БЕЗ трат",
+                        "earned", sale_id, None, now
+                    ))
+                
+                if history_rows:
+                    conn.executemany("""
+                        INSERT INTO points_history 
+                        (user_id, change_amount, reason, transaction_type, sale_id, admin_id, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, history_rows)
+                
+                # Уведомляем с КОРРЕКТНОЙ информацией
+                notification_text = self.format_sale_notification(
+                    place=place_data,
+                    amount_gross=amount_gross,
+                    calculation=calculation,
+                    points_transaction=points_transaction
+                )
+                
+                await self._add_notification(user_id, notification_text, "points_change", conn)
+                
+                conn.commit()
+                
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                conn.close()
+            
+            # Побочные эффекты вне транзакции продажи.
+            # Движок достижений работает и на SQLite (значения читает из users),
+            # новый порог возможен только при начислении; передаём итоговый баланс,
+            # прочитанный в транзакции продажи.
+            if net_points_change > 0:
+                from core.services.achievement_engine import (
+                    achievement_engine, AchievementEvent, COUNTER_LOYALTY_POINTS
+                )
+                await achievement_engine.handle_event(
+                    AchievementEvent.POINTS_CREDITED, user_id,
+                    counter=COUNTER_LOYALTY_POINTS, total=user_points + net_points_change
+                )
+            
+            # Месячный счетчик транзакций для лимитов тарифа
+            from core.services.tariff_service import tariff_service
+            await tariff_service.record_transaction(partner_id)
+            
+            return {
+                'sale_id': sale_id,
+                'calculation': calculation,
+                'points_transaction': points_transaction,
+                'notification': notification_text
+            }
                     
         except Exception as e:
             logger.error(f"Error processing sale: {e}")
             raise
     
+    def _calculate_benefits(self, place_data: Dict[str, Any], config: Dict[str, Any],
+                            amount_gross: float, user_points: int, points_to_spend: int) -> Dict[str, Any]:
+        """Расчет льгот B + E по уже загруженным данным (без обращений к БД)"""
+        from core.services.loyalty_points_service import loyalty_points_service
+        
+        benefits = loyalty_points_service.calculate_loyalty_benefits(
+            amount_gross=amount_gross,
+            base_discount_pct=place_data.get('base_discount_pct', 0.0),
+            user_points_balance=user_points,
+            redeem_rate=config['redeem_rate'],
+            max_percent_per_bill=place_data.get('max_percent_per_bill', 50.0),
+            points_to_spend=points_to_spend
+        )
+        
+        # Применяем правило округления
+        if config.get('rounding_rule') == 'bankers':
+            for key in ('final_user_price', 'amount_partner_due', 'amount_user_subsidy'):
+                benefits[key] = loyalty_points_service.apply_bankers_rounding(benefits[key])
+        
+        return benefits
+    
+    def invalidate_cache(self, place_id: Optional[int] = None) -> None:
+        """Сбросить кэш заведений (или одного заведения) и конфигурации"""
+        if place_id is None:
+            self._place_cache.clear()
+        else:
+            self._place_cache.pop(place_id, None)
+        self._config_cache = None
+    
     def calculate_points_transaction(self, amount_gross: float, accrual_pct: float, 
                                    redeem_rate: float, points_to_spend: int = 0) -> Dict[str, Any]:
         """
@@ -175,6 +247,10 @@ class PaymentService:
     
     async def _get_place_data(self, place_id: int) -> Optional[Dict[str, Any]]:
         """Получить данные заведения"""
+        cached = self._place_cache.get(place_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
         try:
             from core.database.db_v2 import get_connection
             
@@ -187,13 +263,15 @@ class PaymentService:
                 result = cursor.fetchone()
                 
                 if result:
-                    return {
+                    place_data = {
                         'base_discount_pct': result[0] or 0.0,
                         'loyalty_accrual_pct': result[1] or 5.0,
                         'min_redeem': result[2] or 0,
                         'max_percent_per_bill': result[3] or 50.0,
                         'title': result[4]
                     }
+                    self._place_cache[place_id] = (time.monotonic() + PLACE_CACHE_TTL, place_data)
+                    return place_data
                 return None
                 
         except Exception as e:
@@ -202,6 +280,9 @@ class PaymentService:
     
     async def _get_loyalty_config(self) -> Dict[str, Any]:
         """Получить конфигурацию системы лояльности"""
+        if self._config_cache and self._config_cache[0] > time.monotonic():
+            return self._config_cache[1]
+        
         try:
             from core.database.db_v2 import get_connection
             
@@ -214,17 +295,19 @@ class PaymentService:
                 result = cursor.fetchone()
                 
                 if result:
-                    return {
+                    config = {
                         'redeem_rate': result[0] or 5000.0,
                         'rounding_rule': result[1] or 'bankers',
                         'max_accrual_percent': result[2] or 20.0
                     }
                 else:
-                    return {
+                    config = {
                         'redeem_rate': 5000.0,
                         'rounding_rule': 'bankers',
                         'max_accrual_percent': 20.0
                     }
+                self._config_cache = (time.monotonic() + CONFIG_CACHE_TTL, config)
+                return config
                     
         except Exception as e:
             logger.error(f"Error getting loyalty config: {e}")
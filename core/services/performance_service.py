@@ -11,9 +11,13 @@ from datetime import datetime, timedelta
 import json
 
 from .cache import cache_service
+from .invalidation_bus import invalidation_bus
 
 logger = logging.getLogger(__name__)
 
+# Поколение ключей каталога: инкремент разом делает недействительными все закэшированные страницы
+CATALOG_GENERATION_KEY = "catalog:generation"
+
 
 class PerformanceMonitor:
     """Мониторинг производительности запросов"""
@@ -96,7 +100,8 @@ class QueryOptimizer:
                     sub_slug = bound_args.arguments.get('sub_slug', 'all')
                     page = bound_args.arguments.get('page', 1)
                     city_id = bound_args.arguments.get('city_id', 'none')
-                    unique_key = f"catalog:{slug}:{sub_slug}:{page}:{city_id}"
+                    generation = await cache_service.get(CATALOG_GENERATION_KEY) or 0
+                    unique_key = f"catalog:{generation}:{slug}:{sub_slug}:{page}:{city_id}"
                     # Используем короткий TTL для каталога
                     ttl = self.cache_ttl.get('catalog', 30)
                 else:
@@ -118,9 +123,10 @@ class QueryOptimizer:
                     # Записываем метрику
                     self.monitor.record_query(func.__name__, duration_ms, kwargs)
                     
-                    # Сохраняем в кэш
-                    await cache_service.set(unique_key, json.dumps(result), ex=ttl)
-                    logger.debug(f"💾 Cached: {unique_key} (TTL: {ttl}s)")
+                    # Сохраняем в кэш (None не кэшируем: "null" при чтении дал бы пустой ответ)
+                    if result is not None:
+                        await cache_service.set(unique_key, json.dumps(result), ex=ttl)
+                        logger.debug(f"💾 Cached: {unique_key} (TTL: {ttl}s)")
                     
                     return result
                 except Exception as e:
@@ -131,6 +137,13 @@ class QueryOptimizer:
             return wrapper
         return decorator
     
+    async def invalidate(self, cache_key: str) -> None:
+        """Сбросить кэш запроса; для каталога — все страницы сразу сменой поколения ключей"""
+        if cache_key == "catalog":
+            await cache_service.incr(CATALOG_GENERATION_KEY)
+        else:
+            await cache_service.delete(cache_key)
+    
     def batch_query(self, queries: List[Callable], batch_size: int = 10):
         """Выполнение запросов батчами для оптимизации"""
         async def execute_batch():
@@ -280,6 +293,19 @@ def cached_query(cache_key: str, ttl: int = 300):
     return performance_service.optimizer.cached_query(cache_key, ttl)
 
 
+async def invalidate_cached_query(cache_key: str) -> None:
+    """Сбросить кэш, заполненный декоратором cached_query"""
+    await performance_service.optimizer.invalidate(cache_key)
+
+
+async def _invalidate_catalog(_ids) -> None:
+    await invalidate_cached_query("catalog")
+
+# Страницы каталога содержат карточки, имена партнеров и категории
+for _kind in ("card", "partner", "category"):
+    invalidation_bus.register(_kind, _invalidate_catalog)
+
+
 def monitor_performance(func_name: str = None):
     """Декоратор для мониторинга производительности"""
     def decorator(func: Callable):
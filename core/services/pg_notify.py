@@ -9,95 +9,60 @@ except Exception:
     asyncpg = None
 
 from ..settings import settings
-from .cache import cache_service
-from ..utils.telemetry import log_event
+from .invalidation_bus import CHANNEL, TRIGGER_BACKED_KINDS, InvalidationBus, ReconnectingListener
 
 logger = logging.getLogger(__name__)
 
 
-class PGNotifyListener:
-    """LISTEN/NOTIFY consumer for cache invalidation.
-    Non-breaking: if asyncpg or PG URL unavailable, runs as no-op with logs.
-    """
-
-    def __init__(self, dsn: str, channel: str = "cache_invalidation"):
-        self._dsn = dsn
-        self._channel = channel
-        self._conn: Optional[any] = None
-        self._task: Optional[asyncio.Task] = None
-        self._stop = asyncio.Event()
+class PGNotifyListener(ReconnectingListener):
+    """LISTEN/NOTIFY transport of the cache invalidation bus.
 
-    async def start(self):
-        if not settings.features.listen_notify:
-            logger.info("PGNotifyListener disabled by feature flag")
-            return
-        if not asyncpg or not self._dsn.startswith("postgresql+"):
-            logger.warning("PGNotifyListener not started (no asyncpg or DSN not Postgres)")
-            return
+    Payloads go to InvalidationBus.handle_payload (coalesced there, no task per NOTIFY).
+    A lost connection is detected by asyncpg's termination callback or a failed ping;
+    the listener reconnects with backoff and the bus resyncs after reconnect.
+    Events of trigger_kinds are sent by the table triggers, not by send().
+    """
+    trigger_kinds = TRIGGER_BACKED_KINDS
+
+    def __init__(self, dsn: str, bus: InvalidationBus, channel: str = CHANNEL):
+        super().__init__(bus, channel)
+        self._dsn = dsn.replace("+asyncpg", "")
+        self._conn: Optional[Any] = None
+        self._lock = asyncio.Lock()  # asyncpg connection: one operation at a time
+        self.ping_interval = float(os.getenv("PG_NOTIFY_PING_INTERVAL", "10"))
+
+    async def send(self, payload: str) -> None:
+        if self._conn is None:
+            raise ConnectionError("PG LISTEN connection is down")
+        async with self._lock:
+            await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def _session(self) -> None:
+        conn = await asyncpg.connect(self._dsn)
+        lost = asyncio.Event()
         try:
-            self._conn = await asyncpg.connect(self._dsn.replace("+asyncpg", ""))
-            await self._conn.add_listener(self._channel, self._on_notify)
-            await self._conn.execute(f"LISTEN {self._channel};")
-            logger.info(f"✅ PG LISTEN started on channel '{self._channel}'")
-            self._task = asyncio.create_task(self._watchdog())
-        except Exception as e:
-            logger.warning(f"PGNotifyListener start failed: {e}")
-
-    async def stop(self):
-        self._stop.set()
-        if self._task:
+            conn.add_termination_listener(lambda _conn: lost.set())
+            await conn.add_listener(self.channel, self._on_notify)
+            self._conn = conn
+            self._on_connected()
+            logger.info(f"✅ PG LISTEN started on channel '{self.channel}'")
+            while not self._stop.is_set():
+                await self._wait_any(self.ping_interval, lost)
+                if lost.is_set():
+                    raise ConnectionError("PG LISTEN connection terminated")
+                if not self._stop.is_set():
+                    async with self._lock:
+                        await conn.execute("SELECT 1")
+        finally:
+            self._conn = None
             try:
-                await asyncio.wait_for(self._task, timeout=2)
+                await conn.close(timeout=2)
             except Exception:
-                pass
-        try:
-            if self._conn:
-                await self._conn.close()
-        except Exception:
-            pass
-
-    async def _watchdog(self):
-        # Keep connection alive, periodically ping
-        while not self._stop.is_set():
-            await asyncio.sleep(30)
-            try:
-                if self._conn:
-                    await self._conn.execute("SELECT 1;")
-            except Exception as e:
-                logger.warning(f"PGNotifyListener ping failed: {e}")
+                conn.terminate()
 
     def _on_notify(self, connection, pid, channel, payload):
-        # Expected payload: JSON with {type, city_id, category, partner_profile_id}
-        logger.info(f"📣 PG NOTIFY: channel={channel} payload={payload}")
-        # Safe parse and delete by mask
-        try:
-            import json
-            data = json.loads(payload)
-            # telemetry (fire-and-forget)
-            try:
-                import asyncio; asyncio.create_task(log_event("cache_invalidate_event_received", source="pg_notify", **{k: data.get(k) for k in ("type","city_id","category","category_id","partner_profile_id")}))
-            except Exception:
-                pass
-            if data.get("type") == "catalog":
-                city_id = data.get("city_id", "*")
-                category = data.get("category") or data.get("category_id") or "*"
-                mask = f"catalog:{city_id}:{category}:*"
-                asyncio.create_task(cache_service.delete_by_mask(mask))
-                try:
-                    import asyncio; asyncio.create_task(log_event("cache_invalidate_delete_scheduled", type="catalog", mask=mask))
-                except Exception:
-                    pass
-            elif data.get("type") == "partner_cab":
-                partner_id = data.get("partner_profile_id", "*")
-                category = data.get("category") or data.get("category_id") or "*"
-                mask = f"partner_cab:{partner_id}:{category}:*"
-                asyncio.create_task(cache_service.delete_by_mask(mask))
-                try:
-                    import asyncio; asyncio.create_task(log_event("cache_invalidate_delete_scheduled", type="partner_cab", mask=mask))
-                except Exception:
-                    pass
-        except Exception as e:
-            logger.warning(f"PGNotifyListener payload error: {e}")
+        logger.debug(f"📣 PG NOTIFY: channel={channel} payload={payload}")
+        self.bus.handle_payload(payload)
 
 
 def _get_db_url():
@@ -109,29 +74,9 @@ def _get_db_url():
     )
 
 def _is_postgres(url: str | None) -> bool:
-    return bool(url and (url.startswith("postgres://") or url.startswith("postgresql://")))
+    return bool(url and url.startswith(("postgres://", "postgresql://", "postgresql+asyncpg://")))
 
 def _pg_notify_enabled() -> bool:
     # Включается либо флагом окружения, либо фичей в конфиге
     return os.getenv("ENABLE_PG_NOTIFY", "0") == "1" or \
            getattr(getattr(settings, "features", None), "listen_notify", False)
-
-class NoopPGNotifyListener:
-    def __init__(self, *_args, **_kwargs): 
-        pass
-    async def start(self): 
-        pass
-    async def stop(self): 
-        pass
-
-# Инициализация с безопасным фолбэком
-try:
-    DB_URL = _get_db_url()
-    if _pg_notify_enabled() and _is_postgres(DB_URL):
-        pg_notify_listener = PGNotifyListener(DB_URL)
-    else:
-        print(f"[pg_notify] disabled or not Postgres (url={DB_URL}); using Noop")
-        pg_notify_listener = NoopPGNotifyListener()
-except Exception as e:
-    print(f"[pg_notify] init failed: {e}. Using Noop.")
-    pg_notify_listener = NoopPGNotifyListener()
@@ -3,12 +3,12 @@ Service layer for plastic cards functionality.
 Handles card binding, validation, management, and generation.
 """
 from typing import Optional, Dict, Any, List
+import asyncio
 import os
 import asyncpg
 from datetime import datetime
-import csv
-import io
 
+from core.settings import settings
 from core.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -93,6 +93,11 @@ class PlasticCardsService:
                     telegram_id, card_id, card_id_printable or card_id, qr_url, datetime.now()
                 )
                 
+                from core.services.achievement_engine import achievement_engine, AchievementEvent
+                await achievement_engine.handle_event(
+                    AchievementEvent.CARD_BOUND, telegram_id, card_count=existing_cards_count + 1
+                )
+                
                 return {
                     'success': True,
                     'message': f'Карта {card_id_printable or card_id} успешно привязана к вашему аккаунту!',
@@ -192,6 +197,9 @@ class PlasticCardsService:
                 
                 conn.commit()
                 
+                from core.services.achievement_engine import achievement_engine, AchievementEvent
+                await achievement_engine.handle_event(AchievementEvent.CARD_UNBOUND, telegram_id)
+                
                 return {
                     'success': True,
                     'message': f'Карта {card_id} успешно отвязана от вашего аккаунта.'
@@ -221,90 +229,111 @@ class PlasticCardsService:
         # Check if card ID contains only alphanumeric characters
         return card_id.replace('-', '').replace('_', '').isalnum()
     
-    async def generate_cards(self, count: int, created_by: int) -> Dict[str, Any]:
+    async def generate_cards(
+        self,
+        count: int,
+        created_by: int,
+        csv_path: Optional[str] = None,
+        pdf_path: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Generate new plastic cards (Super Admin only).
         
+        On PostgreSQL delegates to the bulk generator in CardService (COPY under
+        an advisory lock); on SQLite the range is reserved by BEGIN IMMEDIATE and
+        inserted with one executemany. Both stream the CSV to a file.
+        
         Args:
             count: Number of cards to generate
             created_by: Admin who created the cards
+            csv_path: Where to write the CSV (a temp file by default)
+            pdf_path: Optional path for a print-ready PDF sheet of QR codes
             
         Returns:
-            dict: Result with success status and CSV data
+            dict: Result with success status and CSV path
         """
+        from core.services.card_service import card_service
+        
+        if self.database_url.startswith("postgresql"):
+            return await card_service.generate_cards(count, created_by, csv_path=csv_path, pdf_path=pdf_path)
+        
         try:
-            with self.get_connection() as conn:
-                # Get the last card ID to continue sequence
-                cursor = conn.execute(
-                    "SELECT card_id FROM cards_generated ORDER BY id DESC LIMIT 1"
-                )
-                last_card = cursor.fetchone()
-                
-                if last_card:
-                    # Extract number from last card ID (e.g., KS12340001 -> 12340001)
-                    last_number = int(last_card['card_id'][2:])  # Remove 'KS' prefix
-                    start_number = last_number + 1
-                else:
-                    start_number = 12340001  # Starting number
-                
-                generated_cards = []
-                
-                for i in range(count):
-                    card_number = start_number + i
-                    card_id = f"KS{card_number}"
-                    card_id_printable = f"KS-{str(card_number)[:4]}-{str(card_number)[4:]}"
-                    qr_url = f"https://t.me/KarmaQRBot?startapp=bind&cid={card_id}"
-                    
-                    # Insert into cards_generated table
-                    conn.execute("""
-                        INSERT INTO cards_generated 
-                        (card_id, card_id_printable, qr_url, created_by, created_at)
-                        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    """, (card_id, card_id_printable, qr_url, created_by))
-                    
-                    generated_cards.append({
-                        'card_id': card_id,
-                        'card_id_printable': card_id_printable,
-                        'qr_url': qr_url
-                    })
-                
-                conn.commit()
-                
-                # Generate CSV content
-                csv_content = self._generate_csv(generated_cards)
-                
+            if not 1 <= count <= settings.karma.card_generation_limit:
                 return {
-                    'success': True,
-                    'message': f'Успешно сгенерировано {count} карт.',
-                    'cards': generated_cards,
-                    'csv_content': csv_content
+                    'success': False,
+                    'message': f'Неверное количество карт. Допустимо: 1-{settings.karma.card_generation_limit}',
+                    'error_code': 'invalid_count'
                 }
-                
+            
+            created = await asyncio.to_thread(self._insert_generated_cards_sqlite, count, created_by)
+            
+            csv_path = await asyncio.to_thread(card_service.write_cards_csv, created, csv_path)
+            if pdf_path:
+                await asyncio.to_thread(card_service.write_cards_pdf, created, pdf_path)
+            
+            logger.info(f"Generated {len(created)} cards for admin {created_by}")
+            
+            return {
+                'success': True,
+                'message': f'Успешно создано {len(created)} карт',
+                'created_count': len(created),
+                'range': f"{created[0]['card_id_printable']} - {created[-1]['card_id_printable']}",
+                'csv_path': csv_path,
+                'pdf_path': pdf_path
+            }
+            
         except Exception as e:
             logger.error(f"Error generating cards: {str(e)}")
             return {
                 'success': False,
-                'message': 'Произошла ошибка при генерации карт.',
-                'error_code': 'database_error'
+                'message': f'Ошибка при генерации карт: {str(e)}',
+                'error_code': 'generation_error'
             }
     
-    def _generate_csv(self, cards: List[Dict[str, Any]]) -> str:
-        """Generate CSV content for cards."""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['card_id', 'card_id_printable', 'qr_url'])
-        
-        # Write card data
-        for card in cards:
-            writer.writerow([
-                card['card_id'],
-                card['card_id_printable'],
-                card['qr_url']
-            ])
+    def _insert_generated_cards_sqlite(self, count: int, created_by: int) -> List[Dict[str, Any]]:
+        """Reserve the next number range and insert it in one SQLite transaction."""
+        from core.database.db_v2 import get_connection
+        from core.services.card_service import card_service
         
-        return output.getvalue()
+        prefix = settings.cards.prefix
+        conn = get_connection()
+        try:
+            # Write lock up front: concurrent generations queue here instead of sharing a range
+            conn.execute("BEGIN IMMEDIATE")
+            last_number = conn.execute(
+                "SELECT MAX(CAST(substr(card_id, ?) AS INTEGER)) FROM cards_generated WHERE card_id LIKE ?",
+                (len(prefix) + 1, f"{prefix}%")
+            ).fetchone()[0]
+            start_number = settings.cards.start_number if last_number is None else last_number + 1
+            
+            created = []
+            for number in range(start_number, start_number + count):
+                card_id = card_service.generate_card_id(number)
+                created.append({
+                    'card_id': card_id,
+                    'card_id_printable': card_service.generate_card_id_printable(number),
+                    'qr_url': card_service.generate_qr_url(card_id)
+                })
+            
+            conn.executemany("""
+                INSERT INTO cards_generated 
+                (card_id, card_id_printable, qr_url, created_by, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, [(card['card_id'], card['card_id_printable'], card['qr_url'], created_by) for card in created])
+            
+            conn.execute("""
+                INSERT INTO admin_logs 
+                (admin_id, action, reason, created_at)
+                VALUES (?, 'generate_cards', ?, CURRENT_TIMESTAMP)
+            """, (created_by, f"Создано {count} карт, диапазон: {created[0]['card_id']}-{created[-1]['card_id']}"))
+            
+            conn.commit()
+            return created
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     async def block_card(self, card_id: str, admin_id: int, reason: str = "") -> Dict[str, Any]:
         """
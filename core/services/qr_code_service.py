@@ -8,8 +8,14 @@ Handles QR code generation, validation, and redemption
 import qrcode
 import qrcode.image.svg
 from io import BytesIO
+import asyncio
 import base64
+import hashlib
+import json
+import os
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -23,6 +29,50 @@ from core.common.exceptions import NotFoundError, ValidationError, BusinessLogic
 
 logger = get_logger(__name__)
 
+QR_IMAGE_FORMATS = ("png", "svg")
+QR_RENDER_CACHE_SIZE = 512
+# Only these fields are encoded into the code; the rest lives in qr_codes
+QR_PAYLOAD_FIELDS = ("qr_id", "user_id", "discount_type", "discount_value", "expires_at")
+
+# Rendering is CPU-bound (matrix + PNG encode), so it runs off the event loop
+_render_executor = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1),
+    thread_name_prefix="qr-render"
+)
+# LRU of rendered data URIs keyed by sha256(format + canonical payload)
+_render_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _qr_payload(qr_data: Dict[str, Any]) -> str:
+    """Canonical QR text: the encoded fields only, in a stable order"""
+    return json.dumps(
+        {field: qr_data.get(field) for field in QR_PAYLOAD_FIELDS},
+        default=str,
+        sort_keys=True,
+        separators=(",", ":")
+    )
+
+
+def _render_qr(payload: str, image_format: str) -> str:
+    """Render a QR payload to a data URI (runs in the render pool)"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    
+    if image_format == "svg":
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        return f"data:image/svg+xml;base64,{base64.b64encode(img.to_string()).decode()}"
+    
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
 
 class QRCodeService:
     """Service for managing QR codes and discounts"""
@@ -36,7 +86,8 @@ class QRCodeService:
         discount_type: str = "loyalty_points",
         discount_value: int = 100,
         expires_in_hours: int = 24,
-        description: str = "Скидка за баллы лояльности"
+        description: str = "Скидка за баллы лояльности",
+        image_format: str = "png"
     ) -> Dict[str, Any]:
         """
         Generate a new QR code for discount redemption
@@ -47,6 +98,7 @@ class QRCodeService:
             discount_value: Value of the discount
             expires_in_hours: Hours until QR code expires
             description: Description of the discount
+            image_format: Image format of the QR code ("png" or "svg")
             
         Returns:
             Dict containing QR code data and image
@@ -67,8 +119,7 @@ class QRCodeService:
                 "user_id": user_id,
                 "discount_type": discount_type,
                 "discount_value": discount_value,
-                "expires_at": datetime.utcnow() + timedelta(hours=expires_in_hours),
-                "created_at": datetime.utcnow()
+                "expires_at": datetime.utcnow() + timedelta(hours=expires_in_hours)
             }
             
             # Create QR code record in database
@@ -88,7 +139,7 @@ class QRCodeService:
             await self.db.commit()
             
             # Generate QR code image
-            qr_image = await self._generate_qr_image(qr_data)
+            qr_image = await self._generate_qr_image(qr_data, image_format)
             
             return {
                 "qr_id": qr_id,
@@ -105,38 +156,66 @@ class QRCodeService:
             logger.error(f"Error generating QR code: {e}")
             raise BusinessLogicError(f"Failed to generate QR code: {str(e)}")
     
-    async def _generate_qr_image(self, qr_data: Dict[str, Any]) -> str:
-        """Generate QR code image as base64 string"""
+    async def _generate_qr_image(self, qr_data: Dict[str, Any], image_format: str = "png") -> str:
+        """Generate QR code image as base64 data URI (PNG or SVG)"""
         try:
-            # Create QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            
-            # Encode QR data as JSON string
-            import json
-            qr_string = json.dumps(qr_data, default=str)
-            qr.add_data(qr_string)
-            qr.make(fit=True)
-            
-            # Create image
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convert to base64
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            buffer.seek(0)
-            
-            img_base64 = base64.b64encode(buffer.getvalue()).decode()
-            return f"data:image/png;base64,{img_base64}"
+            return (await self.render_qr_images([qr_data], image_format))[0]
             
         except Exception as e:
             logger.error(f"Error generating QR image: {e}")
             raise BusinessLogicError(f"Failed to generate QR image: {str(e)}")
     
+    async def render_qr_images(
+        self,
+        payloads: List[Dict[str, Any]],
+        image_format: str = "png"
+    ) -> List[str]:
+        """
+        Render many QR payloads at once
+        
+        Args:
+            payloads: QR data dicts; only QR_PAYLOAD_FIELDS are encoded into the code
+            image_format: "png" or "svg" (SVG skips raster encoding and scales losslessly)
+            
+        Returns:
+            Data URIs in the same order as payloads
+        """
+        if image_format not in QR_IMAGE_FORMATS:
+            raise ValidationError(f"Unsupported QR image format: {image_format}")
+        
+        loop = asyncio.get_running_loop()
+        images: List[Optional[str]] = [None] * len(payloads)
+        pending: Dict[str, Tuple[str, List[int]]] = {}
+        
+        for index, qr_data in enumerate(payloads):
+            payload = _qr_payload(qr_data)
+            key = hashlib.sha256(f"{image_format}:{payload}".encode()).hexdigest()
+            
+            cached = _render_cache.get(key)
+            if cached is not None:
+                _render_cache.move_to_end(key)
+                images[index] = cached
+            elif key in pending:
+                # Same payload twice in one batch - render once
+                pending[key][1].append(index)
+            else:
+                pending[key] = (payload, [index])
+        
+        if pending:
+            keys = list(pending)
+            rendered = await asyncio.gather(*(
+                loop.run_in_executor(_render_executor, _render_qr, pending[key][0], image_format)
+                for key in keys
+            ))
+            for key, image in zip(keys, rendered):
+                for index in pending[key][1]:
+                    images[index] = image
+                _render_cache[key] = image
+                if len(_render_cache) > QR_RENDER_CACHE_SIZE:
+                    _render_cache.popitem(last=False)
+        
+        return images
+    
     async def validate_qr_code(self, qr_id: str) -> Dict[str, Any]:
         """
         Validate QR code and return discount information
@@ -218,38 +297,51 @@ class QRCodeService:
             Dict containing redemption result
         """
         try:
-            # Validate QR code first
-            validation = await self.validate_qr_code(qr_id)
-            if not validation["valid"]:
-                return {
-                    "success": False,
-                    "error": validation["error"]
-                }
-            
-            # Get QR code record
+            # Single conditional update: only one concurrent scan can flip is_used
+            qr_table = QRCode.__table__
+            redeemed_at = datetime.utcnow()
             result = await self.db.execute(
-                select(QRCode).where(QRCode.qr_id == qr_id)
+                update(qr_table)
+                .where(
+                    and_(
+                        qr_table.c.qr_id == qr_id,
+                        qr_table.c.is_used == False,
+                        qr_table.c.expires_at > redeemed_at
+                    )
+                )
+                .values(
+                    is_used=True,
+                    used_at=redeemed_at,
+                    used_by_partner_id=partner_id,
+                    updated_at=redeemed_at
+                )
+                .returning(
+                    qr_table.c.user_id,
+                    qr_table.c.discount_type,
+                    qr_table.c.discount_value,
+                    qr_table.c.description
+                )
             )
-            qr_code = result.scalar_one()
-            
-            # Mark as used
-            qr_code.is_used = True
-            qr_code.used_at = datetime.utcnow()
-            qr_code.used_by_partner_id = partner_id
-            
+            row = result.first()
             await self.db.commit()
             
+            if row is None:
+                return {
+                    "success": False,
+                    "error": await self._redemption_failure_reason(qr_id)
+                }
+            
             # Log the redemption
             logger.info(f"QR code {qr_id} redeemed by partner {partner_id} ({partner_name})")
             
             return {
                 "success": True,
                 "qr_id": qr_id,
-                "user_id": qr_code.user_id,
-                "discount_type": qr_code.discount_type,
-                "discount_value": qr_code.discount_value,
-                "description": qr_code.description,
-                "redeemed_at": qr_code.used_at.isoformat(),
+                "user_id": row.user_id,
+                "discount_type": row.discount_type,
+                "discount_value": row.discount_value,
+                "description": row.description,
+                "redeemed_at": redeemed_at.isoformat(),
                 "partner_id": partner_id,
                 "partner_name": partner_name
             }
@@ -262,6 +354,20 @@ class QRCodeService:
                 "error": f"Redemption error: {str(e)}"
             }
     
+    async def _redemption_failure_reason(self, qr_id: str) -> str:
+        """Explain why the conditional redemption update matched no rows"""
+        qr_table = QRCode.__table__
+        result = await self.db.execute(
+            select(qr_table.c.is_used, qr_table.c.expires_at).where(qr_table.c.qr_id == qr_id)
+        )
+        row = result.first()
+        
+        if row is None:
+            return "QR code not found"
+        if row.is_used:
+            return "QR code already used"
+        return "QR code expired"
+    
     async def get_user_qr_codes(
         self, 
         user_id: int, 
@@ -95,6 +95,10 @@ class ReferralService:
                 f"Бонус за регистрацию по приглашению"
             )
             
+            # Счётчик рефералов приглашающего для движка достижений
+            from core.services.achievement_engine import achievement_engine, AchievementEvent
+            await achievement_engine.handle_event(AchievementEvent.REFERRAL_ADDED, inviter_id)
+            
             logger.info(f"Referral processed: {inviter_id} -> {invited_user_id}")
             return True
             
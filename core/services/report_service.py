@@ -1,14 +1,44 @@
 """
 Сервис генерации отчётов для AI-ассистента
 """
+import asyncio
+import csv
+import io
 import logging
-from typing import Dict, Any, List, Optional
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, AsyncIterator, Awaitable, Callable, IO, Tuple
 from datetime import datetime, timedelta
+
+from aiogram.types import InputFile
+
 from core.services.user_service import get_user_role
 from core.database.db_v2 import DatabaseServiceV2
 
 logger = logging.getLogger(__name__)
 
+# Экспорт читает продажи порциями и пишет во временный файл:
+# до EXPORT_SPOOL_MAX_SIZE байт в памяти, дальше — на диск
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+EXPORT_FORMATS = ("csv", "xlsx")
+
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+
+class SpooledInputFile(InputFile):
+    """Загрузка документа в Telegram из (spooled) временного файла кусками"""
+    
+    def __init__(self, file: IO[bytes], filename: str, chunk_size: int = 64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+    
+    async def read(self, bot) -> AsyncIterator[bytes]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
 
 class ReportService:
     """Сервис для генерации отчётов по ролям"""
@@ -92,8 +122,10 @@ class ReportService:
             scope["type"] = "admin_data"
             if "partner_id" in params:
                 scope["partner_id"] = params["partner_id"]
-            if "city" in params:
-                scope["city"] = params["city"]
+            # Города хранятся только идентификатором (partner_places.city_id)
+            city_id = params.get("city_id", params.get("city"))
+            if city_id is not None:
+                scope["city_id"] = int(city_id)
         
         return scope
     
@@ -110,12 +142,13 @@ class ReportService:
         elif scope["type"] == "partner_data":
             # Данные партнёра
             partner_id = scope["partner_id"]
-            data["sales"] = self._get_partner_sales(partner_id, period)
+            data["sales"] = self._get_sales_summary(period, partner_id)
             data["places"] = self._get_partner_places(partner_id)
             
         elif scope["type"] == "admin_data":
-            # Админские данные
-            data["all_sales"] = self._get_all_sales(period)
+            # Админские данные: в текстовом отчёте только агрегаты,
+            # построчная выгрузка — через export_report
+            data["all_sales"] = self._get_sales_summary(period, scope.get("partner_id"))
             data["partners"] = self._get_partners_stats(period)
             data["cities"] = self._get_cities_stats(period)
         
@@ -124,7 +157,7 @@ class ReportService:
     def _get_user_purchases(self, user_id: int, period: Dict[str, datetime]) -> List[Dict]:
         """Получает покупки пользователя"""
         query = """
-        SELECT ps.*, pp.name as place_name, pp.address
+        SELECT ps.*, pp.title as place_name, pp.address
         FROM partner_sales ps
         JOIN partner_places pp ON ps.place_id = pp.id
         WHERE ps.user_telegram_id = ? 
@@ -143,47 +176,43 @@ class ReportService:
         """
         return self.db.execute_query(query, (user_id, period["start"], period["end"]))
     
-    def _get_partner_sales(self, partner_id: int, period: Dict[str, datetime]) -> List[Dict]:
-        """Получает продажи партнёра"""
+    def _get_sales_summary(self, period: Dict[str, datetime], partner_id: Optional[int] = None) -> Dict[str, Any]:
+        """Получает агрегаты продаж за период (без выгрузки строк)"""
         query = """
-        SELECT ps.*, pp.name as place_name, pp.address
+        SELECT
+            COUNT(ps.id) as sales_count,
+            COALESCE(SUM(ps.amount_gross), 0) as total_gross,
+            COALESCE(SUM(ps.amount_partner_due), 0) as total_due
         FROM partner_sales ps
-        JOIN partner_places pp ON ps.place_id = pp.id
-        WHERE ps.partner_id = ? 
-        AND ps.created_at >= ? AND ps.created_at <= ?
-        ORDER BY ps.created_at DESC
+        WHERE ps.created_at >= ? AND ps.created_at <= ?
         """
-        return self.db.execute_query(query, (partner_id, period["start"], period["end"]))
+        params: Tuple[Any, ...] = (period["start"], period["end"])
+        if partner_id is not None:
+            query += " AND ps.partner_id = ?"
+            params += (partner_id,)
+        rows = self.db.execute_query(query, params)
+        if not rows:
+            return {"sales_count": 0, "total_gross": 0, "total_due": 0}
+        row = rows[0]
+        return {"sales_count": row[0] or 0, "total_gross": row[1] or 0, "total_due": row[2] or 0}
     
     def _get_partner_places(self, partner_id: int) -> List[Dict]:
         """Получает заведения партнёра"""
         query = "SELECT * FROM partner_places WHERE partner_id = ?"
         return self.db.execute_query(query, (partner_id,))
     
-    def _get_all_sales(self, period: Dict[str, datetime]) -> List[Dict]:
-        """Получает все продажи (для админов)"""
-        query = """
-        SELECT ps.*, pp.name as place_name, pp.address, p.name as partner_name
-        FROM partner_sales ps
-        JOIN partner_places pp ON ps.place_id = pp.id
-        JOIN partners p ON ps.partner_id = p.id
-        WHERE ps.created_at >= ? AND ps.created_at <= ?
-        ORDER BY ps.created_at DESC
-        """
-        return self.db.execute_query(query, (period["start"], period["end"]))
-    
     def _get_partners_stats(self, period: Dict[str, datetime]) -> List[Dict]:
         """Получает статистику по партнёрам"""
         query = """
         SELECT 
-            p.id, p.name,
+            p.id, p.title,
             COUNT(ps.id) as sales_count,
             SUM(ps.amount_gross) as total_gross,
             SUM(ps.amount_partner_due) as total_due
         FROM partners p
         LEFT JOIN partner_sales ps ON p.id = ps.partner_id 
             AND ps.created_at >= ? AND ps.created_at <= ?
-        GROUP BY p.id, p.name
+        GROUP BY p.id, p.title
         ORDER BY total_gross DESC
         """
         return self.db.execute_query(query, (period["start"], period["end"]))
@@ -192,13 +221,13 @@ class ReportService:
         """Получает статистику по городам"""
         query = """
         SELECT 
-            pp.city,
+            pp.city_id,
             COUNT(ps.id) as sales_count,
             SUM(ps.amount_gross) as total_gross
         FROM partner_places pp
         LEFT JOIN partner_sales ps ON pp.id = ps.place_id 
             AND ps.created_at >= ? AND ps.created_at <= ?
-        GROUP BY pp.city
+        GROUP BY pp.city_id
         ORDER BY total_gross DESC
         """
         return self.db.execute_query(query, (period["start"], period["end"]))
@@ -229,32 +258,213 @@ class ReportService:
             report_lines.append("🤝 **Отчёт партнёра**")
             report_lines.append(f"📅 Период: {period['start'].strftime('%d.%m.%Y')} - {period['end'].strftime('%d.%m.%Y')}")
             
-            sales = data.get("sales", [])
+            sales = data.get("sales", {})
             places = data.get("places", [])
             
             report_lines.append(f"🏪 Заведений: {len(places)}")
-            report_lines.append(f"🛒 Продаж: {len(sales)}")
+            report_lines.append(f"🛒 Продаж: {sales.get('sales_count', 0)}")
             
-            if sales:
-                total_gross = sum(s.get("amount_gross", 0) for s in sales)
-                total_due = sum(s.get("amount_partner_due", 0) for s in sales)
-                report_lines.append(f"💰 Общая выручка: {total_gross:.2f} ₽")
-                report_lines.append(f"💵 К доплате: {total_due:.2f} ₽")
+            if sales.get("sales_count"):
+                report_lines.append(f"💰 Общая выручка: {sales['total_gross']:.2f} ₽")
+                report_lines.append(f"💵 К доплате: {sales['total_due']:.2f} ₽")
         
         elif user_role in ["admin", "superadmin"]:
             report_lines.append("🛡️ **Админский отчёт**")
             report_lines.append(f"📅 Период: {period['start'].strftime('%d.%m.%Y')} - {period['end'].strftime('%d.%m.%Y')}")
             
-            all_sales = data.get("all_sales", [])
+            all_sales = data.get("all_sales", {})
             partners = data.get("partners", [])
             cities = data.get("cities", [])
             
-            report_lines.append(f"🛒 Всего продаж: {len(all_sales)}")
-            if all_sales:
-                total_gross = sum(s.get("amount_gross", 0) for s in all_sales)
-                report_lines.append(f"💰 Общая выручка: {total_gross:.2f} ₽")
+            report_lines.append(f"🛒 Всего продаж: {all_sales.get('sales_count', 0)}")
+            if all_sales.get("sales_count"):
+                report_lines.append(f"💰 Общая выручка: {all_sales['total_gross']:.2f} ₽")
             
             report_lines.append(f"🤝 Партнёров: {len(partners)}")
             report_lines.append(f"🏙️ Городов: {len(cities)}")
         
         return "\n".join(report_lines)
+    
+    # --- Потоковая выгрузка -------------------------------------------
+    
+    def _build_export_query(self, scope: Dict[str, Any], period: Dict[str, datetime]) -> Tuple[str, List[Any]]:
+        """Запрос построчной выгрузки продаж в рамках скоупа роли"""
+        query = """
+        SELECT ps.*, pp.title as place_name, pp.address, pp.city_id, p.title as partner_name
+        FROM partner_sales ps
+        LEFT JOIN partner_places pp ON ps.place_id = pp.id
+        LEFT JOIN partners p ON ps.partner_id = p.id
+        WHERE ps.created_at >= ? AND ps.created_at <= ?
+        """
+        params: List[Any] = [period["start"], period["end"]]
+        
+        if scope.get("type") == "user_data":
+            query += " AND ps.user_telegram_id = ?"
+            params.append(scope["user_id"])
+        elif scope.get("type") == "partner_data" or scope.get("partner_id") is not None:
+            query += " AND ps.partner_id = ?"
+            params.append(scope["partner_id"])
+        elif scope.get("type") != "admin_data":
+            raise PermissionError("Export is not available for this role")
+        
+        if scope.get("city_id") is not None:
+            query += " AND pp.city_id = ?"
+            params.append(scope["city_id"])
+        
+        query += " ORDER BY ps.created_at DESC"
+        return query, params
+    
+    async def _iter_export_chunks(self, query: str, params: List[Any],
+                                  chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """Читает результат курсором порциями по chunk_size строк: (колонки, строки)"""
+        database_url = os.getenv("DATABASE_URL", "")
+        
+        if database_url.startswith("postgres"):
+            import asyncpg
+            
+            # Серверный курсор asyncpg живёт только внутри транзакции
+            pg_query = query
+            for i in range(1, len(params) + 1):
+                pg_query = pg_query.replace("?", f"${i}", 1)
+            
+            conn = await asyncpg.connect(database_url)
+            try:
+                async with conn.transaction():
+                    cursor = await conn.cursor(pg_query, *params)
+                    while True:
+                        records = await cursor.fetch(chunk_size)
+                        if not records:
+                            break
+                        yield list(records[0].keys()), [tuple(record.values()) for record in records]
+            finally:
+                await conn.close()
+        else:
+            # sqlite3 блокирует: соединение, запрос и каждая порция — в отдельном потоке.
+            # Поток один на выгрузку, потому что соединение sqlite3 привязано к потоку.
+            loop = asyncio.get_running_loop()
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-export")
+            
+            def run(func, *args):
+                return loop.run_in_executor(executor, func, *args)
+            
+            try:
+                conn = await run(self.db.get_connection)
+                try:
+                    cursor = await run(conn.execute, query, params)
+                    columns = [column[0] for column in cursor.description]
+                    while rows := await run(cursor.fetchmany, chunk_size):
+                        yield columns, [tuple(row) for row in rows]
+                finally:
+                    if conn is not getattr(self.db, "_conn", None):  # общее соединение in-memory БД не закрываем
+                        await run(conn.close)
+            finally:
+                executor.shutdown(wait=False)
+    
+    async def export_report(self, user_id: int, params: Dict[str, Any], fmt: str = "csv",
+                            progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Выгружает продажи за период в CSV/XLSX во временный файл.
+        
+        Память ограничена размером порции и EXPORT_SPOOL_MAX_SIZE независимо
+        от количества строк. Файл в результате закрывает вызывающая сторона.
+        
+        Args:
+            user_id: Telegram ID запросившего
+            params: Параметры отчёта (period, partner_id, city)
+            fmt: "csv" или "xlsx" (без openpyxl — откат на CSV)
+            progress: Корутина, получающая число выгруженных строк после каждой порции
+        """
+        fmt = (fmt or "csv").lower()
+        if fmt not in EXPORT_FORMATS:
+            return {"success": False, "error": f"Unsupported format: {fmt}"}
+        
+        if fmt == "xlsx":
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                logger.warning("openpyxl is not installed, falling back to CSV export")
+                fmt = "csv"
+        
+        spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE, mode="w+b")
+        try:
+            user_role = await get_user_role(user_id)
+            period = self._parse_period(params.get("period", "неделя"))
+            scope = await self._resolve_scope(user_role, user_id, params)
+            query, query_params = self._build_export_query(scope, period)
+            
+            total_rows = 0
+            if fmt == "xlsx":
+                # write_only книга сбрасывает строки на диск, а не держит их в памяти
+                workbook = Workbook(write_only=True)
+                sheet = workbook.create_sheet("sales")
+                header_written = False
+                async for columns, rows in self._iter_export_chunks(query, query_params):
+                    if not header_written:
+                        sheet.append(columns)
+                        header_written = True
+                    for row in rows:
+                        sheet.append(list(row))
+                    total_rows += len(rows)
+                    if progress:
+                        await progress(total_rows)
+                workbook.save(spool)
+            else:
+                # utf-8-sig — чтобы Excel корректно открывал кириллицу
+                text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+                writer = csv.writer(text)
+                header_written = False
+                async for columns, rows in self._iter_export_chunks(query, query_params):
+                    if not header_written:
+                        writer.writerow(columns)
+                        header_written = True
+                    writer.writerows(rows)
+                    total_rows += len(rows)
+                    if progress:
+                        await progress(total_rows)
+                text.flush()
+                text.detach()
+            
+            spool.seek(0)
+            filename = f"sales_{period['start']:%Y%m%d}_{period['end']:%Y%m%d}.{fmt}"
+            return {
+                "success": True,
+                "file": spool,
+                "filename": filename,
+                "format": fmt,
+                "rows": total_rows,
+                "scope": scope,
+                "period": period
+            }
+            
+        except Exception as e:
+            spool.close()
+            logger.error(f"Error exporting report: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def send_report_document(self, bot, chat_id: int, user_id: int, params: Dict[str, Any],
+                                   fmt: str = "csv", progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Выгружает отчёт и отправляет его в чат документом"""
+        result = await self.export_report(user_id, params, fmt, progress)
+        if not result["success"]:
+            return result
+        
+        try:
+            period = result["period"]
+            caption = (
+                f"📊 Продажи {period['start'].strftime('%d.%m.%Y')} - {period['end'].strftime('%d.%m.%Y')}\n"
+                f"🧾 Строк: {result['rows']}"
+            )
+            await bot.send_document(
+                chat_id,
+                SpooledInputFile(result["file"], filename=result["filename"]),
+                caption=caption
+            )
+            return {key: value for key, value in result.items() if key != "file"}
+        except Exception as e:
+            logger.error(f"Error sending report document: {e}")
+            return {"success": False, "error": str(e)}
+        finally:
+            result["file"].close()
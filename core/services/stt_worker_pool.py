@@ -0,0 +1,359 @@
+"""
+Пул процессов распознавания речи (STT)
+Модель живет в отдельных процессах (или одна общая в потоках) и грузится
+лениво при первом использовании, event loop бота только ждет результат.
+Очередь ограничена (backpressure), задачи раздаются по кругу между
+пользователями (fairness), у каждой задачи есть таймаут.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from core.settings import settings
+from core.utils.startup_report import startup_report
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Код, выполняющийся в процессах-воркерах
+# ---------------------------------------------------------------------------
+
+_worker_config: Dict[str, Any] = {'model_size': "small", 'compute_type': "int8", 'num_workers': 1}
+_worker_backend: Optional[str] = None
+_worker_model: Any = None
+_worker_load_lock = threading.Lock()
+
+
+def _configure_worker(model_size: str = "small", compute_type: str = "int8", num_workers: int = 1) -> None:
+    """Инициализатор воркера: только запоминает настройки, модель грузится при первом использовании"""
+    _worker_config.update(model_size=model_size, compute_type=compute_type, num_workers=num_workers)
+
+
+def _get_model() -> Tuple[Optional[str], Any]:
+    """
+    Ленивая загрузка модели, одна на процесс
+
+    В режиме thread все потоки пула делят один экземпляр: WhisperModel
+    с num_workers=N обслуживает N параллельных transcribe().
+    """
+    global _worker_backend, _worker_model
+    if _worker_model is not None:
+        return _worker_backend, _worker_model
+
+    with _worker_load_lock:
+        if _worker_model is not None:
+            return _worker_backend, _worker_model
+        try:
+            from faster_whisper import WhisperModel
+            _worker_model = WhisperModel(
+                _worker_config['model_size'],
+                device="cpu",
+                compute_type=_worker_config['compute_type'],
+                num_workers=_worker_config['num_workers'],
+            )
+            _worker_backend = "faster_whisper"
+        except ImportError:
+            try:
+                import vosk
+                model_path = os.getenv("VOSK_MODEL_PATH", "vosk-model-small-ru-0.22")
+                if os.path.exists(model_path):
+                    _worker_model = vosk.Model(model_path)
+                    _worker_backend = "vosk"
+            except ImportError:
+                pass
+    return _worker_backend, _worker_model
+
+
+def warm_up_worker() -> Dict[str, Any]:
+    """Загрузить модель заранее; возвращает pid, бэкенд и время загрузки"""
+    started = time.perf_counter()
+    backend, _ = _get_model()
+    return {'pid': os.getpid(), 'backend': backend, 'seconds': time.perf_counter() - started}
+
+
+SAMPLE_RATE = 16000
+
+
+def transcribe_pcm(pcm: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Транскрибация внутри процесса-воркера
+
+    Args:
+        pcm: 16 кГц моно signed 16-bit little-endian PCM (выход ffmpeg в pipe)
+    """
+    backend, model = _get_model()
+
+    if backend == "faster_whisper":
+        import numpy as np
+
+        # faster-whisper принимает float32-массив напрямую, без файла
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, info = model.transcribe(audio)
+        text = " ".join(segment.text for segment in segments)
+        return text.strip(), info.language
+
+    if backend == "vosk":
+        import json
+        import vosk
+
+        rec = vosk.KaldiRecognizer(model, SAMPLE_RATE)
+        for offset in range(0, len(pcm), 4000):
+            rec.AcceptWaveform(pcm[offset:offset + 4000])
+        result = json.loads(rec.FinalResult())
+        return result.get('text', '').strip(), "ru"  # Vosk не определяет язык
+
+    raise RuntimeError("STT model not available")
+
+
+# ---------------------------------------------------------------------------
+# Пул на стороне event loop
+# ---------------------------------------------------------------------------
+
+class STTQueueFull(Exception):
+    """Очередь распознавания переполнена (общая или лимит пользователя)"""
+
+
+@dataclass
+class _Job:
+    user_id: int
+    pcm: bytes
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class STTWorkerPool:
+    """Ограниченная очередь задач STT поверх пула процессов"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queue: int = 32,
+        per_user_limit: int = 2,
+        timeout: float = 60.0,
+        transcribe_fn: Callable[[bytes], Tuple[Optional[str], Optional[str]]] = transcribe_pcm,
+        initializer: Optional[Callable[..., None]] = _configure_worker,
+        initargs: tuple = (),
+        executor_factory: Optional[Callable[[], Executor]] = None,
+        executor_kind: str = "process",
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.timeout = timeout
+        self._transcribe_fn = transcribe_fn
+        self._initializer = initializer
+        self._initargs = initargs
+        self._executor_factory = executor_factory
+        self.executor_kind = executor_kind
+
+        self._executor: Optional[Executor] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._has_jobs: Optional[asyncio.Event] = None
+        # user_id -> очередь задач; порядок ключей задает round-robin
+        self._pending: "OrderedDict[int, Deque[_Job]]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0,
+            'rejected': 0, 'timeouts': 0, 'max_queue_depth': 0,
+        }
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    # --- жизненный цикл ---------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._dispatcher and not self._dispatcher.done():
+            return
+        if self._executor is None:
+            if self._executor_factory:
+                self._executor = self._executor_factory()
+            elif self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="stt",
+                    initializer=self._initializer,
+                    initargs=self._initargs,
+                )
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=self._initializer,
+                    initargs=self._initargs,
+                )
+        self._slots = asyncio.Semaphore(self.workers)
+        self._has_jobs = asyncio.Event()
+        if self._pending:
+            self._has_jobs.set()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"✅ STT worker pool started: {self.workers} workers, queue {self.max_queue}")
+
+    async def shutdown(self) -> None:
+        """Остановка диспетчера и процессов; ожидающие задачи отменяются"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for queue in self._pending.values():
+            for job in queue:
+                if not job.future.done():
+                    job.future.cancel()
+        self._pending.clear()
+        self._queued = 0
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # --- публичный API ----------------------------------------------------
+
+    async def submit(self, user_id: int, pcm: bytes) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Поставить аудио (16 кГц моно s16le PCM) в очередь и дождаться результата
+
+        Raises:
+            STTQueueFull: очередь или лимит пользователя исчерпаны
+            asyncio.TimeoutError: задача не уложилась в таймаут
+        """
+        self._ensure_started()
+
+        user_queue = self._pending.get(user_id)
+        if self._queued >= self.max_queue or (user_queue and len(user_queue) >= self.per_user_limit):
+            self._stats['rejected'] += 1
+            raise STTQueueFull(f"STT queue is full (depth={self._queued})")
+
+        job = _Job(user_id, pcm, asyncio.get_running_loop().create_future())
+        self._pending.setdefault(user_id, deque()).append(job)
+        self._queued += 1
+        self._stats['submitted'] += 1
+        self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queued)
+        self._has_jobs.set()
+
+        try:
+            return await asyncio.wait_for(job.future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            self._discard(job)
+            raise
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Глубина очереди и счетчики для мониторинга"""
+        finished = self._stats['completed'] + self._stats['failed']
+        return {
+            'queue_depth': self._queued,
+            'running': self._running,
+            'users_waiting': len(self._pending),
+            'workers': self.workers,
+            **self._stats,
+            'avg_wait_ms': round(self._wait_total / finished * 1000, 1) if finished else 0.0,
+            'avg_run_ms': round(self._run_total / finished * 1000, 1) if finished else 0.0,
+        }
+
+    async def warm_up(self) -> List[Dict[str, Any]]:
+        """
+        Загрузить модель во всех воркерах заранее (фоновая задача после старта бота),
+        чтобы первое голосовое сообщение не ждало загрузку
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, warm_up_worker) for _ in range(self.workers)),
+            return_exceptions=True
+        )
+        loaded = [r for r in results if isinstance(r, dict)]
+        startup_report.record(
+            "stt_worker_pool.warm_up", time.perf_counter() - started, kind="warmup",
+            backends=sorted({str(r['backend']) for r in loaded}), processes=len({r['pid'] for r in loaded})
+        )
+        logger.info(f"🔥 STT model warm-up finished: {loaded}")
+        return loaded
+
+    # --- диспетчер --------------------------------------------------------
+
+    def _discard(self, job: _Job) -> None:
+        """Убрать из очереди задачу, которую больше никто не ждет"""
+        queue = self._pending.get(job.user_id)
+        if queue and job in queue:
+            queue.remove(job)
+            self._queued -= 1
+            if not queue:
+                del self._pending[job.user_id]
+
+    def _pop_next(self) -> Optional[_Job]:
+        """Следующая задача по кругу: по одной от каждого пользователя"""
+        while self._pending:
+            user_id, queue = next(iter(self._pending.items()))
+            job = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._pending.move_to_end(user_id)
+            else:
+                del self._pending[user_id]
+            if not job.future.done():
+                return job
+        return None
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            await self._slots.acquire()
+            job = None
+            while job is None:
+                if not self._pending:
+                    self._has_jobs.clear()
+                    await self._has_jobs.wait()
+                job = self._pop_next()
+            self._running += 1
+            task = asyncio.create_task(self._run_job(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_job(self, job: _Job) -> None:
+        started = time.monotonic()
+        self._wait_total += started - job.enqueued_at
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._transcribe_fn, job.pcm
+            )
+            self._stats['completed'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            self._stats['failed'] += 1
+            logger.error(f"STT job failed for user {job.user_id}: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._run_total += time.monotonic() - started
+            self._running -= 1
+            self._slots.release()
+
+
+# Глобальный экземпляр
+stt_worker_pool = STTWorkerPool(
+    workers=settings.voice.stt_workers,
+    max_queue=settings.voice.stt_queue_size,
+    per_user_limit=settings.voice.stt_per_user_limit,
+    timeout=settings.voice.stt_timeout,
+    executor_kind=settings.voice.stt_executor,
+    initargs=(
+        settings.voice.stt_model_size,
+        settings.voice.stt_compute_type,
+        # Одна модель на процесс либо одна общая на все потоки
+        settings.voice.stt_workers if settings.voice.stt_executor == "thread" else 1,
+    ),
+)
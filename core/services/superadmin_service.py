@@ -27,7 +27,8 @@ class SuperAdminService:
     async def generate_cards(
         self, 
         count: int, 
-        created_by: int
+        created_by: int,
+        pdf_path: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate new plastic cards (SuperAdmin only).
@@ -35,13 +36,14 @@ class SuperAdminService:
         Args:
             count: Number of cards to generate
             created_by: SuperAdmin who created the cards
+            pdf_path: Optional path for a print-ready PDF sheet of QR codes
             
         Returns:
             dict: Generation result
         """
         try:
             # Use card service for generation
-            result = await card_service.generate_cards(count, created_by)
+            result = await card_service.generate_cards(count, created_by, pdf_path=pdf_path)
             
             if result['success']:
                 # Log super admin action
@@ -4,32 +4,38 @@
 import logging
 from typing import Dict, Any, Optional
 from core.services.user_service import get_user_role
-from core.i18n import get_text
+from core.services.support_retrieval import IntentMatcher, support_knowledge_base
+from core.utils.locales_v2 import get_text
 
 logger = logging.getLogger(__name__)
 
+# Порядок — приоритет интента при нескольких совпадениях; остальное — вопрос (qa)
+INTENT_PHRASES = {
+    "report_make": ["отчёт", "report", "сделай", "сформируй"],
+    "report_help": ["какие отчёты", "что входит", "отчёты"],
+    "notification_management": ["уведомления", "notifications", "уведомление", "настройки уведомлений"],
+    "error_help": ["ошибка", "не работает", "проблема", "не создаётся"],
+}
+
+NOTIFICATION_ACTIONS = {
+    "disable_all": ["отключить все", "выключить все"],
+    "enable_all": ["включить все", "включить уведомления"],
+    "configure": ["настроить", "категории"],
+    "quiet_hours": ["не беспокоить", "тихие часы"],
+}
+
+# Роли user_service -> роли ссылок справки HelpService
+HELP_ROLES = {"superadmin": "super_admin"}
+
 
 class SupportAIService:
     """AI-ассистент для поддержки пользователей"""
     
-    def __init__(self):
-        self.knowledge_base = self._load_knowledge_base()
-    
-    def _load_knowledge_base(self) -> Dict[str, Any]:
-        """Загружает базу знаний из ТЗ, кода и i18n"""
-        return {
-            "faq": {
-                "qr_expired": "QR-код истёк. Сгенерируйте новый в разделе 'Мои QR-коды'",
-                "qr_repeat": "QR-код уже использован. Каждый код можно применить только один раз",
-                "no_balance": "Недостаточно баллов. Накапливайте баллы, совершая покупки",
-                "no_rights": "У вас нет прав для этого действия. Обратитесь к администратору"
-            },
-            "reports": {
-                "user": ["покупки", "баллы", "история"],
-                "partner": ["заведения", "продажи", "аналитика"],
-                "admin": ["все_данные", "партнёры", "города", "платформа"]
-            }
-        }
+    def __init__(self, knowledge_base=support_knowledge_base):
+        # База знаний (FAQ, тексты support_ai_* всех языков, справка) — BM25-индекс
+        self.knowledge_base = knowledge_base
+        self.intents = IntentMatcher(INTENT_PHRASES)
+        self.notification_actions = IntentMatcher(NOTIFICATION_ACTIONS)
     
     async def answer(self, user_id: int, message: str, lang: str = "ru") -> str:
         """
@@ -62,34 +68,19 @@ class SupportAIService:
     
     def _classify_intent(self, message: str) -> str:
         """Классифицирует интент сообщения"""
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ["отчёт", "отчет", "report", "сделай", "сформируй"]):
-            return "report_make"
-        elif any(word in message_lower for word in ["какие отчёты", "что входит", "отчёты"]):
-            return "report_help"
-        elif any(word in message_lower for word in ["уведомления", "notifications", "уведомление", "настройки уведомлений"]):
-            return "notification_management"
-        elif any(word in message_lower for word in ["ошибка", "не работает", "проблема", "не создаётся"]):
-            return "error_help"
-        else:
-            return "qa"
+        return self.intents.match(message) or "qa"
+    
+    def _lookup(self, message: str, kinds, user_role: str, lang: str) -> Optional[str]:
+        """Лучший ответ из базы знаний или None"""
+        hits = self.knowledge_base.search(message, kinds=kinds, role=HELP_ROLES.get(user_role, user_role))
+        if not hits:
+            return None
+        doc, _ = hits[0]
+        return get_text(doc.answer_key, lang) if doc.answer_key else doc.answer
     
     async def _handle_qa(self, message: str, user_role: str, lang: str) -> str:
         """Обрабатывает вопросы и ответы"""
-        message_lower = message.lower()
-        
-        # Проверяем FAQ
-        if "qr" in message_lower and "истёк" in message_lower:
-            return get_text("support_ai_qr_expired", lang)
-        elif "qr" in message_lower and ("повтор" in message_lower or "уже" in message_lower):
-            return get_text("support_ai_qr_repeat", lang)
-        elif "балл" in message_lower and ("нет" in message_lower or "недостаточно" in message_lower):
-            return get_text("support_ai_no_balance", lang)
-        elif "права" in message_lower or "доступ" in message_lower:
-            return get_text("support_ai_no_rights", lang)
-        else:
-            return get_text("support_ai_general_help", lang)
+        return self._lookup(message, ("faq", "help"), user_role, lang) or get_text("support_ai_general_help", lang)
     
     async def _handle_report_request(self, message: str, user_role: str, lang: str) -> str:
         """Обрабатывает запросы на создание отчётов"""
@@ -108,12 +99,12 @@ class SupportAIService:
     
     async def _handle_notification_management(self, user_id: int, message: str, user_role: str, lang: str) -> str:
         """Обрабатывает управление уведомлениями согласно системному промту"""
-        message_lower = message.lower()
+        action = self.notification_actions.match(message)
         
         # Определяем категории уведомлений по ролям
         categories = self._get_notification_categories(user_role)
         
-        if "отключить все" in message_lower or "выключить все" in message_lower:
+        if action == "disable_all":
             return self._format_notification_response(
                 "🔇 Отключение всех уведомлений",
                 "Вы уверены, что хотите отключить все уведомления? CRITICAL уведомления останутся активными для безопасности.",
@@ -121,7 +112,7 @@ class SupportAIService:
                 user_role,
                 lang
             )
-        elif "включить все" in message_lower or "включить уведомления" in message_lower:
+        elif action == "enable_all":
             return self._format_notification_response(
                 "🔔 Включение всех уведомлений",
                 "Восстанавливаю стандартные настройки уведомлений для вашей роли.",
@@ -129,7 +120,7 @@ class SupportAIService:
                 user_role,
                 lang
             )
-        elif "настроить" in message_lower or "категории" in message_lower:
+        elif action == "configure":
             return self._format_notification_response(
                 "⚙️ Настройка категорий уведомлений",
                 "Выберите категории, которые хотите настроить:",
@@ -137,7 +128,7 @@ class SupportAIService:
                 user_role,
                 lang
             )
-        elif "не беспокоить" in message_lower or "тихие часы" in message_lower:
+        elif action == "quiet_hours":
             return self._format_quiet_hours_response(lang)
         else:
             return self._format_notification_response(
@@ -221,11 +212,11 @@ class SupportAIService:
 
     async def _handle_error_help(self, message: str, user_role: str, lang: str) -> str:
         """Помогает с решением ошибок"""
-        message_lower = message.lower()
-        
-        if "qr" in message_lower:
-            return get_text("support_ai_qr_troubleshoot", lang)
-        elif "балл" in message_lower:
-            return get_text("support_ai_points_troubleshoot", lang)
-        else:
-            return get_text("support_ai_general_troubleshoot", lang)
+        return (
+            self._lookup(message, ("troubleshoot",), user_role, lang)
+            or get_text("support_ai_general_troubleshoot", lang)
+        )
+
+
+# Создаем экземпляр сервиса
+support_ai_service = SupportAIService()
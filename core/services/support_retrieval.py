@@ -0,0 +1,249 @@
+"""
+Поиск ответов для AI-ассистента "Карма"
+
+- IntentMatcher: все фразы интентов скомпилированы в одно регулярное выражение,
+  сообщение просматривается за один проход вместо цепочек `any(word in ...)`.
+- BM25Index: инвертированный индекс с добавлением/удалением документов, так что
+  при изменении базы знаний перестраиваются только изменившиеся документы.
+- SupportKnowledgeBase: база знаний из FAQ, текстов support_ai_* всех языков
+  (скомпилированный каталог core.utils.locales_v2) и ссылок справки по ролям.
+  Обновляется лениво, когда меняется get_catalog_version().
+"""
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from core.utils.locales_v2 import get_all_texts, get_catalog_version, get_supported_languages
+from core.utils.trigrams import words
+
+logger = logging.getLogger(__name__)
+
+# Простейший стемминг: срезаем одно окончание и ограничиваем длину основы
+STEM_LENGTH = 6
+_ENDINGS = (
+    "ами", "ями", "ов", "ев", "ей", "ам", "ям", "ах", "ях", "ом", "ем", "ой",
+    "ы", "и", "а", "я", "у", "ю", "е", "о", "ь", "й", "s",
+)
+STOPWORDS = frozenset({
+    "и", "в", "во", "на", "не", "что", "как", "а", "но", "у", "мне", "мой", "я", "это", "с", "по", "за",
+    "the", "a", "an", "is", "my", "i", "to", "of", "in", "and", "it", "for", "do", "how", "what",
+})
+
+# Минимальный BM25-score, ниже которого совпадение считаем случайным
+MIN_SCORE = 1.0
+
+
+def _normalize(text: str) -> str:
+    return (text or "").casefold().replace("ё", "е")
+
+
+def _stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            word = word[:-len(ending)]
+            break
+    return word[:STEM_LENGTH]
+
+
+def tokenize(text: str) -> List[str]:
+    """Термы для индекса: слова без стоп-слов, приведенные к основе"""
+    return [_stem(w) for w in words(_normalize(text)) if w not in STOPWORDS]
+
+
+class IntentMatcher:
+    """Многошаблонный поиск фраз интентов за один проход по сообщению"""
+
+    def __init__(self, intents: Dict[str, Sequence[str]]):
+        # Порядок ключей — приоритет: при нескольких совпадениях побеждает более ранний интент
+        self._priority = {intent: i for i, intent in enumerate(intents)}
+        self._owner: Dict[str, str] = {}
+        for intent, phrases in intents.items():
+            for phrase in phrases:
+                self._owner.setdefault(_normalize(phrase), intent)
+        # Длинные фразы раньше коротких: "какие отчеты" не распадется на "отчет"
+        alternatives = sorted(self._owner, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(p) for p in alternatives)) if alternatives else None
+
+    def match(self, message: str) -> Optional[str]:
+        if self._pattern is None:
+            return None
+        found = {self._owner[m.group(0)] for m in self._pattern.finditer(_normalize(message))}
+        return min(found, key=self._priority.__getitem__) if found else None
+
+    def contains(self, message: str, intent: str) -> bool:
+        """Есть ли в сообщении хотя бы одна фраза интента"""
+        if self._pattern is None:
+            return False
+        return any(self._owner[m.group(0)] == intent for m in self._pattern.finditer(_normalize(message)))
+
+
+class BM25Index:
+    """Инвертированный индекс с ранжированием Okapi BM25 и инкрементальным обновлением"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_terms
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Добавить или заменить документ"""
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = sum(terms.values())
+        self._total_len += self._doc_len[doc_id]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(doc_id)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, limit: int = 3,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Документы по убыванию BM25; accept отсекает недоступные документы"""
+        n = len(self._doc_terms)
+        if not n:
+            return []
+        avgdl = self._total_len / n
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                dl = self._doc_len[doc_id]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if accept is not None:
+            ranked = [item for item in ranked if accept(item[0])]
+        return ranked[:limit]
+
+
+@dataclass(frozen=True)
+class SupportDocument:
+    """Документ базы знаний: что индексируем и чем отвечаем"""
+    doc_id: str
+    kind: str  # faq | troubleshoot | help
+    text: str
+    answer_key: Optional[str] = None  # ключ i18n, ответ на языке пользователя
+    answer: Optional[str] = None  # готовый текст (ссылки справки)
+    roles: FrozenSet[str] = field(default_factory=frozenset)  # пусто — для всех
+
+
+# Формулировки вопросов для ответов support_ai_*: индексируются вместе с самими ответами
+FAQ_PHRASES: Dict[str, Tuple[str, ...]] = {
+    "support_ai_qr_expired": ("qr код истёк", "срок действия qr закончился", "просрочен qr", "qr code expired"),
+    "support_ai_qr_repeat": ("qr уже использован", "повторно применить qr", "qr code already used"),
+    "support_ai_no_balance": ("нет баллов", "недостаточно баллов", "не хватает баллов", "not enough points"),
+    "support_ai_no_rights": ("нет прав", "нет доступа", "доступ запрещён", "access denied", "no permission"),
+    "support_ai_become_partner": ("как стать партнёром", "добавить заведение", "become a partner", "add my place"),
+    "support_ai_change_city": ("сменить город", "другой город", "change city"),
+    "support_ai_change_language": ("сменить язык", "поменять язык", "change language"),
+    "support_ai_qr_troubleshoot": ("qr не работает", "qr не сканируется", "qr not working"),
+    "support_ai_points_troubleshoot": ("баллы не начислились", "не пришли баллы", "points not credited"),
+}
+# Служебные тексты ассистента — не ответы на вопросы
+NON_ANSWER_KEYS = frozenset({
+    "support_ai_hi", "support_ai_error", "support_ai_general_help", "support_ai_general_troubleshoot",
+    "support_ai_report_ask_range", "support_ai_reports_user", "support_ai_reports_partner", "support_ai_reports_admin",
+})
+
+
+def build_support_documents() -> List[SupportDocument]:
+    """Собрать документы из i18n (все языки) и ссылок справки"""
+    langs = get_supported_languages()
+    texts = {lang: get_all_texts(lang) for lang in langs}
+    documents = []
+    keys = sorted(k for k in texts['ru'] if k.startswith("support_ai_") and k not in NON_ANSWER_KEYS)
+    for key in keys:
+        variants = {texts[lang].get(key, '') for lang in langs}
+        body = "\n".join(FAQ_PHRASES.get(key, ()) + tuple(sorted(variants)))
+        kind = "troubleshoot" if key.endswith("_troubleshoot") else "faq"
+        documents.append(SupportDocument(f"i18n:{key}", kind, body, answer_key=key))
+
+    try:
+        from core.services.help_service import HelpService
+        links: Dict[Tuple[str, str], set] = {}
+        for role, role_links in HelpService().help_links.items():
+            for link in role_links:
+                links.setdefault((link['title'], link['url']), set()).add(role)
+        for (title, url), roles in sorted(links.items()):
+            documents.append(SupportDocument(
+                f"help:{url}#{title}", "help", title,
+                answer=f"📚 {title}: {url}", roles=frozenset(roles)
+            ))
+    except Exception as e:
+        logger.warning(f"Help links are not indexed: {e}")
+    return documents
+
+
+class SupportKnowledgeBase:
+    """BM25-индекс базы знаний ассистента с инкрементальной пересборкой"""
+
+    def __init__(self, loader: Callable[[], Iterable[SupportDocument]] = build_support_documents):
+        self._loader = loader
+        self.index = BM25Index()
+        self._documents: Dict[str, SupportDocument] = {}
+        self._version: Optional[int] = None
+
+    def refresh(self, force: bool = False) -> int:
+        """Переиндексировать изменившиеся документы; возвращает число изменений"""
+        version = get_catalog_version()
+        if not force and version == self._version:
+            return 0
+        fresh = {doc.doc_id: doc for doc in self._loader()}
+        changed = 0
+        for doc_id in set(self._documents) - set(fresh):
+            self.index.remove(doc_id)
+            changed += 1
+        for doc_id, doc in fresh.items():
+            if self._documents.get(doc_id) != doc:
+                self.index.add(doc_id, doc.text)
+                changed += 1
+        self._documents = fresh
+        self._version = version
+        if changed:
+            logger.info(f"Support knowledge base: {changed} documents reindexed, {len(fresh)} total")
+        return changed
+
+    def search(self, query: str, kinds: Iterable[str] = ("faq", "help"), role: Optional[str] = None,
+               limit: int = 1, min_score: float = MIN_SCORE) -> List[Tuple[SupportDocument, float]]:
+        """Лучшие документы нужных видов, доступные роли"""
+        self.refresh()
+        kinds = frozenset(kinds)
+
+        def accept(doc_id: str) -> bool:
+            doc = self._documents[doc_id]
+            return doc.kind in kinds and (not doc.roles or role in doc.roles)
+
+        return [
+            (self._documents[doc_id], score)
+            for doc_id, score in self.index.search(query, limit, accept)
+            if score >= min_score
+        ]
+
+
+support_knowledge_base = SupportKnowledgeBase()
@@ -2,20 +2,27 @@
 Сервис управления тарифной системой для партнеров
 """
 import logging
-from typing import List, Optional, Dict, Any
+import time
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from decimal import Decimal
 
 from core.models.tariff_models import Tariff, TariffType, TariffFeatures, DEFAULT_TARIFFS
 from core.database.db_adapter import db_v2
+from core.services.cache import cache_service
+from core.services.invalidation_bus import invalidation_bus
 
 logger = logging.getLogger(__name__)
 
+# Тариф партнера кэшируется в процессе; запись сбрасывают события 'partner'/'tariff' шины инвалидации
+PARTNER_TARIFF_CACHE_TTL = 300
+
 class TariffService:
     """Сервис управления тарифами партнеров"""
     
     def __init__(self):
         self.default_tariffs = DEFAULT_TARIFFS
+        self._partner_tariffs: Dict[int, Tuple[float, Tariff]] = {}
     
     async def get_all_tariffs(self) -> List[Tariff]:
         """Получить все доступные тарифы"""
@@ -106,8 +113,30 @@ class TariffService:
             logger.error(f"❌ Error getting tariff by type {tariff_type}: {e}")
             return None
     
+    def invalidate_partner_tariff(self, partner_id: int) -> None:
+        """Сбросить кэшированный тариф партнера"""
+        self._partner_tariffs.pop(partner_id, None)
+    
+    def _on_partners_invalidated(self, partner_ids) -> None:
+        if partner_ids is None:
+            self._partner_tariffs.clear()
+            return
+        for partner_id in partner_ids:
+            self.invalidate_partner_tariff(partner_id)
+    
     async def get_partner_current_tariff(self, partner_id: int) -> Optional[Tariff]:
         """Получить текущий тариф партнера"""
+        cached = self._partner_tariffs.get(partner_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        tariff = await self._load_partner_tariff(partner_id)
+        if tariff:
+            self._partner_tariffs[partner_id] = (time.monotonic() + PARTNER_TARIFF_CACHE_TTL, tariff)
+        return tariff
+    
+    async def _load_partner_tariff(self, partner_id: int) -> Optional[Tariff]:
+        """Загрузить текущий тариф партнера из БД"""
         try:
             query = """
                 SELECT t.id, t.name, t.tariff_type, t.price_vnd, t.max_transactions_per_month,
@@ -184,6 +213,7 @@ class TariffService:
             """
             
             await db_v2.execute(subscribe_query, (partner_id, tariff.id, expires_at))
+            await invalidation_bus.publish('partner', partner_id)
             
             logger.info(f"✅ Partner {partner_id} subscribed to {tariff_type.value} tariff")
             return True
@@ -204,18 +234,8 @@ class TariffService:
             if tariff.features.max_transactions_per_month == -1:
                 return {"allowed": True, "remaining": -1, "tariff": tariff.name}
             
-            # Считаем транзакции за текущий месяц
-            current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            query = """
-                SELECT COUNT(*) 
-                FROM loyalty_transactions 
-                WHERE partner_id = $1 
-                AND created_at >= $2
-                AND transaction_type = 'purchase'
-            """
-            
-            used_transactions = (await db_v2.fetch_one(query, (partner_id, current_month_start)))[0]
+            # Счетчик транзакций за текущий месяц (без сканирования журнала)
+            used_transactions = await self.get_monthly_transaction_count(partner_id)
             remaining = tariff.features.max_transactions_per_month - used_transactions
             
             return {
@@ -230,6 +250,61 @@ class TariffService:
             logger.error(f"❌ Error checking transaction limit for partner {partner_id}: {e}")
             return {"allowed": False, "reason": "Database error"}
     
+    def _usage_key(self, partner_id: int, now: datetime) -> str:
+        return f"tariff:tx_used:{partner_id}:{now:%Y%m}"
+    
+    def _usage_ttl(self, now: datetime) -> int:
+        """TTL счетчика — до начала следующего месяца плюс сутки запаса"""
+        next_month = (now.replace(day=28) + timedelta(days=4)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        return int((next_month - now).total_seconds()) + 86400
+    
+    async def _seed_monthly_usage(self, partner_id: int, now: datetime, pending: int = 0) -> int:
+        """
+        Посчитать продажи месяца по partner_sales (их пишет process_sale) и
+        положить в счетчик через SET NX: уже созданный счетчик не перезаписывается.
+        pending — сколько посчитанных продаж вызывающий учтет сам через INCR.
+        """
+        current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        
+        query = """
+            SELECT COUNT(*) 
+            FROM partner_sales 
+            WHERE partner_id = $1 
+            AND created_at >= $2
+        """
+        
+        used = max(0, (await db_v2.fetch_one(query, (partner_id, current_month_start)))[0] - pending)
+        key = self._usage_key(partner_id, now)
+        if await cache_service.set(key, used, ex=self._usage_ttl(now), nx=True):
+            return used
+        cached = await cache_service.get(key)
+        return int(cached) if cached is not None else used
+    
+    async def get_monthly_transaction_count(self, partner_id: int) -> int:
+        """Получить количество транзакций партнера за текущий месяц"""
+        now = datetime.now()
+        cached = await cache_service.get(self._usage_key(partner_id, now))
+        if cached is not None:
+            return int(cached)
+        return await self._seed_monthly_usage(partner_id, now)
+    
+    async def record_transaction(self, partner_id: int) -> int:
+        """Учесть уже записанную продажу в месячном счетчике (атомарный INCR)"""
+        try:
+            now = datetime.now()
+            key = self._usage_key(partner_id, now)
+            if await cache_service.get(key) is None:
+                # Продажа уже в partner_sales: засеиваем без нее, INCR ниже ее учтет
+                await self._seed_monthly_usage(partner_id, now, pending=1)
+            used = await cache_service.incr(key)
+            if used == 1:
+                # Ключ создан INCR'ом (например, после вытеснения) — вернуть TTL
+                await cache_service.expire(key, self._usage_ttl(now))
+            return used
+        except Exception as e:
+            logger.error(f"❌ Error recording transaction for partner {partner_id}: {e}")
+            return 0
+    
     async def get_tariff_commission_rate(self, partner_id: int) -> float:
         """Получить процент комиссии для партнера"""
         try:
@@ -277,4 +352,6 @@ class TariffService:
             }
 
 # Глобальный экземпляр сервиса
-tariff_service = TariffService()
\ No newline at end of file
+tariff_service = TariffService()
+invalidation_bus.register('partner', tariff_service._on_partners_invalidated)
+invalidation_bus.register('tariff', lambda _ids: tariff_service._on_partners_invalidated(None))
@@ -203,6 +203,9 @@ class KarmaService:
                 VALUES ($1, $2, $3, $4, NOW())
             """, user_id, -amount, reason, admin_id)
             
+            # Keep the achievement counter in sync so reached milestones are awarded
+            await self._check_karma_milestone_achievements(user_id, new_karma)
+            
             logger.info(f"Subtracted {amount} karma from user {user_id}. New total: {new_karma}")
             return True
 
@@ -380,39 +383,11 @@ class KarmaService:
             logger.error(f"Error checking level up achievements for user {user_id}: {str(e)}")
     
     async def _check_karma_milestone_achievements(self, user_id: int, karma_points: int):
-        """Check and award karma milestone achievements"""
-        try:
-            conn = await self.get_connection()
-            try:
-                milestones = [1000, 2500, 5000, 10000, 25000]
-                
-                for milestone in milestones:
-                    if karma_points >= milestone:
-                        # Check if achievement already exists
-                        existing = await conn.fetchrow("""
-                            SELECT id FROM user_achievements 
-                            WHERE user_id = $1 AND achievement_type = 'karma_milestone' 
-                            AND achievement_data::json->>'karma' = $2
-                        """, user_id, str(milestone))
-                        
-                        if not existing:
-                            # Award achievement
-                            await conn.execute("""
-                                INSERT INTO user_achievements (user_id, achievement_type, achievement_data, earned_at)
-                                VALUES ($1, 'karma_milestone', $2, NOW())
-                            """, user_id, f'{{"karma": {milestone}}}')
-                            
-                            # Add notification
-                            await conn.execute("""
-                                INSERT INTO user_notifications (user_id, message, notification_type, created_at)
-                                VALUES ($1, $2, 'karma_change', NOW())
-                            """, user_id, f"💎 Достижение! У вас {milestone} кармы!")
-                            
-                            logger.info(f"Karma milestone achievement awarded to user {user_id} for {milestone} karma")
-            finally:
-                await conn.close()
-        except Exception as e:
-            logger.error(f"Error checking karma milestone achievements for user {user_id}: {str(e)}")
+        """Report the new karma total to the achievement engine (awards reached milestones not awarded yet)"""
+        from core.services.achievement_engine import achievement_engine, AchievementEvent, COUNTER_KARMA
+        await achievement_engine.handle_event(
+            AchievementEvent.POINTS_CREDITED, user_id, counter=COUNTER_KARMA, total=karma_points
+        )
 
 
 # Create singleton instance
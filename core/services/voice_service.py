@@ -3,17 +3,16 @@
 Обеспечивает STT (Speech-to-Text) функционал для AI-помощника
 """
 
-import os
-import tempfile
+import io
 import logging
 import asyncio
 from typing import Optional, Tuple
-from pathlib import Path
 from datetime import datetime, timedelta
 
 from aiogram import Bot
 from aiogram.types import Voice, Audio, Message
 from core.settings import settings
+from core.services.stt_worker_pool import SAMPLE_RATE, STTQueueFull, stt_worker_pool
 
 logger = logging.getLogger(__name__)
 
@@ -21,32 +20,10 @@ class VoiceService:
     """Сервис обработки голосовых сообщений"""
     
     def __init__(self):
-        self.temp_dir = Path(tempfile.gettempdir()) / "karma_voice"
-        self.temp_dir.mkdir(exist_ok=True)
-        
         # Rate limiting storage (in production should use Redis)
         self._rate_limits = {}
         
-        # Initialize STT models
-        self._stt_model = None
-        self._init_stt_model()
-    
-    def _init_stt_model(self):
-        """Инициализация модели STT"""
-        try:
-            # Try faster-whisper first (recommended)
-            from faster_whisper import WhisperModel
-            self._stt_model = WhisperModel("small", device="cpu", compute_type="int8")
-            logger.info("✅ Faster-whisper model loaded successfully")
-        except ImportError:
-            try:
-                # Fallback to vosk
-                import vosk
-                self._stt_model = "vosk"
-                logger.info("✅ Vosk model will be used as fallback")
-            except ImportError:
-                logger.warning("⚠️ No STT models available. Install faster-whisper or vosk")
-                self._stt_model = None
+        # Модель STT живет в процессах пула stt_worker_pool, а не в процессе бота
     
     async def check_rate_limit(self, user_id: int) -> bool:
         """Проверка rate limit для пользователя"""
@@ -89,133 +66,72 @@ class VoiceService:
         
         return True, None
     
-    async def download_voice_file(self, bot: Bot, voice: Voice | Audio) -> Optional[Path]:
-        """Скачивание голосового файла"""
+    async def download_voice_file(self, bot: Bot, voice: Voice | Audio) -> Optional[bytes]:
+        """Скачивание голосового файла в память"""
         try:
-            # Get file info
-            file_info = await bot.get_file(voice.file_id)
+            buffer = io.BytesIO()
+            await bot.download(voice.file_id, destination=buffer)
+            data = buffer.getvalue()
             
-            # Create temp file
-            temp_file = self.temp_dir / f"voice_{voice.file_id}_{datetime.now().timestamp()}.ogg"
-            
-            # Download file
-            await bot.download_file(file_info.file_path, temp_file)
-            
-            logger.info(f"✅ Voice file downloaded: {temp_file}")
-            return temp_file
+            logger.info(f"✅ Voice file downloaded: {len(data)} bytes")
+            return data
             
         except Exception as e:
             logger.error(f"Error downloading voice file: {e}")
             return None
     
-    async def convert_to_wav(self, input_file: Path) -> Optional[Path]:
-        """Конвертация аудио в WAV формат"""
+    async def decode_audio(self, data: bytes) -> Optional[bytes]:
+        """
+        Декодирование OGG/Opus (или любого формата ffmpeg) в 16 кГц моно PCM
+        
+        Байты идут в ffmpeg через stdin, PCM читается из stdout — без временных файлов.
+        """
         try:
-            import ffmpeg
-            
-            output_file = input_file.with_suffix('.wav')
-            
-            # Convert to 16kHz mono WAV
-            (
-                ffmpeg
-                .input(str(input_file))
-                .output(
-                    str(output_file),
-                    acodec='pcm_s16le',
-                    ac=1,  # mono
-                    ar=16000  # 16kHz
-                )
-                .overwrite_output()
-                .run(quiet=True)
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+                "-i", "pipe:0",
+                "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+                "pipe:1",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
+            pcm, stderr = await process.communicate(input=data)
+            if process.returncode != 0 or not pcm:
+                logger.error(f"ffmpeg failed: {stderr.decode(errors='ignore')[-500:]}")
+                return None
             
-            logger.info(f"✅ Audio converted to WAV: {output_file}")
-            return output_file
+            logger.info(f"✅ Audio decoded: {len(pcm) / 2 / SAMPLE_RATE:.1f}s of PCM")
+            return pcm
             
-        except ImportError:
-            logger.error("ffmpeg-python not installed")
+        except FileNotFoundError:
+            logger.error("ffmpeg binary not found")
             return None
         except Exception as e:
-            logger.error(f"Error converting audio: {e}")
+            logger.error(f"Error decoding audio: {e}")
             return None
     
-    async def transcribe_audio(self, audio_file: Path) -> Tuple[Optional[str], Optional[str]]:
-        """Транскрибация аудио в текст"""
-        if not self._stt_model:
-            return None, "STT model not available"
+    async def transcribe_audio(self, pcm: bytes, user_id: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Транскрибация PCM в текст через пул процессов STT
         
+        Returns:
+            Tuple[text, language]; при ошибке text=None, а вместо языка код ошибки
+        """
         try:
-            if isinstance(self._stt_model, str) and self._stt_model == "vosk":
-                return await self._transcribe_vosk(audio_file)
-            else:
-                return await self._transcribe_faster_whisper(audio_file)
-                
+            text, language = await stt_worker_pool.submit(user_id, pcm)
+            logger.info(f"✅ Transcription completed: {len(text or '')} chars, lang: {language}")
+            return text, language
+        except STTQueueFull:
+            logger.warning(f"STT queue is full, rejecting voice from user {user_id}")
+            return None, "stt_busy"
+        except asyncio.TimeoutError:
+            logger.warning(f"STT timeout for user {user_id}")
+            return None, "stt_timeout"
         except Exception as e:
             logger.error(f"Error transcribing audio: {e}")
             return None, "transcription_error"
     
-    async def _transcribe_faster_whisper(self, audio_file: Path) -> Tuple[Optional[str], Optional[str]]:
-        """Транскрибация с помощью faster-whisper"""
-        try:
-            segments, info = self._stt_model.transcribe(str(audio_file))
-            
-            # Combine all segments
-            text = " ".join([segment.text for segment in segments])
-            
-            # Detect language
-            detected_lang = info.language
-            
-            logger.info(f"✅ Transcription completed: {len(text)} chars, lang: {detected_lang}")
-            return text.strip(), detected_lang
-            
-        except Exception as e:
-            logger.error(f"Faster-whisper transcription error: {e}")
-            return None, "transcription_error"
-    
-    async def _transcribe_vosk(self, audio_file: Path) -> Tuple[Optional[str], Optional[str]]:
-        """Транскрибация с помощью Vosk (fallback)"""
-        try:
-            import vosk
-            import json
-            
-            # Load model (you need to download models separately)
-            model_path = os.getenv("VOSK_MODEL_PATH", "vosk-model-small-ru-0.22")
-            if not os.path.exists(model_path):
-                logger.error(f"Vosk model not found at {model_path}")
-                return None, "model_not_found"
-            
-            model = vosk.Model(model_path)
-            rec = vosk.KaldiRecognizer(model, 16000)
-            
-            # Read audio file
-            with open(audio_file, 'rb') as f:
-                while True:
-                    data = f.read(4000)
-                    if len(data) == 0:
-                        break
-                    if rec.AcceptWaveform(data):
-                        pass
-            
-            result = json.loads(rec.FinalResult())
-            text = result.get('text', '')
-            
-            logger.info(f"✅ Vosk transcription completed: {len(text)} chars")
-            return text.strip(), "ru"  # Default to Russian for Vosk
-            
-        except Exception as e:
-            logger.error(f"Vosk transcription error: {e}")
-            return None, "transcription_error"
-    
-    async def cleanup_temp_files(self, *files: Path):
-        """Очистка временных файлов"""
-        for file_path in files:
-            try:
-                if file_path and file_path.exists():
-                    file_path.unlink()
-                    logger.debug(f"🗑️ Cleaned up temp file: {file_path}")
-            except Exception as e:
-                logger.warning(f"Failed to cleanup {file_path}: {e}")
-    
     async def process_voice_message(self, bot: Bot, message: Message) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         """
         Полная обработка голосового сообщения
@@ -237,22 +153,20 @@ class VoiceService:
             voice = message.voice or message.audio
             
             # Download file
-            temp_file = await self.download_voice_file(bot, voice)
-            if not temp_file:
+            data = await self.download_voice_file(bot, voice)
+            if not data:
                 return None, None, "download_error"
             
-            # Convert to WAV
-            wav_file = await self.convert_to_wav(temp_file)
-            if not wav_file:
-                await self.cleanup_temp_files(temp_file)
+            # Decode to PCM
+            pcm = await self.decode_audio(data)
+            if not pcm:
                 return None, None, "conversion_error"
             
             # Transcribe
-            text, language = await self.transcribe_audio(wav_file)
-            
-            # Cleanup
-            await self.cleanup_temp_files(temp_file, wav_file)
+            text, language = await self.transcribe_audio(pcm, message.from_user.id)
             
+            if language in ("stt_busy", "stt_timeout", "transcription_error"):
+                return None, None, language
             if not text:
                 return None, None, "couldnt_understand"
             
@@ -24,6 +24,34 @@ class Features:
     verbose_admin_back: bool = field(default=False)
     multi_platform_available: bool = field(default=True)
 
+@dataclass
+class KarmaConfig:
+    card_generation_limit: int = field(default_factory=lambda: int(os.getenv("CARD_GENERATION_LIMIT", "10000")))
+
+@dataclass
+class CardsConfig:
+    prefix: str = field(default_factory=lambda: os.getenv("CARD_PREFIX", "KS"))
+    start_number: int = field(default_factory=lambda: int(os.getenv("CARD_START_NUMBER", "12340001")))
+    format: str = field(default="{prefix}{number}")
+    printable_format: str = field(default="{prefix}-{group1}-{group2}")
+
+@dataclass
+class VoiceConfig:
+    max_duration: int = field(default_factory=lambda: int(os.getenv("VOICE_MAX_DURATION", "60")))
+    max_filesize_mb: int = field(default_factory=lambda: int(os.getenv("VOICE_MAX_FILESIZE_MB", "20")))
+    rate_limit: int = field(default_factory=lambda: int(os.getenv("VOICE_RATE_LIMIT", "5")))
+    rate_period: int = field(default_factory=lambda: int(os.getenv("VOICE_RATE_PERIOD", "60")))
+    # Модель и пул распознавания речи
+    stt_model_size: str = field(default_factory=lambda: os.getenv("STT_MODEL_SIZE", "small"))
+    stt_compute_type: str = field(default_factory=lambda: os.getenv("STT_COMPUTE_TYPE", "int8"))
+    # process — модель в каждом процессе; thread — одна общая модель на все потоки
+    stt_executor: str = field(default_factory=lambda: os.getenv("STT_EXECUTOR", "process"))
+    stt_warmup: bool = field(default_factory=lambda: os.getenv("STT_WARMUP", "true").lower() == "true")
+    stt_workers: int = field(default_factory=lambda: int(os.getenv("STT_WORKERS", "2")))
+    stt_queue_size: int = field(default_factory=lambda: int(os.getenv("STT_QUEUE_SIZE", "32")))
+    stt_per_user_limit: int = field(default_factory=lambda: int(os.getenv("STT_PER_USER_LIMIT", "2")))
+    stt_timeout: float = field(default_factory=lambda: float(os.getenv("STT_TIMEOUT", "60")))
+
 @dataclass
 class DatabaseConfig:
     url: str = field(default_factory=lambda: os.getenv("DATABASE_URL", "sqlite:///./data.db"))
@@ -39,6 +67,9 @@ class Settings:
     supabase_key: str = field(default_factory=lambda: os.getenv("SUPABASE_KEY", ""))
     redis_url: str = field(default_factory=lambda: os.getenv("REDIS_URL", "redis://localhost:6379/0"))
     features: Features = field(default_factory=Features)
+    karma: KarmaConfig = field(default_factory=KarmaConfig)
+    cards: CardsConfig = field(default_factory=CardsConfig)
+    voice: VoiceConfig = field(default_factory=VoiceConfig)
     
     # Настройки ботов
     admin_id: int = field(default_factory=lambda: int(os.getenv("ADMIN_ID", "6391215556")))  # Ваш ID как админ
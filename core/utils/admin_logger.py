@@ -23,7 +23,7 @@ for handler in admin_logger.handlers[:]:
 
 # Создать файловый обработчик
 log_file = log_dir / "admin_actions.log"
-file_handler = logging.FileHandler(log_file, encoding='utf-8')
+file_handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)  # файл открывается при первой записи
 file_handler.setLevel(logging.INFO)
 
 # Создать форматтер с подробной информацией
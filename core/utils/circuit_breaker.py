@@ -0,0 +1,86 @@
+"""
+Circuit breaker для внешних сервисов
+
+После `failure_threshold` подряд неудачных вызовов цепь размыкается: вызовы
+сразу получают CircuitOpenError, не тратя время на таймауты. Через
+`reset_timeout` секунд пропускается один пробный вызов (half-open): успех
+замыкает цепь, неудача снова размыкает ее.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Вызов отклонен: цепь разомкнута"""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Разрешить вызов или бросить CircuitOpenError"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probe_in_flight:
+                # Один пробный вызов, остальные ждут его результата
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = True
+                return
+            self._rejected += 1
+        raise CircuitOpenError(f"{self.name}: circuit open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"🔌 {self.name}: circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"🔌 {self.name}: circuit opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Вызов отменен до результата: освободить пробный слот, не считая это сбоем"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            failures, rejected = self._failures, self._rejected
+        return {'state': self.state, 'failures': failures, 'rejected': rejected}
+
+
+__all__ = ['CircuitBreaker', 'CircuitOpenError']
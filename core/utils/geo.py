@@ -197,3 +197,43 @@ def format_distance(distance_km: float) -> str:
         return f"{int(distance_km * 1000)} м"
     else:
         return f"{distance_km:.1f} км"
+
+# Города сервиса: id как в клавиатуре выбора города (inline_v2.get_cities_inline),
+# написания для поиска в адресе и центр города
+CITIES: Dict[int, Tuple[Tuple[str, ...], GeoPoint]] = {
+    1: (("нячанг", "nha trang", "nhatrang"), GeoPoint(12.2388, 109.1967)),
+    2: (("дананг", "da nang", "đà nẵng", "danang"), GeoPoint(16.0544, 108.2022)),
+    3: (("хошимин", "ho chi minh", "hồ chí minh", "saigon", "сайгон"), GeoPoint(10.8231, 106.6297)),
+    4: (("фукуок", "phu quoc", "phú quốc"), GeoPoint(10.2899, 103.9840)),
+}
+
+# Дальше этого от центра точка не относится ни к одному городу
+CITY_RADIUS_KM = 60.0
+
+def resolve_city_id(
+    address: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+) -> Optional[int]:
+    """
+    Определяет город заведения по адресу, а если в адресе города нет — по координатам.
+    
+    Args:
+        address: Адрес заведения
+        latitude, longitude: Координаты заведения
+        
+    Returns:
+        ID города из CITIES или None
+    """
+    if address:
+        text = address.lower()
+        for city_id, (names, _) in CITIES.items():
+            if any(name in text for name in names):
+                return city_id
+    
+    if latitude is None or longitude is None:
+        return None
+    
+    point = GeoPoint(float(latitude), float(longitude))
+    distance, city_id = min((point.distance_to(center), city_id) for city_id, (_, center) in CITIES.items())
+    return city_id if distance <= CITY_RADIUS_KM else None
@@ -0,0 +1,94 @@
+"""
+Профилировщик времени импорта модулей
+
+Ставится первым в sys.meta_path и замеряет exec_module каждого загружаемого
+модуля: полное время (с вложенными импортами) и собственное. Включается
+переменной PROFILE_IMPORTS=1 в main_v2, результаты уходят в startup_report.
+"""
+from __future__ import annotations
+
+import sys
+import time
+from importlib.abc import Loader, MetaPathFinder
+from typing import Dict, List, Optional, Tuple
+
+from core.utils.startup_report import startup_report
+
+
+class _TimingLoader(Loader):
+    """Обертка над настоящим загрузчиком; после загрузки модуль получает исходный loader обратно"""
+
+    def __init__(self, loader: Loader, profiler: "ImportProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        spec = module.__spec__
+        self._profiler._stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - started
+            children = self._profiler._stack.pop()
+            if self._profiler._stack:
+                self._profiler._stack[-1] += total
+            self._profiler.timings[module.__name__] = (total, total - children)
+            spec.loader = self._loader
+            module.__loader__ = self._loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportProfiler(MetaPathFinder):
+    """Собирает (cumulative, self) секунды по каждому импортированному модулю"""
+
+    def __init__(self):
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self._stack: List[float] = []
+        self._installed = False
+
+    def install(self) -> None:
+        if not self._installed:
+            sys.meta_path.insert(0, self)
+            self._installed = True
+
+    def uninstall(self) -> None:
+        if self._installed:
+            sys.meta_path.remove(self)
+            self._installed = False
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimingLoader(spec.loader, self)
+        return spec
+
+    def top(self, limit: int = 20, prefix: Optional[str] = None) -> List[Tuple[str, float, float]]:
+        """Самые медленные модули по собственному времени"""
+        rows = [
+            (name, total, own) for name, (total, own) in self.timings.items()
+            if prefix is None or name.startswith(prefix)
+        ]
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:limit]
+
+    def report(self, limit: int = 20) -> None:
+        """Переложить самые медленные импорты в startup_report"""
+        for name, total, own in self.top(limit):
+            startup_report.record(name, own, kind="import", cumulative_ms=round(total * 1000, 1))
+
+
+# Глобальный экземпляр
+import_profiler = ImportProfiler()
@@ -0,0 +1,98 @@
+"""
+Ленивая регистрация роутеров aiogram
+
+LazyRouter занимает место настоящего роутера в дереве диспетчера, но модуль с
+хендлерами импортирует только при первом апдейте, попавшем под его триггеры
+(команды, тексты кнопок, префиксы callback_data). После загрузки настоящий
+роутер включается внутрь LazyRouter, и апдейт обрабатывается им же — порядок
+роутеров и поведение не меняются.
+
+Триггеры объявляет сам модуль хендлеров литералом LAZY_TRIGGERS (его же
+используют фильтры); LazyRouter.from_module читает его из исходника через ast,
+не импортируя модуль.
+"""
+from __future__ import annotations
+
+import ast
+import logging
+import time
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from aiogram import F, Router
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+
+from core.utils.startup_report import startup_report
+
+logger = logging.getLogger(__name__)
+
+TRIGGERS_ATTR = "LAZY_TRIGGERS"
+
+
+def read_module_triggers(module: str) -> Dict[str, List[str]]:
+    """LAZY_TRIGGERS модуля (commands/texts/callback_prefixes) без импорта самого модуля"""
+    spec = find_spec(module)
+    if spec is None or not spec.origin:
+        raise ModuleNotFoundError(module)
+    tree = ast.parse(Path(spec.origin).read_text(encoding="utf-8"), filename=spec.origin)
+    for node in tree.body:
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target] if isinstance(node, ast.AnnAssign) else []
+        if any(isinstance(target, ast.Name) and target.id == TRIGGERS_ATTR for target in targets):
+            return ast.literal_eval(node.value)
+    raise LookupError(f"{module} does not define {TRIGGERS_ATTR}")
+
+
+class LazyRouter(Router):
+    """Заглушка, подгружающая `module:attr` по первому подходящему апдейту"""
+
+    def __init__(
+        self,
+        module: str,
+        attr: str = "router",
+        *,
+        commands: Iterable[str] = (),
+        texts: Iterable[str] = (),
+        callback_prefixes: Iterable[str] = (),
+    ):
+        super().__init__(name=f"lazy:{module}")
+        self.module = module
+        self.attr = attr
+        self.loaded: Optional[Router] = None
+
+        commands, texts, callback_prefixes = list(commands), list(texts), list(callback_prefixes)
+        if commands:
+            self.message.register(self._trigger, Command(*commands))
+        if texts:
+            self.message.register(self._trigger, F.text.in_(texts))
+        if callback_prefixes:
+            self.callback_query.register(
+                self._trigger, F.data.func(lambda data: data.startswith(tuple(callback_prefixes)))
+            )
+
+    @classmethod
+    def from_module(cls, module: str, attr: str = "router") -> "LazyRouter":
+        """LazyRouter с триггерами, которые экспортирует сам модуль хендлеров"""
+        return cls(module, attr, **read_module_triggers(module))
+
+    def load(self) -> Router:
+        """Импортировать модуль и подключить настоящий роутер (идемпотентно)"""
+        if self.loaded is None:
+            started = time.perf_counter()
+            router = getattr(import_module(self.module), self.attr)
+            if callable(router) and not isinstance(router, Router):
+                router = router()  # фабрики вида get_*_router()
+            self.include_router(router)
+            self.loaded = router
+            elapsed = time.perf_counter() - started
+            startup_report.record(self.module, elapsed, kind="lazy_import")
+            logger.info(f"📦 Lazy router loaded: {self.module} in {elapsed * 1000:.0f} ms")
+        return self.loaded
+
+    async def _trigger(self, event: Message | CallbackQuery, **kwargs):
+        self.load()
+        # Пропускаем заглушку: aiogram продолжит обход с sub_routers, где уже настоящий роутер
+        raise SkipHandler()
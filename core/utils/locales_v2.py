@@ -2,9 +2,20 @@
 Enhanced localization with backward compatibility
 Extends existing translations without breaking changes
 """
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+import asyncio
 import json
+import logging
+import os
+import sys
+from collections.abc import Mapping
 from pathlib import Path
+from string import Formatter
+
+logger = logging.getLogger(__name__)
+
+I18N_DIR = Path(__file__).resolve().parent.parent / 'i18n'
+FALLBACK_LANG = 'ru'
 
 # Alias mapping for deprecated keys (backward compatibility)
 ALIASES = {
@@ -82,6 +93,8 @@ translations_v2 = {
         'catalog_found': '발견된 매장',
         'catalog_page': '페이지',
         'catalog_empty_sub': '❌ 이 하위 카테고리에는 아직 매장이 없습니다.',
+        'catalog_search_prompt': '🔍 장소 이름, 주소 또는 할인을 입력하세요 (예: <code>pho</code>, 카테고리 필터: <code>#restaurants pho</code>):',
+        'catalog_search_empty': "❌ '{query}'에 대한 결과가 없습니다.",
         'catalog_error': '❌ 카탈로그 로드 오류. 나중에 다시 시도해주세요.',
         'districts_found': '🌆 <b>지역별 매장:</b>\n\n',
         'no_districts_found': '❌ 지역별 매장을 찾을 수 없습니다.',
@@ -287,6 +300,7 @@ translations_v2 = {
         'commands.policy': '개인정보 보호정책',
         'commands.clear_cache': '캐시 지우기 (관리자만)',
         'commands.tariffs': '요금제 보기',
+        'commands.search': '장소 검색',
     },
     'vi': {
         # v4.2.4 minimal labels
@@ -327,6 +341,8 @@ translations_v2 = {
         'catalog_found': 'Tìm thấy địa điểm',
         'catalog_page': 'Trang',
         'catalog_empty_sub': '❌ Chưa có địa điểm nào trong danh mục con này.',
+        'catalog_search_prompt': '🔍 Nhập tên, địa chỉ hoặc ưu đãi (ví dụ: <code>pho</code>, lọc theo danh mục: <code>#restaurants pho</code>):',
+        'catalog_search_empty': "❌ Không tìm thấy kết quả cho '{query}'.",
         'catalog_error': '❌ Lỗi tải danh mục. Vui lòng thử lại sau.',
         'districts_found': '🌆 <b>Địa điểm theo khu vực:</b>\n\n',
         'no_districts_found': '❌ Không tìm thấy địa điểm theo khu vực.',
@@ -535,6 +551,7 @@ Bạn có quyền truy cập, sửa đổi và xóa dữ liệu cá nhân của
         'commands.policy': 'Chính sách bảo mật',
         'commands.clear_cache': 'Xóa cache (chỉ admin)',
         'commands.tariffs': 'Xem gói cước',
+        'commands.search': 'Tìm địa điểm',
     },
     'ru': {
         # v4.2.4 menu keys
@@ -566,6 +583,7 @@ Bạn có quyền truy cập, sửa đổi và xóa dữ liệu cá nhân của
         'commands.policy': 'Политика конфиденциальности',
         'commands.clear_cache': 'Очистить кэш (только админ)',
         'commands.tariffs': 'Просмотр тарифов',
+        'commands.search': 'Поиск заведений',
         # v4.2.5 commands (новые описания)
         'commands.add_card': 'Добавить партнёра',
         
@@ -644,6 +662,8 @@ Bạn có quyền truy cập, sửa đổi và xóa dữ liệu cá nhân của
         'catalog_found': 'Найдено заведений',
         'catalog_page': 'Страница',
         'catalog_empty_sub': '❌ В этой подкатегории пока нет заведений.',
+        'catalog_search_prompt': '🔍 Введите название, адрес или скидку (например: <code>pho</code>, фильтр по категории: <code>#restaurants pho</code>):',
+        'catalog_search_empty': "❌ По запросу '{query}' ничего не найдено.",
         'catalog_error': '❌ Ошибка загрузки каталога. Попробуйте позже.',
         'districts_found': '🌆 <b>Заведения по районам:</b>\n\n',
         'no_districts_found': '❌ Заведений по районам не найдено.',
@@ -854,6 +874,24 @@ Bạn có quyền truy cập, sửa đổi và xóa dữ liệu cá nhân của
         'actv_claim_ok': '✅ Активность засчитана! Баллы начислены.',
         'actv_geo_required': '📍 Нужна геолокация. Отправьте местоположение и повторите.',
         'actv_out_of_coverage': 'ℹ️ Вы вне зоны действия для этой активности.',
+        # AI-ассистент "Карма": ответы поддержки (индексируются SupportAIService)
+        'support_ai_hi': '🤖 Привет! Я Карма, помощник KarmaBot. Спросите про баллы, QR-коды, отчёты или уведомления.',
+        'support_ai_general_help': '🤖 Я могу помочь с баллами, QR-кодами, отчётами и уведомлениями. Опишите вопрос подробнее или откройте /help.',
+        'support_ai_error': '❌ Не удалось обработать вопрос. Попробуйте позже.',
+        'support_ai_qr_expired': '⌛ QR-код истёк. Сгенерируйте новый в разделе «Мои QR-коды» — срок действия отсчитывается заново.',
+        'support_ai_qr_repeat': '🔁 QR-код уже использован. Каждый код применяется только один раз — создайте новый для следующей покупки.',
+        'support_ai_no_balance': '💰 Недостаточно баллов для списания. Баллы начисляются за покупки у партнёров, баланс видно в личном кабинете.',
+        'support_ai_no_rights': '🔒 У вас нет прав для этого действия или доступа к разделу. Обратитесь к администратору.',
+        'support_ai_report_ask_range': '📊 За какой период сделать отчёт? Например: «неделя», «месяц» или даты «01.09–30.09». Выгрузка файлом: /export_report.',
+        'support_ai_reports_user': '📊 Вам доступны отчёты: покупки, начисленные и списанные баллы, история визитов.',
+        'support_ai_reports_partner': '📊 Партнёрам доступны отчёты: заведения, продажи, аналитика по чекам и баллам.',
+        'support_ai_reports_admin': '📊 Администраторам доступны отчёты: все данные платформы, партнёры, города, сводка по платформе.',
+        'support_ai_qr_troubleshoot': '🛠 QR-код не работает: проверьте, что он не истёк и не использован, обновите экран и покажите код партнёру ещё раз. Если не помогло — создайте новый код.',
+        'support_ai_points_troubleshoot': '🛠 Баллы не начислились: начисление может занять несколько минут после оплаты. Проверьте историю в личном кабинете; если баллов нет через час — напишите в поддержку.',
+        'support_ai_general_troubleshoot': '🛠 Опишите, что именно не работает и на каком шаге, — я подскажу решение. Также помогает перезапуск: /start.',
+        'support_ai_become_partner': '🤝 Чтобы стать партнёром, нажмите /add_card и заполните заявку: название, категория, адрес и скидка. После модерации заведение появится в каталоге.',
+        'support_ai_change_city': '🏙 Город меняется командой /city — каталог и поиск покажут заведения выбранного города.',
+        'support_ai_change_language': '🌐 Язык меняется в профиле или командой /language.',
     },
     'en': {
         # v4.2.4 minimal labels
@@ -943,6 +981,8 @@ Bạn có quyền truy cập, sửa đổi và xóa dữ liệu cá nhân của
         'catalog_found': 'Found places',
         'catalog_page': 'Page',
         'catalog_empty_sub': '❌ No places in this subcategory yet.',
+        'catalog_search_prompt': '🔍 Type a name, address or discount (e.g. <code>pho</code>, category filter: <code>#restaurants pho</code>):',
+        'catalog_search_empty': "❌ Nothing found for '{query}'.",
         'catalog_error': '❌ Catalog loading error. Please try again later.',
         'districts_found': '🌆 <b>Places by district:</b>\n\n',
         'no_districts_found': '❌ No places by district found.',
@@ -1099,40 +1139,181 @@ For questions about personal data processing, contact the bot administrator.
         'commands.policy': 'Privacy policy',
         'commands.clear_cache': 'Clear cache (admin only)',
         'commands.tariffs': 'View tariffs',
+        'commands.search': 'Search places',
+        # Karma AI assistant: support answers (indexed by SupportAIService)
+        'support_ai_hi': '🤖 Hi! I am Karma, the KarmaBot assistant. Ask me about points, QR codes, reports or notifications.',
+        'support_ai_general_help': '🤖 I can help with points, QR codes, reports and notifications. Describe your question in more detail or open /help.',
+        'support_ai_error': '❌ Could not process your question. Please try again later.',
+        'support_ai_qr_expired': '⌛ The QR code has expired. Generate a new one in "My QR codes" — the validity period starts over.',
+        'support_ai_qr_repeat': '🔁 The QR code has already been used. Each code works only once — create a new one for your next purchase.',
+        'support_ai_no_balance': '💰 Not enough points. Points are earned on purchases from partners; your balance is shown in your cabinet.',
+        'support_ai_no_rights': '🔒 You do not have permission or access to this section. Please contact an administrator.',
+        'support_ai_report_ask_range': '📊 Which period should the report cover? For example: "week", "month" or dates "01.09–30.09". File export: /export_report.',
+        'support_ai_reports_user': '📊 Available reports: purchases, earned and spent points, visit history.',
+        'support_ai_reports_partner': '📊 Partner reports: places, sales, receipt and points analytics.',
+        'support_ai_reports_admin': '📊 Admin reports: all platform data, partners, cities, platform summary.',
+        'support_ai_qr_troubleshoot': '🛠 QR code not working: make sure it has not expired or been used, refresh the screen and show the code to the partner again. If that fails, create a new code.',
+        'support_ai_points_troubleshoot': '🛠 Points not credited: crediting can take a few minutes after payment. Check the history in your cabinet; if nothing shows up within an hour, contact support.',
+        'support_ai_general_troubleshoot': '🛠 Tell me what exactly does not work and at which step, and I will suggest a fix. Restarting with /start often helps too.',
+        'support_ai_become_partner': '🤝 To become a partner, tap /add_card and fill in the application: name, category, address and discount. After moderation the place appears in the catalog.',
+        'support_ai_change_city': '🏙 Change the city with /city — the catalog and search will show places in the selected city.',
+        'support_ai_change_language': '🌐 Change the language in your profile or with /language.',
     }
 }
 
+# Разобранный шаблон: части (литерал, поле, спецификация, конверсия) как у Formatter.parse;
+# в литералах {{ }} уже раскрыты. None — шаблон некорректен
+Template = Optional[Tuple[Tuple[str, Optional[str], Optional[str], Optional[str]], ...]]
+
+_formatter = Formatter()
+
+
+class TextTable(dict):
+    """
+    Плоская таблица языка: фолбэк на ru и алиасы уже вмержены, отсутствующий ключ -> "[key]"
+
+    templates — разобранные при сборке тексты со скобками; лежат в той же таблице,
+    поэтому подменяются вместе с ней.
+    """
+
+    templates: Dict[str, Template] = {}
+
+    def __missing__(self, key: str) -> str:
+        return f"[{key}]"
+
+
+class _Catalog:
+    """
+    Скомпилированный каталог переводов
+
+    Собирается один раз из translations_v2 и JSON из core/i18n: для каждого языка
+    строится плоская таблица {**ru, **lang} с разрешенными ALIASES, ключи
+    интернированы, тексты со скобками разобраны в шаблоны. get_text после этого —
+    один dict lookup, format_text — проход по готовым частям шаблона.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, TextTable] = {}
+        self.overrides: Dict[str, Dict[str, str]] = {}
+        self.mtimes: Dict[str, float] = {}
+        # Растет при каждой пересборке: кэши отрендеренных текстов включают его в ключ
+        self.version = 0
+
+    def compile(self) -> None:
+        sources: Dict[str, Dict[str, str]] = {
+            lang: {**texts, **self.overrides.get(lang, {})}
+            for lang, texts in translations_v2.items()
+        }
+        for lang, texts in self.overrides.items():
+            sources.setdefault(lang, dict(texts))
+
+        base = sources.get(FALLBACK_LANG, {})
+        tables: Dict[str, TextTable] = {}
+        for lang, texts in sources.items():
+            table = TextTable((sys.intern(k), v) for k, v in base.items())
+            table.update((sys.intern(k), v) for k, v in texts.items())
+            # Алиас указывает на канонический ключ — та же логика, что у прежнего get_text
+            for alias in ALIASES:
+                target = _resolve_alias(alias)
+                table[sys.intern(alias)] = texts.get(target, base.get(target, f"[{target}]"))
+            table.templates = {
+                key: _compile_template(value) for key, value in table.items()
+                if isinstance(value, str) and ('{' in value or '}' in value)
+            }
+            tables[lang] = table
+
+        # Атомарная подмена: читатели видят либо старый, либо новый каталог
+        self.tables = tables
+        self.version += 1
+
+
+def _resolve_alias(key: str) -> str:
+    seen = set()
+    while key in ALIASES and key not in seen:
+        seen.add(key)
+        key = ALIASES[key]
+    return key
+
+
+def _compile_template(value: str) -> Template:
+    try:
+        return tuple(_formatter.parse(value))
+    except ValueError:
+        return None
+
+
+def _render_template(parts: Template, kwargs: Dict[str, Any]) -> str:
+    """Подстановка по разобранному шаблону — то же, что str.format(**kwargs), без разбора строки"""
+    out = []
+    for literal, field, spec, conversion in parts:
+        out.append(literal)
+        if field is None:
+            continue
+        value, _ = _formatter.get_field(field, (), kwargs)
+        value = _formatter.convert_field(value, conversion)
+        if spec and '{' in spec:
+            spec = _formatter.vformat(spec, (), kwargs)
+        out.append(format(value, spec or ''))
+    return ''.join(out)
+
+
+_catalog = _Catalog()
+
+
 def get_text(key: str, lang: str = 'ru') -> str:
     """
     Get localized text with fallback and alias support
     Backward compatible with existing code
     """
-    # Check aliases first
-    if key in ALIASES:
-        canonical_key = ALIASES[key]
-        return get_text(canonical_key, lang)
-    
-    # Try new translations first
-    if lang in translations_v2 and key in translations_v2[lang]:
-        return translations_v2[lang][key]
-    
-    # Fallback to Russian if key not found in requested language
-    if key in translations_v2['ru']:
-        return translations_v2['ru'][key]
-    
-    # Ultimate fallback
-    return f"[{key}]"
+    table = _catalog.tables.get(lang) or _catalog.tables[FALLBACK_LANG]
+    return table[key]
+
+def format_text(key: str, lang: str = 'ru', **kwargs: Any) -> str:
+    """get_text + подстановка параметров по шаблону, разобранному при сборке каталога ({{ }} -> скобки)"""
+    table = _catalog.tables.get(lang) or _catalog.tables[FALLBACK_LANG]
+    text = table[key]
+    if key not in table.templates:
+        return text
+    parts = table.templates[key]
+    try:
+        if parts is None:
+            raise ValueError("malformed template")
+        return _render_template(parts, kwargs)
+    except (KeyError, IndexError, ValueError, AttributeError, TypeError) as e:
+        logger.warning(f"Failed to format '{key}' ({lang}): {e}")
+        return text
 
 def get_all_texts(lang: str = 'ru') -> Dict[str, str]:
-    """Get all texts for a language"""
-    return translations_v2.get(lang, translations_v2['ru'])
+    """Get all texts for a language (с фолбэком на ru: t['key'] не бросает KeyError)"""
+    return _catalog.tables.get(lang) or _catalog.tables[FALLBACK_LANG]
+
+def get_catalog_version() -> int:
+    """Номер сборки каталога (меняется при горячей перезагрузке переводов)"""
+    return _catalog.version
 
 def get_supported_languages() -> list:
     """Get list of supported language codes"""
     return list(translations_v2.keys())
 
-# Backward compatibility: expose as 'translations' for existing code
-translations = translations_v2
+class _TranslationsView(Mapping):
+    """
+    Backward compatibility: 'translations' for existing code
+
+    Живое представление скомпилированного каталога: translations[lang] — текущая
+    таблица языка с JSON-переопределениями, после горячей перезагрузки видна новая.
+    """
+
+    def __getitem__(self, lang: str) -> TextTable:
+        return _catalog.tables[lang]
+
+    def __iter__(self):
+        return iter(_catalog.tables)
+
+    def __len__(self) -> int:
+        return len(_catalog.tables)
+
+
+translations = _TranslationsView()
 
 # Export for contract tests
 REQUIRED_KEYS = set(translations_v2['ru'].keys())
@@ -1142,42 +1323,73 @@ def validate_translations() -> Dict[str, list]:
     missing_keys = {}
     
     for lang, texts in translations_v2.items():
-        missing = REQUIRED_KEYS - set(texts.keys())
+        missing = REQUIRED_KEYS - set(texts.keys()) - set(_catalog.overrides.get(lang, {}))
         if missing:
             missing_keys[lang] = list(missing)
     
     return missing_keys
 
 
-def load_translations_from_dir(dirpath: str = None):
+def _scan_dir(dirpath: Path) -> Dict[str, float]:
+    if not dirpath.exists():
+        return {}
+    return {str(file): file.stat().st_mtime for file in dirpath.glob("*.json")}
+
+
+def load_translations_from_dir(dirpath: Optional[str] = None) -> bool:
     """Load translations from all JSON files in a directory.
     Each file should be named like 'ru.json', 'en.json', etc., containing a flat {key: text} map.
+    JSON накладывается поверх встроенных переводов в каталоге, translations_v2 не меняется.
+    Returns True если каталог пересобран.
     """
-    global translations_v2, translations
-    
-    # Use absolute path if dirpath is not provided
-    if dirpath is None:
-        import os
-        dirpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'i18n')
-    
-    p = Path(dirpath)
+    p = Path(dirpath) if dirpath else I18N_DIR
     if not p.exists():
-        print(f"Warning: Translations directory not found: {p.absolute()}")
-        return
-        
-    for file in p.glob("*.json"):
+        logger.debug(f"Translations directory not found: {p}")
+        return False
+    
+    overrides: Dict[str, Dict[str, str]] = {}
+    for file in sorted(p.glob("*.json")):
         try:
             with open(file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                lang_code = file.stem
-                base = translations_v2.get(lang_code, {})
-                base.update(data)
-                translations_v2[lang_code] = base
-                print(f"Loaded translations for language: {lang_code}")
+                overrides[file.stem] = json.load(f)
+            logger.debug(f"Loaded translations for language: {file.stem}")
         except Exception as e:
-            print(f"Warning: Failed to load translations from {file}: {e}")
+            logger.warning(f"Failed to load translations from {file}: {e}")
+            # Битый файл при горячей перезагрузке не должен стирать рабочие строки
+            if file.stem in _catalog.overrides:
+                overrides[file.stem] = _catalog.overrides[file.stem]
     
-    translations = translations_v2
+    _catalog.overrides = overrides
+    _catalog.mtimes = _scan_dir(p)
+    _catalog.compile()
+    return True
+
+
+def reload_translations_if_changed(dirpath: Optional[str] = None) -> bool:
+    """Пересобрать каталог, если JSON в core/i18n добавлены, удалены или изменены"""
+    p = Path(dirpath) if dirpath else I18N_DIR
+    if _scan_dir(p) == _catalog.mtimes:
+        return False
+    if not p.exists():
+        _catalog.overrides, _catalog.mtimes = {}, {}
+        _catalog.compile()
+        return True
+    changed = load_translations_from_dir(str(p))
+    if changed:
+        logger.info(f"🌐 Translations reloaded from {p}")
+    return changed
+
+
+async def watch_translations(interval: float = 30.0, dirpath: Optional[str] = None) -> None:
+    """Фоновая задача горячей перезагрузки переводов без рестарта бота"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reload_translations_if_changed(dirpath)
+        except Exception as e:
+            logger.warning(f"Translations hot reload failed: {e}")
+
 
-# Auto-load on import
+# Компиляция каталога при импорте: встроенные строки + JSON из core/i18n
+_catalog.compile()
 load_translations_from_dir()
@@ -0,0 +1,158 @@
+"""
+Планировщик периодических задач на asyncio
+
+Все задачи выполняются в одном цикле событий. Блокирующий ввод-вывод
+задача выносит сама (asyncio.to_thread); структуры, которые задача делит
+с другими потоками, защищает их владелец.
+
+- interval ± jitter: паузы случайно смещаются, чтобы задачи разных
+  инстансов и соседние задачи не срабатывали одновременно;
+- если прошлый запуск еще идет, очередной тик пропускается (skipped);
+- по каждой задаче хранятся время и длительность последнего запуска;
+- stop() дожидается текущих запусков (до grace секунд) и отменяет остальное.
+"""
+import asyncio
+import inspect
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Union[None, Awaitable[Any]]]
+
+
+class ScheduledJob:
+    """Периодическая задача и статистика ее запусков"""
+
+    def __init__(self, name: str, func: JobFunc, interval: float, jitter: float = 0.1,
+                 timeout: Optional[float] = None, run_at_start: bool = True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter  # доля интервала
+        self.timeout = timeout
+        self.run_at_start = run_at_start
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_run: Optional[str] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._run_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._run_task is not None and not self._run_task.done()
+
+    def next_delay(self) -> float:
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + random.uniform(-spread, spread))
+
+    async def run_once(self) -> None:
+        """Один запуск: ошибки и таймаут попадают в статистику, а не наружу"""
+        self.last_run = datetime.utcnow().isoformat()
+        started = time.monotonic()
+        try:
+            result = self.func()
+            if inspect.isawaitable(result):
+                await asyncio.wait_for(result, timeout=self.timeout) if self.timeout else await result
+            self.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.failures += 1
+            self.last_error = f"timeout after {self.timeout}s"
+            logger.warning(f"Scheduled job '{self.name}' timed out after {self.timeout}s")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Scheduled job '{self.name}' failed: {e}")
+        finally:
+            self.runs += 1
+            self.last_duration = round(time.monotonic() - started, 4)
+
+    def trigger(self) -> bool:
+        """Запустить задачу сейчас; False, если прошлый запуск еще идет"""
+        if self.running:
+            self.skipped += 1
+            logger.debug(f"Scheduled job '{self.name}' still running, tick skipped")
+            return False
+        self._run_task = asyncio.create_task(self.run_once(), name=f"job:{self.name}")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'running': self.running,
+            'last_run': self.last_run,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+        }
+
+
+class JobScheduler:
+    """Один планировщик на набор периодических задач"""
+
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._started = False
+
+    def add_job(self, name: str, func: JobFunc, interval: float, **kwargs) -> ScheduledJob:
+        if name in self.jobs:
+            raise ValueError(f"Job '{name}' already registered in {self.name}")
+        job = ScheduledJob(name, func, interval, **kwargs)
+        self.jobs[name] = job
+        if self._started:
+            job._loop_task = asyncio.create_task(self._loop(job), name=f"{self.name}:{name}")
+        return job
+
+    @property
+    def is_running(self) -> bool:
+        return self._started
+
+    async def _loop(self, job: ScheduledJob) -> None:
+        if not job.run_at_start:
+            await asyncio.sleep(job.next_delay())
+        while True:
+            job.trigger()
+            await asyncio.sleep(job.next_delay())
+
+    async def start(self) -> None:
+        """Запустить тики всех задач в текущем цикле событий"""
+        if self._started:
+            return
+        self._started = True
+        for name, job in self.jobs.items():
+            job._loop_task = asyncio.create_task(self._loop(job), name=f"{self.name}:{name}")
+        logger.info(f"⏱️ {self.name}: started {len(self.jobs)} jobs")
+
+    async def stop(self, grace: float = 5.0) -> None:
+        """Остановить тики и дождаться идущих запусков; зависшие отменяются"""
+        if not self._started:
+            return
+        self._started = False
+        loops = [job._loop_task for job in self.jobs.values() if job._loop_task]
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        runs = [job._run_task for job in self.jobs.values() if job.running]
+        if runs:
+            _, pending = await asyncio.wait(runs, timeout=grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+        for job in self.jobs.values():
+            job._loop_task = None
+            job._run_task = None
+        logger.info(f"⏹️ {self.name}: stopped")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: job.get_stats() for name, job in self.jobs.items()}
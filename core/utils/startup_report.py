@@ -0,0 +1,74 @@
+"""
+Отчет о времени запуска: какие импорты и инициализаторы съедают boot time
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Собирает длительности этапов запуска (import / init / warmup)"""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._entries: List[Dict] = []
+
+    def record(self, name: str, seconds: float, kind: str = "init", **extra) -> None:
+        self._entries.append({'name': name, 'kind': kind, 'ms': round(seconds * 1000, 1), **extra})
+
+    @contextmanager
+    def measure(self, name: str, kind: str = "init") -> Iterator[None]:
+        """
+        Замер блока; работает и вокруг await:
+
+            with startup_report.measure("analytics_service", kind="init"):
+                await analytics_service.initialize()
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, kind)
+
+    def entries(self, kind: Optional[str] = None) -> List[Dict]:
+        return [e for e in self._entries if kind is None or e['kind'] == kind]
+
+    def summary(self, top: int = 15) -> str:
+        """Самые медленные этапы, по убыванию"""
+        lines = [f"⏱️ Startup report: {self.elapsed_ms():.0f} ms since process start"]
+        for entry in sorted(self._entries, key=lambda e: e['ms'], reverse=True)[:top]:
+            lines.append(f"  {entry['ms']:>9.1f} ms  [{entry['kind']}] {entry['name']}")
+        return "\n".join(lines)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def log(self, top: int = 15) -> None:
+        logger.info(self.summary(top))
+
+    def write(self, path: Optional[str] = None) -> Optional[str]:
+        """Сохранить отчет в JSON (STARTUP_REPORT_PATH); возвращает путь"""
+        path = path or os.getenv("STARTUP_REPORT_PATH")
+        if not path:
+            return None
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {'total_ms': round(self.elapsed_ms(), 1), 'entries': self._entries},
+                    f, ensure_ascii=False, indent=2
+                )
+            return path
+        except OSError as e:
+            logger.warning(f"Failed to write startup report to {path}: {e}")
+            return None
+
+
+# Глобальный экземпляр: создается при первом импорте, поэтому импортировать рано
+startup_report = StartupReport()
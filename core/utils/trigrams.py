@@ -0,0 +1,61 @@
+"""
+Триграммы для нечеткого поиска (совместимы с pg_trgm)
+
+Слово дополняется пробелами ("  слово ") и режется на тройки символов, как это
+делает pg_trgm — поэтому оценки в Python и в PostgreSQL ведут себя одинаково.
+Используется для построения MATCH-выражений FTS5 (tokenize='trigram') и для
+переранжирования кандидатов с учетом опечаток.
+"""
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр и схлопнутые пробелы"""
+    return " ".join((text or "").casefold().split())
+
+
+def words(text: str) -> List[str]:
+    """Слова запроса/текста в нормализованном виде"""
+    return _WORD_RE.findall(normalize(text))
+
+
+@lru_cache(maxsize=65536)
+def trigrams(word: str) -> FrozenSet[str]:
+    """Множество триграмм слова в стиле pg_trgm"""
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: str, b: str) -> float:
+    """Коэффициент Жаккара по триграммам (аналог pg_trgm similarity для одного слова)"""
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def best_similarity(word: str, tokens: Iterable[str]) -> float:
+    """Лучшее совпадение слова среди токенов текста"""
+    return max((similarity(word, token) for token in tokens), default=0.0)
+
+
+def fts5_match_expression(query_words: Iterable[str]) -> str:
+    """
+    MATCH-выражение для FTS5 с tokenize='trigram', устойчивое к опечаткам.
+
+    Каждое слово (от 3 символов) превращается в OR по его внутренним
+    триграммам, слова объединяются через AND. Опечатка ломает 1-3 триграммы,
+    остальные по-прежнему находят документ; точность добирает переранжирование.
+    Пустая строка — в запросе нет слов, пригодных для индекса.
+    """
+    groups = []
+    for word in query_words:
+        if len(word) < 3:
+            continue
+        grams = sorted({word[i:i + 3] for i in range(len(word) - 2)})
+        groups.append("(" + " OR ".join('"' + g.replace('"', '""') + '"' for g in grams) + ")")
+    return " AND ".join(groups)
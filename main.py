@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from api.platform_endpoints import main_router
 from core.database.enhanced_unified_service import enhanced_unified_db
+from core.database.fault_tolerant_service import fault_tolerant_db
 
 # Настройка логирования
 logging.basicConfig(
@@ -106,6 +107,9 @@ async def startup_event():
     health_status = enhanced_unified_db.health_check()
     logger.info(f"🏥 System health: {health_status['mode']}")
     
+    # Фоновые задачи отказоустойчивости: проверка БД, очистка, повтор операций
+    await fault_tolerant_db.start()
+    
     logger.info("🌟 System ready to handle multi-platform requests")
 
 @app.on_event("shutdown")
@@ -113,6 +117,8 @@ async def shutdown_event():
     """Очистка при остановке"""
     logger.info("🛑 Shutting down Fault-Tolerant Multi-Platform System")
     
+    await fault_tolerant_db.stop()
+    
     # Принудительная синхронизация перед остановкой
     try:
         sync_result = enhanced_unified_db.force_system_sync()
@@ -3,6 +3,12 @@ KARMABOT1 - Main entry point with aiogram v3 compatibility
 """
 from __future__ import annotations
 import os
+
+# Профилировщик импортов ставится до всех тяжелых импортов (PROFILE_IMPORTS=1)
+from core.utils.import_profiler import import_profiler
+if os.getenv("PROFILE_IMPORTS", "0") == "1":
+    import_profiler.install()
+
 import asyncio
 import logging
 import logging.handlers
@@ -23,6 +29,7 @@ from aiogram.exceptions import TelegramUnauthorizedError
 from aiogram.client.bot import Bot, DefaultBotProperties
 from aiogram.enums import ParseMode
 
+from core.utils.startup_report import startup_report
 from core.settings import Settings, get_settings, Features
 from core.database.migrations import ensure_database_ready
 
@@ -293,24 +300,27 @@ async def main():
     
     # Initialize performance service
     try:
-        from core.services.performance_service import performance_service
-        await performance_service.initialize()
+        with startup_report.measure("performance_service.initialize"):
+            from core.services.performance_service import performance_service
+            await performance_service.initialize()
         logger.info("🚀 Performance service initialized")
     except Exception as e:
         logger.warning(f"Failed to initialize performance service: {e}")
 
     # Initialize analytics service
     try:
-        from core.services.analytics_service import analytics_service
-        await analytics_service.initialize()
+        with startup_report.measure("analytics_service.initialize"):
+            from core.services.analytics_service import analytics_service
+            await analytics_service.initialize()
         logger.info("📊 Analytics service initialized")
     except Exception as e:
         logger.warning(f"Failed to initialize analytics service: {e}")
     
     # Initialize notification service
     try:
-        from core.services.notification_service import notification_service
-        await notification_service.initialize()
+        with startup_report.measure("notification_service.initialize"):
+            from core.services.notification_service import notification_service
+            await notification_service.initialize()
         logger.info("📱 Notification service initialized")
     except Exception as e:
         logger.warning(f"Failed to initialize notification service: {e}")
@@ -341,6 +351,9 @@ async def main():
     dp.include_router(callback_router)
     # 3) Categories
     dp.include_router(get_category_router())
+    # 3.1) Catalog search: /search and inline mode
+    from core.handlers.catalog_search import get_catalog_search_router
+    dp.include_router(get_catalog_search_router())
     # 4) Profile and cabinet
     prof = get_profile_router()
     if prof:
@@ -360,31 +373,95 @@ async def main():
     from core.handlers.loyalty_settings_router import router as loyalty_settings_router
     dp.include_router(loyalty_settings_router)
     
-    # 9) Tariff management (admin only)
-    from core.handlers.tariff_admin_router import router as tariff_admin_router
-    dp.include_router(tariff_admin_router)
+    # 9) Tariff management (admin only) — редкие роутеры подгружаются по первому апдейту
+    from core.utils.lazy_router import LazyRouter
+    # (триггеры — LAZY_TRIGGERS самих модулей)
+    dp.include_router(LazyRouter.from_module("core.handlers.tariff_admin_router"))
     
     # 9.1) Tariff commands for all users
-    from core.handlers.tariffs_user_router import router as tariffs_user_router
-    dp.include_router(tariffs_user_router)
+    dp.include_router(LazyRouter.from_module("core.handlers.tariffs_user_router"))
     
     # 9.2) Language selection router
     from core.handlers.language_router import router as language_router
     dp.include_router(language_router)
     
     # 9.3) Gamification router
-    from core.handlers.gamification_router import router as gamification_router
-    dp.include_router(gamification_router)
+    dp.include_router(LazyRouter.from_module("core.handlers.gamification_router"))
     
     # 10) ВРЕМЕННЫЙ роутер для исправления каталога
     from core.handlers.temp_catalog_fix import temp_router
     dp.include_router(temp_router)
     
+    # 9.4) Voice messages for the AI assistant: STT stack is imported only when enabled
+    if settings.features.support_voice:
+        with startup_report.measure("core.handlers.voice_handlers", kind="import"):
+            from core.handlers.voice_handlers import router as voice_router
+        dp.include_router(voice_router)
+        
+        if settings.voice.stt_warmup:
+            async def _warm_up_stt():
+                from core.services.stt_worker_pool import stt_worker_pool
+                try:
+                    await stt_worker_pool.warm_up()
+                except Exception as e:
+                    logger.warning(f"STT warm-up failed: {e}")
+            
+            async def _schedule_stt_warm_up():
+                # Модель грузится в фоне, не задерживая старт polling
+                dp.workflow_data["stt_warmup_task"] = asyncio.create_task(_warm_up_stt())
+            
+            dp.startup.register(_schedule_stt_warm_up)
+    
     # 10) Ping/catch-alls LAST
     dp.include_router(ping.router)
     
+    # Горячая перезагрузка переводов из core/i18n без рестарта
+    async def _start_i18n_watcher():
+        from core.utils.locales_v2 import watch_translations
+        interval = float(os.getenv("I18N_RELOAD_INTERVAL", "30"))
+        dp.workflow_data["i18n_watcher_task"] = asyncio.create_task(watch_translations(interval))
+    
+    dp.startup.register(_start_i18n_watcher)
+    
+    # Шина инвалидации кэшей: PG LISTEN/NOTIFY или Redis pub/sub между инстансами
+    async def _start_invalidation_bus():
+        from core.services.invalidation_bus import invalidation_bus
+        await invalidation_bus.start()
+    
+    async def _stop_invalidation_bus():
+        from core.services.invalidation_bus import invalidation_bus
+        await invalidation_bus.stop()
+    
+    dp.startup.register(_start_invalidation_bus)
+    dp.shutdown.register(_stop_invalidation_bus)
+
+    # Фоновые задачи отказоустойчивого слоя: проверки БД, очистка очереди и кэша, повтор операций
+    async def _start_fault_tolerance():
+        from core.database.fault_tolerant_service import fault_tolerant_db
+        await fault_tolerant_db.start()
+
+    async def _stop_fault_tolerance():
+        from core.database.fault_tolerant_service import fault_tolerant_db
+        await fault_tolerant_db.stop()
+
+    dp.startup.register(_start_fault_tolerance)
+    dp.shutdown.register(_stop_fault_tolerance)
+    
+    # Фоновая синхронизация карточек Odoo в cards_v2: каталог читает только локальную БД
+    async def _start_odoo_card_sync():
+        from core.services.odoo_card_sync import odoo_card_sync_service
+        if odoo_card_sync_service.is_enabled:
+            dp.workflow_data["odoo_card_sync_task"] = asyncio.create_task(odoo_card_sync_service.run_forever())
+    
+    dp.startup.register(_start_odoo_card_sync)
+    
     # Ensure database is ready
-    ensure_database_ready()
+    with startup_report.measure("ensure_database_ready"):
+        ensure_database_ready()
+    
+    import_profiler.report()
+    startup_report.log()
+    startup_report.write()
     
     # Log environment info
     env = settings.environment or "production"
@@ -1,12 +1,23 @@
-# АВТОНОМНЫЙ ФАЙЛ - НЕ ИМПОРТИРУЕТ ИЗ CORE/
+# АВТОНОМНЫЙ ФАЙЛ - ОТДЕЛЬНОЕ ПРИЛОЖЕНИЕ API МУЛЬТИПЛАТФОРМЫ
 
 from fastapi import FastAPI
 from api.platform_endpoints import main_router
+from core.database.fault_tolerant_service import fault_tolerant_db
 
 app = FastAPI(title="Multi-Platform System")
 
 app.include_router(main_router, prefix="/v1")
 
+
+@app.on_event("startup")
+async def startup_event():
+    await fault_tolerant_db.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await fault_tolerant_db.stop()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("multiplatform.main_api:app", host="0.0.0.0", port=8001, reload=True)
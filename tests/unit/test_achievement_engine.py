@@ -0,0 +1,164 @@
+"""
+Тесты движка достижений: заполнение счётчиков из источника, выдача достигнутых порогов
+"""
+import json
+import sqlite3
+
+import pytest
+
+from core.services.achievement_engine import AchievementEngine, AchievementEvent
+
+
+class _FakeConnection:
+    """Минимальная замена asyncpg-соединения для запросов движка"""
+
+    def __init__(self, sources):
+        self.sources = sources  # счётчик -> значение в исходной таблице
+        self.counters = {}
+        self.achievements = []
+
+    def transaction(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def close(self):
+        pass
+
+    async def execute(self, sql, *args):
+        pass
+
+    async def fetchval(self, sql, *args):
+        if sql.lstrip().startswith("UPDATE user_achievement_counters"):
+            user_id, counter, delta = args
+            if (user_id, counter) not in self.counters:
+                return None
+            self.counters[(user_id, counter)] += delta
+            return self.counters[(user_id, counter)]
+        if "INSERT INTO user_achievement_counters" in sql and "EXCLUDED.value" in sql:
+            user_id, counter, value = args
+            self.counters[(user_id, counter)] = value
+            return value
+        if "INSERT INTO user_achievement_counters" in sql:
+            user_id, counter, seeded, delta = args
+            key = (user_id, counter)
+            self.counters[key] = self.counters[key] + delta if key in self.counters else seeded
+            return self.counters[key]
+        if "INSERT INTO user_achievements" in sql:
+            user_id, achievement_type, data, key, milestone = args
+            for row in self.achievements:
+                stored = json.loads(row['data'])
+                if row['achievement_type'] == achievement_type and (
+                        milestone is None or milestone in (str(stored.get(key)), str(stored.get('target')))):
+                    return None
+            self.achievements.append({'achievement_type': achievement_type, 'data': data})
+            return len(self.achievements)
+        for counter, value in self.sources.items():
+            if counter in sql:
+                return value
+        raise AssertionError(sql)
+
+    async def fetch(self, sql, user_id, types):
+        assert "FROM user_achievements" in sql
+        return [{'achievement_type': row['achievement_type'], 'achievement_data': row['data']}
+                for row in self.achievements if row['achievement_type'] in types]
+
+
+@pytest.fixture
+def engine_with(monkeypatch):
+    def build(sources):
+        conn = _FakeConnection(sources)
+        engine = AchievementEngine()
+        engine.database_url = "postgresql://test"
+
+        async def get_connection():
+            return conn
+
+        monkeypatch.setattr(engine, 'get_connection', get_connection)
+        return engine, conn
+    return build
+
+
+@pytest.mark.asyncio
+async def test_missing_counter_is_seeded_from_source(engine_with):
+    # Пятая карта уже в cards_binding, строки счётчика еще нет
+    engine, conn = engine_with({'cards_binding': 5})
+    awarded = await engine.handle_event(AchievementEvent.CARD_BOUND, 1)
+    assert [(a['achievement_type'], a['threshold']) for a in awarded] == [('first_card', 1), ('card_collector', 5)]
+
+    assert await engine.handle_event(AchievementEvent.CARD_BOUND, 1) == []
+    assert conn.counters[(1, 'cards')] == 5
+
+
+@pytest.mark.asyncio
+async def test_card_counter_follows_actual_count(engine_with):
+    engine, conn = engine_with({})
+    first = await engine.handle_event(AchievementEvent.CARD_BOUND, 1, card_count=1)
+    assert [a['achievement_type'] for a in first] == ['first_card']
+    assert await engine.handle_event(AchievementEvent.CARD_BOUND, 1, card_count=1) == []
+    assert await engine.handle_event(AchievementEvent.CARD_UNBOUND, 1, card_count=0) == []
+    assert conn.counters[(1, 'cards')] == 0
+
+    awarded = await engine.handle_event(AchievementEvent.CARD_BOUND, 1, card_count=10)
+    assert [a['threshold'] for a in awarded] == [5, 10]
+
+
+@pytest.mark.asyncio
+async def test_milestones_reached_before_the_engine_are_backfilled(engine_with):
+    engine, conn = engine_with({})
+    conn.counters[(1, 'karma')] = 6000  # посеяно миграцией, порогов не выдавалось
+    conn.achievements.append({'achievement_type': 'karma_milestone', 'data': json.dumps({"karma": 1000})})
+    # Строка GamificationService в формате {"target", "achieved"} засчитывается как порог target
+    conn.achievements.append({'achievement_type': 'karma_milestone',
+                              'data': json.dumps({"target": 2500, "achieved": 2600})})
+
+    awarded = await engine.handle_event(AchievementEvent.POINTS_CREDITED, 1, counter='karma', amount=10)
+    assert [a['threshold'] for a in awarded] == [5000]
+    assert await engine.award_reached(1) == []
+
+
+@pytest.mark.asyncio
+async def test_single_type_achievement_is_not_duplicated(engine_with):
+    engine, conn = engine_with({'referrals': 10})
+    # Уже выдано GamificationService в формате {"target", "achieved"}
+    conn.achievements.append({'achievement_type': 'referral_master',
+                              'data': json.dumps({"target": 10, "achieved": 12})})
+    assert await engine.handle_event(AchievementEvent.REFERRAL_ADDED, 1) == []
+    assert conn.counters[(1, 'referrals')] == 10
+
+
+@pytest.mark.asyncio
+async def test_sqlite_reads_counters_from_source_tables(monkeypatch, tmp_path):
+    db_path = str(tmp_path / "achievements.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE users (telegram_id INTEGER, karma_points INTEGER, points_balance INTEGER);
+        CREATE TABLE cards_binding (telegram_id INTEGER, status TEXT);
+        CREATE TABLE referrals (inviter_id INTEGER);
+        CREATE TABLE user_achievements (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                                        achievement_type TEXT, achievement_data TEXT);
+        CREATE TABLE user_notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                                         message TEXT, notification_type TEXT);
+        INSERT INTO users VALUES (1, 0, 6000);
+        INSERT INTO cards_binding VALUES (1, 'active');
+        INSERT INTO cards_binding VALUES (1, 'unbound');
+    """)
+    conn.commit()
+    conn.close()
+
+    engine = AchievementEngine()
+    engine.database_url = ""
+    monkeypatch.setattr(engine, 'get_sqlite_connection', lambda: sqlite3.connect(db_path))
+
+    awarded = await engine.handle_event(AchievementEvent.POINTS_CREDITED, 1, counter='loyalty_points', amount=50)
+    assert [a['achievement_type'] for a in awarded] == ['loyalty_champion']
+    assert [a['achievement_type'] for a in await engine.award_reached(1)] == ['first_card']
+    assert await engine.award_reached(1) == []
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM user_notifications").fetchone()[0] == 2
+    conn.close()
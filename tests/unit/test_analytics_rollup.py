@@ -0,0 +1,50 @@
+"""
+Тесты дневных агрегатов аналитики: разбивка продаж по городу заведения
+"""
+import sqlite3
+from datetime import date, timedelta
+
+from core.database.migrations import DatabaseMigrator
+from core.services.analytics_service import AnalyticsService
+
+
+def test_sales_are_split_by_city_without_stored_city_id(tmp_path):
+    path = str(tmp_path / "analytics.db")
+    migrator = DatabaseMigrator(path)
+    migrator.init_migration_table()
+    migrator.migrate_017_loyalty_system()
+    migrator.migrate_020_loyalty_expansion()
+    migrator.migrate_026_analytics_daily()
+
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO partners (id, code, title) VALUES (1, 'P1', 'Pho Corp')")
+    conn.execute("INSERT INTO partner_places (id, partner_id, title, address) VALUES (1, 1, 'Pho 24', 'Нячанг, ул. Чан Фу, 1')")
+    conn.commit()
+    conn.close()
+    migrator.migrate_032_backfill_partner_places_city()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT city_id FROM partner_places WHERE id = 1").fetchone() == (1,)
+    # Заведение добавлено после миграции: город определяется по координатам
+    conn.execute("""
+        INSERT INTO partner_places (id, partner_id, title, address, geo_lat, geo_lon)
+        VALUES (2, 1, 'Pho Island', '12 Tran Hung Dao', 10.22, 103.96)
+    """)
+    conn.executemany(
+        """INSERT INTO partner_sales (partner_id, place_id, user_telegram_id, amount_gross, base_discount_pct,
+               amount_partner_due, amount_user_subsidy, redeem_rate, created_at)
+           VALUES (1, ?, 42, ?, 5, 0, 0, 1, datetime('now'))""",
+        [(1, 100.0), (2, 200.0), (1, 50.0)],
+    )
+    conn.commit()
+
+    today = date.today()
+    try:
+        rows = AnalyticsService()._aggregate_days(conn, today.isoformat(), (today + timedelta(days=1)).isoformat())
+    finally:
+        conn.close()
+
+    day = today.isoformat()
+    assert rows[(day, 'city', '1')]['revenue'] == 150.0
+    assert rows[(day, 'city', '4')]['revenue'] == 200.0
+    assert (day, 'city', '') not in rows
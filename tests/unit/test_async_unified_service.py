@@ -0,0 +1,54 @@
+"""
+Тесты асинхронного фасада мультиплатформенного API
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.database.async_unified_service import (
+    AsyncUnifiedDatabaseService, BackendUnavailableError, BlockingOffloader
+)
+
+
+class _SlowService:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def get_unified_loyalty_info(self, identifiers):
+        self.release.wait(2)
+        return {'current_points': 10}
+
+    def get_telegram_user_info(self, telegram_id):
+        return {'telegram_id': telegram_id}
+
+
+@pytest.mark.asyncio
+async def test_slow_backend_is_limited_and_does_not_block_others():
+    service = _SlowService()
+    offloader = BlockingOffloader({'main': 2, 'loyalty': 1, 'admin': 1}, timeout=0.2, queue_timeout=0.05)
+    db = AsyncUnifiedDatabaseService(service, offloader)
+
+    slow = asyncio.create_task(db.get_unified_loyalty_info({'telegram_id': 1}))
+    await asyncio.sleep(0.01)
+    with pytest.raises(BackendUnavailableError) as busy:
+        await db.get_unified_loyalty_info({'telegram_id': 2})
+    assert busy.value.reason == 'busy'
+
+    started = time.monotonic()
+    assert await db.get_telegram_user_info(5) == {'telegram_id': 5}
+    assert time.monotonic() - started < 0.1
+
+    with pytest.raises(BackendUnavailableError) as timeout:
+        await slow
+    assert timeout.value.reason == 'timeout'
+    stats = db.get_stats()
+    assert stats['loyalty']['rejected'] == 1 and stats['loyalty']['timeouts'] == 1
+    assert stats['loyalty']['in_flight'] == 1  # поток еще работает, слот занят
+
+    service.release.set()
+    await asyncio.sleep(0.05)
+    assert db.get_stats()['loyalty']['in_flight'] == 0
+    assert await db.get_unified_loyalty_info({'telegram_id': 3}) == {'current_points': 10}
+    offloader.shutdown()
@@ -0,0 +1,49 @@
+"""
+Тесты кэша отрендеренных карточек
+"""
+from core.services.card_renderer import CardRenderingService
+
+
+def _card(**fields):
+    card = {'id': 7, 'title': 'Pho 24', 'description': 'Суп', 'updated_at': '2025-01-01 10:00:00'}
+    card.update(fields)
+    return card
+
+
+def test_page_is_rendered_once_and_reused():
+    service = CardRenderingService()
+    page = [_card(id=i, title=f"Card {i}") for i in range(5)]
+
+    first = service.render_cards(page, 'ru')
+    second = service.render_cards(page, 'ru')
+
+    assert first == second
+    assert service.get_cache_stats() == {'size': 5, 'hits': 5, 'misses': 5}
+    assert service.render_cards(page, 'en') == [service.render_card(c, 'en') for c in page]
+
+
+def test_edit_and_invalidation_refresh_render():
+    service = CardRenderingService()
+    original = service.render_card(_card(), 'ru')
+
+    edited = service.render_card(_card(title='Pho 25', updated_at='2025-01-02 10:00:00'), 'ru')
+    assert 'Pho 25' in edited and edited != original
+
+    # Правка без смены updated_at видна только после явной инвалидации
+    assert service.render_card(_card(title='Pho 26'), 'ru') == original
+    service.invalidate_card(7)
+    assert 'Pho 26' in service.render_card(_card(title='Pho 26'), 'ru')
+
+
+def test_batch_renders_only_cache_misses(monkeypatch):
+    service = CardRenderingService()
+    service.render_cards([_card(id=1), _card(id=2)], 'ru')
+
+    rendered = []
+    renderer = service.get_renderer()
+    original = renderer.render_card
+    monkeypatch.setattr(renderer, 'render_card', lambda card, lang: rendered.append(card['id']) or original(card, lang))
+
+    texts = service.render_cards([_card(id=2), _card(id=3), _card(id=1), _card(id=3)], 'ru')
+    assert rendered == [3]
+    assert texts[1] == texts[3] and len(texts) == 4
@@ -0,0 +1,26 @@
+"""
+Тесты поиска по каталогу
+"""
+from core.services.catalog_search import CatalogSearchService
+from core.utils.trigrams import fts5_match_expression
+
+
+def _cards():
+    return [
+        {'id': 1, 'title': 'Sushi Bar', 'description': 'Японская кухня', 'address': '5 Pizza Lane'},
+        {'id': 2, 'title': 'Pizza Hut', 'description': 'Итальянская кухня', 'discount_text': '10%'},
+        {'id': 3, 'title': 'Spa Relax', 'description': 'Массаж', 'address': 'Tran Phu 12'},
+    ]
+
+
+def test_typos_match_and_title_ranks_first():
+    ranked = CatalogSearchService.rank(_cards(), 'pizzza')
+    assert [c['id'] for c in ranked] == [2, 1]
+    assert [c['id'] for c in CatalogSearchService.rank(_cards(), 'tran phuu')] == [3]
+    assert CatalogSearchService.rank(_cards(), 'burger') == []
+
+
+def test_category_filter_and_fts_expression():
+    assert CatalogSearchService.parse_query('#restaurants pho bo') == ('pho bo', 'restaurants')
+    assert fts5_match_expression(['pho', 'bo']) == '("pho")'
+    assert fts5_match_expression(['cafe']) == '("afe" OR "caf")'
@@ -0,0 +1,46 @@
+"""
+Тесты пакетного повтора отложенных операций FaultTolerantService
+"""
+from datetime import datetime
+
+import pytest
+
+from core.database import fault_tolerant_service as ft
+from core.database.fault_tolerant_service import DatabaseType, FaultTolerantService, PendingOperation
+
+
+def _operation(op_id, op_type, **data):
+    return PendingOperation(
+        operation_id=op_id, operation_type=op_type, target_db=DatabaseType.SUPABASE.value,
+        user_identifier=1, platform='telegram', data=data, timestamp=datetime.utcnow().isoformat()
+    )
+
+
+@pytest.mark.asyncio
+async def test_replay_batches_by_type_and_backs_off_bad_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    inserts = []
+
+    def insert_rows(table, rows):
+        inserts.append((table, len(rows)))
+        return all(row.get('points', 0) >= 0 for row in rows)
+
+    monkeypatch.setattr(ft.secure_supabase, 'insert_rows', insert_rows)
+    monkeypatch.setattr(ft.secure_supabase, 'add_loyalty_points', lambda user, points, reason: points >= 0)
+    service = FaultTolerantService()
+    service.replay_batch_size = 2
+    for i, points in enumerate([10, 20, -1, 30]):
+        service.operation_queue.add_operation(_operation(f'p{i}', 'add_loyalty_points', points=points))
+    service.operation_queue.add_operation(_operation('u1', 'create_user_profile', name='Ann'))
+
+    await service._process_pending_operations()
+
+    assert sorted(inserts) == [('loyalty_points', 2), ('loyalty_points', 2), ('user_profiles', 1)]
+    [left] = service.operation_queue.queue
+    assert left.operation_id == 'p2' and left.retry_count == 1 and left.next_attempt_at > datetime.utcnow().isoformat()
+    stats = service.get_replay_stats()
+    assert stats['replayed'] == 4 and stats['retried'] == 1 and stats['backlog'] == 1
+
+    # Пауза еще не истекла: повторный проход операцию не трогает
+    await service._process_pending_operations()
+    assert service.get_replay_stats()['passes'] == 1
@@ -0,0 +1,88 @@
+"""
+Тесты графа идентичностей: объединение по размеру, разрешение, счетчики
+"""
+import pytest
+
+from core.database import platform_adapters as pa
+from core.database.db_adapter import DatabaseAdapter
+from core.database.db_v2 import DatabaseServiceV2
+from core.database.migrations import DatabaseMigrator
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "identity.db")
+    migrator = DatabaseMigrator(path)
+    migrator.init_migration_table()
+    migrator.migrate_030_identity_graph()
+    return DatabaseServiceV2(path)
+
+
+def test_link_merges_smaller_user_into_larger_and_counts(db):
+    assert db.ensure_identity('telegram', 1, user_uuid='tg-1') == 'tg-1'
+    assert db.ensure_identity('telegram', 1, user_uuid='other') == 'tg-1'
+    assert db.link_identities(('telegram', 1), ('email', 'a@b.c')) == 'tg-1'
+
+    db.ensure_identity('device', 'd1', user_uuid='dev-1')
+    # Пользователь tg-1 больше (2 идентичности), поэтому побеждает, хотя device передан первым
+    assert db.link_identities(('device', 'd1'), ('email', 'a@b.c')) == 'tg-1'
+    assert db.link_identities(('device', 'd1'), ('telegram', '1')) == 'tg-1'
+
+    assert db.resolve_identity('device', 'd1') == 'tg-1'
+    assert db.resolve_identity('email', 'missing') is None
+    assert db.get_linked_identities('device', 'd1') == {'telegram': ['1'], 'email': ['a@b.c']}
+    assert db.get_identity_counters() == {
+        'identities': 3, 'users': 1, 'links': 2,
+        'platform:telegram': 1, 'platform:email': 1, 'platform:device': 1,
+    }
+
+
+def test_website_adapter_links_telegram_through_database_adapter(db, monkeypatch):
+    adapter = DatabaseAdapter.__new__(DatabaseAdapter)
+    adapter.use_postgresql = False
+    adapter.sqlite_service = db
+    monkeypatch.setattr(pa, 'db_v2', adapter)
+    monkeypatch.setattr(pa.WebsiteAdapter, 'get_user_info', staticmethod(lambda email: {'email': email}))
+
+    assert pa.WebsiteAdapter.link_telegram_account('A@b.c', 42) is True
+    assert pa.WebsiteAdapter.get_linked_telegram('a@b.c') == 42
+    assert pa.UniversalAdapter.get_platform_statistics()['cross_platform_links'] == 1
+
+
+@pytest.mark.asyncio
+async def test_postgres_sync_identity_calls_share_one_pool(monkeypatch):
+    from core.database import postgresql_service as pg
+
+    created = []
+
+    class _Pool:
+        def acquire(self):
+            return self
+
+        async def __aenter__(self):
+            return 'conn'
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def close(self):
+            created.remove(self)
+
+    async def create_pool(*args, **kwargs):
+        created.append(_Pool())
+        return created[-1]
+
+    async def resolve(conn, platform, external_id):
+        return f"{conn}:{platform}:{external_id}"
+
+    monkeypatch.setattr(pg.asyncpg, 'create_pool', create_pool)
+    service = pg.PostgreSQLService('postgresql://test')
+    monkeypatch.setattr(service, '_resolve_identity', resolve)
+
+    # Вызов из работающего event loop (как из хендлеров бота) не создает новых соединений
+    assert service.resolve_identity_sync('telegram', 1) == 'conn:telegram:1'
+    assert service.resolve_identity_sync('email', 'a@b.c') == 'conn:email:a@b.c'
+    assert len(created) == 1
+
+    await service.close_pool()
+    assert created == []
@@ -0,0 +1,74 @@
+"""
+Тесты шины инвалидации кэшей
+"""
+import asyncio
+import json
+
+import pytest
+
+from core.services.invalidation_bus import InvalidationBus, ReconnectingListener
+
+
+def _recording_bus():
+    bus = InvalidationBus(window=0.01)
+    calls = []
+    for kind in ("card", "partner", "category"):
+        bus.register(kind, lambda ids, kind=kind: calls.append((kind, ids)))
+    return bus, calls
+
+
+@pytest.mark.asyncio
+async def test_burst_of_notifications_is_coalesced():
+    bus, calls = _recording_bus()
+    for card_id in (1, 2, 2, 3):
+        bus.handle_payload(json.dumps({"type": "card", "ids": [card_id]}))
+    bus.handle_payload(json.dumps({"type": "partner_cab", "partner_profile_id": 9}))
+    bus.handle_payload(bus.encode("category", None))  # собственное событие уже обработано при publish
+    await asyncio.sleep(0.05)
+
+    assert sorted(calls, key=lambda c: c[0]) == [("card", frozenset({1, 2, 3})), ("partner", frozenset({9}))]
+    assert bus.get_stats()["coalesced"] == 3
+
+
+@pytest.mark.asyncio
+async def test_reconnect_triggers_full_resync():
+    bus, calls = _recording_bus()
+
+    class _FlakyListener(ReconnectingListener):
+        async def _session(self):
+            self._on_connected()
+            if self._sessions == 1:
+                raise ConnectionError("connection lost")
+            await self._stop.wait()
+
+    listener = _FlakyListener(bus, min_delay=0.01)
+    await listener.start()
+    await asyncio.sleep(0.1)
+    await listener.stop()
+
+    assert sorted(calls, key=lambda c: c[0]) == [("card", None), ("category", None), ("partner", None)]
+
+
+@pytest.mark.asyncio
+async def test_trigger_backed_kinds_are_not_sent_twice():
+    bus, calls = _recording_bus()
+    sent = []
+
+    class _TriggerTransport:
+        trigger_kinds = frozenset({"card"})
+
+        async def send(self, payload):
+            sent.append(json.loads(payload)["type"])
+
+    bus._transport = _TriggerTransport()
+    await bus.publish("card", 1)  # NOTIFY отправит триггер
+    await bus.publish("card", None)
+    await bus.publish("partner", 2)
+    assert calls == [("card", frozenset({1})), ("card", None), ("partner", frozenset({2}))]
+    assert sent == ["card", "partner"]
+
+    # Триггер на записи этого инстанса (origin из настройки сессии) и на чужой записи
+    bus.handle_payload(json.dumps({"type": "card", "ids": [1], "origin": bus.instance_id}))
+    bus.handle_payload(json.dumps({"type": "card", "ids": [5], "origin": None}))
+    await asyncio.sleep(0.05)
+    assert calls[3:] == [("card", frozenset({5}))]
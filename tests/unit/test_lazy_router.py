@@ -0,0 +1,69 @@
+"""
+Тесты ленивой регистрации роутеров
+"""
+import sys
+import types
+from datetime import datetime
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import Command
+from aiogram.types import Chat, Message, Update, User
+
+from core.utils.lazy_router import LazyRouter
+
+MODULE = "tests_lazy_router_fake_handlers"
+
+
+@pytest.fixture
+def fake_handlers_module():
+    handled = []
+    router = Router(name="fake")
+
+    @router.message(Command("tariffs"))
+    async def tariffs(message: Message):
+        handled.append(message.text)
+
+    module = types.ModuleType(MODULE)
+    module.router = router
+    sys.modules[MODULE] = module
+    yield handled
+    sys.modules.pop(MODULE, None)
+
+
+def _update(update_id: int, text: str) -> Update:
+    user = User(id=1, is_bot=False, first_name="Test")
+    return Update(update_id=update_id, message=Message(
+        message_id=update_id, date=datetime.now(), chat=Chat(id=1, type="private"),
+        from_user=user, text=text
+    ))
+
+
+@pytest.mark.asyncio
+async def test_router_loaded_on_first_matching_update(fake_handlers_module):
+    dp = Dispatcher()
+    lazy = LazyRouter(MODULE, commands=["tariffs"])
+    dp.include_router(lazy)
+    bot = Bot("42:TEST")
+
+    await dp.feed_update(bot, _update(1, "hello"))
+    assert lazy.loaded is None
+
+    await dp.feed_update(bot, _update(2, "/tariffs"))
+    await dp.feed_update(bot, _update(3, "/tariffs"))
+    assert lazy.loaded is sys.modules[MODULE].router
+    assert fake_handlers_module == ["/tariffs", "/tariffs"]
+    await bot.session.close()
+
+
+def test_triggers_are_read_from_module_without_importing_it(tmp_path, monkeypatch):
+    (tmp_path / "tests_lazy_router_exported.py").write_text(
+        'raise RuntimeError("imported")\n'
+        'LAZY_TRIGGERS = {"commands": ["tariffs"], "callback_prefixes": ["tariff_"]}\n',
+        encoding="utf-8",
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    lazy = LazyRouter.from_module("tests_lazy_router_exported")
+    assert lazy.loaded is None and "tests_lazy_router_exported" not in sys.modules
+    assert len(lazy.message.handlers) == 1 and len(lazy.callback_query.handlers) == 1
@@ -0,0 +1,38 @@
+"""
+Тесты каталога переводов: JSON-переопределения, живой translations, format_text
+"""
+import json
+
+import pytest
+
+from core.utils import locales_v2
+
+
+@pytest.fixture
+def overrides(tmp_path):
+    (tmp_path / 'ru.json').write_text(json.dumps({
+        'test_plain': 'Скобки {{ок}}', 'test_tpl': 'Привет, {name}', 'test_spec': '{{{n:>3}}} {n!r}',
+    }))
+    locales_v2.load_translations_from_dir(str(tmp_path))
+    yield tmp_path
+    locales_v2.reload_translations_if_changed()
+
+
+def test_translations_follow_overrides_and_format_unescapes_braces(overrides):
+    assert locales_v2.translations['ru']['test_tpl'] == 'Привет, {name}'
+    assert locales_v2.format_text('test_tpl', 'ru', name='Ann') == 'Привет, Ann'
+    assert locales_v2.format_text('test_plain', 'ru') == 'Скобки {ок}'
+
+    (overrides / 'ru.json').write_text(json.dumps({'test_plain': 'Новый текст'}))
+    locales_v2.load_translations_from_dir(str(overrides))
+    assert locales_v2.translations['ru']['test_plain'] == 'Новый текст'
+
+
+def test_templates_are_parsed_once_at_compile(overrides, monkeypatch):
+    def parse(value):
+        raise AssertionError("template parsed at format time")
+
+    monkeypatch.setattr(locales_v2._formatter, 'parse', parse)
+    assert locales_v2.format_text('test_spec', 'ru', n=7) == '{  7} 7'
+    assert locales_v2.format_text('test_tpl', 'en', name='Bob') == 'Привет, Bob'
+    assert locales_v2.format_text('test_tpl', 'ru') == 'Привет, {name}'
@@ -0,0 +1,101 @@
+"""
+Тесты синхронизации карточек Odoo в cards_v2
+"""
+import pytest
+
+from core.database.db_v2 import DatabaseServiceV2
+from core.database.migrations import DatabaseMigrator
+from core.services.odoo_card_sync import SYNC_SOURCE, OdooCardSyncService, map_odoo_card
+
+
+class _FakeOdoo:
+    is_configured = True
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    async def get_partner_cards_changed(self, *, since=None, after_id=0, limit=200):
+        self.calls.append((since, after_id))
+        key = lambda r: (r['write_date'], r['id'])
+        changed = [r for r in sorted(self.records, key=key) if since is None or key(r) > (since, after_id)]
+        return {'success': True, 'cards': changed[:limit]}
+
+
+class _AsyncDb:
+    def __init__(self, db):
+        self.db = db
+
+    async def get_sync_watermark(self, source):
+        return self.db.get_sync_watermark(source)
+
+    async def upsert_odoo_cards(self, cards, **kwargs):
+        return self.db.upsert_odoo_cards(cards, **kwargs)
+
+    async def retry_parked_odoo_cards(self, **kwargs):
+        return self.db.retry_parked_odoo_cards(**kwargs)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "sync.db")
+    migrator = DatabaseMigrator(path)
+    migrator.init_migration_table()
+    migrator.migrate_001_expand_legacy_tables()
+    migrator.migrate_001_1_add_categories_created_at()
+    migrator.migrate_002_expand_new_schema()
+    migrator.migrate_003_seed_default_data()
+    migrator.migrate_004_add_cards_optional_fields()
+    migrator.migrate_008_card_photos()
+    migrator.migrate_029_odoo_card_sync()
+    migrator.migrate_031_sync_parked_records()
+    return DatabaseServiceV2(path)
+
+
+def _record(odoo_id, write_date, **fields):
+    return {'id': odoo_id, 'name': f'Card {odoo_id}', 'category': 'restaurant', 'write_date': write_date,
+            'active': True, 'description': False, 'latitude': 12.24, 'longitude': 109.19, **fields}
+
+
+def test_map_odoo_card_handles_false_fields_and_archive():
+    card = map_odoo_card(_record(7, '2026-01-01 00:00:00', cashback_percent=5, active=False))
+    assert card['category_slug'] == 'restaurants' and card['status'] == 'archived'
+    assert card['description'] is None and card['discount_text'] == 'Cashback 5%'
+    assert map_odoo_card(_record(8, '2026-01-01 00:00:00', category=False)) is None
+    assert map_odoo_card(_record(9, '2026-01-01 00:00:00', status='approved'))['status'] == 'published'
+
+
+@pytest.mark.asyncio
+async def test_sync_pages_by_watermark_and_keeps_local_cards(db):
+    local_id = db.admin_add_card(555, 'spa', 'Local spa', status='published')
+    db.update_card_odoo_id(local_id, 3)
+    records = [_record(i, '2026-01-01 10:00:00') for i in (1, 2, 4)]
+    records.append(_record(3, '2026-01-01 10:00:00', name='Remote spa', category='spa'))
+    odoo = _FakeOdoo(records)
+    service = OdooCardSyncService(api=odoo, db=_AsyncDb(db))
+    service.batch_size = 2
+
+    assert await service.sync_once() == 3
+    assert odoo.calls == [(None, 0), ('2026-01-01 10:00:00', 2), ('2026-01-01 10:00:00', 4)]
+    assert db.get_sync_watermark(SYNC_SOURCE) == ('2026-01-01 10:00:00', 4)
+    assert db.get_card_by_id(local_id)['title'] == 'Local spa'
+
+    records[0].update(active=False, write_date='2026-01-02 00:00:00')
+    assert await service.sync_once() == 1
+    assert sorted(c['odoo_card_id'] for c in db.get_cards_by_category('restaurants')) == [2, 4]
+
+
+@pytest.mark.asyncio
+async def test_unknown_category_is_parked_and_applied_once_category_exists(db):
+    odoo = _FakeOdoo([_record(1, '2026-01-01 10:00:00', category='yoga'), _record(2, '2026-01-01 11:00:00')])
+    service = OdooCardSyncService(api=odoo, db=_AsyncDb(db))
+
+    assert await service.sync_once() == 1
+    assert db.get_sync_watermark(SYNC_SOURCE) == ('2026-01-01 11:00:00', 2)
+    assert db.get_cards_by_category('yoga') == []
+
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO categories_v2 (slug, name) VALUES ('yoga', 'Yoga')")
+    assert await service.sync_once() == 1
+    assert [c['odoo_card_id'] for c in db.get_cards_by_category('yoga')] == [1]
+    assert await service.sync_once() == 0  # запись больше не отложена
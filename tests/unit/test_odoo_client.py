@@ -0,0 +1,113 @@
+"""
+Тесты XML-RPC клиента Odoo: кэш, объединение запросов, circuit breaker
+"""
+import asyncio
+import threading
+import time
+from socketserver import ThreadingMixIn
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+import pytest
+
+from core.services.odoo_api import OdooKarmasystemAPI
+
+
+class _Handler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+    protocol_version = 'HTTP/1.1'
+
+
+class _Server(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def odoo_server():
+    calls, sent = [], []
+    server = _Server(('127.0.0.1', 0), requestHandler=_Handler, logRequests=False)
+    server.register_function(lambda db, user, pwd, ctx: 7, 'authenticate')
+
+    def execute_kw(db, uid, pwd, model, method, args, kwargs):
+        calls.append((model, method))
+        sent.append((method, args, kwargs))
+        if method == 'fields_get':
+            return {'name': {'type': 'char'}, 'write_date': {'type': 'datetime'}, 'active': {'type': 'boolean'}}
+        time.sleep(0.05)
+        return [{'id': 1, 'name': 'Pho 24'}]
+
+    server.register_function(execute_kw, 'execute_kw')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", calls, sent
+    server.shutdown()
+    server.server_close()
+
+
+def _client(base_url: str) -> OdooKarmasystemAPI:
+    return OdooKarmasystemAPI(base_url, db='odoo', username='bot', password='secret')
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_rpc_and_are_cached(odoo_server):
+    base_url, calls, _ = odoo_server
+    client = _client(base_url)
+
+    results = await asyncio.gather(*(
+        client.get_cards_by_category(category='restaurant', wait=5) for _ in range(5)
+    ))
+    assert all(r == {'success': True, 'cards': [{'id': 1, 'name': 'Pho 24'}]} for r in results)
+    await client.get_cards_by_category(category='restaurant')
+
+    assert calls == [('karmasystem.partner.card', 'search_read')]
+    assert client.get_stats()['coalesced'] == 4 and client.get_stats()['hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_changed_cards_send_options_as_xmlrpc_kwargs(odoo_server):
+    base_url, _, sent = odoo_server
+    client = _client(base_url)
+
+    result = await client.get_partner_cards_changed(since='2026-01-01 10:00:00', after_id=4, limit=50)
+    assert result['success']
+
+    assert sent[0] == ('fields_get', [], {'attributes': ['type']})
+    method, args, kwargs = sent[1]
+    assert method == 'search_read'
+    assert args == [['|', ['write_date', '>', '2026-01-01 10:00:00'],
+                     '&', ['write_date', '=', '2026-01-01 10:00:00'], ['id', '>', 4]]]
+    assert kwargs == {'fields': ['name', 'active', 'write_date'], 'order': 'write_date asc, id asc', 'limit': 50,
+                      'context': {'active_test': False}}
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_serves_without_waiting(monkeypatch):
+    monkeypatch.setenv("ODOO_BREAKER_THRESHOLD", "2")
+    client = _client("http://127.0.0.1:9")  # discard port: connection refused
+
+    for _ in range(2):
+        assert (await client.get_user_points(telegram_user_id='1'))['success'] is False
+    assert client.get_stats()['breaker']['state'] == 'open'
+
+    started = time.monotonic()
+    assert await client.get_user_points(telegram_user_id='2') == {'success': False, 'error': 'circuit_open'}
+    assert time.monotonic() - started < 0.05
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded_and_cancellation_is_not_a_failure(monkeypatch):
+    monkeypatch.setenv("ODOO_CACHE_MAX_ENTRIES", "2")
+    monkeypatch.setenv("ODOO_BREAKER_THRESHOLD", "1")
+    client = _client("http://127.0.0.1:9")
+
+    async def fetch():
+        return {'success': True}
+
+    for user in ('1', '2', '1', '3'):
+        await client._cached(('points', user), fetch)
+    assert list(client._cache) == [('points', '1'), ('points', '3')]  # '2' давно не читали
+
+    task = asyncio.ensure_future(client._call(time.sleep, 1))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert client.get_stats()['breaker'] == {'state': 'closed', 'failures': 0, 'rejected': 0}
@@ -0,0 +1,69 @@
+"""
+Тесты генерации пластиковых карт на SQLite: диапазон номеров и запись CSV
+"""
+import csv
+import sqlite3
+
+import pytest
+
+from core.services.plastic_cards_service import PlasticCardsService
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    path = tmp_path / "cards.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE cards_generated (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id TEXT UNIQUE NOT NULL,
+            card_id_printable TEXT NOT NULL,
+            qr_url TEXT NOT NULL,
+            created_by INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_blocked BOOLEAN DEFAULT FALSE,
+            is_deleted BOOLEAN DEFAULT FALSE
+        );
+        CREATE TABLE admin_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            target_id TEXT,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.close()
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("DATABASE_PATH", str(path))
+    return path
+
+
+@pytest.mark.asyncio
+async def test_generate_cards_sqlite_continues_range(sqlite_db, tmp_path):
+    service = PlasticCardsService()
+
+    first = await service.generate_cards(3, created_by=1, csv_path=str(tmp_path / "a.csv"))
+    second = await service.generate_cards(2, created_by=1, csv_path=str(tmp_path / "b.csv"))
+
+    assert first['success'] and second['success']
+    assert second['created_count'] == 2
+
+    conn = sqlite3.connect(sqlite_db)
+    card_ids = [row[0] for row in conn.execute("SELECT card_id FROM cards_generated ORDER BY id")]
+    logs = conn.execute("SELECT COUNT(*) FROM admin_logs WHERE action = 'generate_cards'").fetchone()[0]
+    conn.close()
+
+    assert len(set(card_ids)) == 5
+    assert logs == 2
+    with open(second['csv_path'], newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert card_ids[-1] in rows[-1]
+
+
+@pytest.mark.asyncio
+async def test_generate_cards_sqlite_rejects_invalid_count(sqlite_db):
+    result = await PlasticCardsService().generate_cards(0, created_by=1)
+
+    assert not result['success']
+    assert result['error_code'] == 'invalid_count'
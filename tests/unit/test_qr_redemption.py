@@ -0,0 +1,127 @@
+"""
+Тесты атомарного погашения QR-кодов
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from core.models import QRCode
+from core.services.qr_code_service import QRCodeService
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Файловая SQLite-база, чтобы параллельные сессии работали с одной таблицей"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'qr.db'}")
+    async with engine.begin() as conn:
+        # DDL без внешних ключей: users/partners_v2 в этом тесте не нужны
+        await conn.exec_driver_sql("""
+            CREATE TABLE qr_codes (
+                id INTEGER PRIMARY KEY,
+                qr_id VARCHAR(36) UNIQUE NOT NULL,
+                user_id INTEGER NOT NULL,
+                discount_type VARCHAR(50) NOT NULL,
+                discount_value INTEGER NOT NULL,
+                description TEXT,
+                expires_at DATETIME NOT NULL,
+                is_used BOOLEAN NOT NULL DEFAULT 0,
+                used_at DATETIME,
+                used_by_partner_id INTEGER,
+                created_at DATETIME NOT NULL,
+                updated_at DATETIME NOT NULL
+            )
+        """)
+        await conn.exec_driver_sql(
+            "CREATE INDEX idx_qr_codes_unused ON qr_codes (qr_id, expires_at) WHERE is_used = 0"
+        )
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def _add_qr(factory, qr_id: str, expires_at: datetime, is_used: bool = False):
+    now = datetime.utcnow()
+    async with factory() as session:
+        await session.execute(QRCode.__table__.insert().values(
+            qr_id=qr_id,
+            user_id=1,
+            discount_type="loyalty_points",
+            discount_value=100,
+            description="test",
+            expires_at=expires_at,
+            is_used=is_used,
+            created_at=now,
+            updated_at=now
+        ))
+        await session.commit()
+
+
+class TestQRRedemption:
+    """Тесты для QRCodeService.redeem_qr_code"""
+    
+    @pytest.mark.asyncio
+    async def test_parallel_scans_redeem_exactly_once(self, session_factory):
+        """Параллельные сканы одного кода: успешен ровно один"""
+        await _add_qr(session_factory, "qr-1", datetime.utcnow() + timedelta(hours=1))
+        
+        async def scan(partner_id: int):
+            async with session_factory() as session:
+                return await QRCodeService(session).redeem_qr_code("qr-1", partner_id)
+        
+        results = await asyncio.gather(*(scan(partner_id) for partner_id in range(1, 21)))
+        
+        successes = [r for r in results if r["success"]]
+        assert len(successes) == 1
+        assert successes[0]["discount_value"] == 100
+        assert all(r["error"] == "QR code already used" for r in results if not r["success"])
+        
+        async with session_factory() as session:
+            qr = (await session.execute(QRCode.__table__.select())).one()
+            assert qr.is_used is True
+            assert qr.used_by_partner_id == successes[0]["partner_id"]
+    
+    @pytest.mark.asyncio
+    async def test_expired_code_is_not_redeemed(self, session_factory):
+        """Просроченный код не погашается"""
+        await _add_qr(session_factory, "qr-expired", datetime.utcnow() - timedelta(minutes=1))
+        
+        async with session_factory() as session:
+            result = await QRCodeService(session).redeem_qr_code("qr-expired", 1)
+        
+        assert result["success"] is False
+        assert result["error"] == "QR code expired"
+    
+    @pytest.mark.asyncio
+    async def test_unknown_code(self, session_factory):
+        """Несуществующий код"""
+        async with session_factory() as session:
+            result = await QRCodeService(session).redeem_qr_code("missing", 1)
+        
+        assert result["success"] is False
+        assert result["error"] == "QR code not found"
+
+
+@pytest.mark.asyncio
+async def test_render_cache_ignores_fields_outside_payload(monkeypatch):
+    """Повторный рендер того же кода берётся из кэша, даже если в dict есть лишние поля"""
+    from core.services import qr_code_service
+
+    calls = []
+    monkeypatch.setattr(qr_code_service, "_render_qr", lambda payload, fmt: calls.append(payload) or f"img:{payload}")
+    monkeypatch.setattr(qr_code_service, "_render_cache", qr_code_service.OrderedDict())
+
+    qr_data = {
+        "qr_id": "qr-cache",
+        "user_id": 1,
+        "discount_type": "loyalty_points",
+        "discount_value": 100,
+        "expires_at": datetime(2030, 1, 1),
+    }
+    service = QRCodeService(None)
+    first = await service.render_qr_images([qr_data])
+    second = await service.render_qr_images([{**qr_data, "created_at": datetime.utcnow()}])
+
+    assert first == second
+    assert len(calls) == 1
@@ -0,0 +1,54 @@
+"""
+Тесты построчной выгрузки продаж в CSV на мигрированной SQLite
+"""
+import csv
+import io
+
+import pytest
+
+from core.database.db_v2 import DatabaseServiceV2
+from core.database.migrations import DatabaseMigrator
+from core.services import report_service as rs
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    path = str(tmp_path / "reports.db")
+    migrator = DatabaseMigrator(path)
+    migrator.init_migration_table()
+    migrator.migrate_017_loyalty_system()
+    migrator.migrate_020_loyalty_expansion()
+    migrator.migrate_026_analytics_daily()
+    db = DatabaseServiceV2(path)
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO partners (id, code, title) VALUES (1, 'P1', 'Pho Corp')")
+        conn.executemany(
+            "INSERT INTO partner_places (id, partner_id, title, address, city_id) VALUES (?, 1, ?, 'Tran Phu 1', ?)",
+            [(1, 'Pho 24', 1), (2, 'Pho Danang', 2)],
+        )
+        conn.executemany(
+            """INSERT INTO partner_sales (partner_id, place_id, user_telegram_id, amount_gross, base_discount_pct,
+                   amount_partner_due, amount_user_subsidy, redeem_rate, created_at)
+               VALUES (1, ?, 42, ?, 5, 0, 0, 1, datetime('now', '-1 hour'))""",
+            [(1, 100.0), (2, 200.0), (1, 300.0)],
+        )
+    service = rs.ReportService()
+    service.db = db
+
+    async def admin_role(user_id):
+        return "admin"
+
+    monkeypatch.setattr(rs, "get_user_role", admin_role)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_export_streams_sales_filtered_by_city(service):
+    result = await service.export_report(1, {"period": "неделя", "city_id": 1}, fmt="csv")
+    assert result["success"], result.get("error")
+    rows = list(csv.DictReader(io.TextIOWrapper(result["file"], encoding="utf-8-sig")))
+    result["file"].close()
+
+    assert result["rows"] == 2
+    assert sorted(float(row["amount_gross"]) for row in rows) == [100.0, 300.0]
+    assert {(row["place_name"], row["partner_name"], row["city_id"]) for row in rows} == {("Pho 24", "Pho Corp", "1")}
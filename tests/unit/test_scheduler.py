@@ -0,0 +1,36 @@
+"""
+Тесты планировщика периодических задач
+"""
+import asyncio
+
+import pytest
+
+from core.utils.scheduler import JobScheduler
+
+
+@pytest.mark.asyncio
+async def test_slow_job_skips_ticks_and_reports_timing():
+    scheduler = JobScheduler("test")
+    started = []
+
+    async def slow():
+        started.append(1)
+        await asyncio.sleep(0.12)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    scheduler.add_job("slow", slow, interval=0.03, jitter=0)
+    scheduler.add_job("broken", broken, interval=0.03, jitter=0)
+    await scheduler.start()
+    await asyncio.sleep(0.1)
+
+    stats = scheduler.get_stats()
+    assert len(started) == 1 and stats['slow']['running'] and stats['slow']['skipped'] >= 2
+    assert stats['broken']['failures'] >= 2 and stats['broken']['last_error'] == 'boom'
+    assert stats['broken']['last_run'] is not None and stats['broken']['last_duration'] is not None
+
+    await scheduler.stop(grace=1)
+    stats = scheduler.get_stats()
+    assert stats['slow']['runs'] == 1 and not stats['slow']['running']
+    assert not scheduler.is_running
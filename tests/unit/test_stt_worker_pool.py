@@ -0,0 +1,115 @@
+"""
+Тестовый стенд пула распознавания речи: прогоняет сгенерированные WAV-файлы
+(как PCM из ffmpeg pipe) через STTWorkerPool с подменной функцией транскрибации
+"""
+import asyncio
+import math
+import struct
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.services.stt_worker_pool import STTQueueFull, STTWorkerPool
+
+SAMPLE_RATE = 16000
+
+_calls = []
+_calls_lock = threading.Lock()
+
+
+def _write_sample(path, seconds: float, freq: float = 440.0) -> str:
+    """16 кГц моно s16le — тот же формат, что отдает VoiceService.decode_audio"""
+    frames = int(SAMPLE_RATE * seconds)
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b''.join(
+            struct.pack('<h', int(8000 * math.sin(2 * math.pi * freq * i / SAMPLE_RATE)))
+            for i in range(frames)
+        ))
+    return str(path)
+
+
+def _read_pcm(path: str) -> bytes:
+    with wave.open(path, 'rb') as wav:
+        return wav.readframes(wav.getnframes())
+
+
+def fake_transcribe(pcm: bytes):
+    """Подмена модели: «распознает» длительность записи"""
+    duration = len(pcm) / 2 / SAMPLE_RATE
+    with _calls_lock:
+        _calls.append(len(pcm))
+    return f"{duration:.1f}s", "ru"
+
+
+def slow_transcribe(pcm: bytes):
+    time.sleep(0.3)
+    return fake_transcribe(pcm)
+
+
+@pytest.fixture
+def samples(tmp_path):
+    return [
+        _read_pcm(_write_sample(tmp_path / f"sample_{i}.wav", 0.5 + i * 0.5))
+        for i in range(4)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_process_pool_transcribes_sample_files(samples):
+    pool = STTWorkerPool(workers=2, max_queue=8, timeout=30, transcribe_fn=fake_transcribe, initializer=None)
+    try:
+        results = await asyncio.gather(*(pool.submit(i, pcm) for i, pcm in enumerate(samples)))
+    finally:
+        await pool.shutdown()
+
+    assert results == [("0.5s", "ru"), ("1.0s", "ru"), ("1.5s", "ru"), ("2.0s", "ru")]
+    metrics = pool.get_metrics()
+    assert metrics['completed'] == 4
+    assert metrics['queue_depth'] == 0
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_users(samples):
+    _calls.clear()
+    pool = STTWorkerPool(
+        workers=1, max_queue=8, per_user_limit=3, transcribe_fn=fake_transcribe,
+        executor_factory=lambda: ThreadPoolExecutor(max_workers=1)
+    )
+    try:
+        await asyncio.gather(
+            pool.submit(1, samples[0]), pool.submit(1, samples[1]), pool.submit(1, samples[2]),
+            pool.submit(2, samples[3]),
+        )
+    finally:
+        await pool.shutdown()
+
+    # Второй пользователь не ждет, пока отработает вся очередь первого
+    assert _calls.index(len(samples[3])) == 1
+
+
+@pytest.mark.asyncio
+async def test_backpressure_and_timeout(samples):
+    pool = STTWorkerPool(
+        workers=1, max_queue=2, per_user_limit=2, timeout=0.1, transcribe_fn=slow_transcribe,
+        executor_factory=lambda: ThreadPoolExecutor(max_workers=1)
+    )
+    try:
+        outcomes = await asyncio.gather(
+            pool.submit(1, samples[0]), pool.submit(2, samples[1]), pool.submit(3, samples[2]),
+            return_exceptions=True
+        )
+    finally:
+        await pool.shutdown()
+
+    assert isinstance(outcomes[2], STTQueueFull)
+    assert all(isinstance(o, asyncio.TimeoutError) for o in outcomes[:2])
+    metrics = pool.get_metrics()
+    assert metrics['rejected'] == 1
+    assert metrics['timeouts'] == 2
+    assert metrics['queue_depth'] == 0
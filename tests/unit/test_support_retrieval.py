@@ -0,0 +1,33 @@
+"""
+Тесты поиска ответов AI-ассистента
+"""
+from core.services.support_retrieval import IntentMatcher, SupportDocument, SupportKnowledgeBase
+
+
+def test_intent_matcher_prefers_longest_phrase_then_priority():
+    matcher = IntentMatcher({
+        "report_make": ["отчёт", "сделай"],
+        "report_help": ["какие отчёты"],
+    })
+    assert matcher.match("Какие отчеты доступны?") == "report_help"
+    assert matcher.match("сделай какие отчёты есть") == "report_make"
+    assert matcher.match("привет") is None
+
+
+def test_knowledge_base_reindexes_only_changed_documents():
+    docs = {
+        "qr": SupportDocument("qr", "faq", "qr код истёк срок", answer="new qr"),
+        "points": SupportDocument("points", "faq", "недостаточно баллов", answer="earn points"),
+        "admin": SupportDocument("admin", "help", "панель администратора", answer="admin", roles=frozenset({"admin"})),
+    }
+    kb = SupportKnowledgeBase(loader=lambda: list(docs.values()))
+
+    assert kb.refresh(force=True) == 3
+    assert kb.search("у меня истёк QR")[0][0].answer == "new qr"
+    assert kb.search("панель администратора", role="user") == []
+
+    docs["points"] = SupportDocument("points", "faq", "баланс пуст", answer="earn points")
+    del docs["qr"]
+    assert kb.refresh(force=True) == 2
+    assert kb.search("qr истёк") == []
+    assert kb.search("баланс", min_score=0)[0][0].doc_id == "points"
@@ -0,0 +1,76 @@
+"""
+Тесты объединенной лояльности: параллельный опрос платформ, слияние истории, кэш
+"""
+import threading
+import time
+
+from core.database import platform_adapters as pa
+from core.database.platform_adapters import MobileAppAdapter, TelegramAdapter, UniversalAdapter, WebsiteAdapter
+
+
+def test_fan_out_merges_sorted_histories_and_skips_slow_platform(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def telegram(telegram_id):
+        calls.append('telegram')
+        time.sleep(0.1)
+        return {'current_points': 50, 'partner_cards': [{'card_id': 'A'}],
+                'recent_history': [{'created_at': '2026-01-05'}, {'created_at': '2026-01-01'}]}
+
+    def website(email):
+        time.sleep(0.1)
+        return {'current_points': 40, 'partner_cards': [{'card_id': 'A'}, {'card_id': 'B'}],
+                'recent_history': [{'created_at': '2026-01-03'}, {'created_at': '2026-01-04'}]}
+
+    def mobile(device_id, platform):
+        if platform == 'mobile_ios':
+            release.wait(2)
+        return {'current_points': 0}
+
+    monkeypatch.setattr(TelegramAdapter, 'get_loyalty_info', staticmethod(telegram))
+    monkeypatch.setattr(WebsiteAdapter, 'get_loyalty_info', staticmethod(website))
+    monkeypatch.setattr(MobileAppAdapter, 'get_loyalty_info', staticmethod(mobile))
+    monkeypatch.setattr(pa, 'LOYALTY_PLATFORM_TIMEOUT', 0.5)
+    pa._unified_loyalty_cache.clear()
+
+    started = time.monotonic()
+    result = UniversalAdapter.get_unified_loyalty_info({'telegram_id': 1, 'email': 'a@b.c', 'device_id': 'd'})
+    release.set()
+
+    assert time.monotonic() - started < 1.0  # telegram и website шли параллельно, iOS отброшен по таймауту
+    assert result['platforms'] == ['telegram', 'website'] and result['platforms_timed_out'] == ['mobile_ios']
+    assert result['total_points'] == 50
+    assert [c['card_id'] for c in result['partner_cards']] == ['A', 'B']
+    assert [h['created_at'] for h in result['history']] == ['2026-01-05', '2026-01-04', '2026-01-03', '2026-01-01']
+
+    # Частичный ответ не кэшируется, полный — кэшируется по набору идентификаторов
+    UniversalAdapter.get_unified_loyalty_info({'email': 'a@b.c', 'telegram_id': 1})
+    UniversalAdapter.get_unified_loyalty_info({'telegram_id': 1, 'email': 'a@b.c'})
+    assert calls == ['telegram', 'telegram']
+
+
+def test_cache_returns_copies_and_resets_on_points_change(monkeypatch):
+    points = {'value': 10}
+    monkeypatch.setattr(TelegramAdapter, 'get_loyalty_info',
+                        staticmethod(lambda telegram_id: {'current_points': points['value']}))
+    pa._unified_loyalty_cache.clear()
+
+    first = UniversalAdapter.get_unified_loyalty_info({'telegram_id': 7})
+    first['platforms'].append('mutated')
+    assert UniversalAdapter.get_unified_loyalty_info({'telegram_id': 7})['platforms'] == ['telegram']
+
+    points['value'] = 25
+    pa.fault_tolerant_db._notify_points_changed(7)
+    assert UniversalAdapter.get_unified_loyalty_info({'telegram_id': 7})['total_points'] == 25
+
+
+def test_platform_with_no_free_slots_is_skipped(monkeypatch):
+    monkeypatch.setattr(TelegramAdapter, 'get_loyalty_info', staticmethod(lambda telegram_id: {'current_points': 5}))
+    monkeypatch.setattr(WebsiteAdapter, 'get_loyalty_info', staticmethod(lambda email: {'current_points': 9}))
+    monkeypatch.setitem(pa._loyalty_slots, 'website', threading.BoundedSemaphore(1))
+    pa._loyalty_slots['website'].acquire()  # единственный слот занят зависшим вызовом
+    pa._unified_loyalty_cache.clear()
+
+    result = UniversalAdapter.get_unified_loyalty_info({'telegram_id': 8, 'email': 'x@y.z'})
+    assert result['platforms'] == ['telegram'] and result['platforms_timed_out'] == ['website']